@@ -0,0 +1,62 @@
+"""How many simulated cameras can one asyncio event loop drive?
+
+Each simulated camera is a picocam.emulator.PicoEmulator (CircuitPython
+dialect) serving the largest sample JPEG from a child process at LINK_RATE
+bytes/s. The parent drives every pty from a single event loop through
+picocam.aio and measures its own CPU time, so the emulators do not count
+against the host core.
+
+    uv run benchmarks/bench_aio.py [max_cameras]
+"""
+import asyncio
+import sys
+import time
+
+from simserial import sample_jpegs
+from picocam.aio import AsyncPicoCamera
+from picocam.camera import CIRCUITPYTHON
+from picocam.emulator import PicoEmulator
+
+LINK_RATE = 500_000  # bytes/s per camera, roughly a busy CircuitPython USB CDC link
+FRAMES = 4
+
+
+async def drive(emulators):
+    cams = [AsyncPicoCamera(fd=emu.fd, dialect=CIRCUITPYTHON) for emu in emulators]
+    for cam in cams:
+        await cam.open()
+
+    async def run(cam):
+        total = 0
+        async for header, jpeg in cam.stream_frames(FRAMES):
+            total += header.length
+        return total
+
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    totals = await asyncio.gather(*(run(cam) for cam in cams))
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+    for cam in cams:
+        cam.close()
+    return sum(totals), wall, cpu
+
+
+def main():
+    max_cams = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    jpeg = sample_jpegs()[0]
+    print(f"{FRAMES} x {len(jpeg)} byte frames per camera at {LINK_RATE / 1e3:.0f} KB/s each")
+    print(f"{'cameras':>7} {'MB/s':>8} {'per cam':>9} {'CPU':>6}  {'CPU ms/MB':>9}")
+    n = 1
+    while n <= max_cams:
+        emulators = [PicoEmulator(CIRCUITPYTHON, [jpeg], rate=LINK_RATE).start() for _ in range(n)]
+        total, wall, cpu = asyncio.run(drive(emulators))
+        for emu in emulators:
+            emu.stop()
+        per_cam = total / wall / n
+        cost = cpu / (total / 1e6) * 1000
+        print(f"{n:>7} {total / wall / 1e6:8.2f} {per_cam / 1e3:7.0f}KB {cpu / wall:6.0%}  {cost:9.2f}")
+        n *= 2
+    print(f"One core sustains about {1e3 / (cost * LINK_RATE / 1e6):.0f} cameras at this link rate")
+
+
+if __name__ == "__main__":
+    main()
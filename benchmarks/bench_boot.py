@@ -0,0 +1,83 @@
+"""Sensor programming cost at boot: before vs after the shadow register cache.
+
+Runs circuitpython/Arducam.py on the simulated buses in simbus.py for the
+boot path of code.py's run_diagnostics() (init_cam() + the size table +
+its 0.5 s settle), a 0x11 re-init, and a repeated size-table write. The
+"before" driver is the file at the git revision given with --before
+(default: the last one without the cache). The sync sweep is unchanged
+and not included.
+
+    uv run benchmarks/bench_boot.py
+"""
+import argparse
+import contextlib
+import inspect
+import io
+import os
+
+import simbus
+from picocam.regs import read_compiled
+
+# Resolution programmed by code.py at boot (SELECTED_RESOLUTION)
+BOOT_SIZE = 'ov5642_2592x1944'
+
+
+def init(cam, size_regs):
+    # Drivers before the cache programmed the size table after init_cam()
+    if 'size_regs' in inspect.signature(cam.init_cam).parameters:
+        cam.init_cam(size_regs)
+    else:
+        cam.init_cam()
+        cam.set_jpeg_size(size_regs)
+
+
+def boot(module, clock, size_regs):
+    with contextlib.redirect_stdout(io.StringIO()):  # Driver's 'OV5642 detected' etc.
+        return _boot(module, clock, size_regs)
+
+
+def _boot(module, clock, size_regs):
+    cam = module.Arducam()
+    clock.reset()
+    init(cam, size_regs)
+    clock.sleep(0.5)
+    result = {'boot': (clock.now, dict(clock.stats))}
+
+    clock.reset()
+    init(cam, size_regs)
+    result['reinit'] = (clock.now, dict(clock.stats))
+
+    clock.reset()
+    cam.set_jpeg_size(size_regs)
+    result['size'] = (clock.now, dict(clock.stats))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--before', help="git revision of the driver to compare against")
+    args = parser.parse_args()
+    args.before = args.before or simbus.revision_before('UNCACHED_REGS', 'circuitpython/Arducam.py')
+
+    clock = simbus.install()
+    with open(os.path.join(simbus.CIRCUITPYTHON_DIR, 'OV5642_regs.bin'), 'rb') as f:
+        size_regs = read_compiled(f.read())[0][BOOT_SIZE]
+
+    runs = {
+        f'before ({args.before})': boot(simbus.load_driver(clock, args.before), clock, size_regs),
+        'after (worktree)': boot(simbus.load_driver(clock), clock, size_regs),
+    }
+
+    print(f"{'driver':<22} {'step':<8} {'time s':>8} {'writes':>7} {'locks':>6} "
+          f"{'sleeps':>7} {'sleep s':>8}")
+    for name, result in runs.items():
+        for step, (elapsed, stats) in result.items():
+            print(f"{name:<22} {step:<8} {elapsed:>8.3f} {stats['i2c_writes']:>7} "
+                  f"{stats['locks']:>6} {stats['sleeps']:>7} {stats['sleep_time']:>8.3f}")
+    (before, _), (after, _) = (r['boot'] for r in runs.values())
+    print(f"\nBoot to 'Camera Ready!' (excluding the sync sweep): "
+          f"{before:.2f} s -> {after:.2f} s ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Burst capture throughput with and without background disk writes.
+
+Replays a simulated 0x12 burst over a rate-limited link. The sample JPEGs in
+images/ stand in for QVGA, UXGA and 5MP frames. For each, frames are either
+written inline on the receive loop or handed to picocam.burst's
+BackgroundWriter, and the sustained frames/minute and time between frames
+are reported.
+
+    uv run benchmarks/bench_burst.py [link_bytes_per_second]
+"""
+import os
+import sys
+import tempfile
+
+from simserial import SimulatedSerial, sample_jpegs
+from picocam.burst import BackgroundWriter, format_stats, receive_burst
+from picocam.frame import encode_frame
+
+FRAMES = 8
+# Sample captures stand in for these resolution ids (see ArduCAM.h)
+RESOLUTION_IDS = (6, 4, 0)
+
+
+def burst_stream(jpeg, resolution, count):
+    out = bytearray()
+    for seq in range(1, count + 1):
+        out += b"ACK CMD Capture Started... END\n"
+        out += f"ACK CMD Length: {len(jpeg)} END\n".encode()
+        out += b"ACK IMG END\n"
+        out += encode_frame(jpeg, resolution, seq)
+    out += f"ACK CMD Burst Done: {count} frames END\n".encode()
+    return out
+
+
+def run(jpeg, resolution, rate, pipelined):
+    ser = SimulatedSerial(burst_stream(jpeg, resolution, FRAMES), rate=rate)
+    with tempfile.TemporaryDirectory() as tmp:
+        if pipelined:
+            writer = BackgroundWriter(tmp)
+            on_frame = lambda header, data: writer.submit(data, header.sequence)
+        else:
+            def on_frame(header, data):
+                with open(os.path.join(tmp, f"{header.sequence}.jpg"), 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+        stats = receive_burst(ser, FRAMES, on_frame)
+        if pipelined:
+            writer.close()
+    return stats
+
+
+def main():
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"Link: {rate / 1e6:.2f} MB/s, {FRAMES} frames per burst")
+    for jpeg, res in zip(sample_jpegs(), RESOLUTION_IDS):
+        for pipelined in (False, True):
+            stats = run(jpeg, res, rate, pipelined)
+            mode = "background" if pipelined else "inline"
+            print(f"{mode:<10} {format_stats(stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Whole-frame retry vs chunked selective retransmission on a lossy link.
+
+The emulator flips a byte in each 4 KB block with probability --error
+(several rates by default). Whole-frame mode retakes the picture until a
+frame passes its CRC, as the capture scripts do today; chunked mode (0x14)
+asks only for the damaged chunks again. Reported per mode: mean time per
+good image, and attempts or resent chunks per image.
+
+    uv run benchmarks/bench_chunked.py --rate 1000000 --size 1.5 --images 5
+"""
+import argparse
+import time
+
+from simserial import sample_jpegs
+from picocam.camera import CIRCUITPYTHON, PicoCamera
+from picocam.emulator import Faults, PicoEmulator
+from picocam.frame import FrameError
+
+MAX_ATTEMPTS = 50
+
+
+def whole_frame(cam, count):
+    times, attempts = [], 0
+    for _ in range(count):
+        start = time.perf_counter()
+        for _ in range(MAX_ATTEMPTS):
+            attempts += 1
+            try:
+                cam.capture()
+                break
+            except FrameError:
+                continue
+        times.append(time.perf_counter() - start)
+    return times, attempts
+
+
+def chunked(cam, count):
+    times, resent = [], 0
+    for _ in range(count):
+        start = time.perf_counter()
+        cam.capture(chunked=True)
+        times.append(time.perf_counter() - start)
+        resent += cam.last_chunk_stats['resent']
+    return times, resent
+
+
+def run(error, jpeg, rate, count):
+    faults = Faults(block_error=error)
+    row = {}
+
+    with PicoEmulator(CIRCUITPYTHON, [jpeg], rate=rate, faults=faults, seed=1) as emu:
+        with PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+            times, attempts = whole_frame(cam, count)
+    row['whole'] = (sum(times) / count, attempts / count)
+
+    with PicoEmulator(CIRCUITPYTHON, [jpeg], rate=rate, faults=faults, seed=1) as emu:
+        with PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+            times, resent = chunked(cam, count)
+    row['chunked'] = (sum(times) / count, resent / count)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--rate', type=float, default=1_000_000, help="Link speed in bytes/s")
+    parser.add_argument('--images', type=int, default=5, help="Good images per mode and error rate")
+    parser.add_argument('--error', type=float, action='append',
+                        help="Per-4KB-block error probability (repeatable)")
+    parser.add_argument('--size', type=float, help="Payload size in MB (default: largest sample)")
+    args = parser.parse_args()
+
+    jpeg = sample_jpegs()[0]
+    if args.size:
+        # Stand-in for a full 5MP frame: the sample repeated, ending on its EOI
+        jpeg = jpeg * -(-int(args.size * 1e6) // len(jpeg))
+    errors = args.error or [0.0, 0.001, 0.005, 0.02]
+    size = len(jpeg)
+    blocks = -(-size // 4096)
+    print(f"Payload {size / 1e6:.2f} MB ({blocks} blocks) at {args.rate / 1e6:.1f} MB/s, "
+          f"{args.images} good images per run")
+    print(f"{'block err':>10} {'P(clean)':>9} {'whole s/img':>12} {'attempts':>9} "
+          f"{'chunked s/img':>14} {'resent':>7} {'speedup':>8}")
+    for error in errors:
+        row = run(error, jpeg, args.rate, args.images)
+        whole, attempts = row['whole']
+        part, resent = row['chunked']
+        print(f"{error:>10.3f} {(1 - error) ** blocks:>9.2f} {whole:>12.2f} {attempts:>9.1f} "
+              f"{part:>14.2f} {resent:>7.1f} {whole / part:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Connect to first image byte: boot waits vs the status ping (0x18).
+
+PicoCamera opens a picocam.emulator.PicoEmulator of each firmware dialect
+and captures one frame. The time from opening the port to the first frame
+byte ('ACK IMG END') is averaged over --runs connections, with and without
+the status ping probe (probe=False is the previous open()):
+
+  booted   the board has been up for a while; each connection starts at a
+           random point in the CircuitPython heartbeat cycle
+  booting  the board is powered up as the host connects and takes
+           BOOT_DELAY seconds to initialize
+
+Before that, circuitpython/code.py is run on the simulated HAL with a ping
+queued during its diagnostics, to check that it answers 'initializing'
+there and 'ready' afterwards.
+
+    uv run benchmarks/bench_connect.py
+"""
+import argparse
+import contextlib
+import os
+import random
+import re
+import select
+import sys
+import time
+
+import simbus
+from simserial import sample_jpegs
+from picocam.camera import ARDUINO, CIRCUITPYTHON, PicoCamera
+from picocam.emulator import HEARTBEAT_INTERVAL, PicoEmulator
+
+BOOT_DELAY = 2.5  # The sketch's setup() alone waits 2.5s for USB serial
+LINK_RATE = 1_000_000
+
+
+def device_statuses(jpeg):
+    """States code.py reports for a ping queued before diagnostics and one after."""
+    clock = simbus.install()
+    hal = sys.modules['hal']
+    with contextlib.redirect_stdout(simbus.ConsoleText(hal.console)):
+        driver = simbus.load_driver(clock)
+        firmware = simbus.load_firmware(clock, driver=driver)
+        cam = firmware['cam'] = driver.Arducam()
+        cam.spi.fifo = jpeg + bytes(8)
+        hal.console.sent.clear()
+        hal.console.feed("\x18")
+        firmware['run_diagnostics']()
+        hal.console.feed("\x18")
+        firmware['poll_ping']()
+    return re.findall(r"ACK CMD Status: (\w+)", bytes(hal.console.sent).decode('ascii', errors='ignore'))
+
+
+def drain(fd, quiet=0.3):
+    # Drop what the emulator has printed so far (boot chatter, heartbeats)
+    while select.select([fd], [], [], quiet)[0]:
+        os.read(fd, 65536)
+
+
+def connect(port, dialect, probe):
+    """(seconds to first frame byte, DeviceStatus or None) for one connection."""
+    first = None
+
+    def on_line(text):
+        nonlocal first
+        if first is None and "ACK IMG END" in text:
+            first = time.perf_counter()
+
+    start = time.perf_counter()
+    with PicoCamera(port, dialect, on_line=on_line, probe=probe) as cam:
+        cam.capture()
+        return first - start, cam.status
+
+
+def run(dialect, jpeg, scenario, probe, runs, rng):
+    times = []
+    status = None
+    for _ in range(runs):
+        if scenario == 'booted':
+            with PicoEmulator(dialect, [jpeg], rate=LINK_RATE) as emu:
+                drain(emu.fd)
+                time.sleep(rng.uniform(0, HEARTBEAT_INTERVAL))
+                drain(emu.fd, 0)
+                elapsed, status = connect(emu.port, dialect, probe)
+        else:
+            with PicoEmulator(dialect, [jpeg], rate=LINK_RATE, boot_delay=BOOT_DELAY) as emu:
+                elapsed, status = connect(emu.port, dialect, probe)
+        times.append(elapsed)
+    return times, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--runs', type=int, default=3, help="Connections per dialect, scenario and method")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    jpeg = max(sample_jpegs(), key=len)
+
+    states = device_statuses(jpeg)
+    print(f"code.py status replies: during diagnostics {states[0] if states else None}, "
+          f"after {states[1] if len(states) > 1 else None}")
+    if states != ['initializing', 'ready']:
+        raise SystemExit(1)
+
+    print(f"\n{len(jpeg)} byte JPEG, {LINK_RATE / 1e6:.1f} MB/s link, {BOOT_DELAY}s boot, {args.runs} runs")
+    print(f"{'dialect':<14} {'board':<8} {'open()':<11} {'mean ms':>8} {'max ms':>8}  status")
+    for dialect in (ARDUINO, CIRCUITPYTHON):
+        for scenario in ('booted', 'booting'):
+            for name, probe in (("boot wait", False), ("ping", True)):
+                times, status = run(dialect, jpeg, scenario, probe, args.runs, rng)
+                reported = '-' if status is None else f"{status.state}, {status.dialect} {status.version}"
+                print(f"{dialect:<14} {scenario:<8} {name:<11} {sum(times) / len(times) * 1000:>8.1f} "
+                      f"{max(times) * 1000:>8.1f}  {reported}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Device-side hot paths of code.py and Arducam.py, run under CPython.
+
+Runs the CircuitPython firmware on the simulated HAL in simbus.py and
+measures host CPU time for the loops that dominate on the Pico:
+
+  stream        capture_frame() + stream_image() of a --size MB frame
+  fifo_burst    cam.read_fifo_burst() of a 2 KB header probe
+  write_regs    cam._write_regs() of the init tables on an empty shadow
+  soi_scan      check_for_header() on a probe with the SOI at --noise
+
+CPython is not the Pico's interpreter, so absolute numbers only matter
+relative to each other; a change that slows a loop here will slow it on
+the device too. The modelled device time (bus + USB + sleeps) is shown
+alongside. The streamed frame is decoded and checked against the FIFO
+contents before anything is timed.
+
+--record appends the results as a JSON line; --check compares against the
+last line of a file and exits non-zero if any path got more than
+--tolerance slower, for catching regressions on a CPU-only machine:
+
+    uv run benchmarks/bench_device.py --record device.jsonl
+    uv run benchmarks/bench_device.py --check device.jsonl
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import subprocess
+import sys
+import time
+
+import simbus
+from simserial import sample_jpegs
+from picocam.frame import HEADER_SIZE, check_body, decode_header
+
+STREAM_MARKER = b"ACK IMG END\n"
+
+
+def fifo_image(size, noise):
+    # FIFO contents: `noise` bytes before the SOI, then the sample JPEG repeated to `size` MB
+    jpeg = sample_jpegs()[0]
+    jpeg = jpeg * max(1, -(-int(size * 1e6) // len(jpeg)))
+    return b'\x55' * noise + jpeg
+
+
+def best_cpu(run, repeat):
+    """Lowest process CPU time of `repeat` calls to run()."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.process_time()
+        run()
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def check_stream(sent, payload):
+    at = sent.index(STREAM_MARKER) + len(STREAM_MARKER)
+    header = decode_header(sent[at:at + HEADER_SIZE])
+    body = sent[at + HEADER_SIZE:at + HEADER_SIZE + header.length + 4]
+    if bytes(check_body(header, body)) != payload:
+        raise SystemExit("stream_image() sent a payload that differs from the FIFO contents")
+
+
+def run(size, noise, repeat):
+    clock = simbus.install()
+    hal = sys.modules['hal']
+    stdout = simbus.ConsoleText(hal.console)
+    with contextlib.redirect_stdout(stdout):
+        driver = simbus.load_driver(clock)
+        firmware = simbus.load_firmware(clock, driver=driver)
+        cam = firmware['cam'] = driver.Arducam()
+        cam.spi.fifo = fifo_image(size, noise)
+
+        # Correctness first: one streamed frame, decoded on the host side
+        hal.console.sent.clear()
+        firmware['stream_image']()
+        check_stream(bytes(hal.console.sent), cam.spi.fifo[noise:])
+        hal.console.keep = False
+
+        results = {}
+        clock.reset()
+        results['stream'] = best_cpu(firmware['stream_image'], repeat)
+        model = clock.now / repeat
+
+        probe = min(2048, len(cam.spi.fifo))
+        results['fifo_burst'] = best_cpu(lambda: [cam.read_fifo_burst(probe) for _ in range(100)], repeat) / 100
+
+        tables = [cam.regs.table(name) for name in driver.INIT_TABLES] + [driver.INIT_FIXUPS]
+        writes = sum(len(t) for t in tables) // 3
+
+        def write_regs():
+            cam.shadow.clear()
+            cam._write_regs(*tables)
+        results['write_regs'] = best_cpu(write_regs, repeat) / writes
+
+        cam.read_fifo_burst(probe)
+        check_for_header = firmware['check_for_header']
+        results['soi_scan'] = best_cpu(lambda: [check_for_header(cam.buffers[0], probe) for _ in range(100)], repeat) / 100
+    return results, model, len(cam.spi.fifo) - noise, writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--size', type=float, default=1.5, help="Frame size in MB")
+    parser.add_argument('--noise', type=int, default=0, help="FIFO bytes before the SOI")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per path (best is kept)")
+    parser.add_argument('--record', help="Append results as a JSON line to this file")
+    parser.add_argument('--check', help="Compare against the last JSON line of this file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown for --check")
+    args = parser.parse_args()
+
+    results, model, payload, writes = run(args.size, args.noise, args.repeat)
+    print(f"Frame {payload / 1e6:.2f} MB, SOI at {args.noise}; modelled device time per stream "
+          f"{model:.2f} s ({payload / model / 1e3:.0f} KB/s)")
+    units = {
+        'stream': (f"{results['stream'] * 1000:.1f} ms", f"{results['stream'] * 1e6 / (payload / 1024):.2f} us/KB"),
+        'fifo_burst': (f"{results['fifo_burst'] * 1e6:.1f} us", "per 2 KB probe"),
+        'write_regs': (f"{results['write_regs'] * 1e6:.2f} us", f"per write ({writes} writes)"),
+        'soi_scan': (f"{results['soi_scan'] * 1e6:.1f} us", "per probe"),
+    }
+    print(f"{'path':<12} {'host CPU':>10}")
+    for name, (value, note) in units.items():
+        print(f"{name:<12} {value:>10}  {note}")
+
+    if args.check:
+        with open(args.check) as f:
+            last = json.loads(f.read().splitlines()[-1])
+        if (last.get('size'), last.get('noise')) != (args.size, args.noise):
+            print(f"\nNote: recorded with --size {last.get('size')} --noise {last.get('noise')}")
+        slower = {name: results[name] / last[name] for name in results
+                  if name in last and results[name] > last[name] * (1 + args.tolerance)}
+        print(f"\nAgainst {last.get('rev', '?')} ({last.get('date', '?')}): "
+              + (", ".join(f"{n} {r:.2f}x slower" for n, r in slower.items()) or "no slowdowns"))
+        if slower:
+            raise SystemExit(1)
+    if args.record:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=simbus.PROJECT_DIR,
+                             capture_output=True, text=True).stdout.strip()
+        results.update(rev=rev, size=args.size, noise=args.noise,
+                       date=datetime.datetime.now().isoformat(timespec='seconds'))
+        with open(args.record, 'a') as f:
+            f.write(json.dumps(results) + "\n")
+
+
+if __name__ == "__main__":
+    main()
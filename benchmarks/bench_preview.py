@@ -0,0 +1,143 @@
+"""Live preview (0x19): frames per second and the time back to a full frame.
+
+Framing a shot used to mean a full 2592x1944 capture per look. The
+preview streams 320x240 frames instead, and 0x10 sent during a preview
+switches back and captures at full resolution in one step.
+
+Device: circuitpython/code.py runs on the simulated HAL (800 KB/s USB).
+The simulated sensor holds the 2592x1944 sample in full resolution and
+the 320x240 sample in preview, and CAP_DONE takes --full-capture or
+--preview-capture seconds after the trigger. The table shows the seconds
+per look with a full capture and with the preview. It also shows the time
+from the end of a preview frame, with a 0x10 waiting, to the last byte of
+the full frame.
+
+Host: PicoCamera on a picocam.emulator.PicoEmulator at --rate bytes/s
+(the emulator adds no capture time). It measures preview fps, the frames
+and MJPEG bytes received, and the time shoot() takes to return the full
+JPEG next to a plain capture().
+
+    uv run benchmarks/bench_preview.py
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+import simbus
+from simserial import sample_jpegs
+from picocam.camera import ARDUINO, CIRCUITPYTHON, PicoCamera
+from picocam.emulator import PicoEmulator
+from picocam.jpeg import validate_jpeg
+
+FULL, PREVIEW = 6, 0
+PADDING = bytes(8)  # The FIFO runs on past EOI
+
+
+def sized(resolution, jpegs):
+    name = ('2592x1944', '320x240')[resolution == PREVIEW]
+    for jpeg in jpegs:
+        info = validate_jpeg(jpeg)
+        if f"{info.width}x{info.height}" == name:
+            return jpeg
+    raise SystemExit(f"No {name} sample in images/")
+
+
+def device(jpegs, frames, full_capture, preview_capture):
+    """Modelled seconds: full look, preview look, 0x10 -> full frame done, switch back, switch in."""
+    clock = simbus.install()
+    hal = sys.modules['hal']
+    with contextlib.redirect_stdout(simbus.ConsoleText(hal.console)):
+        driver = simbus.load_driver(clock)
+        firmware = simbus.load_firmware(clock, driver=driver)
+        cam = firmware['cam'] = driver.Arducam()
+        switch_to = firmware['switch_to']
+        switches = []
+
+        def sensor_mode(resolution):
+            cam.spi.fifo = sized(resolution, jpegs) + PADDING
+            cam.spi.capture_time = preview_capture if resolution == PREVIEW else full_capture
+
+        def switch_and_follow(target):
+            start = clock.now
+            switch_to(target)
+            sensor_mode(target)
+            switches.append((start, clock.now - start))
+
+        firmware['switch_to'] = switch_and_follow
+        sensor_mode(FULL)
+        cam.init_cam(cam.regs.table(firmware['RESOLUTIONS'][FULL]))
+        firmware['current_resolution'] = FULL
+
+        clock.reset()
+        firmware['stream_image']()
+        full_look = clock.now
+
+        clock.reset()
+        switches.clear()
+        firmware['stream_preview'](frames)
+        entered = switches[0][1]
+        preview_look = (switches[1][0] - entered) / frames
+
+        # One preview frame with 0x10 already waiting: the preview ends after it
+        clock.reset()
+        switches.clear()
+        hal.console.feed("\x10")
+        firmware['stream_preview'](0)
+        back_start, back = switches[1]
+        latency = clock.now - back_start
+    return full_look, preview_look, latency, back, entered
+
+
+def host(dialect, jpegs, frames, rate):
+    """(preview fps, frames, MJPEG bytes, shoot() seconds, capture() seconds)."""
+    with PicoEmulator(dialect, jpegs, rate=rate) as emu, PicoCamera(emu.port, dialect) as cam:
+        start = time.perf_counter()
+        cam.capture()
+        plain = time.perf_counter() - start
+
+        mjpeg = io.BytesIO()
+        stream = cam.preview(mjpeg=mjpeg)
+        for n, _ in enumerate(stream, 1):
+            if n == frames:
+                break
+        fps = stream.fps
+        start = time.perf_counter()
+        cam.shoot()
+        shoot = time.perf_counter() - start
+        if cam.last_dimensions != (2592, 1944):
+            raise SystemExit(f"shoot() returned a {cam.last_dimensions} frame")
+    return fps, stream.frames, len(mjpeg.getvalue()), shoot, plain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--frames', type=int, default=20, help="Preview frames per run")
+    parser.add_argument('--rate', type=float, default=800e3, help="Emulated link speed in bytes/s")
+    parser.add_argument('--full-capture', type=float, default=simbus.CAPTURE_TIME,
+                        help="Seconds from trigger to CAP_DONE at 2592x1944")
+    parser.add_argument('--preview-capture', type=float, default=0.05,
+                        help="Seconds from trigger to CAP_DONE at 320x240")
+    args = parser.parse_args()
+    jpegs = sample_jpegs()
+    full, small = sized(FULL, jpegs), sized(PREVIEW, jpegs)
+
+    full_look, preview_look, latency, back, entered = device(jpegs, args.frames, args.full_capture,
+                                                             args.preview_capture)
+    print(f"Device (code.py, simulated): {len(full)} byte full frame, {len(small)} byte preview frame")
+    print(f"  full capture per look   {full_look * 1000:>7.0f} ms  {1 / full_look:>5.1f} fps")
+    print(f"  preview per look        {preview_look * 1000:>7.0f} ms  {1 / preview_look:>5.1f} fps")
+    print(f"  entering preview        {entered * 1000:>7.1f} ms")
+    print(f"  0x10 -> full frame done {latency * 1000:>7.0f} ms (switch back {back * 1000:.1f} ms), "
+          f"plus up to one preview frame")
+
+    print(f"\nHost (emulator at {args.rate / 1e3:.0f} KB/s, {args.frames} preview frames)")
+    print(f"{'dialect':<14} {'fps':>6} {'frames':>7} {'MJPEG':>8} {'shoot()':>9} {'capture()':>10}")
+    for dialect in (ARDUINO, CIRCUITPYTHON):
+        fps, frames, size, shoot, plain = host(dialect, jpegs, args.frames, args.rate)
+        print(f"{dialect:<14} {fps:>6.1f} {frames:>7} {size:>8} {shoot * 1000:>7.0f}ms {plain * 1000:>8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
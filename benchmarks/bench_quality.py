@@ -0,0 +1,173 @@
+"""Adaptive JPEG quality (0x1B): frames kept within a budget on a replayed sequence.
+
+A sequence of scenes is replayed as their frame size at the init scale of
+8. The default is --frames synthetic frames: the 2592x1944 sample's size,
+times a level that jumps at a few scene cuts between 0.5x and 2x and drifts
+in between, with 3% noise. --trace FILE replays recorded 'ACK CMD Length'
+values instead, one per line, optionally preceded by the scale they were
+taken at. The sensor's response to the scale is the power law in
+picocam.quality, with exponent --true-exponent. The controller always
+assumes SIZE_EXPONENT, so the mismatch rows show how a wrong model costs.
+
+For a byte budget (--budget bytes) and a time budget (--deadline seconds,
+with each capture taking --overhead seconds plus its length at --rate
+bytes/s), it compares:
+  fixed 8     the init scale, never changed
+  fixed best  the finest single scale that keeps every frame of the
+              sequence within the budget, chosen knowing the whole sequence
+              (63 and a note if none does)
+  adaptive    QualityController fed each frame's length (and time)
+The table shows the frames over budget (and how many of them follow a
+scene cut), the worst overshoot, the mean scale, and the mean share of
+the budget used.
+
+Finally the first --emulated frames are replayed end to end: a
+picocam.emulator.PicoEmulator serves each scene in turn, resized to the
+scale PicoCamera sets through 0x1B. The scale must come back from each
+JPEG's COM segment.
+
+    uv run benchmarks/bench_quality.py
+"""
+import argparse
+import random
+
+from simserial import sample_jpegs
+from picocam.camera import CIRCUITPYTHON, PicoCamera
+from picocam.emulator import PicoEmulator, resized_scan
+from picocam.jpeg import jpeg_comments
+from picocam.quality import QSCALE_DEFAULT, SIZE_EXPONENT, QualityController, qscale_from_comments, size_ratio
+
+LEVELS = (1.0, 0.6, 1.5, 0.8, 2.0, 0.5, 1.2)  # Scene detail between cuts, relative to the sample
+
+
+class FixedScale:
+    def __init__(self, qscale):
+        self.qscale = qscale
+
+    def observe(self, qscale, length, seconds=None):
+        return self.qscale
+
+
+def synthetic_trace(base, frames, seed):
+    """(scene sizes at scale 8, indices of the frames right after a cut)."""
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(10, frames), len(LEVELS) - 1))
+    sizes, level, drift = [], LEVELS[0], 1.0
+    for n in range(frames):
+        if n in cuts:
+            level, drift = LEVELS[cuts.index(n) + 1], 1.0
+        drift = min(max(drift * rng.uniform(0.98, 1.02), 0.8), 1.25)
+        sizes.append(base * level * drift * rng.gauss(1.0, 0.03))
+    return sizes, set(cuts)
+
+
+def load_trace(path, exponent):
+    # 'length' or 'qscale length' per line; lengths are brought back to scale 8
+    sizes = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if fields:
+                qscale = int(fields[0]) if len(fields) > 1 else QSCALE_DEFAULT
+                sizes.append(int(fields[-1]) / size_ratio(qscale, exponent=exponent))
+    return sizes, set()
+
+
+def replay(sizes, policy, exponent, overhead, rate):
+    """Per frame: (scale, length, seconds)."""
+    frames = []
+    for scene in sizes:
+        qscale = policy.qscale
+        length = scene * size_ratio(qscale, exponent=exponent)
+        seconds = overhead + length / rate
+        policy.observe(qscale, length, seconds)
+        frames.append((qscale, length, seconds))
+    return frames
+
+
+def finest_fixed(sizes, fits, exponent):
+    # None if even the coarsest scale leaves some frame over budget
+    for qscale in range(1, 64):
+        if all(fits(scene * size_ratio(qscale, exponent=exponent)) for scene in sizes):
+            return qscale
+    return None
+
+
+def summary(name, frames, cuts, used):
+    over = [n for n, frame in enumerate(frames) if used(frame) > 1]
+    worst = max(used(frame) for frame in frames)
+    mean_q = sum(frame[0] for frame in frames) / len(frames)
+    mean_use = sum(min(used(frame), 1) for frame in frames) / len(frames)
+    at_cuts = sum(1 for n in over if n in cuts)
+    print(f"  {name:<12} {len(over):>5} {at_cuts:>7} {max(worst - 1, 0):>9.0%} {mean_q:>7.1f} {mean_use:>8.0%}")
+    return len(over) - at_cuts
+
+
+def emulated(sizes, full, budget, rate):
+    """(frames over budget, frames whose JPEG names another scale) through PicoEmulator."""
+    scenes = [resized_scan(full, scene / len(full)) for scene in sizes]
+    controller = QualityController(budget_bytes=budget)
+    untagged = 0
+    with PicoEmulator(CIRCUITPYTHON, scenes, rate=rate) as emu, PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        for _ in scenes:
+            jpeg = controller.capture(cam)
+            untagged += qscale_from_comments(jpeg_comments(jpeg)) != controller.history[-1].qscale
+    over = sum(1 for record in controller.history if record.length > budget)
+    return over, untagged, controller.history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--frames', type=int, default=300, help="Synthetic frames to replay")
+    parser.add_argument('--trace', help="File of recorded frame lengths to replay instead")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--budget', type=int, default=200_000, help="Byte budget per frame")
+    parser.add_argument('--deadline', type=float, default=1.0, help="Seconds per capture")
+    parser.add_argument('--overhead', type=float, default=0.35, help="Fixed seconds per capture")
+    parser.add_argument('--rate', type=float, default=235e3, help="Readout bytes/s (2 MHz SPI FIFO)")
+    parser.add_argument('--true-exponent', type=float, default=SIZE_EXPONENT,
+                        help="The replayed sensor's size exponent")
+    parser.add_argument('--emulated', type=int, default=40, help="Frames replayed through the emulator")
+    args = parser.parse_args()
+    full = sample_jpegs()[0]
+    if args.trace:
+        sizes, cuts = load_trace(args.trace, SIZE_EXPONENT)
+    else:
+        sizes, cuts = synthetic_trace(len(full), args.frames, args.seed)
+    print(f"{len(sizes)} frames, {min(sizes) / 1e3:.0f}-{max(sizes) / 1e3:.0f} KB at scale 8, "
+          f"{len(cuts)} scene cuts")
+
+    budgets = (
+        (f"byte budget {args.budget / 1e3:.0f} KB", dict(budget_bytes=args.budget),
+         lambda frame: frame[1] / args.budget),
+        (f"time budget {args.deadline:.2f} s ({args.overhead:.2f} s + length at {args.rate / 1e3:.0f} KB/s)",
+         dict(budget_time=args.deadline, overhead=args.overhead), lambda frame: frame[2] / args.deadline),
+    )
+    failed = 0
+    for exponent in sorted({args.true_exponent, 0.5, 1.0}):
+        for title, kwargs, used in budgets:
+            print(f"\n{title}, true exponent {exponent}")
+            print(f"  {'policy':<12} {'over':>5} {'at cuts':>7} {'overshoot':>9} {'scale':>7} {'budget':>8}")
+            fits = lambda length: used((0, length, args.overhead + length / args.rate)) <= 1
+            best = finest_fixed(sizes, fits, exponent)
+            for name, policy in (("fixed 8", FixedScale(QSCALE_DEFAULT)),
+                                 (f"fixed {best or '63 (!)'}", FixedScale(best or 63)),
+                                 ("adaptive", QualityController(**kwargs))):
+                missed = summary(name, replay(sizes, policy, exponent, args.overhead, args.rate), cuts, used)
+                if name == "adaptive" and exponent == args.true_exponent:
+                    failed += missed > 1  # Beyond the frame the controller starts from
+            if best is None:
+                print("  (!) no single scale keeps every frame within the budget")
+
+    if args.emulated:
+        over, untagged, history = emulated(sizes[:args.emulated], full, args.budget, 800e3)
+        scales = sorted({record.qscale for record in history})
+        print(f"\nEmulated (800 KB/s, {len(history)} frames): {over} over {args.budget / 1e3:.0f} KB, "
+              f"scales {scales[0]}-{scales[-1]}, {untagged} JPEGs without their scale")
+        failed += untagged
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
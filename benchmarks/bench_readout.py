@@ -0,0 +1,83 @@
+"""stream_image() FIFO readout: throughput and heap use at 2592x1944.
+
+Runs stream_image() from code.py and Arducam.py at the git revision given
+with --before (default: the last one without the double-buffered
+readout) and in the worktree on the simulated HAL, with a --size MB frame
+behind --noise bytes of FIFO noise, and reports for each:
+
+  KB/s        payload bytes over the modelled device time of one stream
+              (capture to last byte through the USB transmit buffer)
+  alloc KB    peak traced CPython heap during the stream, above what was
+              allocated before it started
+  buffers KB  readout buffers the driver keeps allocated between frames
+
+The worktree is also run over a grid of readout buffer sizes (Arducam
+chunk_size) and SPI read slices (STREAM_SLICE). Every streamed frame is
+decoded and checked against the FIFO contents first. The heap figures
+are CPython's, not the Pico's, but allocations that the device code
+makes per frame show up in both.
+
+    uv run benchmarks/bench_readout.py
+"""
+import argparse
+import contextlib
+import sys
+import tracemalloc
+
+import simbus
+from bench_device import check_stream, fifo_image
+
+CHUNK_SIZES = (2048, 4096, 8192)
+SLICES = (256, 512, 1024)
+
+
+def measure(rev, size, noise, chunk_size=None, stream_slice=None):
+    """(KB/s, peak heap bytes during the stream, resident readout buffer bytes)."""
+    clock = simbus.install()
+    hal = sys.modules['hal']
+    with contextlib.redirect_stdout(simbus.ConsoleText(hal.console)):
+        driver = simbus.load_driver(clock, rev)
+        firmware = simbus.load_firmware(clock, rev, driver=driver)
+        cam = firmware['cam'] = driver.Arducam() if chunk_size is None else driver.Arducam(chunk_size=chunk_size)
+        if stream_slice is not None:
+            firmware['STREAM_SLICE'] = stream_slice
+        cam.spi.fifo = fifo_image(size, noise)
+        payload = len(cam.spi.fifo) - noise
+
+        hal.console.sent.clear()
+        firmware['stream_image']()
+        check_stream(bytes(hal.console.sent), cam.spi.fifo[noise:])
+        hal.console.keep = False
+
+        clock.reset()
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        firmware['stream_image']()
+        peak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        hal.console.flush()
+    buffers = sum(len(c) for c in getattr(cam, 'chunks', ()))
+    return payload / clock.now / 1e3, peak, buffers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--before', help="git revision of the device code to compare against")
+    parser.add_argument('--size', type=float, default=1.5, help="Frame size in MB")
+    parser.add_argument('--noise', type=int, default=37, help="FIFO bytes before the SOI")
+    args = parser.parse_args()
+    args.before = args.before or simbus.revision_before('set_chunk_size', 'circuitpython/Arducam.py')
+
+    print(f"2592x1944 frame of {args.size:.2f} MB, SOI at {args.noise}")
+    print(f"{'readout':<34} {'KB/s':>6} {'alloc KB':>9} {'buffers KB':>11}")
+    rows = [(f"before ({args.before})", measure(args.before, args.size, args.noise)),
+            ("after (worktree defaults)", measure(None, args.size, args.noise))]
+    rows += [(f"after, chunk {chunk}, slice {step}",
+              measure(None, args.size, args.noise, chunk, step))
+             for chunk in CHUNK_SIZES for step in SLICES]
+    for name, (rate, peak, buffers) in rows:
+        print(f"{name:<34} {rate:>6.0f} {peak / 1024:>9.1f} {buffers / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare the legacy byte-at-a-time receive loop with picocam's receive paths.
+
+Replays the largest JPEG in images/ (repeated up to ~5MP size) through a
+SimulatedSerial and reports throughput and host CPU time for the legacy
+loop, the length-driven bulk receive and the framed protocol.
+
+    uv run benchmarks/bench_receive.py
+"""
+import time
+
+from simserial import SimulatedSerial, sample_jpegs
+from picocam.receive import receive_jpeg
+from picocam.frame import FrameError, encode_frame, read_frame
+
+TARGET_SIZE = 2 * 1024 * 1024  # Upper end of a 2592x1944 JPEG
+
+
+def legacy_receive(ser, timeout=60):
+    # Verbatim receive loop from the original pico_ov5642/capture.py
+    img_bytes = bytearray()
+    last_byte = b''
+    bytes_received = 0
+    transfer_start = time.time()
+    while time.time() - transfer_start < timeout:
+        byte = ser.read(1)
+        if not byte:
+            continue
+        img_bytes.append(byte[0])
+        bytes_received += 1
+        if last_byte == b'\xff' and byte == b'\xd9':
+            break
+        last_byte = byte
+    return img_bytes
+
+
+def make_payload():
+    # Pad the sample's entropy-coded body (no FF D9 inside) up to TARGET_SIZE
+    jpeg = sample_jpegs()[0]
+    body = jpeg[:-2]
+    filler = jpeg[2:-2]
+    while len(body) < TARGET_SIZE:
+        body += filler[:TARGET_SIZE - len(body)]
+    return body + b'\xff\xd9'
+
+
+def check_framing(payload):
+    # A flipped payload bit or header byte must be rejected, not saved
+    frame = bytearray(encode_frame(payload, resolution=6, sequence=1))
+    for offset in (2, 14, len(frame) // 2):
+        bad = bytearray(frame)
+        bad[offset] ^= 0x01
+        try:
+            read_frame(SimulatedSerial(bad), timeout=1)
+        except FrameError:
+            continue
+        raise AssertionError(f"corruption at byte {offset} not detected")
+    try:
+        read_frame(SimulatedSerial(frame[:-100]), timeout=0.1)
+    except FrameError:
+        return
+    raise AssertionError("truncated frame not detected")
+
+
+def run(name, fn, payload, repeat, stream=None):
+    wall = cpu = 0.0
+    for _ in range(repeat):
+        ser = SimulatedSerial(stream or payload)
+        w0, c0 = time.perf_counter(), time.process_time()
+        img = fn(ser)
+        wall += time.perf_counter() - w0
+        cpu += time.process_time() - c0
+        assert bytes(img) == payload, f"{name}: payload mismatch"
+    mb = len(payload) * repeat / 1e6
+    print(f"{name:<10} {mb / wall:9.1f} MB/s  {cpu / repeat * 1000:9.1f} ms CPU/image")
+
+
+def main():
+    payload = make_payload()
+    print(f"Payload: {len(payload)} bytes")
+    run("legacy", legacy_receive, payload, repeat=1)
+    run("bulk", lambda ser: receive_jpeg(ser, len(payload) + 4096), payload, repeat=10)
+
+    check_framing(payload)
+    frame = encode_frame(payload, resolution=6, sequence=1)
+    run("framed", lambda ser: read_frame(ser)[1], payload, repeat=10, stream=frame)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Register table footprint: OV5642_regs.py import vs the compiled OV5642_regs.bin.
+
+"before" imports circuitpython/OV5642_regs.py as it was at the git
+revision given with --before (default: the last one with the file), compiling the
+source as CircuitPython does on import; "after" opens OV5642_regs.bin with
+the worktree driver's RegisterTables and then loads the tables a 5MP boot
+needs. Times are CPython medians and memory is traced CPython heap (which
+for the .bin includes CPython's buffered file object), so the absolute
+numbers differ from the Pico's; the table bytes kept in RAM are the same.
+
+    uv run benchmarks/bench_regs.py
+"""
+import argparse
+import os
+import statistics
+import time
+import tracemalloc
+import types
+
+import simbus
+
+BOOT_TABLES = ('OV5642_QVGA_Preview', 'OV5642_JPEG_Capture_QSXGA', 'ov5642_320x240', 'ov5642_2592x1944')
+REPEAT = 50
+
+
+def measure(load):
+    """Median seconds of load(), plus traced (retained, peak) bytes of one call."""
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        load()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    result = load()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return statistics.median(times), retained, peak
+
+
+def import_module(source):
+    module = types.ModuleType('OV5642_regs')
+    exec(compile(source, 'OV5642_regs.py', 'exec'), module.__dict__)
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--before', help="git revision of OV5642_regs.py to compare against")
+    args = parser.parse_args()
+    args.before = args.before or simbus.revision_before('REGS_FILE', 'circuitpython/Arducam.py')
+
+    source = simbus.git_source('circuitpython/OV5642_regs.py', args.before)
+    module = import_module(source)
+    before_tables = [v for v in vars(module).values() if isinstance(v, bytes)]
+
+    clock = simbus.install()
+    driver = simbus.load_driver(clock)
+    path = driver.REGS_FILE
+    tables = driver.RegisterTables(path)
+
+    def boot():
+        regs = driver.RegisterTables(path)
+        return regs, [regs.table(name) for name in BOOT_TABLES]
+
+    rows = [
+        (f'import OV5642_regs.py ({args.before})', measure(lambda: import_module(source)),
+         sum(map(len, before_tables))),
+        ('open OV5642_regs.bin', measure(lambda: driver.RegisterTables(path)), len(tables.index)),
+        ('open + 5MP boot tables', measure(boot), None),
+    ]
+    print(f"OV5642_regs.py: {len(source.encode())} bytes of source, {len(before_tables)} tables; "
+          f"OV5642_regs.bin: {os.path.getsize(path)} bytes, all {tables.count} tables and deltas")
+    print(f"{'step':<40} {'time ms':>8} {'retained KB':>12} {'peak KB':>8} {'table bytes in RAM':>19}")
+    for name, (elapsed, retained, peak), data in rows:
+        data = '(transient)' if data is None else str(data)
+        print(f"{name:<40} {elapsed * 1000:>8.3f} {retained / 1024:>12.1f} {peak / 1024:>8.1f} {data:>19}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Resolution switch cost for every pair of JPEG modes in ov5642_regs.h.
+
+For each (from, to) pair this prints the register writes the 0x16 command
+makes (the delta computed by picocam.regs, identical to the firmwares'),
+the I2C time that implies, and the full InitCAM() + set_JPEG_size() it
+replaces. It then times the host round trip of PicoCamera.set_resolution()
+for every pair against the emulator, which sleeps for the same modelled
+I2C time.
+
+    uv run benchmarks/bench_resolution.py --dialect arduino
+"""
+import argparse
+import time
+
+import simserial  # noqa: F401 (puts picocam on sys.path)
+from picocam.camera import ARDUINO, CIRCUITPYTHON, PicoCamera
+from picocam.emulator import PicoEmulator
+from picocam.regs import (RESOLUTIONS, SIZE_TABLES, init_writes, load_tables,
+                          resolution_delta, switch_time)
+
+
+def print_matrix(title, cell):
+    width = max(len(name) for name in RESOLUTIONS.values()) + 1
+    print(f"\n{title}")
+    corner = "from \\ to"
+    print(f"{corner:>{width}}" + "".join(f"{name:>{width}}" for name in RESOLUTIONS.values()))
+    for src, name in RESOLUTIONS.items():
+        print(f"{name:>{width}}" + "".join(f"{cell(src, dst):>{width}}" for dst in RESOLUTIONS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--dialect', choices=(ARDUINO, CIRCUITPYTHON), default=CIRCUITPYTHON)
+    args = parser.parse_args()
+
+    tables = load_tables()
+    full_writes = init_writes(tables)
+    deltas = {(src, dst): resolution_delta(tables, src, dst)
+              for src in RESOLUTIONS for dst in RESOLUTIONS}
+
+    def writes(src, dst):
+        delta = deltas[src, dst]
+        return "full" if delta is None else str(len(delta))
+
+    def model_ms(src, dst):
+        delta = deltas[src, dst]
+        return f"{switch_time(None if delta is None else len(delta), tables) * 1000:.1f}"
+
+    print(f"Full re-init: {full_writes} + size table writes, "
+          f"~{switch_time(None, tables) * 1000:.0f} ms at 100 kHz I2C")
+    print_matrix("Register writes per switch (delta):", writes)
+    print_matrix("Modelled switch time (ms):", model_ms)
+
+    measured = {}
+    with PicoEmulator(args.dialect) as emu:
+        with PicoCamera(emu.port, args.dialect) as cam:
+            for src in RESOLUTIONS:
+                for dst in RESOLUTIONS:
+                    cam.set_resolution(src)
+                    start = time.perf_counter()
+                    assert cam.set_resolution(dst) == dst
+                    measured[src, dst] = time.perf_counter() - start
+    print_matrix(f"Host round trip via emulator, {args.dialect} (ms):",
+                 lambda src, dst: f"{measured[src, dst] * 1000:.1f}")
+
+    safe = [d for (src, dst), d in deltas.items() if d is not None and src != dst]
+    full = sum(d is None for d in deltas.values())
+    print(f"\nDelta switches: {min(map(len, safe))}-{max(map(len, safe))} writes "
+          f"(vs {full_writes + len(tables[SIZE_TABLES[6]])} for re-init + 5MP table); "
+          f"{full} pairs fall back to a full re-init")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Region-of-interest capture (0x1A): bytes and time against the full frame.
+
+Device: circuitpython/code.py runs on the simulated HAL. For each crop it
+gets a 0x1A command, then one capture (0x10). The simulated sensor has no
+image pipeline, so the FIFO is filled after the command from the output
+size code.py wrote to 0x3808-0x380B. It holds
+picocam.emulator.windowed_image() of the 2592x1944 sample at that size:
+the sample's headers, with its entropy-coded data cut in proportion to the
+area. Bytes therefore scale with area as for an evenly detailed scene. The
+table shows the payload bytes, the modelled capture-to-last-byte time and
+the time taken to program the window. It also checks that the frame
+carries FLAG_ROI and that its JPEG is the window's size.
+
+Host: PicoCamera.set_roi() and capture() on a picocam.emulator.PicoEmulator
+at --rate bytes/s, serving the same 2592x1944 sample. The ROI must come
+back from the JPEG's COM segment.
+
+    uv run benchmarks/bench_roi.py
+"""
+import argparse
+import contextlib
+import sys
+import time
+
+import simbus
+from bench_preview import sized
+from simserial import sample_jpegs
+from picocam.camera import CIRCUITPYTHON, PicoCamera
+from picocam.emulator import PicoEmulator, windowed_image
+from picocam.frame import HEADER_SIZE, check_body, decode_header
+from picocam.jpeg import jpeg_comments, validate_jpeg
+from picocam.roi import FLAG_ROI, SENSOR_HEIGHT, SENSOR_WIDTH, align_roi, roi_from_comments
+
+FULL = 6
+STREAM_MARKER = b"ACK IMG END\n"
+PADDING = bytes(8)  # The FIFO runs on past EOI
+
+# Centred crops, as fractions of the full frame's width and height
+CROPS = (1.0, 0.75, 0.5, 0.25, 0.1)
+
+
+def crop(fraction):
+    if fraction == 1.0:
+        return None
+    width, height = SENSOR_WIDTH * fraction, SENSOR_HEIGHT * fraction
+    return align_roi((SENSOR_WIDTH - width) / 2, (SENSOR_HEIGHT - height) / 2, width, height)
+
+
+def output_size(regs):
+    # DVP output size as code.py programmed it
+    return (regs[0x3808] << 8) | regs[0x3809], (regs[0x380A] << 8) | regs[0x380B]
+
+
+def device(full, rois):
+    """Per crop: (payload bytes, capture seconds, window seconds, problems)."""
+    clock = simbus.install()
+    hal = sys.modules['hal']
+    results = []
+    with contextlib.redirect_stdout(simbus.ConsoleText(hal.console)):
+        driver = simbus.load_driver(clock)
+        firmware = simbus.load_firmware(clock, driver=driver)
+        cam = firmware['cam'] = driver.Arducam()
+        cam.init_cam(cam.regs.table(firmware['RESOLUTIONS'][FULL]))
+        firmware['current_resolution'] = FULL
+        for roi in rois:
+            clock.reset()
+            firmware['set_roi']("" if roi is None else ",".join(str(v) for v in roi))
+            window = clock.now
+            width, height = output_size(cam.i2c.regs)
+            cam.spi.fifo = (full if roi is None else windowed_image(full, width, height)) + PADDING
+
+            hal.console.sent.clear()
+            clock.reset()
+            firmware['stream_image']()
+            elapsed = clock.now
+            sent = bytes(hal.console.sent)
+            at = sent.index(STREAM_MARKER) + len(STREAM_MARKER)
+            header = decode_header(sent[at:at + HEADER_SIZE])
+            payload = check_body(header, sent[at + HEADER_SIZE:at + HEADER_SIZE + header.length + 4])
+            info = validate_jpeg(payload)
+            expected = (SENSOR_WIDTH, SENSOR_HEIGHT) if roi is None else (roi.width, roi.height)
+            problems = []
+            if (info.width, info.height) != expected:
+                problems.append(f"JPEG is {info.width}x{info.height}")
+            if bool(header.flags & FLAG_ROI) != (roi is not None):
+                problems.append(f"flags 0x{header.flags:04X}")
+            results.append((info.end, elapsed, window, problems))
+    return results
+
+
+def host(full, rois, rate):
+    """Per crop: (JPEG bytes, capture() seconds, ROI read back from the JPEG)."""
+    results = []
+    with PicoEmulator(CIRCUITPYTHON, [full], rate=rate, resolution=FULL) as emu, \
+            PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        for roi in rois:
+            cam.set_roi(*(roi or ()))
+            start = time.perf_counter()
+            jpeg = cam.capture()
+            elapsed = time.perf_counter() - start
+            results.append((len(jpeg), elapsed, roi_from_comments(jpeg_comments(jpeg))))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--rate', type=float, default=800e3, help="Emulated link speed in bytes/s")
+    args = parser.parse_args()
+    full = sized(FULL, sample_jpegs())
+    rois = [crop(f) for f in CROPS]
+
+    failed = 0
+    print(f"Device (code.py, simulated): crops of a {len(full)} byte 2592x1944 frame")
+    print(f"{'window':<22} {'bytes':>8} {'vs full':>8} {'capture ms':>11} {'vs full':>8} {'0x1A ms':>8}")
+    results = device(full, rois)
+    full_bytes, full_time = results[0][:2]
+    for roi, (size, elapsed, window, problems) in zip(rois, results):
+        name = "full 2592x1944" if roi is None else f"{roi.width}x{roi.height} at {roi.x},{roi.y}"
+        print(f"{name:<22} {size:>8} {size / full_bytes:>8.0%} {elapsed * 1000:>11.0f} "
+              f"{elapsed / full_time:>8.0%} {window * 1000:>8.1f}  {'; '.join(problems)}")
+        failed += bool(problems)
+
+    print(f"\nHost (emulator at {args.rate / 1e3:.0f} KB/s)")
+    print(f"{'window':<22} {'bytes':>8} {'capture ms':>11}  ROI in JPEG")
+    for roi, (size, elapsed, recorded) in zip(rois, host(full, rois, args.rate)):
+        name = "full 2592x1944" if roi is None else f"{roi.width}x{roi.height} at {roi.x},{roi.y}"
+        print(f"{name:<22} {size:>8} {elapsed * 1000:>11.0f}  {recorded}")
+        failed += recorded != roi
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
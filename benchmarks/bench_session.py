@@ -0,0 +1,59 @@
+"""Per-capture latency for a warm PicoCamera session versus a cold one.
+
+A cold capture opens the port, waits for the (simulated) boot to finish,
+captures and closes, as the original one-shot scripts did. A warm capture
+reuses an open session. SimulatedPico boots in BOOT_DELAY seconds and
+streams the largest sample JPEG over a rate-limited link.
+
+    uv run benchmarks/bench_session.py [captures]
+"""
+import functools
+import sys
+import time
+
+from simserial import SimulatedPico, sample_jpegs
+from picocam.camera import ARDUINO, CIRCUITPYTHON, PicoCamera
+
+BOOT_DELAY = 2.5  # The sketch's setup() alone waits 2.5s for USB serial
+LINK_RATE = 1_000_000
+
+
+def make_camera(dialect, jpeg):
+    device = functools.partial(SimulatedPico, jpeg=jpeg, dialect=dialect,
+                               boot_delay=BOOT_DELAY, rate=LINK_RATE)
+    return PicoCamera('sim', dialect, serial_class=device)
+
+
+def cold(dialect, jpeg, captures):
+    times = []
+    for _ in range(captures):
+        start = time.perf_counter()
+        with make_camera(dialect, jpeg) as cam:
+            cam.capture()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def warm(dialect, jpeg, captures):
+    times = []
+    with make_camera(dialect, jpeg) as cam:
+        for _ in range(captures):
+            start = time.perf_counter()
+            cam.capture()
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    captures = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    jpeg = sample_jpegs()[0]
+    print(f"{len(jpeg)} byte JPEG, {LINK_RATE / 1e6:.1f} MB/s link, {BOOT_DELAY}s boot")
+    for dialect in (ARDUINO, CIRCUITPYTHON):
+        for name, fn in (("cold", cold), ("warm", warm)):
+            times = fn(dialect, jpeg, captures)
+            mean = sum(times) / len(times)
+            print(f"{dialect:<14} {name}  {mean * 1000:8.1f} ms/capture  (min {min(times) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
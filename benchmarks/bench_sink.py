@@ -0,0 +1,121 @@
+"""Image sinks: sustained writes per second for each backend and fsync policy.
+
+For the largest and the smallest sample JPEG, --frames copies are handed to
+a picocam.sink.BackgroundWriter in a tight loop, as a burst at an unlimited
+link rate would. Each backend (directory, .tar, .zip, .sqlite) is run with
+each fsync policy ('never', 'close', every 16 images, 'always'). The table
+shows the sustained writes/s and MB/s from the first submit() until
+close() returns, and the share of that time the caller spent blocked in
+submit() on the bounded queue.
+
+Before that, the same number of frames is saved the way the capture
+scripts did before: a file per frame named to the second, so frames that
+arrive within one second overwrite each other. The files left over are
+counted against the distinct locations the writer reports.
+
+The results depend on the disk behind --dir (default: the system temp
+directory); its filesystem type is printed first.
+
+    uv run benchmarks/bench_sink.py
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import tarfile
+import tempfile
+import time
+import zipfile
+
+from simserial import sample_jpegs
+from picocam.sink import BackgroundWriter, open_sink
+
+BACKENDS = ('directory', '.tar', '.zip', '.sqlite')
+POLICIES = ('never', 'close', 16, 'always')
+
+
+def filesystem(path):
+    """Type of the filesystem `path` is on, from /proc/mounts (Linux), else '?'."""
+    path = os.path.realpath(path)
+    best, kind = '', '?'
+    try:
+        with open('/proc/mounts') as f:
+            for line in f:
+                fields = line.split()
+                mount = fields[1]
+                if (path == mount or path.startswith(mount.rstrip('/') + '/')) and len(mount) > len(best):
+                    best, kind = mount, fields[2]
+    except OSError:
+        pass
+    return kind
+
+
+def stored(target):
+    """Number of images found in a sink after it has been closed."""
+    if os.path.isdir(target):
+        return len(os.listdir(target))
+    if target.endswith('.tar'):
+        with tarfile.open(target) as tar:
+            return len(tar.getnames())
+    if target.endswith('.zip'):
+        with zipfile.ZipFile(target) as z:
+            return len(z.namelist())
+    with sqlite3.connect(target) as db:
+        return db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+
+def second_names(jpeg, frames, directory):
+    # The capture scripts' save_image() before the sinks: second-resolution names
+    for _ in range(frames):
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        with open(os.path.join(directory, f"img_{stamp}.jpg"), 'wb') as f:
+            f.write(jpeg)
+    return len(os.listdir(directory))
+
+
+def run(jpeg, frames, backend, fsync, base):
+    target = os.path.join(base, 'images' if backend == 'directory' else 'images' + backend)
+    blocked = 0.0
+    futures = []
+    start = time.perf_counter()
+    with BackgroundWriter(open_sink(target, fsync)) as writer:
+        for i in range(frames):
+            t = time.perf_counter()
+            futures.append(writer.submit(jpeg, index=i, camera='cam0'))
+            blocked += time.perf_counter() - t
+    elapsed = time.perf_counter() - start
+    return elapsed, blocked, len({f.result() for f in futures}), stored(target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--frames', type=int, default=64, help="Images per run")
+    parser.add_argument('--dir', default=None, help="Where to write (default: a temp directory)")
+    args = parser.parse_args()
+
+    samples = sample_jpegs()
+    base_dir = args.dir or tempfile.gettempdir()
+    print(f"Writing under {base_dir} ({filesystem(base_dir)}), {args.frames} images per run")
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        left = second_names(samples[-1], args.frames, tmp)
+    print(f"Second-resolution names: {left} of {args.frames} files left, the rest overwritten")
+
+    lost = 0
+    for jpeg in (samples[0], samples[-1]):
+        print(f"\n{len(jpeg)} byte JPEG")
+        print(f"{'backend':<10} {'fsync':<7} {'writes/s':>9} {'MB/s':>7} {'blocked':>8}  stored")
+        for backend in BACKENDS:
+            for fsync in POLICIES:
+                with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+                    elapsed, blocked, names, count = run(jpeg, args.frames, backend, fsync, tmp)
+                lost += args.frames - min(names, count)
+                print(f"{backend:<10} {str(fsync):<7} {args.frames / elapsed:>9.0f} "
+                      f"{args.frames * len(jpeg) / elapsed / 1e6:>7.1f} {blocked / elapsed:>7.0%}  "
+                      f"{count}/{args.frames}")
+    if lost:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""check_for_header(): per-index Python loop vs native find() scan.
+
+Loads check_for_header() from circuitpython/code.py and checks that it
+returns the same (label, index) as legacy_check_for_header(), a copy of
+the per-index loop it replaced, on a set of sample buffers. Then times
+both under CPython. The buffers are the 2048-byte header probes
+code.py reads: the sample JPEGs behind 0-1500 bytes of FIFO noise, with
+each wiring fault applied, plus buffers with no SOI at all. Patterns added
+to SOI_PATTERNS after the find() scanner (EXTRA_PATTERNS) are left out of
+code.py's table, so both versions look for the same byte pairs.
+
+    uv run benchmarks/bench_soi.py
+"""
+import argparse
+import ast
+import os
+import random
+import timeit
+
+import simbus
+from simserial import sample_jpegs
+
+PROBE = 2048
+EXTRA_PATTERNS = (b'\xff\xb1',)  # Shift-L1 with the top bit of the next FF shifted in
+
+# Forward models of the wiring faults check_for_header() recognises
+FAULTS = {
+    'Standard': lambda data: data,
+    'Bit-Reversed': lambda data: bytes(int(f'{b:08b}'[::-1], 2) for b in data),
+    'Bit-Inverted': lambda data: bytes(b ^ 0xFF for b in data),
+    'Nibble-Swap': lambda data: bytes(((b << 4) | (b >> 4)) & 0xFF for b in data),
+    'Shift-R1': lambda data: (int.from_bytes(data, 'big') >> 1).to_bytes(len(data), 'big'),
+    'Shift-L1': lambda data: ((int.from_bytes(data, 'big') << 1) & ((1 << 8 * len(data)) - 1)).to_bytes(len(data), 'big'),
+}
+
+
+def legacy_check_for_header(data):
+    # code.py's scanner before the find() version: one Python iteration per byte
+    for i in range(len(data)-1):
+        b1, b2 = data[i], data[i+1]
+        # 1. Standard
+        if b1 == 0xFF and b2 == 0xD8: return f"Standard at {i}", i
+        # 2. Bit-Reversed
+        if b1 == 0xFF and b2 == 0x1B: return f"Bit-Reversed at {i}", i
+        # 3. Bit-Inverted
+        if b1 == 0x00 and b2 == 0x27: return f"Bit-Inverted at {i}", i
+        # 4. Swapped Nibbles
+        if b1 == 0xFF and b2 == 0x8D: return f"Nibble-Swap at {i}", i
+        # 5. Shifted Right 1-bit
+        if b1 == 0x7F and b2 == 0xEC: return f"Shift-R1 at {i}", i
+        # 6. Shifted Left 1-bit
+        if b1 == 0xFF and b2 == 0xB0: return f"Shift-L1 at {i}", i
+    return None, -1
+
+
+def load_scanner():
+    """check_for_header() and the constants it uses, from circuitpython/code.py."""
+    with open(os.path.join(simbus.CIRCUITPYTHON_DIR, 'code.py')) as f:
+        source = f.read()
+    tree = ast.parse(source)
+    keep = [node for node in tree.body
+            if isinstance(node, ast.FunctionDef) and node.name == 'check_for_header'
+            or isinstance(node, ast.Assign) and any(getattr(t, 'id', '').startswith('SOI_') for t in node.targets)]
+    namespace = {}
+    exec(compile(ast.Module(body=keep, type_ignores=[]), 'code.py', 'exec'), namespace)
+    if 'SOI_PATTERNS' in namespace:
+        namespace['SOI_PATTERNS'] = tuple(p for p in namespace['SOI_PATTERNS'] if p[0] not in EXTRA_PATTERNS)
+    return namespace['check_for_header']
+
+
+def sample_buffers(seed=1):
+    rng = random.Random(seed)
+    buffers = {}
+    for n, jpeg in enumerate(sample_jpegs()):
+        for fault, apply in FAULTS.items():
+            for offset in (0, 1, 37, 700, 1500):
+                noise = bytes(rng.choice((0x00, 0x55, 0xAA, 0xFF)) for _ in range(offset))
+                buffers[f'jpeg{n} {fault} +{offset}'] = bytearray((noise + apply(jpeg))[:PROBE])
+    buffers['random'] = bytearray(rng.randbytes(PROBE))
+    buffers['zeros'] = bytearray(PROBE)
+    buffers['ones'] = bytearray(b'\xff' * PROBE)
+    buffers['SOI last'] = bytearray(PROBE - 2) + b'\xff\xd8'
+    buffers['FF last'] = bytearray(PROBE - 1) + b'\xff'
+    buffers['empty'] = bytearray()
+    return buffers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--number', type=int, default=200, help="Calls per buffer and timing")
+    args = parser.parse_args()
+
+    before, after = legacy_check_for_header, load_scanner()
+    buffers = sample_buffers()
+    mismatches = [name for name, data in buffers.items() if before(data) != after(data)]
+    print(f"Equivalence: {len(buffers) - len(mismatches)}/{len(buffers)} buffers give the same (label, index)")
+    for name in mismatches:
+        print(f"  {name}: {before(buffers[name])} != {after(buffers[name])}")
+
+    # Grouped by where the scan stops, which is what the old loop's cost depends on
+    found = {name: before(data)[1] for name, data in buffers.items()}
+    groups = {
+        'SOI at 0-1': [buffers[n] for n, i in found.items() if 0 <= i <= 1],
+        'SOI at 37-1500': [buffers[n] for n, i in found.items() if i >= 37],
+        'no SOI (sync miss)': [buffers[n] for n, i in found.items() if i < 0],
+    }
+    print(f"\n{'buffers':<20} {'before us':>10} {'after us':>9} {'speedup':>8}")
+    for name, group in groups.items():
+        times = []
+        for scan in (before, after):
+            total = sum(timeit.timeit(lambda: scan(data), number=args.number) for data in group)
+            times.append(total / (args.number * len(group)))
+        print(f"{name:<20} {times[0] * 1e6:>10.1f} {times[1] * 1e6:>9.1f} {times[0] / times[1]:>7.1f}x")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
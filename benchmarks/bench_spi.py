@@ -0,0 +1,103 @@
+"""ArduChip SPI cost: per-call locking vs the batched bus transaction.
+
+Runs code.py and Arducam.py on the simulated buses in simbus.py, both at
+the git revision given with --before (default: the last one without the
+bus transaction) and in the worktree, and measures the firmware's own
+capture path:
+
+  polls/s       CAP_DONE reads per second of modelled time while
+                capture_frame() waits for the capture
+  host us/poll  host CPU time per CAP_DONE read under CPython, with a
+                capture that never finishes so capture_frame() polls
+                until its 5 s timeout (a rough proxy for the interpreter
+                overhead per call)
+  to probe us   CAP_DONE to the first FIFO byte of the header probe
+                (code.py's 10 ms settle included)
+  locks, calls  SPI bus locks and transfers for one stream_image() of
+                the 2592x1944 sample
+
+    uv run benchmarks/bench_spi.py --capture-time 0.2
+"""
+import argparse
+import contextlib
+import sys
+import time
+
+import simbus
+from simserial import sample_jpegs
+
+ARDUCHIP_TRIG = 0x41
+
+
+def count_polls(spi, clock):
+    """Wrap spi._reg so CAP_DONE reads are counted; returns the list of their times."""
+    polls = []
+    read = spi._reg
+
+    def reg(address):
+        if address == ARDUCHIP_TRIG:
+            polls.append(clock.now)
+        return read(address)
+
+    spi._reg = reg
+    return polls
+
+
+def run(rev, capture_time):
+    clock = simbus.install()
+    hal = sys.modules['hal']
+    with contextlib.redirect_stdout(simbus.ConsoleText(hal.console)):
+        driver = simbus.load_driver(clock, rev)
+        firmware = simbus.load_firmware(clock, rev, driver=driver)
+        cam = firmware['cam'] = driver.Arducam()
+        spi = cam.spi
+        spi.fifo = sample_jpegs()[0]
+        polls = count_polls(spi, clock)
+
+        # Polling on the modelled bus, and CAP_DONE to the header probe
+        spi.capture_time = capture_time
+        clock.reset()
+        assert firmware['capture_frame']()
+        done = spi.triggered + capture_time
+        rate = sum(1 for t in polls if t < done) / capture_time
+        probe = spi.first_byte - done
+
+        # Host time per poll: the capture never finishes
+        spi.capture_time = float('inf')
+        polls.clear()
+        host = time.perf_counter()
+        assert not firmware['capture_frame']()
+        host = (time.perf_counter() - host) / len(polls)
+
+        # Bus traffic for a whole frame
+        spi.capture_time = capture_time
+        hal.console.keep = False
+        clock.reset()
+        firmware['stream_image']()
+    return rate, host, probe, clock.stats['locks'], clock.stats['spi_calls']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--before', help="git revision of the device code to compare against")
+    parser.add_argument('--capture-time', type=float, default=simbus.CAPTURE_TIME,
+                        help="Seconds from trigger to CAP_DONE")
+    args = parser.parse_args()
+    args.before = args.before or simbus.revision_before('SPITransaction', 'circuitpython/Arducam.py')
+
+    runs = {
+        f'before ({args.before})': run(args.before, args.capture_time),
+        'after (worktree)': run(None, args.capture_time),
+    }
+
+    print(f"Capture time {args.capture_time * 1000:.0f} ms, SPI at 2 MHz")
+    print(f"{'firmware':<22} {'polls/s':>9} {'host us/poll':>13} {'to probe us':>12} {'locks':>7} {'calls':>7}")
+    for name, (rate, host, probe, locks, calls) in runs.items():
+        print(f"{name:<22} {rate:>9.0f} {host * 1e6:>13.1f} {probe * 1e6:>12.0f} {locks:>7} {calls:>7}")
+    (before, _, b_probe, b_locks, _), (after, _, a_probe, a_locks, _) = runs.values()
+    print(f"\nPolling rate {after / before:.2f}x; CAP_DONE to first FIFO byte "
+          f"{b_probe * 1e6:.0f} us -> {a_probe * 1e6:.0f} us; bus locks per frame {b_locks} -> {a_locks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""SPI clock calibration: FIFO readout time at the calibrated clock vs 2 MHz.
+
+Boots circuitpython/code.py on the simulated buses with an ArduChip whose
+wiring carries burst reads intact up to --limits MHz ("none": any clock;
+faster reads flip random bits, see simbus.SimSPI). A cold boot calibrates
+the FIFO clock and stores it in NVM, and a warm boot checks the stored clock
+with one read. For each wiring the table shows the clock chosen, both boot
+times, and for a --size MB 2592x1944 frame:
+
+  FIFO s    burst-reading the whole frame at the FIFO clock
+  stream s  stream_image(), capture to last byte through USB (the
+            stream is checked against the FIFO contents)
+
+The "before" row is code.py and Arducam.py at the git revision given with
+--before (default: the last one without calibration), which read the FIFO
+at a fixed 2 MHz.
+
+    uv run benchmarks/bench_spiclock.py --limits none,13,7
+"""
+import argparse
+import contextlib
+import io
+import sys
+
+import simbus
+from bench_device import check_stream, fifo_image
+
+CPLD_REVISION = 0x73
+
+
+def boot(clock, firmware, driver, limit, frame):
+    """Seconds to 'Camera Ready!' and the booted camera."""
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        clock.reset()
+        clock.sleep(1)  # time.sleep(1) before Arducam() in main
+        cam = driver.Arducam()
+        cam.spi.regs[0x40] = CPLD_REVISION
+        cam.spi.max_baudrate = limit
+        cam.spi.fifo = frame
+        firmware['cam'] = cam
+        firmware['run_diagnostics']()
+    assert "Camera Ready!" in out.getvalue(), out.getvalue()
+    return clock.now, cam
+
+
+def readout(clock, firmware, cam):
+    """(FIFO burst seconds, stream seconds) for the frame in cam.spi.fifo."""
+    hal = sys.modules['hal']
+    length = len(cam.spi.fifo)
+    clock.reset()
+    if hasattr(cam, 'fifo_crc'):
+        cam.fifo_crc(length, cam.bus.burst_baudrate)
+    else:
+        with cam.bus as bus:
+            bus.begin_burst()
+            for pos in range(0, length, 4096):
+                cam.spi.readinto(bytearray(min(4096, length - pos)))
+            bus.end_burst()
+    fifo = clock.now
+
+    hal.console.sent.clear()
+    hal.console.keep = True
+    with contextlib.redirect_stdout(simbus.ConsoleText(hal.console)):
+        clock.reset()
+        firmware['stream_image']()
+        hal.console.flush()
+    check_stream(bytes(hal.console.sent), cam.spi.fifo)
+    return fifo, clock.now
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--before', help="git revision of the device code to compare against")
+    parser.add_argument('--limits', default="none,26,13,7,3",
+                        help="Comma-separated wiring limits in MHz ('none': no limit)")
+    parser.add_argument('--size', type=float, default=1.5, help="Frame size in MB")
+    args = parser.parse_args()
+    args.before = args.before or simbus.revision_before('set_fifo_baudrate', 'circuitpython/Arducam.py')
+    frame = fifo_image(args.size, 0)
+
+    print(f"2592x1944 frame of {len(frame) / 1e6:.2f} MB")
+    print(f"{'firmware':<22} {'wiring':>8} {'FIFO clock':>11} {'cold boot s':>12} {'warm boot s':>12} "
+          f"{'FIFO s':>7} {'stream s':>9}")
+
+    clock = simbus.install()
+    driver = simbus.load_driver(clock, args.before)
+    with contextlib.redirect_stdout(io.StringIO()):  # Boot banner
+        firmware = simbus.load_firmware(clock, args.before, driver)
+    elapsed, cam = boot(clock, firmware, driver, None, frame)
+    fifo, stream = readout(clock, firmware, cam)
+    print(f"{f'before ({args.before})':<22} {'-':>8} {'2.0 MHz':>11} {elapsed:>12.2f} {elapsed:>12.2f} "
+          f"{fifo:>7.2f} {stream:>9.2f}")
+
+    for limit in args.limits.split(","):
+        limit = None if limit == 'none' else float(limit) * 1e6
+        clock = simbus.install()  # Fresh NVM
+        driver = simbus.load_driver(clock)
+        with contextlib.redirect_stdout(io.StringIO()):
+            firmware = simbus.load_firmware(clock, None, driver)
+        cold, _ = boot(clock, firmware, driver, limit, frame)
+        warm, cam = boot(clock, firmware, driver, limit, frame)
+        fifo, stream = readout(clock, firmware, cam)
+        wiring = 'none' if limit is None else f"{limit / 1e6:g} MHz"
+        chosen = f"{cam.bus.burst_baudrate / 1e6:g} MHz"
+        print(f"{'after (worktree)':<22} {wiring:>8} {chosen:>11} {cold:>12.2f} {warm:>12.2f} "
+              f"{fifo:>7.2f} {stream:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
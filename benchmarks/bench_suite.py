@@ -0,0 +1,116 @@
+"""Hermetic host benchmark suite against the pty emulator.
+
+For each firmware dialect, PicoEmulator serves the sample JPEGs in images/
+over a rate-limited pty from a child process, and the host side is measured
+through the real pyserial + PicoCamera stack:
+
+  cold_ms      open (boot wait) + first capture
+  warm_ms      mean / p95 latency of further captures on the same session
+  burst_mbps   sustained burst throughput, and frames per minute
+  cpu_ms_mb    host CPU time per MB received
+  fault_catch  share of injected corruptions rejected by the frame CRC
+
+Results can be appended as JSON lines with --record so they can be
+compared across releases.
+
+    uv run benchmarks/bench_suite.py --rate 1000000 --record bench_results.jsonl
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import time
+import tomllib
+
+from simserial import PROJECT_DIR
+from picocam.camera import ARDUINO, CIRCUITPYTHON, PicoCamera
+from picocam.emulator import Faults, PicoEmulator, load_images
+from picocam.frame import FrameError
+
+
+def project_version():
+    with open(os.path.join(PROJECT_DIR, 'pyproject.toml'), 'rb') as f:
+        version = tomllib.load(f)['project']['version']
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                             capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ''
+    return version, rev
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def bench_dialect(dialect, images, rate, captures, boot_delay):
+    result = {'dialect': dialect}
+
+    with PicoEmulator(dialect, images, rate=rate, boot_delay=boot_delay) as emu:
+        cam = PicoCamera(emu.port, dialect)
+        start = time.perf_counter()
+        cam.open()
+        cam.capture()
+        result['cold_ms'] = (time.perf_counter() - start) * 1000
+
+        warm, received = [], 0
+        cpu0 = time.process_time()
+        for _ in range(captures):
+            start = time.perf_counter()
+            received += len(cam.capture())
+            warm.append(time.perf_counter() - start)
+        cpu = time.process_time() - cpu0
+        result['warm_ms'] = sum(warm) / len(warm) * 1000
+        result['warm_p95_ms'] = percentile(warm, 0.95) * 1000
+        result['cpu_ms_mb'] = cpu / (received / 1e6) * 1000
+
+        stats = cam.burst(captures, lambda header, jpeg: None)
+        result['burst_mbps'] = stats.bytes / stats.elapsed / 1e6
+        result['burst_fpm'] = stats.frames / stats.elapsed * 60
+        cam.close()
+
+    # Every frame gets one flipped byte; all of them must be rejected
+    with PicoEmulator(dialect, images, rate=rate, faults=Faults(corrupt=1.0)) as emu:
+        caught = 0
+        with PicoCamera(emu.port, dialect) as cam:
+            for _ in range(captures):
+                try:
+                    cam.capture()
+                except FrameError:
+                    caught += 1
+        result['fault_catch'] = caught / captures
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--rate', type=float, default=1_000_000, help="Emulated link bytes/s")
+    parser.add_argument('--captures', type=int, default=6)
+    parser.add_argument('--boot-delay', type=float, default=2.5)
+    parser.add_argument('--record', help="Append results as JSON lines to this file")
+    args = parser.parse_args()
+
+    images = load_images()
+    version, rev = project_version()
+    print(f"project {version} ({rev}), link {args.rate / 1e6:.2f} MB/s, "
+          f"{len(images)} sample images, {args.captures} captures")
+    print(f"{'dialect':<14} {'cold ms':>8} {'warm ms':>8} {'p95 ms':>7} {'MB/s':>6} "
+          f"{'fpm':>6} {'CPU ms/MB':>9} {'faults':>7}")
+
+    for dialect in (ARDUINO, CIRCUITPYTHON):
+        r = bench_dialect(dialect, images, args.rate, args.captures, args.boot_delay)
+        print(f"{dialect:<14} {r['cold_ms']:8.0f} {r['warm_ms']:8.1f} {r['warm_p95_ms']:7.1f} "
+              f"{r['burst_mbps']:6.2f} {r['burst_fpm']:6.0f} {r['cpu_ms_mb']:9.1f} "
+              f"{r['fault_catch']:7.0%}")
+        if args.record:
+            r.update(version=version, rev=rev, rate=args.rate, captures=args.captures,
+                     date=datetime.datetime.now().isoformat(timespec='seconds'))
+            with open(args.record, 'a') as f:
+                f.write(json.dumps(r) + "\n")
+
+
+if __name__ == "__main__":
+    main()
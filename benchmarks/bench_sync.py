@@ -0,0 +1,77 @@
+"""Boot time to 'Camera Ready!': 16-mode sync sweep vs the NVM calibration cache.
+
+Boots circuitpython/code.py (main's 1 s wait, Arducam(), run_diagnostics())
+on the simulated buses in simbus.py, with an ArduChip that only delivers a
+JPEG in one timing mode (--mode); modes with the wrong VSYNC polarity time
+out after 1 s. The "before" firmware is code.py and Arducam.py at the git
+revision given with --before (default: the last one without the cache),
+which sweeps on every boot. The worktree firmware starts from an empty NVM
+and keeps it across its boots: a cold boot, warm
+boots, a boot after the sensor moved to --moved, and one after it moved
+back (the sweep then tries the modes that locked before first).
+
+    uv run benchmarks/bench_sync.py --mode 0x06 --moved 0x0B
+"""
+import argparse
+import contextlib
+import io
+import sys
+
+import simbus
+from simserial import sample_jpegs
+
+CPLD_REVISION = 0x73
+
+
+def boot(clock, firmware, driver, mode):
+    """Seconds from power-up to 'Camera Ready!', captures made and the locked mode."""
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        clock.reset()
+        clock.sleep(1)  # time.sleep(1) before Arducam() in main
+        cam = driver.Arducam()
+        cam.spi.regs[0x40] = CPLD_REVISION
+        cam.spi.sync_mode = mode
+        cam.spi.fifo = sample_jpegs()[0]
+        firmware['cam'] = cam
+        firmware['run_diagnostics']()
+    assert "Camera Ready!" in out.getvalue()
+    return clock.now, cam.spi.captures, firmware['LOCKED_MODAL_BITS']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--before', help="git revision of the device code to compare against")
+    parser.add_argument('--mode', type=lambda v: int(v, 0), default=0x06, help="Timing mode the sensor needs")
+    parser.add_argument('--moved', type=lambda v: int(v, 0), default=0x0B, help="Mode it needs after moving")
+    args = parser.parse_args()
+    args.before = args.before or simbus.revision_before('SYNC_MAGIC', 'circuitpython/code.py')
+
+    clock = simbus.install()
+    nvm = sys.modules['hal'].nvm
+    with contextlib.redirect_stdout(io.StringIO()):  # Boot banner
+        old_driver = simbus.load_driver(clock, args.before)
+        before = simbus.load_firmware(clock, args.before, old_driver)
+        driver = simbus.load_driver(clock)
+        after = simbus.load_firmware(clock, None, driver)
+
+    nvm[:] = bytes(len(nvm))
+    before_row = boot(clock, before, old_driver, args.mode)
+    nvm[:] = bytes(len(nvm))  # The worktree's cold boot finds nothing the old firmware left
+    rows = [
+        (f'before ({args.before})', 'every boot', before_row),
+        ('after (worktree)', 'cold (empty NVM)', boot(clock, after, driver, args.mode)),
+        ('after (worktree)', 'warm', boot(clock, after, driver, args.mode)),
+        ('after (worktree)', f'moved to 0x{args.moved:02X}', boot(clock, after, driver, args.moved)),
+        ('after (worktree)', f'back to 0x{args.mode:02X}', boot(clock, after, driver, args.mode)),
+        ('after (worktree)', 'warm', boot(clock, after, driver, args.mode)),
+    ]
+    print(f"Sensor syncs in mode 0x{args.mode:02X}; NVM record: {bytes(nvm[:23]).hex(' ')}")
+    print(f"{'firmware':<20} {'boot':<18} {'to Ready s':>11} {'captures':>9} {'locked':>7}")
+    for name, label, (elapsed, captures, locked) in rows:
+        print(f"{name:<20} {label:<18} {elapsed:>11.2f} {captures:>9} {f'0x{locked:02X}':>7}")
+    cold, warm = rows[0][2][0], rows[2][2][0]
+    print(f"\nTime to 'Camera Ready!': {cold:.2f} s every boot -> {warm:.2f} s warm ({cold / warm:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Recovering mis-synced payloads: per-byte Python loop vs picocam.transform.
+
+First, for each wiring fault, the sample JPEG and a few bytes of padding
+are put in the simulated FIFO with the fault applied and streamed by
+circuitpython/code.py's stream_image(), checking that the frame flags name
+the fault and that recover() gives back the JPEG. Then each inverse is
+timed on a --size MB payload (a 2592x1944 frame) three ways:
+
+  loop     a per-byte Python loop over a lookup table (shifts carry the bit
+           between bytes by hand)
+  stdlib   recover(use_numpy=False): bytes.translate() and int shifts
+  numpy    recover(use_numpy=True): NumPy lookup tables and array shifts,
+           if NumPy is installed (uv run --with numpy benchmarks/bench_transform.py)
+
+recover() by default uses translate() for the tables and NumPy for the shifts.
+
+    uv run benchmarks/bench_transform.py
+"""
+import argparse
+import contextlib
+import sys
+import time
+
+import simbus
+from bench_device import fifo_image
+from simserial import sample_jpegs
+from picocam.frame import HEADER_SIZE, check_body, decode_header
+from picocam.receive import trim_to_eoi
+from picocam.transform import (FLAG_TRANSFORM, SHIFT_L1, SHIFT_R1, STANDARD, TABLES, TRANSFORM_NAMES,
+                               apply, np, recover)
+
+STREAM_MARKER = b"ACK IMG END\n"
+
+
+def loop_recover(data, transform):
+    """Reference inverse, one byte at a time in Python."""
+    out = bytearray(len(data))
+    if transform in TABLES:
+        table = TABLES[transform]
+        for i, b in enumerate(data):
+            out[i] = table[b]
+    elif transform == SHIFT_R1:
+        for i in range(len(data) - 1):
+            out[i] = ((data[i] << 1) | (data[i + 1] >> 7)) & 0xFF
+        out[-1] = (data[-1] << 1) & 0xFF
+    elif transform == SHIFT_L1:
+        carry = 1  # The SOI's first byte is 0xFF
+        for i, b in enumerate(data):
+            out[i] = (b >> 1) | (carry << 7)
+            carry = b & 1
+    return bytes(out)
+
+
+def check_device(jpeg):
+    """Stream each faulted FIFO through code.py; returns the transforms that failed."""
+    clock = simbus.install()
+    hal = sys.modules['hal']
+    failed = []
+    with contextlib.redirect_stdout(simbus.ConsoleText(hal.console)):
+        driver = simbus.load_driver(clock)
+        firmware = simbus.load_firmware(clock, driver=driver)
+        cam = firmware['cam'] = driver.Arducam()
+        for transform, name in enumerate(TRANSFORM_NAMES):
+            cam.spi.fifo = apply(jpeg + bytes(8), transform)  # The FIFO runs on past EOI
+            hal.console.sent.clear()
+            firmware['stream_image']()
+            sent = bytes(hal.console.sent)
+            if STREAM_MARKER not in sent:
+                failed.append(f"{name}: no frame")
+                continue
+            at = sent.index(STREAM_MARKER) + len(STREAM_MARKER)
+            header = decode_header(sent[at:at + HEADER_SIZE])
+            payload = check_body(header, sent[at + HEADER_SIZE:at + HEADER_SIZE + header.length + 4])
+            flags = header.flags & FLAG_TRANSFORM
+            recovered = trim_to_eoi(recover(payload, flags))
+            if flags != transform or bytes(recovered) != jpeg:
+                failed.append(f"{name}: flags {flags}, {len(recovered)} bytes recovered")
+    return failed
+
+
+def best(run, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--size', type=float, default=1.5, help="Payload size in MB")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per method (best is kept)")
+    args = parser.parse_args()
+
+    failed = check_device(sample_jpegs()[0])
+    print(f"Device flags + recover(): {len(TRANSFORM_NAMES) - len(failed)}/{len(TRANSFORM_NAMES)} "
+          f"faults recovered to the original JPEG")
+    for line in failed:
+        print(f"  {line}")
+
+    jpeg = fifo_image(args.size, 0)
+    methods = {
+        'loop': loop_recover,
+        'stdlib': lambda data, t: recover(data, t, use_numpy=False),
+    }
+    if np is not None:
+        methods['numpy'] = lambda data, t: recover(data, t, use_numpy=True)
+    else:
+        print("NumPy is not installed; skipping the numpy column")
+
+    print(f"\nRecovering a {len(jpeg) / 1e6:.2f} MB payload (ms)")
+    print(f"{'fault':<14}" + "".join(f"{name:>9}" for name in methods) + f"{'vs loop':>9}")
+    mismatches = 0
+    for transform, name in enumerate(TRANSFORM_NAMES):
+        if transform == STANDARD:
+            continue
+        faulted = apply(jpeg, transform)
+        times = {}
+        results = []
+        for method, run in methods.items():
+            elapsed, result = best(lambda: run(faulted, transform), 1 if method == 'loop' else args.repeat)
+            times[method] = elapsed
+            results.append(bytes(result))
+        if len(set(results)) != 1:
+            mismatches += 1
+            print(f"  {name}: methods disagree")
+        fastest = min(t for m, t in times.items() if m != 'loop')
+        print(f"{name:<14}" + "".join(f"{t * 1000:>9.1f}" for t in times.values())
+              + f"{times['loop'] / fastest:>8.0f}x")
+    if failed or mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
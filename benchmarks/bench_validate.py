@@ -0,0 +1,162 @@
+"""Streaming JPEG validation: when a bad frame is caught, before and after.
+
+Each case streams one framed 2592x1944 sample JPEG through a
+SimulatedSerial at --rate bytes/s, with one fault:
+
+  stall          the device stops sending 40% into the payload
+  dropped bytes  300 payload bytes are lost on the link, so the frame never
+                 reaches its announced length
+  link flip      a DHT byte is flipped on the link (the CRC catches it)
+  bad DQT        a DQT byte is wrong in the FIFO (the device's CRC covers it)
+  truncated      the FIFO holds only the first 60% of the JPEG
+  no SOI         the FIFO holds noise
+
+"before" is the receive path without validation: read_frame() with the
+transfer timeout, trim_to_eoi() and the capture script's size check
+(> 20000 bytes, circuitpython/capture.py). "after" is PicoCamera.receive()'s:
+read_frame() feeding a JpegValidator with an idle timeout, then
+picocam.jpeg.frame_jpeg(). For each, the table shows the outcome, the
+seconds until it was known and, after, the payload bytes received when the
+fault was detected.
+
+Then the validator's own cost is timed on a 2 MB payload with no link
+delay, and the dimensions it reads from each sample are listed.
+
+    uv run benchmarks/bench_validate.py
+"""
+import argparse
+import time
+
+from simserial import SimulatedSerial, sample_jpegs
+from picocam.frame import FrameError, encode_frame, read_frame
+from picocam.jpeg import JpegValidator, frame_jpeg, validate_jpeg
+from picocam.receive import trim_to_eoi
+
+MIN_SIZE = 20000  # The size check validation replaces
+TARGET_SIZE = 2 * 1024 * 1024  # Upper end of a 2592x1944 JPEG
+
+
+def flip(data, at, mask=0xFF):
+    data = bytearray(data)
+    data[at] ^= mask
+    return bytes(data)
+
+
+def large_jpeg(jpeg):
+    # Repeat the scan's entropy-coded data (no markers but RSTn) up to TARGET_SIZE
+    sos = jpeg.index(b'\xff\xda')
+    start = sos + 2 + int.from_bytes(jpeg[sos + 2:sos + 4], 'big')
+    body, entropy = jpeg[:-2], jpeg[start:-2]
+    while len(body) < TARGET_SIZE:
+        body += entropy[:TARGET_SIZE - len(body)]
+    return body + b'\xff\xd9'
+
+
+def cases(jpeg):
+    """(name, stream as the host receives it) for each fault."""
+    frame = encode_frame(jpeg, resolution=6, sequence=1)
+    dht = 20 + jpeg.index(b'\xff\xc4') + 5  # First code count of the first table
+    dqt = jpeg.index(b'\xff\xdb') + 4  # Precision and id of the first table
+    middle = 20 + len(jpeg) // 2
+    noise = bytes((i * 131 + 7) & 0xFF for i in range(len(jpeg)))
+    truncated = jpeg[:len(jpeg) * 6 // 10]
+    return [
+        ("clean", frame),
+        ("stall", frame[:20 + len(jpeg) * 4 // 10]),
+        ("dropped bytes", frame[:middle] + frame[middle + 300:]),
+        ("link flip", flip(frame, dht, 0x80)),
+        ("bad DQT", encode_frame(flip(jpeg, dqt, 0x40), resolution=6, sequence=1)),
+        ("truncated", encode_frame(truncated, resolution=6, sequence=1)),
+        ("no SOI", encode_frame(noise, resolution=6, sequence=1)),
+    ]
+
+
+def link(stream, rate):
+    ser = SimulatedSerial(stream, rate=rate)
+    ser.timeout = 0.1  # Granularity of the timeouts
+    return ser
+
+
+def before(stream, rate, timeout):
+    try:
+        _, payload = read_frame(link(stream, rate), timeout=timeout)
+    except FrameError as e:
+        return f"rejected: {e}"
+    jpeg = trim_to_eoi(payload)
+    if len(jpeg) > MIN_SIZE:
+        return f"accepted, {len(jpeg)} bytes"
+    return f"rejected: {len(jpeg)} bytes"
+
+
+def after(stream, rate, timeout, idle_timeout, detected):
+    validator = JpegValidator()
+    ser = link(stream, rate)
+    try:
+        header, payload = read_frame(ser, timeout=timeout, validator=validator, idle_timeout=idle_timeout)
+        jpeg, _ = frame_jpeg(header, payload, validator)
+    except FrameError as e:
+        detected.append(max(ser.pos - 20, 0))
+        return f"rejected: {e}"
+    detected.append(None)
+    return f"accepted, {len(jpeg)} bytes, {validator.width}x{validator.height}"
+
+
+def timed(run):
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start
+
+
+def overhead(jpeg, repeat):
+    payload = large_jpeg(jpeg)
+    frame = encode_frame(payload, resolution=6, sequence=1)
+    times = {}
+    for name, make in (("read_frame", lambda: None), ("+ validator", JpegValidator)):
+        best = None
+        for _ in range(repeat):
+            validator = make()
+            start = time.perf_counter()
+            read_frame(SimulatedSerial(frame), validator=validator)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            assert validator is None or validator.done
+        times[name] = best
+    return len(payload), times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--rate', type=float, default=235e3, help="Link speed in bytes/s")
+    parser.add_argument('--timeout', type=float, default=20, help="Transfer timeout in seconds")
+    parser.add_argument('--idle', type=float, default=5, help="Idle timeout in seconds (after)")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs of the overhead test (best is kept)")
+    args = parser.parse_args()
+
+    jpeg = max(sample_jpegs(), key=len)
+    print(f"{len(jpeg)} byte JPEG at {args.rate / 1e3:.0f} KB/s, transfer timeout {args.timeout:g} s, "
+          f"idle timeout {args.idle:g} s")
+    print(f"{'fault':<14} {'':<7} {'s':>6} {'received':>9}  outcome")
+    for name, stream in cases(jpeg):
+        old, old_s = timed(lambda: before(stream, args.rate, args.timeout))
+        detected = []
+        new, new_s = timed(lambda: after(stream, args.rate, args.timeout, args.idle, detected))
+        at = '-' if detected[0] is None else detected[0]
+        print(f"{name:<14} {'before':<7} {old_s:>6.2f} {'-':>9}  {old}")
+        print(f"{'':<14} {'after':<7} {new_s:>6.2f} {at:>9}  {new}")
+
+    size, times = overhead(jpeg, args.repeat)
+    print(f"\nReceiving a {size / 1e6:.2f} MB frame with no link delay (best of {args.repeat})")
+    for name, elapsed in times.items():
+        print(f"{name:<12} {elapsed * 1000:>7.2f} ms  {size / elapsed / 1e6:>7.0f} MB/s")
+    extra = times["+ validator"] - times["read_frame"]
+    print(f"Validation adds {extra * 1000 / (size / 1e6):.2f} ms per MB")
+
+    print("\nDimensions from the SOF of each sample")
+    for data in sample_jpegs():
+        info = validate_jpeg(data)
+        print(f"  {len(data):>8} bytes  {info.width}x{info.height}, {info.components} components, "
+              f"{info.tables} tables, {info.scans} scan{'s' if info.scans != 1 else ''}")
+
+
+if __name__ == "__main__":
+    main()
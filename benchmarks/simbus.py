@@ -0,0 +1,470 @@
+"""Simulated Pico hardware for running circuitpython/code.py and Arducam.py on CPython.
+
+install() registers a simulated `hal` module (the interface the device
+code uses, see circuitpython/hal.py) and returns its VirtualClock. It
+also registers stand-in `board`, `busio`, `digitalio`, `supervisor`,
+`usb_cdc` and `microcontroller` modules for driver revisions that predate
+the HAL. Bus and USB operations advance the clock by a modelled cost
+(Timings) instead of taking real time, and the device code's sleeps go to
+the same clock. A full sensor init therefore "runs" in milliseconds of
+real time while reporting the time it would take on a Pico:
+
+    clock = simbus.install()
+    Arducam = simbus.load_driver(clock)
+    cam = Arducam.Arducam()
+    cam.init_cam()
+    print(clock.now, clock.stats)
+
+Modelled costs are per call and per bit on the wire. Interpreter time
+between calls is not part of the clock; it is what real CPU time measures
+under CPython (see bench_device.py).
+"""
+import ast
+import io
+import os
+import random
+import subprocess
+import sys
+import types
+from dataclasses import dataclass
+
+from simserial import PROJECT_DIR
+
+CIRCUITPYTHON_DIR = os.path.join(PROJECT_DIR, 'circuitpython')
+
+# Default modelled costs (seconds)
+LOCK_COST = 5e-6        # try_lock() + unlock()
+I2C_CALL_COST = 40e-6   # busio.I2C.writeto / readfrom_into overhead
+SPI_CALL_COST = 15e-6   # busio.SPI transfer overhead
+CONFIGURE_COST = 10e-6  # busio.SPI.configure
+CAPTURE_TIME = 0.2      # Trigger (0x04 <- 0x02) to CAP_DONE in ARDUCHIP_TRIG
+USB_CALL_COST = 20e-6   # usb_cdc.console.write overhead
+USB_RATE = 800_000      # USB CDC bytes/s to the host
+USB_BUFFER = 1024       # USB CDC transmit buffer (CircuitPython's CFG_TUD_CDC_TX_BUFSIZE)
+
+# ArduChip registers the SPI model gives meaning to
+ARDUCHIP_TIM = 0x03
+ARDUCHIP_FIFO = 0x04
+ARDUCHIP_TRIG = 0x41
+FIFO_SIZE = (0x42, 0x43, 0x44)
+BURST_FIFO_READ = 0x3c
+
+
+@dataclass
+class Timings:
+    lock: float = LOCK_COST
+    i2c_call: float = I2C_CALL_COST
+    spi_call: float = SPI_CALL_COST
+    configure: float = CONFIGURE_COST
+    capture: float = CAPTURE_TIME
+    usb_call: float = USB_CALL_COST
+    usb_rate: float = USB_RATE
+    usb_buffer: int = USB_BUFFER
+
+
+class VirtualClock:
+    def __init__(self, timings=None):
+        self.timings = timings or Timings()
+        self.reset()
+
+    def reset(self):
+        self.now = 0.0
+        self.usb_drained = 0.0  # When the USB transmit buffer will be empty
+        self.stats = {'i2c_writes': 0, 'i2c_reads': 0, 'locks': 0, 'sleeps': 0,
+                      'sleep_time': 0.0, 'spi_calls': 0, 'usb_writes': 0, 'usb_bytes': 0}
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def sleep(self, seconds):
+        self.stats['sleeps'] += 1
+        self.stats['sleep_time'] += seconds
+        self.now += seconds
+
+    def monotonic(self):
+        return self.now
+
+
+class SimI2C:
+    """OV5642 on I2C: a register file that answers the chip id."""
+
+    def __init__(self, timer, scl=None, sda=None, frequency=100000):
+        self.clock = timer
+        self.frequency = frequency
+        self.regs = {0x300a: 0x56, 0x300b: 0x42}
+        self.pointer = 0
+
+    def _wire(self, nbytes):
+        # Address byte + data, 9 bits each, plus start/stop
+        self.clock.advance(self.clock.timings.i2c_call + ((nbytes + 1) * 9 + 2) / self.frequency)
+
+    def try_lock(self):
+        self.clock.stats['locks'] += 1
+        self.clock.advance(self.clock.timings.lock)
+        return True
+
+    def unlock(self):
+        pass
+
+    def writeto(self, address, buf):
+        self._wire(len(buf))
+        self.pointer = (buf[0] << 8) | buf[1]
+        if len(buf) == 3:
+            self.clock.stats['i2c_writes'] += 1
+            self.regs[self.pointer] = buf[2]
+
+    def readfrom_into(self, address, buf):
+        self._wire(len(buf))
+        self.clock.stats['i2c_reads'] += 1
+        for i in range(len(buf)):
+            buf[i] = self.regs.get(self.pointer + i, 0)
+
+
+class SimSPI:
+    """ArduChip on SPI: a register file (bit 7 of the first byte selects a
+    write) plus the capture trigger and FIFO.
+
+    Writing 0x02 to ARDUCHIP_FIFO starts a capture that sets CAP_DONE in
+    ARDUCHIP_TRIG `capture_time` seconds later; the FIFO then holds `fifo`
+    and reports its length in 0x42-0x44. A 0x3c burst streams the FIFO from
+    the read pointer, and `first_byte` records when its first byte was on
+    the wire.
+
+    With `sync_mode` set, the timing mode in the low nibble of ARDUCHIP_TIM
+    matters as it does on hardware: a wrong VSYNC polarity (bit 1) never
+    sets CAP_DONE, and any other wrong bit garbles the FIFO data.
+
+    With `max_baudrate` set, burst reads clocked faster than the wiring
+    carries flip bits in random FIFO bytes, more of them the further the
+    clock is past the limit (`error_rate` per byte at twice the limit).
+    """
+
+    def __init__(self, timer, clock=None, MOSI=None, MISO=None):
+        self.clock = timer
+        self.baudrate = 100000
+        self.regs = {}
+        self.pointer = 0
+        self.capture_time = timer.timings.capture
+        self.fifo = bytes(range(256)) * 16
+        self.triggered = None
+        self.read_pos = 0
+        self.first_byte = None
+        self.sync_mode = None
+        self.captures = 0
+        self.max_baudrate = None
+        self.error_rate = 0.001
+        self.random = random.Random(0)
+
+    def _mode_error(self):
+        # Bits of the timing mode that differ from the one the sensor needs
+        if self.sync_mode is None:
+            return 0
+        return (self.regs.get(ARDUCHIP_TIM, 0) ^ self.sync_mode) & 0x0F
+
+    def _reg(self, address):
+        if address == ARDUCHIP_TRIG:
+            done = (self.triggered is not None and not self._mode_error() & 0x02
+                    and self.clock.now >= self.triggered + self.capture_time)
+            return self.regs.get(address, 0) | (0x08 if done else 0)
+        if address in FIFO_SIZE and self.triggered is not None:
+            return (len(self.fifo) >> (8 * FIFO_SIZE.index(address))) & 0xFF
+        return self.regs.get(address, 0)
+
+    def _write_reg(self, address, value):
+        if address == ARDUCHIP_FIFO:
+            if value & 0x01:  # Clear the done flag
+                self.triggered = None
+            if value & 0x02:  # Start capture
+                self.captures += 1
+                self.triggered = self.clock.now
+                self.first_byte = None
+            if value & 0x10:  # Reset the FIFO read pointer
+                self.read_pos = 0
+            return
+        self.regs[address] = value
+
+    def _burst(self, buf, start, end, lead=1):
+        # `lead` bytes are clocked before the first FIFO byte is complete
+        if self.first_byte is None:
+            self.first_byte = self.clock.now + self.clock.timings.spi_call + lead * 8 / self.baudrate
+        data = memoryview(self.fifo)[self.read_pos:self.read_pos + end - start]
+        if self._mode_error():
+            data = b'\x55' * len(data)
+        buf[start:start + len(data)] = data
+        if self.max_baudrate and self.baudrate > self.max_baudrate and len(data):
+            p = min(1.0, (self.baudrate / self.max_baudrate - 1) * self.error_rate)
+            for _ in range(self.random.binomialvariate(len(data), p)):
+                buf[start + self.random.randrange(len(data))] ^= 1 << self.random.randrange(8)
+        self.read_pos += end - start
+
+    def _wire(self, nbytes):
+        self.clock.stats['spi_calls'] += 1
+        self.clock.advance(self.clock.timings.spi_call + nbytes * 8 / self.baudrate)
+
+    def try_lock(self):
+        self.clock.stats['locks'] += 1
+        self.clock.advance(self.clock.timings.lock)
+        return True
+
+    def unlock(self):
+        pass
+
+    def configure(self, baudrate=100000, polarity=0, phase=0, bits=8):
+        self.baudrate = baudrate
+        self.clock.advance(self.clock.timings.configure)
+
+    def write(self, buf, start=0, end=None):
+        data = bytes(buf[start:end])
+        self._wire(len(data))
+        if data[0] & 0x80 and len(data) > 1:
+            self._write_reg(data[0] & 0x7F, data[1])
+        else:
+            self.pointer = data[0] & 0x7F
+
+    def readinto(self, buf, start=0, end=None, write_value=0):
+        end = len(buf) if end is None else end
+        if self.pointer == BURST_FIFO_READ:
+            self._burst(buf, start, end)
+        else:
+            value = self._reg(self.pointer)
+            for i in range(start, end):
+                buf[i] = value
+        self._wire(end - start)
+
+    def write_readinto(self, out_buf, in_buf):
+        if out_buf[0] == BURST_FIFO_READ:
+            # Command byte clocks in a dummy byte, then the FIFO follows
+            in_buf[0] = 0
+            self._burst(in_buf, 1, len(in_buf), lead=2)
+        else:
+            for i in range(len(in_buf)):
+                in_buf[i] = 0
+        self._wire(len(out_buf))
+
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = None
+        self.value = True
+
+
+class SimConsole:
+    """USB CDC serial port: binary writes and print() output to the host,
+    and a queue of host input for the device to read.
+
+    Writes cost usb_call and go into a usb_buffer-byte transmit buffer that
+    drains to the host at usb_rate in the background (clock.usb_drained is
+    when it will be empty). A write returns once its last byte is in the buffer,
+    or, with write_timeout 0, takes only what fits and returns the count.
+    `keep` retains what was sent in `sent`; otherwise only the count and
+    total are kept.
+    """
+
+    def __init__(self, clock, keep=True):
+        self.clock = clock
+        self.keep = keep
+        self.sent = bytearray()
+        self.pending = ''
+        self.write_timeout = None
+
+    def write(self, buf):
+        n = len(buf)
+        clock = self.clock
+        timings = clock.timings
+        clock.advance(timings.usb_call)
+        start = max(clock.usb_drained, clock.now)
+        if self.write_timeout == 0:
+            queued = (start - clock.now) * timings.usb_rate
+            n = min(n, max(0, int(timings.usb_buffer - queued)))
+        clock.usb_drained = start + n / timings.usb_rate
+        # Wait until all but the last usb_buffer bytes have gone out
+        clock.advance(max(0.0, clock.usb_drained - timings.usb_buffer / timings.usb_rate - clock.now))
+        clock.stats['usb_writes'] += 1
+        clock.stats['usb_bytes'] += n
+        if self.keep:
+            self.sent += buf[:n]
+        return n
+
+    def flush(self):
+        # Wait until the host has everything
+        self.clock.advance(max(0.0, self.clock.usb_drained - self.clock.now))
+
+    def feed(self, text):
+        # Queue host input (commands) for serial_read()
+        self.pending += text
+
+    def available(self):
+        return len(self.pending)
+
+    def read(self, n):
+        text, self.pending = self.pending[:n], self.pending[n:]
+        return text
+
+
+class ConsoleText(io.TextIOBase):
+    """Text stream for sys.stdout that writes into a SimConsole, as print() does on the Pico."""
+
+    def __init__(self, console):
+        self.console = console
+
+    def write(self, text):
+        self.console.write(text.encode())
+        return len(text)
+
+
+def make_hal(clock, console=None, nvm=None):
+    """A simulated `hal` module: the circuitpython/hal.py interface on `clock`."""
+    hal = types.ModuleType('hal')
+    for name in ('CS', 'SDA', 'SCL', 'SCK', 'MOSI', 'MISO'):
+        setattr(hal, f'{name}_PIN', name)
+    hal.nvm = bytearray(4096) if nvm is None else nvm
+    hal.sleep = clock.sleep
+    hal.monotonic = clock.monotonic
+    hal.console = console or SimConsole(clock)
+
+    def console_send(buf):
+        hal.console.write_timeout = 0
+        n = hal.console.write(buf)
+        hal.console.write_timeout = None
+        return n
+
+    hal.console_send = console_send
+    hal.release_displays = lambda: None
+    hal.spi_bus = lambda sck, mosi, miso: SimSPI(clock, sck, mosi, miso)
+    hal.i2c_bus = lambda scl, sda, frequency: SimI2C(clock, scl, sda, frequency)
+
+    def output_pin(pin, value=True):
+        io = DigitalInOut(pin)
+        io.value = value
+        return io
+
+    hal.output_pin = output_pin
+    hal.serial_available = hal.console.available
+    hal.serial_read = hal.console.read
+    return hal
+
+
+def install(clock=None):
+    """Register the simulated hardware modules and return their clock."""
+    clock = clock or VirtualClock()
+    hal = make_hal(clock)
+
+    # Stand-ins for the CircuitPython modules, for revisions that predate hal.py
+    board = types.ModuleType('board')
+    for n in range(29):
+        setattr(board, f'GP{n}', f'GP{n}')
+
+    busio = types.ModuleType('busio')
+    busio.I2C = lambda *args, **kwargs: SimI2C(clock, *args, **kwargs)
+    busio.SPI = lambda *args, **kwargs: SimSPI(clock, *args, **kwargs)
+
+    digitalio = types.ModuleType('digitalio')
+    digitalio.DigitalInOut = DigitalInOut
+    digitalio.Direction = types.SimpleNamespace(OUTPUT='output', INPUT='input')
+
+    microcontroller = types.ModuleType('microcontroller')
+    microcontroller.nvm = hal.nvm
+    supervisor = types.ModuleType('supervisor')
+    supervisor.runtime = types.SimpleNamespace(serial_bytes_available=0)
+    usb_cdc = types.ModuleType('usb_cdc')
+    usb_cdc.console = hal.console
+
+    sys.modules.update(hal=hal, board=board, busio=busio, digitalio=digitalio,
+                       microcontroller=microcontroller, supervisor=supervisor, usb_cdc=usb_cdc)
+    if CIRCUITPYTHON_DIR not in sys.path:
+        sys.path.insert(0, CIRCUITPYTHON_DIR)
+    return clock
+
+
+def git_source(path, rev):
+    """`path` (relative to the project root) as committed at git `rev`.
+
+    Exits with an error if `rev` is not a commit or has no such file, so a
+    benchmark never silently compares the worktree with itself.
+    """
+    result = subprocess.run(['git', 'show', f'{rev}:{path}'], cwd=PROJECT_DIR, capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(f"Cannot read {path} at {rev}: {result.stderr.strip()}")
+    return result.stdout
+
+
+def revision_before(symbol, path):
+    """The last git revision of `path` without `symbol`: the parent of the
+    commit that introduced it.
+
+    A benchmark's default "before". If no commit adds `symbol` (a shallow
+    clone, or a history without it), this is HEAD, with a warning that the
+    committed code is then compared with the worktree.
+    """
+    result = subprocess.run(['git', 'log', '--format=%H', '--reverse', '-S', symbol, '--', path],
+                            cwd=PROJECT_DIR, capture_output=True, text=True)
+    found = result.stdout.split()
+    if found:
+        parent = subprocess.run(['git', 'rev-parse', '--short', f'{found[0]}~1'], cwd=PROJECT_DIR,
+                                capture_output=True, text=True).stdout.strip()
+        if parent:
+            return parent
+    print(f"Warning: no commit adds {symbol} to {path}; comparing HEAD with the worktree", file=sys.stderr)
+    return 'HEAD'
+
+
+def _source(name, rev):
+    # circuitpython/`name` in the worktree or at git `rev`, or None if absent
+    if rev is None:
+        path = os.path.join(CIRCUITPYTHON_DIR, name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read()
+    if subprocess.run(['git', 'rev-parse', '--verify', '--quiet', f'{rev}^{{commit}}'], cwd=PROJECT_DIR,
+                      capture_output=True).returncode:
+        raise SystemExit(f"{rev} is not a git revision")
+    result = subprocess.run(['git', 'show', f'{rev}:circuitpython/{name}'], cwd=PROJECT_DIR,
+                            capture_output=True, text=True)
+    return result.stdout if result.returncode == 0 else None
+
+
+def load_driver(clock, rev=None):
+    """Load circuitpython/Arducam.py (or its version at git `rev`) on `clock`.
+
+    Drivers that still import OV5642_regs.py get the module from the same
+    revision; newer ones read the compiled OV5642_regs.bin in the worktree.
+    """
+    regs = _source('OV5642_regs.py', rev)
+    if regs is not None:
+        tables = types.ModuleType('OV5642_regs')
+        exec(compile(regs, f'{rev or "worktree"}:OV5642_regs.py', 'exec'), tables.__dict__)
+        sys.modules['OV5642_regs'] = tables
+    source = _source('Arducam.py', rev)
+    module = types.ModuleType(f'Arducam_{rev or "worktree"}')
+    exec(compile(source, f'{rev or "worktree"}:Arducam.py', 'exec'), module.__dict__)
+    if hasattr(module, 'utime'):
+        module.utime = clock  # Drivers before hal.py import time as utime
+    module.REGS_FILE = os.path.join(CIRCUITPYTHON_DIR, 'OV5642_regs.bin')
+    return module
+
+
+def load_firmware(clock, rev=None, driver=None):
+    """Execute circuitpython/code.py (or its version at git `rev`) up to its
+    main section and return its globals.
+
+    The caller creates `cam` (driver.Arducam()) and calls run_diagnostics()
+    etc. itself. Output goes to the simulated console through hal.console
+    and, for print(), to sys.stdout, which callers may point at
+    ConsoleText(hal.console).
+    """
+    tree = ast.parse(_source('code.py', rev))
+    body = []
+    for node in tree.body:
+        if isinstance(node, ast.Try) and any(getattr(target, 'id', None) == 'cam'
+                                             for stmt in node.body if isinstance(stmt, ast.Assign)
+                                             for target in stmt.targets):
+            break  # Main: create the camera, then the command loop
+        body.append(node)
+    sys.modules['Arducam'] = driver or load_driver(clock)
+    namespace = {'__name__': 'code'}
+    exec(compile(ast.Module(body=body, type_ignores=[]), f'{rev or "worktree"}:code.py', 'exec'), namespace)
+    if 'time' in namespace:
+        namespace['time'] = clock  # Revisions before hal.py import time directly
+    return namespace
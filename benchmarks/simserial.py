@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_DIR = os.path.join(PROJECT_DIR, 'images')
+sys.path.insert(0, PROJECT_DIR)
+
+
+def sample_jpegs():
+    """Return the sample captures in images/, largest first."""
+    names = [n for n in os.listdir(IMAGE_DIR) if n.lower().endswith('.jpg')]
+    blobs = []
+    for name in names:
+        with open(os.path.join(IMAGE_DIR, name), 'rb') as f:
+            blobs.append(f.read())
+    return sorted(blobs, key=len, reverse=True)
+
+
+class SimulatedSerial:
+    """In-memory stand-in for serial.Serial that replays a byte stream.
+
+    `rx_buffer` caps what `in_waiting` reports, like the OS-side receive
+    buffer of a real port. With `rate` unset there is no link delay and a
+    benchmark measures host CPU cost only; otherwise each read sleeps for the
+    time `rate` bytes/s would take to deliver it. More data can be queued
+    later with feed().
+    """
+
+    def __init__(self, data=b'', rx_buffer=4096, rate=None):
+        self.data = bytearray(data)
+        self.pos = 0
+        self.rx_buffer = rx_buffer
+        self.rate = rate
+        self.timeout = 1
+        self.is_open = True
+        self.written = bytearray()
+
+    def feed(self, data):
+        self.data += data
+
+    def _available(self):
+        return len(self.data) - self.pos
+
+    def _wait(self):
+        # Nothing buffered: block for the port timeout like pyserial would
+        if not self._available() and self.timeout:
+            time.sleep(self.timeout)
+
+    @property
+    def in_waiting(self):
+        return min(self._available(), self.rx_buffer)
+
+    def read(self, size=1):
+        self._wait()
+        n = min(size, self._available())
+        chunk = bytes(self.data[self.pos:self.pos + n])
+        self.pos += n
+        self._deliver(n)
+        return chunk
+
+    def readinto(self, b):
+        self._wait()
+        n = min(len(b), self._available())
+        with memoryview(self.data) as view:
+            b[:n] = view[self.pos:self.pos + n]
+        self.pos += n
+        self._deliver(n)
+        return n
+
+    def _deliver(self, n):
+        if self.rate and n:
+            time.sleep(n / self.rate)
+
+    def readline(self):
+        self._wait()
+        end = self.data.find(b'\n', self.pos)
+        end = len(self.data) if end == -1 else end + 1
+        return self.read(end - self.pos)
+
+    def write(self, data):
+        self.written.extend(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+ARDUINO_BOOT = (
+    b"\n\nACK CMD --- ArduCAM Boot Start --- END\n"
+    b"ACK CMD SPI interface OK. END\n"
+    b"ACK CMD CPLD Revision: 0x73 END\n"
+    b"ACK CMD OV5642 detected. END\n"
+    b"ACK CMD Camera Ready! END\n"
+)
+
+CIRCUITPYTHON_BOOT = (
+    b"--- Pico Booting ---\n"
+    b"ACK CMD Booting System... END\n\n"
+    b"ACK CMD Sensor Initialized. END\n"
+    b"ACK CMD Camera Ready! END\n"
+    b"\nCircuitPython Waiting for command...\n"
+)
+
+
+class SimulatedPico(SimulatedSerial):
+    """SimulatedSerial that boots like the firmware and answers 0x10 and 0x18.
+
+    Boot chatter becomes readable after `boot_delay` seconds; every 0x10
+    queues one framed capture of `jpeg`. Accepts the serial.Serial
+    constructor arguments so it can be passed to PicoCamera as
+    `serial_class` via functools.partial.
+    """
+
+    def __init__(self, port=None, baudrate=115200, timeout=1, jpeg=b'',
+                 dialect='arduino', boot_delay=2.5, rate=None):
+        super().__init__(rate=rate)
+        from picocam.frame import encode_frame
+        self.encode_frame = encode_frame
+        self.timeout = timeout
+        self.jpeg = jpeg
+        self.dialect = dialect
+        self.sequence = 0
+        self.ready_at = time.monotonic() + boot_delay
+        self.feed(ARDUINO_BOOT if dialect == 'arduino' else CIRCUITPYTHON_BOOT)
+
+    def _available(self):
+        if time.monotonic() < self.ready_at:
+            return 0
+        return super()._available()
+
+    def _wait(self):
+        if self._available():
+            return
+        booting = self.ready_at - time.monotonic()
+        if booting > 0:
+            time.sleep(min(booting, self.timeout or 0))
+        else:
+            time.sleep(self.timeout or 0)
+
+    def write(self, data):
+        if b'\x18' in data:
+            # Status ping; like everything else, readable once boot is over
+            self.feed(f"ACK CMD Status: ready 6 2592x1944 {self.dialect} 0.1.0 END\n".encode())
+        if b'\x10' in data:
+            self.sequence += 1
+            self.feed(b"ACK CMD Capture Started... END\n"
+                      b"ACK CMD Capture Done. END\n"
+                      + f"ACK CMD Length: {len(self.jpeg)} END\n".encode()
+                      + b"ACK IMG END\n"
+                      + self.encode_frame(self.jpeg, 6, self.sequence))
+        return super().write(data)
@@ -1,13 +1,6 @@
-import board
-import busio
-import time as utime
-import digitalio
-from OV5642_regs import (
-    OV5642_QVGA_Preview, 
-    OV5642_JPEG_Capture_QSXGA, 
-    ov5642_2592x1944, 
-    ov5642_320x240
-)
+import struct
+import binascii
+import hal
 
 # Constants
 OV5642 = 0x01
@@ -15,57 +8,206 @@ ARDUCHIP_FIFO = 0x04
 ARDUCHIP_TRIG = 0x41
 CAP_DONE_MASK = 0x08
 ARDUCHIP_GPIO = 0x06 
+FIFO_BURST = 0x3c
+SPI_BAUDRATE = 2000000 # 2MHz Safety; register access always uses it
+FIFO_CHUNK = 2048 # Size of each FIFO readout buffer; at least the 2 KB header probe
+
+# Register tables compiled from ov5642_regs.h by pico_ov5642/extract_regs.py
+REGS_FILE = "OV5642_regs.bin"
+REGS_HEADER = "<4sBBH20sI"
+INIT_TABLES = ("OV5642_QVGA_Preview", "OV5642_JPEG_Capture_QSXGA", "ov5642_320x240")
+
+# Single writes made after the init tables, in the same [AddrH, AddrL, Val] format
+INIT_FIXUPS = b'\x31\x03\x93\x38\x18\xa8\x36\x21\x10\x38\x01\xb0\x44\x07\x08\x58\x88\x00\x50\x00\xff'
+
+# Array window origin the 2592x1944 table sets (0x3800/0x3801, 0x3802/0x3803);
+# set_window() offsets it by the region's position
+WINDOW_HS = 0x1B0
+WINDOW_VS = 0x0A
+
+# COMPRESSION CTRL07 bits [5:0]: JPEG quantization scale, lower is finer
+# (larger files); INIT_FIXUPS sets 0x08
+QSCALE_REG = 0x4407
+
+# Sensor registers that self-clear or sequence other writes (system
+# control, resets, group hold): never cached, skipped or collapsed
+UNCACHED_REGS = (0x3008, 0x3002, 0x3003, 0x3212)
+
+class SPITransaction(object):
+    """Holds the SPI lock and configuration across a batch of ArduChip register operations.
+
+        with cam.bus as bus:
+            bus.write_reg(ARDUCHIP_FIFO, 0x01)
+            done = bus.read_reg(ARDUCHIP_TRIG) & CAP_DONE_MASK
+
+    Only the outermost `with` locks and configures the bus, so register
+    helpers can be called inside a batch. Transfers use preallocated buffers.
+    Burst FIFO reads switch to `burst_baudrate` and back.
+    """
+
+    def __init__(self, spi, cs, baudrate=SPI_BAUDRATE, burst_baudrate=None):
+        self.spi = spi
+        self.cs = cs
+        self.baudrate = baudrate
+        self.burst_baudrate = burst_baudrate or baudrate
+        self.depth = 0
+        self._out = bytearray(2)
+        self._in = bytearray(1)
+
+    def __enter__(self):
+        if self.depth == 0:
+            while not self.spi.try_lock(): pass
+            self.spi.configure(baudrate=self.baudrate)
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.depth -= 1
+        if self.depth == 0:
+            self.cs.value = True
+            self.spi.unlock()
+
+    def write_reg(self, address, value):
+        out = self._out
+        out[0] = address | 0x80
+        out[1] = value
+        self.cs.value = False
+        self.spi.write(out)
+        self.cs.value = True
+
+    def read_reg(self, address):
+        self._out[0] = address & 0x7F
+        self.cs.value = False
+        self.spi.write(self._out, end=1)
+        self.spi.readinto(self._in)
+        self.cs.value = True
+        return self._in[0]
+
+    def begin_burst(self):
+        # Rewind the FIFO read pointer and start a burst read; CS stays low
+        # and the data follows on spi.readinto() until end_burst()
+        self.write_reg(ARDUCHIP_FIFO, 0x10)
+        if self.burst_baudrate != self.baudrate:
+            self.spi.configure(baudrate=self.burst_baudrate)
+        self._out[0] = FIFO_BURST
+        self.cs.value = False
+        self.spi.write(self._out, end=1)
+
+    def end_burst(self):
+        self.cs.value = True
+        if self.burst_baudrate != self.baudrate:
+            self.spi.configure(baudrate=self.baudrate)
+
+class RegisterTables(object):
+    """Sensor register tables in OV5642_regs.bin, read from flash on demand.
+
+    Only the file index stays in RAM. table() reads one table's spans into
+    a fresh buffer and returns a memoryview of it, in the same
+    [AddrH, AddrL, Val] format _write_regs() takes.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        head = self.file.read(struct.calcsize(REGS_HEADER))
+        magic, version, _, self.count, _, index_len = struct.unpack(REGS_HEADER, head)
+        if magic != b"OVRG" or version != 1:
+            raise ValueError("Unsupported register table file " + path)
+        self.index = self.file.read(index_len)
+        self.pool = len(head) + index_len
+
+    def _find(self, name):
+        # Index position of `name`'s span count, or -1
+        key = name.encode()
+        index = self.index
+        pos = 0
+        for _ in range(self.count):
+            end = pos + 1 + index[pos]
+            if index[pos + 1:end] == key:
+                return end
+            pos = end + 1 + 4 * index[end]
+        return -1
+
+    def table(self, name):
+        pos = self._find(name)
+        if pos < 0:
+            raise KeyError(name)
+        spans = struct.unpack_from("<%dH" % (2 * self.index[pos]), self.index, pos + 1)
+        size = 0
+        for i in range(1, len(spans), 2):
+            size += spans[i] * 3
+        view = memoryview(bytearray(size))
+        at = 0
+        for i in range(0, len(spans), 2):
+            n = spans[i + 1] * 3
+            self.file.seek(self.pool + spans[i] * 3)
+            self.file.readinto(view[at:at + n])
+            at += n
+        return view
+
+    def delta(self, src, dst):
+        # Writes from resolution `src` to `dst`, or None if only a re-init will do
+        name = "delta_%d_%d" % (src, dst)
+        if self._find(name) < 0:
+            return None
+        return self.table(name)
 
 class Arducam(object):
-    def __init__(self, cs_pin=board.GP5, sda_pin=board.GP8, scl_pin=board.GP9, 
-                 sck_pin=board.GP2, mosi_pin=board.GP3, miso_pin=board.GP4):
+    def __init__(self, cs_pin=hal.CS_PIN, sda_pin=hal.SDA_PIN, scl_pin=hal.SCL_PIN, 
+                 sck_pin=hal.SCK_PIN, mosi_pin=hal.MOSI_PIN, miso_pin=hal.MISO_PIN, regs_file=None,
+                 chunk_size=FIFO_CHUNK):
         self.I2cAddress = 0x3c
+        self.regs = RegisterTables(regs_file or REGS_FILE)
+        self.set_chunk_size(chunk_size)
         
-        self.spi_cs = digitalio.DigitalInOut(cs_pin)
-        self.spi_cs.direction = digitalio.Direction.OUTPUT
-        self.spi_cs.value = True
+        self.spi_cs = hal.output_pin(cs_pin)
         
         # SPI Bus (2MHz Safety)
-        self.spi = busio.SPI(clock=sck_pin, MOSI=mosi_pin, MISO=miso_pin)
+        self.spi = hal.spi_bus(sck_pin, mosi_pin, miso_pin)
         while not self.spi.try_lock(): pass
-        self.spi.configure(baudrate=2000000, polarity=0, phase=0, bits=8)
+        self.spi.configure(baudrate=SPI_BAUDRATE, polarity=0, phase=0, bits=8)
         self.spi.unlock()
+        self.bus = SPITransaction(self.spi, self.spi_cs)
         
         # Direct I2C
-        self.i2c = busio.I2C(scl=scl_pin, sda=sda_pin, frequency=100000)
+        self.i2c = hal.i2c_bus(scl_pin, sda_pin, 100000)
+        self._i2c_buf = bytearray(3)
+        
+        # Shadow copy of the sensor registers we have written (addr -> value)
+        self.shadow = {}
         
         # Reset CPLD
         self.spi_write_reg(0x07, 0x80)
-        utime.sleep(0.1)
+        hal.sleep(0.1)
         self.spi_write_reg(0x07, 0x00)
-        utime.sleep(0.1)
+        hal.sleep(0.1)
 
     def spi_write_reg(self, address, value):
-        while not self.spi.try_lock(): pass
-        self.spi.configure(baudrate=2000000)
-        self.spi_cs.value = False
-        self.spi.write(bytes([address | 0x80, value]))
-        self.spi_cs.value = True
-        self.spi.unlock()
+        with self.bus as bus:
+            bus.write_reg(address, value)
 
     def spi_read_reg(self, address):
-        while not self.spi.try_lock(): pass
-        self.spi.configure(baudrate=2000000)
-        self.spi_cs.value = False
-        self.spi.write(bytes([address & 0x7F]))
-        result = bytearray(1)
-        self.spi.readinto(result)
-        self.spi_cs.value = True
-        self.spi.unlock()
-        return result[0]
+        with self.bus as bus:
+            return bus.read_reg(address)
 
     def wrSensorReg16_8(self, addr, val):
         while not self.i2c.try_lock(): pass
         try:
-            self.i2c.writeto(self.I2cAddress, bytes([(addr >> 8) & 0xFF, addr & 0xFF, val]))
+            self._i2c_write(addr, val)
         finally:
             self.i2c.unlock()
-        utime.sleep(0.001)
+        hal.sleep(0.001)
+
+    def _i2c_write(self, addr, val):
+        # Caller holds the I2C lock
+        buf = self._i2c_buf
+        buf[0] = (addr >> 8) & 0xFF
+        buf[1] = addr & 0xFF
+        buf[2] = val
+        self.i2c.writeto(self.I2cAddress, buf)
+        if addr == 0x3008 and val & 0x80:
+            self.shadow.clear() # Software reset: back to unknown defaults
+        elif addr not in UNCACHED_REGS:
+            self.shadow[addr] = val
 
     def rdSensorReg16_8(self, addr):
         while not self.i2c.try_lock(): pass
@@ -77,11 +219,14 @@ class Arducam(object):
         finally:
             self.i2c.unlock()
 
-    def init_cam(self):
+    def init_cam(self, size_regs=None):
+        # size_regs: optional size table applied in the same batch as the
+        # init tables, replacing a separate set_jpeg_size() call
         self.spi_write_reg(ARDUCHIP_GPIO, 0x00)
-        utime.sleep(0.05)
+        hal.sleep(0.05)
         self.spi_write_reg(ARDUCHIP_GPIO, 0x05)
-        utime.sleep(0.2)
+        hal.sleep(0.2)
+        self.shadow.clear() # Sensor was power-cycled
 
         while True:
             self.spi_write_reg(0x00, 0x55)
@@ -89,7 +234,7 @@ class Arducam(object):
                 print("SPI Interface OK")
                 break
             print("SPI Interface Error!")
-            utime.sleep(1)
+            hal.sleep(1)
 
         while True:
             vid = self.rdSensorReg16_8(0x300a)
@@ -98,77 +243,171 @@ class Arducam(object):
                 print("OV5642 detected")
                 break
             print(f"Can't find OV5642 module! (VID: 0x{vid:02x}, PID: 0x{pid:02x})")
-            utime.sleep(1)
+            hal.sleep(1)
 
         self.wrSensorReg16_8(0x3008, 0x80)
-        utime.sleep(0.1)
-        self._write_regs(OV5642_QVGA_Preview)
-        utime.sleep(0.1)
-        self._write_regs(OV5642_JPEG_Capture_QSXGA)
-        utime.sleep(0.1)
-        self._write_regs(ov5642_320x240)
-        utime.sleep(0.1)
-        
-        self.wrSensorReg16_8(0x3103, 0x93)
-        self.wrSensorReg16_8(0x3818, 0xa8)
-        self.wrSensorReg16_8(0x3621, 0x10)
-        self.wrSensorReg16_8(0x3801, 0xb0)
-        self.wrSensorReg16_8(0x4407, 0x08)
-        self.wrSensorReg16_8(0x5888, 0x00)
-        self.wrSensorReg16_8(0x5000, 0xFF)
+        hal.sleep(0.1)
+        # One batch, so registers a later table overrides are written once
+        tables = tuple(self.regs.table(name) for name in INIT_TABLES) + (INIT_FIXUPS,)
+        if size_regs is not None:
+            tables += (size_regs,)
+        self._write_regs(*tables)
+        hal.sleep(0.1)
         
         self.spi_write_reg(0x01, 0x00)
         tim = self.spi_read_reg(0x03)
         self.spi_write_reg(0x03, tim | 0x02) # VSYNC Active Low
         
         self.wrSensorReg16_8(0x3008, 0x00)
-        utime.sleep(0.1)
-
-    def _write_regs(self, regs):
-        for i in range(0, len(regs), 3):
-            addr_h = regs[i]
-            addr_l = regs[i+1]
-            val = regs[i+2]
-            addr = (addr_h << 8) | addr_l
-            if addr == 0xffff: 
-                utime.sleep(0.005)
-                continue
-            self.wrSensorReg16_8(addr, val)
+        hal.sleep(0.1)
+
+    def _write_regs(self, *tables):
+        """Write register tables in order as one batch; returns the write count.
+
+        A register that a later table in the batch sets again is only
+        written by that later table, and writes matching the shadow copy
+        are skipped. The I2C lock is held for the whole batch, with one
+        settle sleep at the end instead of one per register.
+        """
+        last = {}
+        for t in range(len(tables)):
+            regs = tables[t]
+            for i in range(0, len(regs), 3):
+                last[(regs[i] << 8) | regs[i+1]] = t
+
+        writes = 0
+        while not self.i2c.try_lock(): pass
+        try:
+            for t in range(len(tables)):
+                regs = tables[t]
+                for i in range(0, len(regs), 3):
+                    addr = (regs[i] << 8) | regs[i+1]
+                    val = regs[i+2]
+                    if addr == 0xffff:
+                        hal.sleep(0.005)
+                        continue
+                    if addr not in UNCACHED_REGS and (last[addr] > t or self.shadow.get(addr) == val):
+                        continue
+                    self._i2c_write(addr, val)
+                    writes += 1
+        finally:
+            self.i2c.unlock()
+        hal.sleep(0.001)
+        return writes
 
     def set_jpeg_size(self, size_regs):
-        self._write_regs(size_regs)
-        utime.sleep(0.1)
+        if self._write_regs(size_regs):
+            hal.sleep(0.1)
+
+    def set_window(self, x, y, width, height):
+        """Output only the width x height region at (x, y) of the 2592x1944 array, unscaled.
+
+        Sets the array window, the DVP output size and the AEC average
+        window; meant for the 2592x1944 mode, which set_window(0, 0, 2592,
+        1944) restores. Returns the number of writes.
+        """
+        hs = WINDOW_HS + x
+        vs = WINDOW_VS + y
+        regs = bytearray()
+        for addr, value in ((0x3800, hs), (0x3802, vs), (0x3804, width), (0x3806, height),
+                            (0x3808, width), (0x380A, height), (0x5682, width), (0x5686, height)):
+            regs += bytes((addr >> 8, addr & 0xFF, value >> 8, addr >> 8, (addr + 1) & 0xFF, value & 0xFF))
+        writes = self._write_regs(regs)
+        if writes:
+            hal.sleep(0.1)
+        return writes
+
+    def set_qscale(self, qscale):
+        """Set the JPEG quantization scale (1-63) for the next capture; returns the number of writes."""
+        return self._write_regs(bytes((QSCALE_REG >> 8, QSCALE_REG & 0xFF, qscale & 0x3F)))
+
+    def switch_resolution(self, src, dst):
+        """Apply the precomputed register delta between two resolution ids.
+
+        Returns the number of writes, or None without writing anything when
+        leaving `src` needs a full init_cam().
+        """
+        delta = self.regs.delta(src, dst)
+        if delta is None:
+            return None
+        return self._write_regs(delta)
 
     def reset_fifo(self):
-        self.spi_write_reg(ARDUCHIP_FIFO, 0x01)
-        utime.sleep(0.005)
-        self.spi_write_reg(ARDUCHIP_FIFO, 0x00)
-        utime.sleep(0.005)
+        with self.bus as bus:
+            bus.write_reg(ARDUCHIP_FIFO, 0x01)
+            hal.sleep(0.005)
+            bus.write_reg(ARDUCHIP_FIFO, 0x00)
+            hal.sleep(0.005)
 
     def start_capture(self):
-        self.spi_write_reg(ARDUCHIP_FIFO, 0x01)
-        self.spi_write_reg(ARDUCHIP_FIFO, 0x02)
+        with self.bus as bus:
+            bus.write_reg(ARDUCHIP_FIFO, 0x01)
+            bus.write_reg(ARDUCHIP_FIFO, 0x02)
+
+    def wait_capture_done(self, timeout):
+        # Poll ARDUCHIP_TRIG in one transaction; False if `timeout` s pass first
+        start = hal.monotonic()
+        with self.bus as bus:
+            while not (bus.read_reg(ARDUCHIP_TRIG) & CAP_DONE_MASK):
+                if hal.monotonic() - start > timeout:
+                    return False
+        return True
 
     def get_fifo_length(self):
-        l1 = self.spi_read_reg(0x42)
-        l2 = self.spi_read_reg(0x43)
-        l3 = self.spi_read_reg(0x44) & 0x7f
+        with self.bus as bus:
+            l1 = bus.read_reg(0x42)
+            l2 = bus.read_reg(0x43)
+            l3 = bus.read_reg(0x44) & 0x7f
         return (l3 << 16) | (l2 << 8) | l1
 
-    def read_fifo_burst(self, length):
-        # Reset Read Pointer OUTSIDE the lock to avoid deadlock with spi_write_reg
-        self.spi_write_reg(ARDUCHIP_FIFO, 0x10)
-        
-        while not self.spi.try_lock(): pass
-        self.spi.configure(baudrate=2000000)
-        
-        cmd_buf = bytearray(length + 1)
-        res_buf = bytearray(length + 1)
-        cmd_buf[0] = 0x3c
-        
-        self.spi_cs.value = False
-        self.spi.write_readinto(cmd_buf, res_buf)
-        self.spi_cs.value = True
-        self.spi.unlock()
-        
-        return res_buf[1:]
+    def set_chunk_size(self, size):
+        # Two FIFO readout buffers, allocated once and used in turn (ping-pong);
+        # buffers keeps the bytearrays so they can be searched in place
+        self.chunk_size = size
+        self.buffers = (bytearray(size), bytearray(size))
+        self.chunks = (memoryview(self.buffers[0]), memoryview(self.buffers[1]))
+
+    def read_fifo_burst(self, length, keep_open=False):
+        """Read the first `length` bytes of the FIFO into the first readout buffer.
+
+        Returns a memoryview of it (buffers[0][:length]), valid until the
+        next FIFO read. With keep_open the burst and its bus transaction
+        stay open, so further spi.readinto() calls continue from where this
+        read ended; close them with end_fifo_read().
+        """
+        if length > self.chunk_size:
+            raise ValueError("FIFO read larger than the readout buffers")
+        view = self.chunks[0][:length]
+        self.bus.__enter__()
+        self.bus.begin_burst()
+        self.spi.readinto(view)
+        if not keep_open:
+            self.end_fifo_read()
+        return view
+
+    def end_fifo_read(self):
+        self.bus.end_burst()
+        self.bus.__exit__(None, None, None)
+
+    def set_fifo_baudrate(self, baudrate):
+        # SPI clock for burst FIFO reads; register access stays at SPI_BAUDRATE
+        self.bus.burst_baudrate = baudrate
+
+    def fifo_crc(self, length, baudrate):
+        # CRC32 of the first `length` FIFO bytes, burst-read at `baudrate`
+        saved = self.bus.burst_baudrate
+        self.bus.burst_baudrate = baudrate
+        view = self.chunks[1]
+        crc = 0
+        try:
+            with self.bus as bus:
+                bus.begin_burst()
+                while length > 0:
+                    n = min(self.chunk_size, length)
+                    self.spi.readinto(view, end=n)
+                    crc = binascii.crc32(view[:n], crc)
+                    length -= n
+                bus.end_burst()
+        finally:
+            self.bus.burst_baudrate = saved
+        return crc
@@ -1,8 +1,4 @@
-import serial
-import serial.tools.list_ports
-import time
 import os
-import datetime
 import sys
 import atexit
 
@@ -20,166 +16,163 @@ BAUD = 115200
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 IMAGE_DIR = os.path.join(PROJECT_DIR, "images")
+SINK = IMAGE_DIR # Or e.g. os.path.join(IMAGE_DIR, "captures.sqlite") / ".tar" / ".zip"
+FSYNC = "close" # 'never', 'close', 'always' or every N images
 DEBUG = False
+BURST_FRAMES = 0 # >0 captures that many frames back to back (0x12) instead of one
+RESOLUTION = None # e.g. '1600x1200'; None keeps the mode code.py booted in
+ROI = None # (x, y, width, height) of the 2592x1944 frame to send alone; overrides RESOLUTION
+QSCALE = None # JPEG quantization scale 1-63, lower is finer and larger; None keeps 8
+BUDGET_BYTES = None # e.g. 200_000: adapt QSCALE per frame to keep JPEGs under this size
+BUDGET_SECONDS = None # Or e.g. 1.0: adapt it to keep each capture under this time
+RETRIES = 2 # Captures again when a frame fails its CRC or JPEG checks
+
+sys.path.insert(0, PROJECT_DIR)
+from picocam.camera import CIRCUITPYTHON, CameraError, PicoCamera, find_pico_port
+from picocam.frame import FrameError
+from picocam.burst import format_stats, stop_burst
+from picocam.quality import QSCALE_DEFAULT, QualityController
+from picocam.sink import BackgroundWriter
+from picocam.regs import RESOLUTIONS
+from picocam.roi import FLAG_ROI
 
 if not os.path.exists(IMAGE_DIR):
     os.makedirs(IMAGE_DIR)
 
-def find_pico_port():
-    ports = list(serial.tools.list_ports.comports())
-    for p in ports:
-        desc = p.description.lower()
-        # Common identifiers for Pico / CircuitPython on Mac
-        if "pico" in desc or "circuitpython" in desc or "usbmodem" in desc:
-            return p.device
-    return None
-
-def connect_pico():
-    global PORT
+def show_status(text):
+    if any(x in text for x in ["ACK CMD", "Pico Status"]):
+        print(f"Pico: {text}")
+
+def budget_text():
+    return f"{BUDGET_BYTES} bytes" if BUDGET_BYTES is not None else f"{BUDGET_SECONDS}s"
+
+def make_quality():
+    # Chooses QSCALE for each frame from the last few when a budget is set
+    if BUDGET_BYTES is None and BUDGET_SECONDS is None:
+        return None
+    return QualityController(budget_bytes=BUDGET_BYTES, budget_time=BUDGET_SECONDS,
+                             start=QSCALE or QSCALE_DEFAULT)
+
+def capture_burst(cam, writer, count, quality=None):
+    if quality is None:
+        print(f"Triggering burst of {count} frames (Byte 0x12)...")
+    else: # The scale can only change between single captures
+        print(f"Triggering {count} captures (Byte 0x10) within {budget_text()} each...")
+
+    def on_frame(header, jpeg):
+        def saved(stored):  # On the writer thread, once the image is stored
+            if stored.exception() is None:
+                print(f"Frame #{header.sequence}: {len(jpeg)} bytes -> {writer.sink.describe(stored.result())}")
+        writer.submit(jpeg, header.sequence).add_done_callback(saved)
+
+    try:
+        stats = cam.burst(count, on_frame, quality)
+    except KeyboardInterrupt:
+        if quality is None: # Single captures leave nothing running to stop
+            stop_burst(cam.ser)
+        raise
+    print(format_stats(stats))
+    if quality is not None and quality.history:
+        scales = [record.qscale for record in quality.history]
+        print(f"Quantization scale {min(scales)}-{max(scales)} for a budget of {budget_text()}")
+
+def capture_once(cam, writer, resolution=None, quality=None):
+    print("Triggering capture (Byte 0x10)...")
+    try:
+        if quality is not None:
+            img_bytes = quality.capture(cam, resolution=resolution, retries=RETRIES)
+        else:
+            img_bytes = cam.capture(resolution=resolution, retries=RETRIES)
+        if resolution is not None and cam.last_switch:
+            print(f"Resolution {resolution}: {cam.last_switch}")
+            cam.last_switch = None
+    except (CameraError, FrameError, ValueError) as e:
+        print(f"Error: {e}")
+        return
+
+    if DEBUG:
+        header = cam.last_header
+        print(f"Frame #{header.sequence}: {header.length} bytes, resolution id {header.resolution}, CRC OK")
+
+    # capture() has checked the JPEG structure from SOI to EOI
+    width, height = cam.last_dimensions
+    where = writer.submit(img_bytes).result()
+    print(f"\nSUCCESS")
+    print(f"Saved to: {writer.sink.describe(where)}")
+    print(f"File size: {len(img_bytes)} bytes")
+    print(f"Image size: {width}x{height}")
+    if cam.qscale is not None:
+        print(f"Quantization scale: {cam.qscale}")
+    expected = RESOLUTIONS.get(cam.last_header.resolution)
+    if expected and expected != f"{width}x{height}" and not cam.last_header.flags & FLAG_ROI:
+        print(f"Warning: the Pico reported resolution {expected}")
+
+def main():
     target_port = PORT or find_pico_port()
-    
     if not target_port:
         print("Error: Could not find Pico serial port. Is it plugged in?")
-        return None
-        
+        return
+
     print(f"Connecting to Pico on {target_port}...")
+    cam = PicoCamera(target_port, CIRCUITPYTHON, baud=BAUD, on_line=show_status)
     try:
-        ser = serial.Serial(target_port, BAUD, timeout=1)
-        return ser
+        print(f"Waiting for Pico to signal 'Camera Ready'...")
+        cam.open()
     except Exception as e:
         print(f"Error connecting to {target_port}: {e}")
-        return None
+        return
+    if cam.status: # Firmware with the status ping (0x18)
+        print(f"Pico ready: {cam.status.dialect} firmware {cam.status.version}, "
+              f"{RESOLUTIONS.get(cam.status.resolution, cam.status.resolution)}")
 
-def main():
-    ser = connect_pico()
-    if not ser: return
-
-    print(f"Waiting for Pico to signal 'Camera Ready'...")
-    ser.reset_input_buffer()
-    
-    ready = False
-    start_time = time.time()
-    ser.timeout = 5
-    
-    while not ready:
-        line = ser.readline()
-        if not line:
-            if time.time() - start_time > 15:
-                print("Poking Pico (0x11)...")
-                ser.write(b'\x11')
-                start_time = time.time()
-            continue
-            
+    # Only echo the Pico's status lines from here on in DEBUG mode
+    cam.on_line = show_status if DEBUG else None
+
+    resolution = RESOLUTION
+    if ROI is not None:
         try:
-            text = line.decode('utf-8', errors='ignore').strip()
-            if text:
-                if any(x in text for x in ["ACK CMD", "Pico Status"]):
-                    print(f"Pico: {text}")
-            
-            if any(x in text for x in ["Camera Ready!", "Waiting for command"]):
-                ready = True
-        except:
-            pass
-    
-    ser.timeout = 1
-
-    while True:
-        if DEBUG:
-            print("\n" + "="*40)
-            user_input = input("Press [Enter] to capture, 's' for status, 'q' to quit: ").lower()
-            
-            if user_input == 'q':
-                break
-            elif user_input == 's':
-                ser.write(b'\x11')
-                continue
-
-        # Trigger
-        print("Triggering capture (Byte 0x10)...")
-        ser.reset_input_buffer() # Clear any heartbeats
-        ser.write(b'\x10')
-        ser.flush()
-        
-        ser.timeout = 10 
-        print("Waiting for Pico to process image...")
-        
-        # 1. Wait for ACK IMG END signal while printing Pico output
-        signal_buf = bytearray()
+            print(f"Region of interest: {cam.set_roi(*ROI)}")
+            resolution = None # A resolution switch would drop the window
+        except (CameraError, ValueError) as e:
+            print(f"Error: {e}")
+    quality = make_quality()
+    if quality is not None:
+        print(f"Budget {budget_text()} per frame; the quantization scale adapts from {quality.qscale}")
+    elif QSCALE is not None:
+        try:
+            cam.set_qscale(QSCALE)
+        except (CameraError, ValueError) as e:
+            print(f"Error: {e}")
+
+    # Images are written on a background thread; closing the writer waits for them
+    with cam, BackgroundWriter(SINK, fsync=FSYNC) as writer:
         while True:
-            char = ser.read(1)
-            if not char: break
-            signal_buf.extend(char)
-            if b"ACK IMG END\n" in signal_buf:
+            if DEBUG:
+                print("\n" + "="*40)
+                user_input = input("Press [Enter] to capture, 'b' for burst, 'r' for resolution, 's' for status, 'q' to quit: ").lower()
+                
+                if user_input == 'q':
+                    break
+                elif user_input == 's':
+                    cam.reinit()
+                    continue
+                elif user_input == 'b':
+                    capture_burst(cam, writer, BURST_FRAMES or 5, quality)
+                    continue
+                elif user_input == 'r':
+                    capture_once(cam, writer, input("Resolution (e.g. 640x480 or id 0-6): ").strip() or None, quality)
+                    continue
+            elif BURST_FRAMES > 0:
+                if resolution is not None:
+                    cam.set_resolution(resolution)
+                capture_burst(cam, writer, BURST_FRAMES, quality)
                 break
-        
-        # Print all the "ACK CMD" status messages that were hidden (only if DEBUG is true)
-        text = signal_buf.decode('utf-8', errors='ignore')
-        if DEBUG:
-            for line in text.strip().split("\n"):
-                if "ACK CMD" in line:
-                    print(f"Pico: {line.strip()}")
-        
-        if b"ACK IMG END" not in signal_buf:
-            print(f"Error: Timed out waiting for image signal. Got: {text[:200]}")
-            continue
-            
-        print("Receiving JPEG bitstream...")
-        img_bytes = bytearray()
-        found_start = False
-        transfer_start = time.time()
-        
-        # 2. Bulk Transfer Loop
-        while time.time() - transfer_start < 20: # 20s timeout for 5MP
-            # Read in large chunks for speed
-            chunk = ser.read(16384) 
-            if not chunk:
-                if found_start: break # End of stream
-                continue
-            
-            img_bytes.extend(chunk)
-            
-            if not found_start:
-                # Seek for SOI in the accumulated data
-                soi_idx = img_bytes.find(b'\xff\xd8')
-                if soi_idx != -1:
-                    print(f"JPEG Header found at byte {soi_idx}!")
-                    img_bytes = img_bytes[soi_idx:]
-                    found_start = True
-            
-            if found_start:
-                if DEBUG: print(f"Buffered {len(img_bytes)//1024} KB...")
-                if b'\xff\xd9' in chunk:
-                    eoi_idx = img_bytes.find(b'\xff\xd9')
-                    if eoi_idx != -1:
-                        img_bytes = img_bytes[:eoi_idx+2]
-                        print("End of Image (EOI) detected.")
-                        break
-        
-        ser.timeout = 1
-
-        if len(img_bytes) > 20000: # 5MP JPEG should be > 20KB for a scene
-            timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-            filename = f"img_{timestamp}.jpg"
-            filepath = os.path.join(IMAGE_DIR, filename)
-            
-            with open(filepath, 'wb') as f:
-                f.write(img_bytes)
-            
-            print(f"\nSUCCESS")
-            print(f"Filename: {filename}")
-            print(f"File size: {len(img_bytes)} bytes")
-            print(f"Location: {filepath}")
-        else:
-            if found_start:
-                print(f"Error: Received only {len(img_bytes)} bytes. Image likely truncated.")
-            else:
-                hex_head = " ".join([f"{b:02X}" for b in img_bytes[:32]])
-                print(f"Error: No JPEG header found in {len(img_bytes)} bytes received. (Start: {hex_head})")
 
-        if not DEBUG:
-            break # Exit after one automated capture
+            capture_once(cam, writer, resolution, quality)
+
+            if not DEBUG:
+                break # Exit after one automated capture
 
-    ser.close()
     # Restore terminal settings after serial port is closed
     try:
         termios.tcsetattr(sys.stdin, termios.TCSADRAIN, _saved_tty)
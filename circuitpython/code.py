@@ -1,99 +1,286 @@
-import board
-import time
-import supervisor
 import sys
-import usb_cdc
-import busio
+import struct
+import binascii
+import hal
 
 # Ensure all previously used buses are released
 print("--- Pico Booting ---")
-try:
-    import displayio
-    displayio.release_displays()
-except ImportError:
-    pass
-
-from Arducam import Arducam
-from OV5642_regs import (
-    OV5642_QVGA_Preview, 
-    OV5642_JPEG_Capture_QSXGA, 
-    ov5642_2592x1944, 
-    ov5642_320x240
-)
+hal.release_displays()
 
-SELECTED_RESOLUTION = ov5642_2592x1944
+from Arducam import Arducam, SPI_BAUDRATE
+# Resolution ids match the OV5642_* constants in ArduCAM.h
+OV5642_320x240 = 0
+OV5642_640x480 = 1
+OV5642_1024x768 = 2
+OV5642_1280x960 = 3
+OV5642_1600x1200 = 4
+OV5642_2048x1536 = 5
+OV5642_2592x1944 = 6
+# Size table for each id, by name in OV5642_regs.bin
+RESOLUTIONS = {
+    OV5642_320x240: "ov5642_320x240",
+    OV5642_640x480: "ov5642_640x480",
+    OV5642_1024x768: "ov5642_1024x768",
+    OV5642_1280x960: "ov5642_1280x960",
+    OV5642_1600x1200: "ov5642_1600x1200",
+    OV5642_2048x1536: "ov5642_2048x1536",
+    OV5642_2592x1944: "ov5642_2592x1944",
+}
+RESOLUTION_NAMES = ("320x240", "640x480", "1024x768", "1280x960", "1600x1200", "2048x1536", "2592x1944")
+
+SELECTED_RESOLUTION = OV5642_2592x1944 # Boot mode; 0x16 switches at runtime
+current_resolution = SELECTED_RESOLUTION
+# Live preview (0x19 + frame count + newline, 0 = until stopped): QVGA JPEG
+# frames back to back; 0x13 ends it and 0x10 ends it with a capture, both
+# back in the mode the preview started from
+PREVIEW_RESOLUTION = OV5642_320x240
+# Region of interest (0x1A + "x,y,width,height" + newline; empty restores the
+# full frame): the 2592x1944 mode with the sensor window and output size set
+# to the rectangle, sent unscaled. x and width are multiples of 16, y and
+# height of 8 (one JPEG MCU). Frames taken through it carry FLAG_ROI; any
+# resolution switch or re-init drops it.
+SENSOR_WIDTH = 2592
+SENSOR_HEIGHT = 1944
+current_roi = None
+# JPEG quantization scale (0x1B + 1-63 + newline; empty just reports it):
+# lower is finer and larger. init_cam() sets QSCALE_DEFAULT; a resolution
+# switch keeps the active scale
+QSCALE_DEFAULT = 0x08
+current_qscale = QSCALE_DEFAULT
 LOCKED_MODAL_BITS = 0x02 
+# Sync calibration kept in microcontroller.nvm: the mode that last locked
+# and how often each mode has locked in a sweep, for one CPLD revision and
+# sensor id (a different camera starts from scratch)
+SYNC_NVM_OFFSET = 0
+SYNC_MAGIC = b"SY"
+SYNC_RECORD = "<2sBBBB16B" # magic, CPLD rev, VID, PID, locked mode (0xFF: none), counts
+# SPI clock for FIFO bursts, calibrated against a read at the register clock
+# (SPI_BAUDRATE) and kept in NVM after the sync record under the same key;
+# 0x17 calibrates again
+SPI_NVM_OFFSET = 32
+SPI_MAGIC = b"SP"
+SPI_RECORD = "<2sBBBI" # magic, CPLD rev, VID, PID, FIFO clock in Hz
+SPI_CLOCKS = (4000000, 6000000, 8000000, 12000000, 16000000, 20000000, 24000000)
+SPI_CAL_BYTES = 65536 # Frame bytes compared at each clock
+SPI_CAL_READS = 3
+hardware_key = None # (CPLD rev, VID, PID) once diagnostics have run
+# Status ping (0x18), answered in the command loop and while diagnostics
+# run: "ACK CMD Status: <state> <resolution id> <name> circuitpython <version> END"
+FIRMWARE_VERSION = "0.1.0"
+camera_state = "initializing" # "ready" once diagnostics pass, "error" if they fail
+pending_input = "" # Host bytes read but not yet handled; the command loop takes them in order
 DEBUG = False # Set to True for verbose hex dumps and parity diagnostics 
 
 # Initialize Camera
 print("ACK CMD Booting System... END")
 sys.stdout.write("\n")
 
-def check_for_header(data):
-    for i in range(len(data)-1):
-        b1, b2 = data[i], data[i+1]
-        # 1. Standard
-        if b1 == 0xFF and b2 == 0xD8: return f"Standard at {i}", i
-        # 2. Bit-Reversed
-        if b1 == 0xFF and b2 == 0x1B: return f"Bit-Reversed at {i}", i
-        # 3. Bit-Inverted
-        if b1 == 0x00 and b2 == 0x27: return f"Bit-Inverted at {i}", i
-        # 4. Swapped Nibbles
-        if b1 == 0xFF and b2 == 0x8D: return f"Nibble-Swap at {i}", i
-        # 5. Shifted Right 1-bit
-        if b1 == 0x7F and b2 == 0xEC: return f"Shift-R1 at {i}", i
-        # 6. Shifted Left 1-bit
-        if b1 == 0xFF and b2 == 0xB0: return f"Shift-L1 at {i}", i
-    return None, -1
-
-def sync_hardware():
+# Framed image protocol (decoded on the host by picocam/frame.py)
+FRAME_MAGIC = b"PCAM"
+FRAME_VERSION = 1
+FLAG_CHUNKED = 0x8000
+FLAG_ROI = 0x4000
+FLAG_TRANSFORM = 0x000F # Wiring fault the SOI was found with, as an index in TRANSFORMS
+frame_sequence = 0
+
+# Chunked transfer (0x14): numbered, CRC-checked chunks; the host asks for
+# bad or missing ones again with 0x15 + comma-separated indices + newline
+CHUNKED_SIZE = 4096
+CHUNK_MAGIC = b"PK"
+CHUNK_END = 0xFFFF
+MAX_RESEND_ROUNDS = 8
+
+# Streaming (0x10): the FIFO is read in steps of STREAM_SLICE bytes into
+# the driver's two readout buffers (Arducam chunk_size), and the USB
+# transmit buffer is topped up between steps
+HEADER_PROBE = 2048
+STREAM_SLICE = 512
+
+def frame_header(length, flags=0):
+    global frame_sequence
+    frame_sequence = (frame_sequence + 1) & 0xFFFFFFFF
+    if current_roi:
+        flags |= FLAG_ROI
+    head = struct.pack("<4sBBHII", FRAME_MAGIC, FRAME_VERSION, current_resolution,
+                       flags, frame_sequence, length)
+    return head + struct.pack("<I", binascii.crc32(head) & 0xFFFFFFFF)
+
+# SOI (FF D8) as it appears after each known wiring fault, scanned by
+# check_for_header(); the earliest match in the buffer wins
+SOI_PATTERNS = (
+    (b"\xff\xd8", "Standard"),
+    (b"\xff\x1b", "Bit-Reversed"),
+    (b"\x00\x27", "Bit-Inverted"),
+    (b"\xff\x8d", "Nibble-Swap"),
+    (b"\x7f\xec", "Shift-R1"),
+    (b"\xff\xb0", "Shift-L1"),
+    # FF D8 FF shifts left to FF B1: the top bit of the marker that always
+    # follows SOI comes in, so FF B0 above never matches a real frame
+    (b"\xff\xb1", "Shift-L1"),
+)
+# Sent in the frame flags so the host can undo the fault (picocam/transform.py)
+TRANSFORMS = ("Standard", "Bit-Reversed", "Bit-Inverted", "Nibble-Swap", "Shift-R1", "Shift-L1")
+
+SOI_WINDOW = 64 # Scanned first: the SOI is usually at or near the start
+
+def check_for_header(data, end=None):
+    # One native find() per pattern, each bounded by the best match so far,
+    # instead of testing every pattern at every index in Python. data is
+    # bytes or a bytearray searched in place (memoryview has no find());
+    # only data[:end] is scanned
+    if end is None:
+        end = len(data)
+    start = 0
+    stop = min(SOI_WINDOW, end)
+    while True:
+        best = -1
+        for pattern, name in SOI_PATTERNS:
+            i = data.find(pattern, start, stop if best < 0 else best + 1)
+            if i >= 0:
+                best = i
+                label = name
+        if best >= 0:
+            return f"{label} at {best}", best
+        if stop >= end:
+            return None, -1
+        start = stop - 1 # A pattern may straddle the window edge
+        stop = end
+
+def report_status():
+    print(f"ACK CMD Status: {camera_state} {current_resolution} {RESOLUTION_NAMES[current_resolution]} "
+          f"circuitpython {FIRMWARE_VERSION} END")
+
+def read_input():
+    global pending_input
+    if hal.serial_available():
+        pending_input += hal.serial_read(hal.serial_available())
+
+def take_input(cmd):
+    # Remove the first `cmd` from pending_input; False if there is none
+    global pending_input
+    i = pending_input.find(cmd)
+    if i < 0:
+        return False
+    pending_input = pending_input[:i] + pending_input[i + 1:]
+    return True
+
+def poll_ping():
+    # Answer a 0x18 while diagnostics run; other input waits for the command loop
+    read_input()
+    while take_input("\x18"):
+        report_status()
+
+def transform_id(label):
+    # TRANSFORMS index of a check_for_header() label
+    for i in range(len(TRANSFORMS)):
+        if label.startswith(TRANSFORMS[i] + " "):
+            return i
+    return 0
+
+def load_sync_record(key):
+    # (locked mode or None, per-mode lock counts) stored for `key` = (rev, vid, pid)
+    if hal.nvm is not None:
+        size = struct.calcsize(SYNC_RECORD)
+        record = struct.unpack(SYNC_RECORD, hal.nvm[SYNC_NVM_OFFSET:SYNC_NVM_OFFSET + size])
+        if record[0] == SYNC_MAGIC and tuple(record[1:4]) == key:
+            return (None if record[4] > 0x0F else record[4]), list(record[5:])
+    return None, [0] * 16
+
+def save_sync_record(key, locked, counts):
+    if hal.nvm is None:
+        return
+    record = struct.pack(SYNC_RECORD, SYNC_MAGIC, key[0], key[1], key[2], locked, *counts)
+    if hal.nvm[SYNC_NVM_OFFSET:SYNC_NVM_OFFSET + len(record)] != record: # Spare the flash
+        hal.nvm[SYNC_NVM_OFFSET:SYNC_NVM_OFFSET + len(record)] = record
+
+def load_spi_record(key):
+    # FIFO clock stored for `key`, or None
+    if hal.nvm is not None:
+        size = struct.calcsize(SPI_RECORD)
+        record = struct.unpack(SPI_RECORD, hal.nvm[SPI_NVM_OFFSET:SPI_NVM_OFFSET + size])
+        if record[0] == SPI_MAGIC and tuple(record[1:4]) == key:
+            return record[4]
+    return None
+
+def save_spi_record(key, clock):
+    if hal.nvm is None:
+        return
+    record = struct.pack(SPI_RECORD, SPI_MAGIC, key[0], key[1], key[2], clock)
+    if hal.nvm[SPI_NVM_OFFSET:SPI_NVM_OFFSET + len(record)] != record: # Spare the flash
+        hal.nvm[SPI_NVM_OFFSET:SPI_NVM_OFFSET + len(record)] = record
+
+def try_sync_mode(tim_base, m):
+    # One capture in mode `m`; returns the header label if a SOI came through
+    if DEBUG: sys.stdout.write(f"ACK CMD Mode 0x{m:02X}: Testing... END\n")
+    cam.spi_write_reg(0x03, tim_base | m)
+    hal.sleep(0.01)
+
+    cam.reset_fifo()
+    cam.start_capture()
+
+    # Wait for capture
+    if not cam.wait_capture_done(1.0):
+        if DEBUG: sys.stdout.write(f"ACK CMD Mode 0x{m:02X}: No VSYNC END\n")
+        return None
+
+    length = cam.get_fifo_length()
+    if length > 1000:
+        data = cam.read_fifo_burst(min(1024, length))
+        if DEBUG:
+            hex_head = " ".join([f"{b:02X}" for b in data[:16]])
+            sys.stdout.write(f"ACK CMD Mode 0x{m:02X}: Len={length}, Start=[{hex_head}] END\n")
+
+        label, idx = check_for_header(cam.buffers[0], len(data))
+        if label:
+            return label
+    cam.reset_fifo()
+    return None
+
+def sync_hardware(key=None):
+    # key: (CPLD rev, VID, PID) to look up and store the calibration under;
+    # None sweeps without the cache
     global LOCKED_MODAL_BITS
-    print("ACK CMD Syncing Hardware (Safe-Sweep 16)... END")
     tim_base = cam.spi_read_reg(0x03) & ~0x0F
-    
-    for m in range(16):
-        if DEBUG: sys.stdout.write(f"ACK CMD Mode 0x{m:02X}: Testing... END\n")
-        cam.spi_write_reg(0x03, tim_base | m)
-        time.sleep(0.01)
-        
-        cam.reset_fifo()
-        cam.start_capture()
-        
-        # Wait for capture
-        start = time.monotonic()
-        done = False
-        while time.monotonic() - start < 1.0:
-            if cam.spi_read_reg(0x41) & 0x08:
-                done = True
-                break
-            
-        if not done:
-            if DEBUG: sys.stdout.write(f"ACK CMD Mode 0x{m:02X}: No VSYNC END\n")
-            continue
-            
-        length = cam.get_fifo_length()
-        if length > 1000:
-            data = cam.read_fifo_burst(min(1024, length))
-            if DEBUG:
-                hex_head = " ".join([f"{b:02X}" for b in data[:16]])
-                sys.stdout.write(f"ACK CMD Mode 0x{m:02X}: Len={length}, Start=[{hex_head}] END\n")
-            
-            label, idx = check_for_header(data)
-            if label:
-                if DEBUG: sys.stdout.write(f"ACK CMD VSYNC: Locked Mode 0x{m:02X} ({label}) END\n")
-                LOCKED_MODAL_BITS = m
-                return True
-        cam.reset_fifo()
+    locked, counts = load_sync_record(key) if key else (None, [0] * 16)
+
+    if locked is not None:
+        print(f"ACK CMD Syncing Hardware (Cached Mode 0x{locked:02X})... END")
+        label = try_sync_mode(tim_base, locked)
+        if label:
+            if DEBUG: sys.stdout.write(f"ACK CMD VSYNC: Verified Mode 0x{locked:02X} ({label}) END\n")
+            LOCKED_MODAL_BITS = locked
+            return True
+
+    print("ACK CMD Syncing Hardware (Safe-Sweep 16)... END")
+    # Modes that locked most often first; ties keep the numeric order
+    for m in sorted(range(16), key=lambda m: (255 - counts[m]) * 16 + m):
+        if m == locked:
+            continue # Just failed verification
+        poll_ping()
+        label = try_sync_mode(tim_base, m)
+        if label:
+            if DEBUG: sys.stdout.write(f"ACK CMD VSYNC: Locked Mode 0x{m:02X} ({label}) END\n")
+            LOCKED_MODAL_BITS = m
+            if key:
+                counts[m] = min(255, counts[m] + 1)
+                save_sync_record(key, m, counts)
+            return True
         
     sys.stdout.write("ACK CMD VSYNC: Sync Failed. No Header Found. END\n")
     return False
 
 def run_diagnostics():
+    global hardware_key, camera_state, current_roi, current_qscale
+    camera_state = "initializing"
+    current_roi = None # init_cam() resets the window
+    current_qscale = QSCALE_DEFAULT # and the quantization scale
     print("\n--- Hardware Diagnostics ---")
     try:
+        poll_ping()
         print("ACK CMD Starting Initializer... END")
-        cam.init_cam()
+        cam.init_cam(cam.regs.table(RESOLUTIONS[current_resolution]))
         print("ACK CMD Sensor Initialized. END")
+        poll_ping()
         
         rev = cam.spi_read_reg(0x40)
         print(f"ACK CMD CPLD Revision: 0x{rev:02X} END")
@@ -102,35 +289,96 @@ def run_diagnostics():
         pid = cam.rdSensorReg16_8(0x300b)
         print(f"ACK CMD ID: VID=0x{vid:02x}, PID=0x{pid:02x} END")
             
-        cam.set_jpeg_size(SELECTED_RESOLUTION)
-        time.sleep(0.5)
+        hal.sleep(0.5)
         
-        sync_hardware()
+        hardware_key = (rev, vid, pid)
+        if sync_hardware(hardware_key):
+            setup_spi_clock(hardware_key)
+        camera_state = "ready"
         print("ACK CMD Camera Ready! END")
         return True
         
     except Exception as e:
+        camera_state = "error"
         print(f"ACK CMD Error: {e} END")
         return False
 
-def stream_image():
-    global LOCKED_MODAL_BITS
-    print("ACK CMD Capture Started... END")
-    
-    tim_base = cam.spi_read_reg(0x03) & ~0x0F
-    cam.spi_write_reg(0x03, tim_base | LOCKED_MODAL_BITS)
+def spi_clock_ok(clock, length, reference, reads):
+    # True if `reads` burst reads at `clock` all give the reference CRC
+    for _ in range(reads):
+        if cam.fifo_crc(length, clock) != reference:
+            return False
+    return True
 
+def calibrate_spi(key=None, capture=True):
+    """Find the fastest SPI clock that reads the FIFO intact; returns the clock used.
+
+    The frame in the FIFO (a new capture unless capture=False) is read at
+    each of SPI_CLOCKS in turn and its CRC32 compared with a read at
+    SPI_BAUDRATE. The first clock that fails ends the search, and the one
+    below the last clock that passed is kept as a safety margin.
+    """
+    print("ACK CMD Calibrating SPI Clock... END")
+    if capture:
+        trigger_capture()
+        if not cam.wait_capture_done(5):
+            print("ACK CMD ERROR: Timeout END")
+            return None
+    length = min(cam.get_fifo_length(), SPI_CAL_BYTES)
+    if length < 1000:
+        print("ACK CMD ERROR: Bad Size END")
+        cam.reset_fifo()
+        return None
+
+    start = hal.monotonic()
+    reference = cam.fifo_crc(length, SPI_BAUDRATE)
+    chosen = good = SPI_BAUDRATE
+    for clock in SPI_CLOCKS:
+        if not spi_clock_ok(clock, length, reference, SPI_CAL_READS):
+            break
+        chosen, good = good, clock
     cam.reset_fifo()
-    cam.start_capture()
+    cam.set_fifo_baudrate(chosen)
+    if key:
+        save_spi_record(key, chosen)
+    print(f"ACK CMD SPI Clock: {chosen} Hz (fastest good {good} Hz, "
+          f"{(hal.monotonic() - start) * 1000:.0f} ms) END")
+    return chosen
+
+def setup_spi_clock(key):
+    # At boot, with the sync capture still in the FIFO: reuse the stored
+    # clock if one read at it matches, otherwise calibrate on that frame
+    clock = load_spi_record(key)
+    if clock:
+        length = min(cam.get_fifo_length(), SPI_CAL_BYTES)
+        if clock == SPI_BAUDRATE or spi_clock_ok(clock, length, cam.fifo_crc(length, SPI_BAUDRATE), 1):
+            cam.set_fifo_baudrate(clock)
+            print(f"ACK CMD SPI Clock: {clock} Hz (cached) END")
+            return clock
+    return calibrate_spi(key, capture=False)
+
+def trigger_capture():
+    # One bus transaction from timing setup to trigger
+    with cam.bus as bus:
+        tim_base = bus.read_reg(0x03) & ~0x0F
+        bus.write_reg(0x03, tim_base | LOCKED_MODAL_BITS)
+        cam.reset_fifo()
+        cam.start_capture()
+
+def capture_frame(keep_open=False):
+    # Trigger a capture and locate SOI; returns (length, soi_index, probe,
+    # transform) or None. With keep_open the FIFO burst stays open after the
+    # probe on success.
+    global LOCKED_MODAL_BITS
+    print("ACK CMD Capture Started... END")
+    trigger_capture()
     
-    start = time.monotonic()
-    while not (cam.spi_read_reg(0x41) & 0x08):
-        if time.monotonic() - start > 5:
-            print("ACK CMD ERROR: Timeout END")
-            return
+    if not cam.wait_capture_done(5):
+        print("ACK CMD ERROR: Timeout END")
+        return None
 
     print("ACK CMD Capture Done. END")
-    time.sleep(0.01)
+    hal.sleep(0.01)
         
     length = cam.get_fifo_length()
     print(f"ACK CMD Length: {length} END")
@@ -138,80 +386,320 @@ def stream_image():
     if length < 1000:
         print("ACK CMD ERROR: Bad Size END")
         cam.reset_fifo()
-        return
+        return None
 
     # Header Check
-    header_check = cam.read_fifo_burst(min(2048, length))
-    label, soi_index = check_for_header(header_check)
+    header_check = cam.read_fifo_burst(min(HEADER_PROBE, length), keep_open)
+    label, soi_index = check_for_header(cam.buffers[0], len(header_check))
             
     if soi_index == -1:
+        if keep_open:
+            cam.end_fifo_read()
         if DEBUG:
             hex_head = " ".join([f"{b:02X}" for b in header_check[:48]])
             print(f"ACK CMD ERROR: No Header (Start: {hex_head}) END")
         else:
             print("ACK CMD ERROR: No valid JPEG Start of Image (SOI) found END")
         cam.reset_fifo()
-        return
+        return None
 
     print(f"ACK CMD Header found: {label} END")
-    time.sleep(0.05) # Settle before stream signal
+    return length, soi_index, header_check, transform_id(label)
 
-    # Binary Stream
-    usb_cdc.console.write(b"ACK IMG END\n")
-    time.sleep(0.05) # Settle before RAW data
-    
-    # Reset Read Pointer (0x04 is ARDUCHIP_FIFO)
-    cam.spi_write_reg(0x04, 0x10) 
-    
-    while not cam.spi.try_lock(): pass
-    cam.spi.configure(baudrate=2000000)
-    
-    cam.spi_cs.value = False
-    cam.spi.write(bytes([0x3c])) # Burst Command
+def stream_fifo(probe, soi_index, total):
+    """Send `total` payload bytes from the open FIFO burst; returns their CRC32.
 
-    
-    if soi_index > 0:
-        skip_buf = bytearray(soi_index)
-        cam.spi.readinto(skip_buf)
-
-    CHUNK_SIZE = 4096
-    buf = bytearray(CHUNK_SIZE)
-    remaining = length - soi_index
-    
+    The probe already holds the start of the frame, so it is sent as is
+    and the burst carries on after it. The rest is read into the readout
+    buffers in turn: while one is being sent, the other is filled
+    STREAM_SLICE bytes at a time, and between slices the USB transmit
+    buffer takes what it has room for, so the host link drains while SPI
+    reads. Nothing is allocated beyond memoryview slices.
+    """
+    out = probe[soi_index:soi_index + total]
+    crc = binascii.crc32(out)
+    remaining = total - len(out)
+    fill, spare = cam.chunks[1], cam.chunks[0] # The probe is in chunks[0]
     while remaining > 0:
-        to_read = min(CHUNK_SIZE, remaining)
-        if to_read < CHUNK_SIZE: buf = bytearray(to_read)
-        cam.spi.readinto(buf)
-        usb_cdc.console.write(buf)
-        remaining -= to_read
-            
-    cam.spi_cs.value = True
-    cam.spi.unlock()
+        n = min(cam.chunk_size, remaining)
+        pos = 0
+        while pos < n:
+            if out:
+                out = out[hal.console_send(out):]
+            step = min(STREAM_SLICE, n - pos)
+            cam.spi.readinto(fill, start=pos, end=pos + step)
+            pos += step
+        if out:
+            hal.console.write(out) # Wait for the rest before its buffer is refilled
+        out = fill[:n]
+        crc = binascii.crc32(out, crc)
+        remaining -= n
+        fill, spare = spare, fill
+    hal.console.write(out)
+    return crc
+
+def stream_image():
+    found = capture_frame(keep_open=True)
+    if not found:
+        return
+    length, soi_index, probe, transform = found
+    total = length - soi_index
+    try:
+        hal.sleep(0.05) # Settle before stream signal
+
+        # Binary Stream: frame header, payload from SOI, payload CRC32 trailer
+        hal.console.write(b"ACK IMG END\n")
+        hal.console.write(frame_header(total, transform))
+        hal.sleep(0.05) # Settle before RAW data
+        crc = stream_fifo(probe, soi_index, total)
+    finally:
+        cam.end_fifo_read()
+    hal.console.write(struct.pack("<I", crc & 0xFFFFFFFF))
     cam.reset_fifo()
     print("ACK CMD Stream Finished. END")
 
+def send_chunks(soi_index, total, indices):
+    # The FIFO holds the frame until reset_fifo(), so any chunk can be re-read
+    # by restarting the burst and skipping forward to its offset
+    buf = bytearray(CHUNKED_SIZE)
+    view = memoryview(buf)
+    pos = 0
+    with cam.bus as bus:
+        bus.begin_burst() # Reset Read Pointer + Burst Command
+        for idx in indices:
+            start = soi_index + idx * CHUNKED_SIZE
+            while pos < start:
+                n = min(CHUNKED_SIZE, start - pos)
+                cam.spi.readinto(buf, end=n)
+                pos += n
+            n = min(CHUNKED_SIZE, total - idx * CHUNKED_SIZE)
+            cam.spi.readinto(buf, end=n)
+            pos += n
+            crc = binascii.crc32(view[:n]) & 0xFFFFFFFF
+            hal.console.write(struct.pack("<2sHHI", CHUNK_MAGIC, idx, n, crc))
+            hal.console.write(view[:n])
+        bus.end_burst()
+    hal.console.write(struct.pack("<2sHHI", CHUNK_MAGIC, CHUNK_END, 0, 0))
+
+def stream_chunked():
+    found = capture_frame()
+    if not found:
+        return
+    length, soi_index, _, transform = found
+    total = length - soi_index
+    count = (total + CHUNKED_SIZE - 1) // CHUNKED_SIZE
+
+    print(f"ACK CMD Chunked: {CHUNKED_SIZE} END")
+    hal.console.write(b"ACK IMG END\n")
+    hal.console.write(frame_header(total, FLAG_CHUNKED | transform))
+    send_chunks(soi_index, total, range(count))
+
+    for _ in range(MAX_RESEND_ROUNDS):
+        request = wait_for_command("\x15", 10.0)
+        if request is None:
+            break
+        missing = sorted(int(i) for i in request.split(",") if i.strip().isdigit() and int(i) < count)
+        if not missing:
+            break
+        send_chunks(soi_index, total, missing)
+
+    cam.reset_fifo()
+    print("ACK CMD Stream Finished. END")
+
+def wait_for_command(cmd, timeout):
+    # Block until `cmd` arrives and return its argument, or None on timeout;
+    # input before it stays pending for the command loop
+    global pending_input
+    start = hal.monotonic()
+    while hal.monotonic() - start < timeout:
+        read_input()
+        if cmd in pending_input:
+            before, _, pending_input = pending_input.partition(cmd)
+            arg = read_command_arg()
+            pending_input = before + pending_input
+            return arg
+    return None
+
+def switch_to(target):
+    # Apply the precomputed delta from the active mode (OV5642_regs.bin)
+    global current_resolution
+    clear_roi() # The deltas assume the mode's own window
+    start = hal.monotonic()
+    writes = 0
+    if target != current_resolution:
+        writes = cam.switch_resolution(current_resolution, target)
+        if writes is None:
+            cam.init_cam(cam.regs.table(RESOLUTIONS[target]))
+            cam.set_qscale(current_qscale)
+    current_resolution = target
+    cam.reset_fifo()
+    done = "full re-init" if writes is None else f"{writes} writes"
+    print(f"ACK CMD Switched: {done} in {(hal.monotonic() - start) * 1000:.1f} ms END")
+
+def set_resolution(arg):
+    # 0x16 + id + newline; an empty id just reports the active mode
+    if arg:
+        try:
+            target = int(arg)
+        except ValueError:
+            target = -1
+        if target not in RESOLUTIONS:
+            print(f"ACK CMD ERROR: Unknown resolution {arg} END")
+            return
+        switch_to(target)
+    print(f"ACK CMD Resolution: {current_resolution} {RESOLUTION_NAMES[current_resolution]} END")
+
+def read_command_arg():
+    # Arguments follow the command byte as ASCII text terminated by a newline;
+    # call with the command byte taken off pending_input, which keeps what follows
+    global pending_input
+    start = hal.monotonic()
+    while "\n" not in pending_input and hal.monotonic() - start < 1.0:
+        read_input()
+    arg, _, pending_input = pending_input.partition("\n")
+    return arg.strip()
+
+def stop_requested():
+    # A 0x13 anywhere in the input ends the burst; other bytes wait for the command loop
+    read_input()
+    return take_input("\x13")
+
+def clear_roi():
+    global current_roi
+    if current_roi:
+        cam.set_window(0, 0, SENSOR_WIDTH, SENSOR_HEIGHT)
+        current_roi = None
+
+def set_roi(arg):
+    # 0x1A + "x,y,width,height" + newline; an empty argument restores the full frame
+    global current_roi
+    if not arg:
+        clear_roi()
+    else:
+        try:
+            x, y, width, height = (int(v) for v in arg.split(","))
+        except ValueError:
+            x = y = width = height = -1
+        if (width <= 0 or height <= 0 or x < 0 or y < 0 or x + width > SENSOR_WIDTH
+                or y + height > SENSOR_HEIGHT or x % 16 or width % 16 or y % 8 or height % 8):
+            print(f"ACK CMD ERROR: Bad ROI {arg} END")
+            return
+        if current_resolution != OV5642_2592x1944:
+            switch_to(OV5642_2592x1944)
+        cam.set_window(x, y, width, height)
+        cam.reset_fifo()
+        current_roi = (x, y, width, height)
+    if current_roi:
+        print(f"ACK CMD ROI: {current_roi[0]},{current_roi[1]},{current_roi[2]},{current_roi[3]} END")
+    else:
+        print("ACK CMD ROI: off END")
+
+def set_qscale(arg):
+    # 0x1B + scale + newline; an empty argument just reports the active scale
+    global current_qscale
+    if arg:
+        try:
+            qscale = int(arg)
+        except ValueError:
+            qscale = -1
+        if not 1 <= qscale <= 63:
+            print(f"ACK CMD ERROR: Bad qscale {arg} END")
+            return
+        cam.set_qscale(qscale)
+        current_qscale = qscale
+    print(f"ACK CMD QScale: {current_qscale} END")
+
+def preview_command():
+    # 0x10 (leave and capture) wins over 0x13 (leave) if both are waiting;
+    # other bytes wait for the command loop
+    read_input()
+    cmd = None
+    for c in ("\x13", "\x10"):
+        if take_input(c):
+            cmd = c
+    return cmd
+
+def stream_preview(count):
+    full = current_resolution
+    if full != PREVIEW_RESOLUTION:
+        switch_to(PREVIEW_RESOLUTION)
+    print(f"ACK CMD Preview Started: {count} frames END")
+    n = 0
+    cmd = None
+    while count == 0 or n < count:
+        stream_image()
+        n += 1
+        cmd = preview_command()
+        if cmd:
+            break
+    print(f"ACK CMD Preview Done: {n} frames END")
+    if full != PREVIEW_RESOLUTION:
+        switch_to(full)
+    print(f"ACK CMD Resolution: {current_resolution} {RESOLUTION_NAMES[current_resolution]} END")
+    if cmd == "\x10":
+        stream_image()
+
+def stream_burst(count):
+    # count == 0 streams until a 0x13 stop byte arrives
+    print(f"ACK CMD Burst Started: {count} frames END")
+    n = 0
+    while count == 0 or n < count:
+        stream_image()
+        n += 1
+        if stop_requested():
+            break
+    print(f"ACK CMD Burst Done: {n} frames END")
+
 # Main
 try:
-    time.sleep(1) 
+    hal.sleep(1) 
     cam = Arducam()
     run_diagnostics()
 except Exception as e:
+    camera_state = "error"
     print(f"ACK CMD Fatal: {e} END")
 
-last_heartbeat = time.monotonic()
+last_heartbeat = hal.monotonic()
 print("\nCircuitPython Waiting for command...")
 
 while True:
-    if supervisor.runtime.serial_bytes_available:
-        raw_cmd = sys.stdin.read(supervisor.runtime.serial_bytes_available)
-        if "\x10" in raw_cmd:
+    read_input()
+    if pending_input.upper().startswith("STOP"):
+        sys.exit(0)
+    if pending_input:
+        # One command at a time, in the order they arrived
+        cmd = pending_input[0]
+        pending_input = pending_input[1:]
+        if cmd == "\x18":
+            report_status()
+        elif cmd == "\x10":
             stream_image()
-        if "\x11" in raw_cmd:
+        elif cmd == "\x11":
             run_diagnostics()
-        if "STOP" in raw_cmd.upper():
-            sys.exit(0)
-            
-    if time.monotonic() - last_heartbeat > 5.0:
+        elif cmd == "\x12":
+            try:
+                count = int(read_command_arg() or 0)
+            except ValueError:
+                count = 1
+            stream_burst(count)
+        elif cmd == "\x14":
+            stream_chunked()
+        elif cmd == "\x16":
+            set_resolution(read_command_arg())
+        elif cmd == "\x17":
+            calibrate_spi(hardware_key)
+        elif cmd == "\x1a":
+            set_roi(read_command_arg())
+        elif cmd == "\x1b":
+            set_qscale(read_command_arg())
+        elif cmd == "\x19":
+            try:
+                count = int(read_command_arg() or 0)
+            except ValueError:
+                count = 0
+            stream_preview(count)
+
+    if hal.monotonic() - last_heartbeat > 5.0:
         print("ACK CMD Heartbeat... END")
-        last_heartbeat = time.monotonic()
-    time.sleep(0.01)
+        last_heartbeat = hal.monotonic()
+    hal.sleep(0.01)
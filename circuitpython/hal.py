@@ -0,0 +1,71 @@
+"""Hardware access for Arducam.py and code.py.
+
+The device code reaches the board only through the names below: pins,
+bus constructors, the USB serial console, NVM and the clock. On the Pico
+they are bound to CircuitPython's modules; under CPython,
+benchmarks/simbus.py registers a simulated `hal` module with the same
+names before the driver is imported, so the same files run on a PC.
+"""
+import sys
+import time
+
+import board
+import busio
+import digitalio
+import supervisor
+import usb_cdc
+
+try:
+    import microcontroller
+    nvm = microcontroller.nvm # None on boards without non-volatile memory
+except (ImportError, AttributeError):
+    nvm = None
+
+# Pico wiring
+CS_PIN = board.GP5
+SDA_PIN = board.GP8
+SCL_PIN = board.GP9
+SCK_PIN = board.GP2
+MOSI_PIN = board.GP3
+MISO_PIN = board.GP4
+
+sleep = time.sleep
+monotonic = time.monotonic
+
+# Binary writes to the host; print() goes to the same USB serial port
+console = usb_cdc.console
+
+def console_send(buf):
+    # Queue what the USB transmit buffer has room for without waiting; the
+    # bytes go out in the background. Returns how many were taken.
+    console.write_timeout = 0
+    n = console.write(buf)
+    console.write_timeout = None
+    return n or 0
+
+def release_displays():
+    # Free any bus a previous program left claimed by a display
+    try:
+        import displayio
+        displayio.release_displays()
+    except ImportError:
+        pass
+
+def spi_bus(sck, mosi, miso):
+    return busio.SPI(clock=sck, MOSI=mosi, MISO=miso)
+
+def i2c_bus(scl, sda, frequency):
+    return busio.I2C(scl=scl, sda=sda, frequency=frequency)
+
+def output_pin(pin, value=True):
+    io = digitalio.DigitalInOut(pin)
+    io.direction = digitalio.Direction.OUTPUT
+    io.value = value
+    return io
+
+def serial_available():
+    # Bytes the host has sent that are waiting to be read
+    return supervisor.runtime.serial_bytes_available
+
+def serial_read(n):
+    return sys.stdin.read(n)
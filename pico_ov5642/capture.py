@@ -1,20 +1,69 @@
-import serial
-import time
 import os
-import datetime
+import sys
 
 # CONFIGURATION
 # Update this port to match your Pico's serial port on macOS
 # Typically something like '/dev/cu.usbmodemXXXX'
 SERIAL_PORT = '/dev/cu.usbmodem22401'  # Updated to user's actual port
 BAUD_RATE = 115200
-TIMEOUT = 5  # Serial timeout in seconds
 # GLOBAL SETTINGS
 DEBUG = False  # Set to True to see all Pico diagnostic logs
+BURST_FRAMES = 0  # >0 captures that many frames back to back (0x12) instead of one
+RESOLUTION = None  # e.g. '1600x1200'; None keeps the mode the sketch booted in
+ROI = None  # (x, y, width, height) of the 2592x1944 frame to send alone; overrides RESOLUTION
+QSCALE = None  # JPEG quantization scale 1-63, lower is finer and larger; None keeps 8
+BUDGET_BYTES = None  # e.g. 200_000: adapt QSCALE per frame to keep JPEGs under this size
+BUDGET_SECONDS = None  # Or e.g. 1.0: adapt it to keep each capture under this time
+RETRIES = 2  # Captures again when a frame fails its CRC or JPEG checks
 
 # Directory configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-IMAGE_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'images'))
+PROJECT_DIR = os.path.abspath(os.path.join(BASE_DIR, '..'))
+IMAGE_DIR = os.path.join(PROJECT_DIR, 'images')
+SINK = IMAGE_DIR  # Or e.g. os.path.join(IMAGE_DIR, 'captures.sqlite') / '.tar' / '.zip'
+FSYNC = 'close'  # 'never', 'close', 'always' or every N images
+
+sys.path.insert(0, PROJECT_DIR)
+from picocam.camera import ARDUINO, CameraError, PicoCamera
+from picocam.frame import FrameError
+from picocam.burst import format_stats, stop_burst
+from picocam.quality import QSCALE_DEFAULT, QualityController
+from picocam.sink import BackgroundWriter
+from picocam.regs import RESOLUTIONS
+from picocam.roi import FLAG_ROI
+
+def budget_text():
+    return f"{BUDGET_BYTES} bytes" if BUDGET_BYTES is not None else f"{BUDGET_SECONDS}s"
+
+def make_quality():
+    # Chooses QSCALE for each frame from the last few when a budget is set
+    if BUDGET_BYTES is None and BUDGET_SECONDS is None:
+        return None
+    return QualityController(budget_bytes=BUDGET_BYTES, budget_time=BUDGET_SECONDS,
+                             start=QSCALE or QSCALE_DEFAULT)
+
+def capture_burst(cam, writer, count, quality=None):
+    if quality is None:
+        print(f"Triggering burst of {count} frames (0x12)...")
+    else:  # The scale can only change between single captures
+        print(f"Triggering {count} captures (0x10) within {budget_text()} each...")
+
+    def on_frame(header, jpeg):
+        def saved(stored):  # On the writer thread, once the image is stored
+            if stored.exception() is None:
+                print(f"Frame #{header.sequence}: {len(jpeg)} bytes -> {writer.sink.describe(stored.result())}")
+        writer.submit(jpeg, header.sequence).add_done_callback(saved)
+
+    try:
+        stats = cam.burst(count, on_frame, quality)
+    except KeyboardInterrupt:
+        if quality is None:  # Single captures leave nothing running to stop
+            stop_burst(cam.ser)
+        raise
+    print(format_stats(stats))
+    if quality is not None and quality.history:
+        scales = [record.qscale for record in quality.history]
+        print(f"Quantization scale {min(scales)}-{max(scales)} for a budget of {budget_text()}")
 
 def capture_image():
     # Ensure images directory exists
@@ -22,104 +71,56 @@ def capture_image():
         print(f"Creating directory: {IMAGE_DIR}")
         os.makedirs(IMAGE_DIR)
 
+    # Wait for Pico to initialize
+    wait_time = 15 if DEBUG else 8
+    on_line = (lambda text: print(f"Pico: {text}")) if DEBUG else None
+    cam = PicoCamera(SERIAL_PORT, ARDUINO, baud=BAUD_RATE, boot_wait=wait_time, on_line=on_line)
+
     try:
         print(f"Connecting to Pico on {SERIAL_PORT}...")
-        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=2)
-        
-        # Wait for Pico to initialize
-        wait_time = 15 if DEBUG else 8
-        print(f"Waiting {wait_time}s for Pico to initialize...")
-        start_time = time.time()
-        while time.time() - start_time < wait_time:
-            if ser.in_waiting:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if DEBUG and line:
-                    print(f"Pico Boot: {line}")
-            time.sleep(0.1)
-
-        ser.reset_input_buffer()
-
-        # Optional: Send 0x11 to Re-Init if we missed the boot logs
-        # This command (0x11) can be used to re-initialize the camera
-        # and get fresh diagnostic output if needed.
-        # ser.write(b'\x11')
-        # time.sleep(2) # Give Pico time to process re-init
-
-        print("Triggering single capture (0x10)...")
-        ser.write(b'\x10')
-
-        # Wait for "ACK IMG END" header
-        print("Waiting for image stream...")
-        start_time = time.time()
-        found_header = False
-        
-        while time.time() - start_time < 10:
-            line = ser.readline()
-            if line:
-                try:
-                    text = line.decode('ascii', errors='ignore').strip()
-                    if DEBUG and text: print(f"Pico: {text}")
-                    if "ACK IMG END" in text:
-                        found_header = True
-                        break
-                    if "ACK CMD ERROR" in text:
-                        print(f"Pico reported error: {text}")
-                        return
-                    if DEBUG and "ACK CMD Length:" in text:
-                        # Extract length just for info
-                        try:
-                            l = int(text.split(":")[1].split(" ")[1])
-                            print(f"Pico reports FIFO length: {l} bytes")
-                        except: pass
-                except:
-                    pass
-        
-        if not found_header:
-            print("Error: Did not receive 'ACK IMG END' from Pico.")
-            return
-
-        print("Receiving JPEG data... (searching for FF D8)")
-        img_bytes = bytearray()
-        last_byte = b''
-        bytes_received = 0
-        
-        # Long timeout for 5MP image transfer
-        transfer_start = time.time()
-        while time.time() - transfer_start < 60:
-            byte = ser.read(1)
-            if not byte:
-                continue
-            
-            img_bytes.append(byte[0])
-            bytes_received += 1
-            
-            if DEBUG and bytes_received % 10240 == 0:
-                print(f"Received {bytes_received // 1024} KB...")
+        print(f"Waiting up to {wait_time}s for Pico to initialize...")
+        # Images are written on a background thread; closing the writer waits for them
+        with cam, BackgroundWriter(SINK, fsync=FSYNC) as writer:
+            if cam.status:  # Firmware with the status ping (0x18)
+                print(f"Pico ready: {cam.status.dialect} firmware {cam.status.version}, "
+                      f"{RESOLUTIONS.get(cam.status.resolution, cam.status.resolution)}")
+            if ROI is not None:
+                print(f"Region of interest: {cam.set_roi(*ROI)}")
+            elif RESOLUTION is not None:
+                cam.set_resolution(RESOLUTION)
+                print(f"Resolution {RESOLUTION} active ({cam.last_switch or 'already set'})")
+            quality = make_quality()
+            if quality is not None:
+                print(f"Budget {budget_text()} per frame; the quantization scale adapts from {quality.qscale}")
+            elif QSCALE is not None:
+                print(f"Quantization scale {cam.set_qscale(QSCALE)}")
+            if BURST_FRAMES > 0:
+                capture_burst(cam, writer, BURST_FRAMES, quality)
+                return
 
-            # Detect JPEG End Of Image (FF D9)
-            if last_byte == b'\xff' and byte == b'\xd9':
-                print(f"End of Image (EOI) detected after {bytes_received} bytes.")
-                break
-            last_byte = byte
+            print("Triggering single capture (0x10)...")
+            if quality is not None:
+                img_bytes = quality.capture(cam, retries=RETRIES)
+            else:
+                img_bytes = cam.capture(retries=RETRIES)
+            if DEBUG:
+                header = cam.last_header
+                print(f"Frame #{header.sequence}: {header.length} bytes, resolution id {header.resolution}, CRC OK")
 
-        if len(img_bytes) > 1000:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-            filename = f"img_{timestamp}.jpg"
-            filepath = os.path.join(IMAGE_DIR, filename)
-            
-            with open(filepath, 'wb') as f:
-                f.write(img_bytes)
-            
-            print(f"Success! Image saved to: {filepath}")
-            print(f"File size: {len(img_bytes)} bytes")
-        else:
-            print(f"Error: Received only {len(img_bytes)} bytes. Image likely corrupt.")
+            # capture() has checked the JPEG structure from SOI to EOI
+            width, height = cam.last_dimensions
+            where = writer.submit(img_bytes).result()
+            print(f"Success! Image saved to: {writer.sink.describe(where)}")
+            print(f"File size: {len(img_bytes)} bytes, {width}x{height}"
+                  + (f", quantization scale {cam.qscale}" if cam.qscale is not None else ""))
+            expected = RESOLUTIONS.get(cam.last_header.resolution)
+            if expected and expected != f"{width}x{height}" and not cam.last_header.flags & FLAG_ROI:
+                print(f"Warning: the Pico reported resolution {expected}")
 
+    except (CameraError, FrameError) as e:
+        print(f"Error: {e}")
     except Exception as e:
         print(f"Fatal Error: {e}")
-    finally:
-        if 'ser' in locals() and ser.is_open:
-            ser.close()
 
 if __name__ == "__main__":
     capture_image()
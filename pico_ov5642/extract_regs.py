@@ -1,69 +1,61 @@
-import re
+"""Compile ov5642_regs.h into circuitpython/OV5642_regs.bin.
+
+Every sensor_reg array in the header is packed as 3-byte entries
+[AddrH, AddrL, Val] into one pool in which shared runs are stored once,
+together with the minimal register delta between each pair of JPEG
+resolutions (see picocam/regs.py for the format). Arducam.py reads tables
+from the file on demand, so nothing is imported into RAM at boot.
+
+The output records a digest of its inputs, so the file is only rewritten
+when the header (or the compiler) has changed:
+
+    uv run pico_ov5642/extract_regs.py            # --force to rebuild anyway
+"""
+import argparse
 import os
+import struct
+import sys
 
-HEADER_PATH = "/Volumes/Data SSD/Development/Antigravity/project12-pico-camera5mp/pico_ov5642/ov5642_regs.h"
-OUTPUT_PATH = "/Volumes/Data SSD/Development/Antigravity/project12-pico-camera5mp/circuitpython/OV5642_regs.py"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+HEADER_PATH = os.path.join(SCRIPT_DIR, "ov5642_regs.h")
+OUTPUT_PATH = os.path.join(PROJECT_DIR, "circuitpython", "OV5642_regs.bin")
 
-def extract_array(content, array_name):
-    # Find start of array
-    start_match = re.search(fr"const struct sensor_reg {array_name}\[\] PROGMEM =\s*{{", content)
-    if not start_match:
+sys.path.insert(0, PROJECT_DIR)
+from picocam.regs import BIN_HEADER, ENTRY_SIZE, compile_tables, load_tables, read_compiled, source_digest
+
+
+def current_digest(path):
+    # Digest stored in an existing output file, or None
+    try:
+        with open(path, "rb") as f:
+            head = f.read(BIN_HEADER.size)
+        return BIN_HEADER.unpack(head)[4]
+    except (OSError, ValueError, struct.error):
         return None
-    
-    start_idx = start_match.end()
-    # Find end of array (matching braces)
-    brace_count = 1
-    end_idx = start_idx
-    while brace_count > 0 and end_idx < len(content):
-        if content[end_idx] == '{':
-            brace_count += 1
-        elif content[end_idx] == '}':
-            brace_count -= 1
-        end_idx += 1
-    
-    array_content = content[start_idx:end_idx-1]
-    
-    # Extract {addr, val} pairs
-    pairs = re.findall(r"\{\s*(0x[0-9a-fA-F]+)\s*,\s*(0x[0-9a-fA-F]+)\s*\}", array_content)
-    
-    return [(int(addr, 16), int(val, 16)) for addr, val in pairs]
 
-def to_bytes_string(pairs):
-    if not pairs:
-        return "b''"
-    
-    lines = []
-    current_line = []
-    for addr, val in pairs:
-        current_line.append(f"\\x{(addr >> 8) & 0xFF:02x}\\x{addr & 0xFF:02x}\\x{val & 0xFF:02x}")
-        if len(current_line) >= 20:
-            lines.append("b'" + "".join(current_line) + "'")
-            current_line = []
-    
-    if current_line:
-        lines.append("b'" + "".join(current_line) + "'")
-    
-    return "(\n    " + "\n    ".join(lines) + "\n)"
 
-with open(HEADER_PATH, 'r') as f:
-    content = f.read()
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--header", default=HEADER_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the output is up to date")
+    args = parser.parse_args()
+
+    digest = source_digest(args.header)
+    if not args.force and current_digest(args.output) == digest:
+        print(f"{os.path.relpath(args.output)} is up to date.")
+        return
 
-qvga_preview = extract_array(content, "OV5642_QVGA_Preview")
-jpeg_qsxga = extract_array(content, "OV5642_JPEG_Capture_QSXGA")
-res_2592x1944 = extract_array(content, "ov5642_2592x1944")
-res_320x240 = extract_array(content, "ov5642_320x240")
-res_1600x1200 = extract_array(content, "ov5642_1600x1200")
+    data = compile_tables(args.header, digest)
+    records, _ = read_compiled(data)
+    raw = sum(len(entries) + 1 for entries in load_tables(args.header).values()) * ENTRY_SIZE
+    tables = sum(not name.startswith("delta_") for name in records)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"Wrote {os.path.relpath(args.output)}: {tables} tables ({raw} bytes raw) and "
+          f"{len(records) - tables} resolution deltas in {len(data)} bytes.")
 
-# Format output
-with open(OUTPUT_PATH, 'w') as f:
-    f.write("# Optimized OV5642 Registers (Bytes format)\n")
-    f.write("# Each register is 3 bytes: [AddrHigh, AddrLow, Value]\n")
-    f.write("# Marker 0xFFFF, 0xFF is used for end of list\n\n")
-    
-    f.write(f"OV5642_QVGA_Preview = {to_bytes_string(qvga_preview)}\n\n")
-    f.write(f"OV5642_JPEG_Capture_QSXGA = {to_bytes_string(jpeg_qsxga)}\n\n")
-    f.write(f"ov5642_2592x1944 = {to_bytes_string(res_2592x1944)}\n\n")
-    f.write(f"ov5642_320x240 = {to_bytes_string(res_320x240)}\n\n")
-    f.write(f"OV5642_1600x1200 = {to_bytes_string(res_1600x1200)}\n\n")
 
-print("Successfully extracted and formatted registers.")
+if __name__ == "__main__":
+    main()
@@ -17,22 +17,384 @@
  */
 const int SELECTED_RESOLUTION = OV5642_2592x1944;
 
+// Runtime resolution switching (0x16 + id as ASCII + newline; an empty id
+// just reports the active mode). Tables are indexed by the OV5642_* ids;
+// 1920x1080 only exists as a RAW table and is not offered.
+const struct sensor_reg *const RESOLUTION_TABLES[] = {
+    ov5642_320x240,   ov5642_640x480,   ov5642_1024x768, ov5642_1280x960,
+    ov5642_1600x1200, ov5642_2048x1536, ov5642_2592x1944};
+const char *const RESOLUTION_NAMES[] = {"320x240",   "640x480",   "1024x768",
+                                        "1280x960",  "1600x1200", "2048x1536",
+                                        "2592x1944"};
+const uint8_t NUM_RESOLUTIONS = 7;
+uint8_t current_resolution = SELECTED_RESOLUTION;
+
+// Live preview (0x19 + frame count as ASCII + newline, 0 = until stopped):
+// QVGA JPEG frames back to back; 0x13 ends it and 0x10 ends it with a
+// capture, both back in the mode the preview started from.
+const uint8_t PREVIEW_RESOLUTION = OV5642_320x240;
+
+// Region of interest (0x1A + "x,y,width,height" + newline; empty restores
+// the full frame): the 2592x1944 mode with the sensor window and output size
+// set to the rectangle, sent unscaled. x and width are multiples of 16, y
+// and height of 8 (one JPEG MCU). Frames taken through it carry FLAG_ROI;
+// any resolution switch or re-init drops it.
+const uint16_t SENSOR_WIDTH = 2592;
+const uint16_t SENSOR_HEIGHT = 1944;
+const uint16_t WINDOW_HS = 0x1B0; // Array window origin of the 2592x1944 table
+const uint16_t WINDOW_VS = 0x0A;
+const uint16_t FLAG_ROI = 0x4000;
+bool roi_active = false;
+long roi[4];
+
+// JPEG quantization scale (0x1B + 1-63 as ASCII + newline; empty just reports
+// it): COMPRESSION CTRL07 (0x4407) bits [5:0], lower is finer and larger.
+// InitCAM() sets QSCALE_DEFAULT; a resolution switch keeps the active scale.
+const uint16_t QSCALE_REG = 0x4407;
+const uint8_t QSCALE_DEFAULT = 0x08;
+uint8_t current_qscale = QSCALE_DEFAULT;
+
+// Status ping (0x18), answered at once, also while setup() is still running:
+// "ACK CMD Status: <state> <resolution id> <name> arduino <version> END"
+const char FIRMWARE_VERSION[] = "0.1.0";
+bool camera_ready = false;
+
+// Single writes InitCAM() makes after its JPEG tables (OV5642_MINI_5MP_PLUS)
+const struct sensor_reg INIT_FIXUPS[] PROGMEM = {
+    {0x3818, 0xa8}, {0x3621, 0x10}, {0x3801, 0xb0}, {0x4407, 0x08},
+    {0x5888, 0x00}, {0x5000, 0xff}, {0xffff, 0xff}};
+
 // Pin configuration for Pico 2W as specified by user
 const int CS = 5;
 
 // Arducam instance
 ArduCAM myCAM(OV5642, CS);
 
+// Framed image protocol (decoded on the host by picocam/frame.py):
+// 20-byte header (magic, version, resolution, flags, sequence, length,
+// header CRC32), payload from SOI, then a CRC32 trailer over the payload.
+const uint8_t FRAME_VERSION = 1;
+const size_t FRAME_HEADER_SIZE = 20;
+const size_t STREAM_CHUNK = 2048;
+uint32_t frame_sequence = 0;
+static uint8_t stream_buf[STREAM_CHUNK];
+
+// Nibble-table CRC32 (zlib polynomial); chainable like zlib.crc32()
+uint32_t crc32_update(uint32_t crc, const uint8_t *data, size_t len) {
+  static const uint32_t table[16] = {
+      0x00000000, 0x1DB71064, 0x3B6E20C8, 0x26D930AC, 0x76DC4190, 0x6B6B51F4,
+      0x4DB26158, 0x5005713C, 0xEDB88320, 0xF00F9344, 0xD6D6A3E8, 0xCB61B38C,
+      0x9B64C2B0, 0x86D3D2D4, 0xA00AE278, 0xBDBDF21C};
+  crc = ~crc;
+  for (size_t i = 0; i < len; i++) {
+    crc = table[(crc ^ data[i]) & 0x0F] ^ (crc >> 4);
+    crc = table[(crc ^ (data[i] >> 4)) & 0x0F] ^ (crc >> 4);
+  }
+  return ~crc;
+}
+
+void put_u32(uint8_t *p, uint32_t v) {
+  p[0] = v & 0xFF;
+  p[1] = (v >> 8) & 0xFF;
+  p[2] = (v >> 16) & 0xFF;
+  p[3] = (v >> 24) & 0xFF;
+}
+
+void write_frame_header(uint32_t payload_len, uint16_t flags) {
+  uint8_t hdr[FRAME_HEADER_SIZE];
+  memcpy(hdr, "PCAM", 4);
+  hdr[4] = FRAME_VERSION;
+  hdr[5] = current_resolution;
+  if (roi_active)
+    flags |= FLAG_ROI;
+  hdr[6] = flags & 0xFF;
+  hdr[7] = flags >> 8;
+  put_u32(hdr + 8, ++frame_sequence);
+  put_u32(hdr + 12, payload_len);
+  put_u32(hdr + 16, crc32_update(0, hdr, 16));
+  Serial.write(hdr, FRAME_HEADER_SIZE);
+}
+
+// Last value `table` gives `reg` (-1 if none); `count` gets the number of writes
+int16_t table_value(const struct sensor_reg *table, uint16_t reg,
+                    uint8_t *count = NULL) {
+  int16_t value = -1;
+  for (const struct sensor_reg *next = table;; next++) {
+    uint16_t r = pgm_read_word(&next->reg);
+    uint8_t v = pgm_read_word(&next->val);
+    if (r == 0xffff && v == 0xff)
+      break;
+    if (r == reg) {
+      value = v;
+      if (count)
+        (*count)++;
+    }
+  }
+  return value;
+}
+
+// Value InitCAM() leaves in `reg` before the size table, or -1 if unset
+int16_t init_value(uint16_t reg) {
+  const struct sensor_reg *const init[] = {INIT_FIXUPS, ov5642_320x240,
+                                           OV5642_JPEG_Capture_QSXGA,
+                                           OV5642_QVGA_Preview};
+  for (uint8_t i = 0; i < 4; i++) {
+    int16_t value = table_value(init[i], reg);
+    if (value >= 0)
+      return value;
+  }
+  return -1;
+}
+
+// Move the sensor from mode `from` to mode `to` writing only the registers
+// that differ: registers only `from` sets go back to their InitCAM() value,
+// then every entry of `to` is written unless `from` left the same value
+// (registers `to` writes more than once are always written in full).
+// Returns the number of writes, or -1 if `from` set a register InitCAM()
+// never touches, which needs a full re-init instead.
+int apply_resolution_delta(uint8_t from, uint8_t to) {
+  const struct sensor_reg *src = RESOLUTION_TABLES[from];
+  const struct sensor_reg *dst = RESOLUTION_TABLES[to];
+  const struct sensor_reg *next;
+  int writes = 0;
+
+  for (next = src; pgm_read_word(&next->reg) != 0xffff; next++) {
+    uint16_t r = pgm_read_word(&next->reg);
+    if (table_value(dst, r) < 0 && init_value(r) < 0)
+      return -1;
+  }
+  for (next = src; pgm_read_word(&next->reg) != 0xffff; next++) {
+    uint16_t r = pgm_read_word(&next->reg);
+    if (table_value(dst, r) >= 0 || table_value(next + 1, r) >= 0)
+      continue; // Kept by `to`, or not the last write of `r` in `from`
+    int16_t base = init_value(r);
+    if (table_value(src, r) != base) {
+      myCAM.wrSensorReg16_8(r, base);
+      writes++;
+    }
+  }
+  for (next = dst; pgm_read_word(&next->reg) != 0xffff; next++) {
+    uint16_t r = pgm_read_word(&next->reg);
+    uint8_t v = pgm_read_word(&next->val);
+    uint8_t count = 0;
+    table_value(dst, r, &count);
+    if (count > 1 || table_value(src, r) != v) {
+      myCAM.wrSensorReg16_8(r, v);
+      writes++;
+    }
+  }
+  return writes;
+}
+
+void switch_to(uint8_t target) {
+  clear_roi(); // The deltas assume the mode's own window
+  unsigned long start = micros();
+  int writes = 0;
+  if (target != current_resolution) {
+    writes = apply_resolution_delta(current_resolution, target);
+    if (writes < 0) {
+      myCAM.InitCAM();
+      myCAM.OV5642_set_JPEG_size(target);
+      myCAM.wrSensorReg16_8(QSCALE_REG, current_qscale);
+    }
+  }
+  current_resolution = target;
+  myCAM.clear_fifo_flag();
+  Serial.print(F("ACK CMD Switched: "));
+  Serial.print(writes < 0 ? String("full re-init") : String(writes) + " writes");
+  Serial.print(F(" in "));
+  Serial.print((micros() - start) / 1000.0, 1);
+  Serial.println(F(" ms END"));
+}
+
+// Array window, DVP output size and AEC average window for the region at
+// (x, y) of the 2592x1944 array; set_window(0, 0, 2592, 1944) restores them
+void set_window(long x, long y, long width, long height) {
+  const uint16_t regs[] = {0x3800, 0x3802, 0x3804, 0x3806,
+                           0x3808, 0x380A, 0x5682, 0x5686};
+  const long values[] = {WINDOW_HS + x, WINDOW_VS + y, width, height,
+                         width,         height,        width, height};
+  for (uint8_t i = 0; i < 8; i++) {
+    myCAM.wrSensorReg16_8(regs[i], values[i] >> 8);
+    myCAM.wrSensorReg16_8(regs[i] + 1, values[i] & 0xFF);
+  }
+  delay(100);
+}
+
+void clear_roi() {
+  if (roi_active) {
+    set_window(0, 0, SENSOR_WIDTH, SENSOR_HEIGHT);
+    roi_active = false;
+  }
+}
+
+void set_roi(String arg) {
+  arg.trim();
+  if (arg.length() == 0) {
+    clear_roi();
+  } else {
+    long x, y, width, height;
+    if (sscanf(arg.c_str(), "%ld,%ld,%ld,%ld", &x, &y, &width, &height) != 4 ||
+        width <= 0 || height <= 0 || x < 0 || y < 0 ||
+        x + width > SENSOR_WIDTH || y + height > SENSOR_HEIGHT || x % 16 ||
+        width % 16 || y % 8 || height % 8) {
+      Serial.print(F("ACK CMD ERROR: Bad ROI "));
+      Serial.print(arg);
+      Serial.println(F(" END"));
+      return;
+    }
+    if (current_resolution != OV5642_2592x1944)
+      switch_to(OV5642_2592x1944);
+    set_window(x, y, width, height);
+    myCAM.clear_fifo_flag();
+    roi[0] = x;
+    roi[1] = y;
+    roi[2] = width;
+    roi[3] = height;
+    roi_active = true;
+  }
+  Serial.print(F("ACK CMD ROI: "));
+  if (roi_active) {
+    for (uint8_t i = 0; i < 4; i++) {
+      Serial.print(roi[i]);
+      Serial.print(i < 3 ? ',' : ' ');
+    }
+  } else {
+    Serial.print(F("off "));
+  }
+  Serial.println(F("END"));
+}
+
+void set_qscale(String arg) {
+  arg.trim();
+  if (arg.length()) {
+    long qscale = arg.toInt();
+    if (qscale < 1 || qscale > 63) {
+      Serial.print(F("ACK CMD ERROR: Bad qscale "));
+      Serial.print(arg);
+      Serial.println(F(" END"));
+      return;
+    }
+    current_qscale = qscale;
+    myCAM.wrSensorReg16_8(QSCALE_REG, current_qscale);
+  }
+  Serial.print(F("ACK CMD QScale: "));
+  Serial.print(current_qscale);
+  Serial.println(F(" END"));
+}
+
+void report_resolution() {
+  Serial.print(F("ACK CMD Resolution: "));
+  Serial.print(current_resolution);
+  Serial.print(F(" "));
+  Serial.print(RESOLUTION_NAMES[current_resolution]);
+  Serial.println(F(" END"));
+}
+
+void set_resolution(String arg) {
+  arg.trim();
+  if (arg.length()) {
+    long target = arg.toInt();
+    if (target < 0 || target >= NUM_RESOLUTIONS ||
+        (target == 0 && arg != "0")) {
+      Serial.print(F("ACK CMD ERROR: Unknown resolution "));
+      Serial.print(arg);
+      Serial.println(F(" END"));
+      return;
+    }
+    switch_to(target);
+  }
+  report_resolution();
+}
+
+int32_t find_soi(const uint8_t *data, size_t len) {
+  for (size_t i = 0; i + 1 < len; i++) {
+    if (data[i] == 0xFF && data[i + 1] == 0xD8)
+      return i;
+  }
+  return -1;
+}
+
+void report_status() {
+  Serial.print(F("ACK CMD Status: "));
+  Serial.print(camera_ready ? F("ready ") : F("initializing "));
+  Serial.print(current_resolution);
+  Serial.print(' ');
+  Serial.print(RESOLUTION_NAMES[current_resolution]);
+  Serial.print(F(" arduino "));
+  Serial.print(FIRMWARE_VERSION);
+  Serial.println(F(" END"));
+}
+
+// Host input read while looking for one command byte (a ping in setup(),
+// a stop in a burst) and not handled there. The command loop takes it
+// before anything still in Serial, so commands run in arrival order.
+const uint8_t PENDING_SIZE = 64;
+uint8_t pending[PENDING_SIZE];
+uint8_t pending_len = 0;
+
+void read_input() {
+  while (pending_len < PENDING_SIZE && Serial.available())
+    pending[pending_len++] = Serial.read();
+}
+
+// Remove the first `cmd` from the pending input; false if there is none
+bool take_input(uint8_t cmd) {
+  for (uint8_t i = 0; i < pending_len; i++) {
+    if (pending[i] == cmd) {
+      memmove(pending + i, pending + i + 1, pending_len - i - 1);
+      pending_len--;
+      return true;
+    }
+  }
+  return false;
+}
+
+bool input_available() {
+  return pending_len || Serial.available();
+}
+
+int input_read() {
+  if (!pending_len)
+    return Serial.read();
+  uint8_t b = pending[0];
+  memmove(pending, pending + 1, --pending_len);
+  return b;
+}
+
+// Command argument: ASCII up to a newline, pending input first
+String read_arg() {
+  String arg;
+  while (pending_len) {
+    int b = input_read();
+    if (b == '\n')
+      return arg;
+    arg += (char)b;
+  }
+  return arg + Serial.readStringUntil('\n');
+}
+
+// delay() that answers status pings while setup() waits
+void wait_answering(unsigned long ms) {
+  unsigned long start = millis();
+  while (millis() - start < ms) {
+    read_input();
+    while (take_input(0x18))
+      report_status();
+    delay(1);
+  }
+}
+
 void setup() {
   uint8_t temp;
 
   // Initialize Serial and wait long enough for USB/Python to catch up
   Serial.begin(115200);
   unsigned long start_serial = millis();
-  delay(2000);
+  wait_answering(2000);
   while (!Serial && (millis() - start_serial < 5000))
     ;
-  delay(500);
+  wait_answering(500);
   Serial.println(F("\n\nACK CMD --- ArduCAM Boot Start --- END"));
 
   // Initialize I2C with specified pins
@@ -67,7 +429,7 @@ void setup() {
     temp = myCAM.read_reg(ARDUCHIP_TEST1);
     if (temp != 0x55) {
       Serial.println(F("ACK CMD SPI interface Error! END"));
-      delay(1000);
+      wait_answering(1000);
       continue;
     } else {
       Serial.println(F("ACK CMD SPI interface OK. END"));
@@ -88,7 +450,7 @@ void setup() {
     myCAM.rdSensorReg16_8(OV5642_CHIPID_LOW, &pid);
     if ((vid != 0x56) || (pid != 0x42)) {
       Serial.println(F("ACK CMD Can't find OV5642 module! END"));
-      delay(1000);
+      wait_answering(1000);
       continue;
     } else {
       Serial.println(F("ACK CMD OV5642 detected. END"));
@@ -111,6 +473,7 @@ void setup() {
                   tim |
                       0x02); // Force VSYNC Low Active (often needed for OV5642)
 
+  camera_ready = true;
   Serial.println(F("ACK CMD Camera Ready! END"));
 }
 
@@ -131,14 +494,28 @@ void loop() {
   }
 #endif
 
-  if (Serial.available()) {
-    uint8_t temp = Serial.read();
+  if (input_available()) {
+    uint8_t temp = input_read();
     if (temp == 0x10) { // Single capture command
       capture_and_stream();
+    } else if (temp == 0x12) { // Burst capture: count as ASCII + newline
+      capture_burst(read_arg().toInt());
+    } else if (temp == 0x16) { // Resolution: id as ASCII + newline
+      set_resolution(read_arg());
+    } else if (temp == 0x1A) { // Region of interest: x,y,width,height + newline
+      set_roi(read_arg());
+    } else if (temp == 0x1B) { // JPEG quantization scale: 1-63 + newline
+      set_qscale(read_arg());
+    } else if (temp == 0x19) { // Preview: count as ASCII + newline
+      capture_preview(read_arg().toInt());
+    } else if (temp == 0x18) { // Status ping
+      report_status();
     } else if (temp == 0x11) { // Manual Re-Init
       Serial.println(F("ACK CMD Re-initializing Camera... END"));
       myCAM.InitCAM();
-      myCAM.OV5642_set_JPEG_size(SELECTED_RESOLUTION);
+      myCAM.OV5642_set_JPEG_size(current_resolution);
+      roi_active = false; // InitCAM() resets the window
+      current_qscale = QSCALE_DEFAULT; // and the quantization scale
       Serial.println(F("ACK CMD Re-init Done. END"));
     } else {
       Serial.print(F("ACK CMD Received unknown byte: 0x"));
@@ -148,10 +525,66 @@ void loop() {
   }
 }
 
+// Capture `count` frames back to back (0 = until a 0x13 stop byte arrives).
+// capture_and_stream() rearms the FIFO and retriggers right after readout.
+void capture_burst(long count) {
+  Serial.print(F("ACK CMD Burst Started: "));
+  Serial.print(count);
+  Serial.println(F(" frames END"));
+
+  long n = 0;
+  while (count == 0 || n < count) {
+    capture_and_stream();
+    n++;
+    // The stop byte may be queued behind other input, which is kept
+    read_input();
+    if (take_input(0x13))
+      break;
+  }
+
+  Serial.print(F("ACK CMD Burst Done: "));
+  Serial.print(n);
+  Serial.println(F(" frames END"));
+}
+
+// Stream QVGA frames until `count` is reached (0 = no limit) or a 0x13 or
+// 0x10 arrives, then return to the previous mode; 0x10 also captures there.
+void capture_preview(long count) {
+  uint8_t full = current_resolution;
+  if (full != PREVIEW_RESOLUTION)
+    switch_to(PREVIEW_RESOLUTION);
+  Serial.print(F("ACK CMD Preview Started: "));
+  Serial.print(count);
+  Serial.println(F(" frames END"));
+
+  long n = 0;
+  int cmd = -1;
+  while (count == 0 || n < count) {
+    capture_and_stream();
+    n++;
+    // 0x10 wins over 0x13 if both are waiting; other input is kept
+    read_input();
+    if (take_input(0x13))
+      cmd = 0x13;
+    if (take_input(0x10))
+      cmd = 0x10;
+    if (cmd >= 0)
+      break;
+  }
+
+  Serial.print(F("ACK CMD Preview Done: "));
+  Serial.print(n);
+  Serial.println(F(" frames END"));
+  if (full != PREVIEW_RESOLUTION)
+    switch_to(full);
+  report_resolution();
+  if (cmd == 0x10)
+    capture_and_stream();
+}
+
 void capture_and_stream() {
-  uint8_t temp = 0, temp_last = 0;
+  uint8_t temp = 0;
   uint32_t length = 0;
-  bool is_header = false;
 
   Serial.println(F("ACK CMD Capture Started... END"));
 
@@ -277,26 +710,38 @@ void capture_and_stream() {
     return;
   }
 
-  // Header marker for Python script
-  Serial.println(F("ACK IMG END"));
-
-  while (length--) {
-    temp_last = temp;
-    temp = SPI.transfer(0x00);
-
-    if (is_header) {
-      Serial.write(temp);
-    } else if ((temp == 0xD8) && (temp_last == 0xFF)) {
-      is_header = true;
-      Serial.write(temp_last);
-      Serial.write(temp);
-    }
+  // The first chunk locates SOI and is streamed as-is, so nothing is read twice
+  uint32_t chunk = min(length, (uint32_t)STREAM_CHUNK);
+  SPI.transfer(stream_buf, chunk);
+  int32_t soi = find_soi(stream_buf, chunk);
+  if (soi < 0) {
+    myCAM.CS_HIGH();
+    SPI.endTransaction();
+    Serial.println(F("ACK CMD ERROR: No JPEG header END"));
+    myCAM.clear_fifo_flag();
+    return;
+  }
 
-    if ((temp == 0xD9) && (temp_last == 0xFF)) {
-      break;
-    }
+  // Header marker for Python script, followed by the binary frame
+  Serial.println(F("ACK IMG END"));
+  write_frame_header(length - soi, 0);
+
+  uint32_t crc = crc32_update(0, stream_buf + soi, chunk - soi);
+  Serial.write(stream_buf + soi, chunk - soi);
+  uint32_t remaining = length - chunk;
+
+  while (remaining) {
+    chunk = min(remaining, (uint32_t)STREAM_CHUNK);
+    SPI.transfer(stream_buf, chunk);
+    crc = crc32_update(crc, stream_buf, chunk);
+    Serial.write(stream_buf, chunk);
+    remaining -= chunk;
   }
 
+  uint8_t trailer[4];
+  put_u32(trailer, crc);
+  Serial.write(trailer, sizeof(trailer));
+
   myCAM.CS_HIGH();
   SPI.endTransaction();
   myCAM.clear_fifo_flag();
@@ -0,0 +1,14 @@
+"""Host-side helpers shared by the Arduino and CircuitPython capture scripts."""
+
+from .receive import parse_length, read_exact, receive_jpeg, trim_to_eoi, wait_for_line
+from .frame import FrameError, FrameHeader, decode_header, encode_frame, read_frame
+from .burst import BurstStats, format_stats, receive_burst, stop_burst
+from .camera import ARDUINO, CIRCUITPYTHON, CameraError, PicoCamera, find_pico_port, save_image
+from .aio import AsyncPicoCamera, AsyncSerial
+from .fleet import Fleet, RoundResult
+from .transform import FLAG_TRANSFORM, TRANSFORM_NAMES, recover
+from .jpeg import JpegError, JpegValidator, add_comment, jpeg_comments, validate_jpeg
+from .preview import PreviewStream
+from .quality import QualityController, QualityRecord, qscale_from_comments
+from .roi import FLAG_ROI, Roi, align_roi, roi_from_comments
+from .sink import BackgroundWriter, DirectorySink, SQLiteSink, Sink, TarSink, ZipSink, open_sink, timestamp_name
@@ -0,0 +1,306 @@
+"""asyncio transport for the Pico capture protocol.
+
+AsyncSerial registers the port's file descriptor with the event loop,
+buffers whatever arrives and queues what the port cannot take yet, so one
+loop can drive many cameras (and any other I/O) without a thread per
+device or busy-polling.
+
+    async with AsyncPicoCamera('/dev/ttyACM0', CIRCUITPYTHON) as cam:
+        jpeg = await cam.capture()
+        async for header, jpeg in cam.stream_frames(10):
+            ...
+"""
+import asyncio
+import os
+import time
+
+from .burst import BURST_DONE, CMD_STOP, ERROR, burst_command
+from .camera import (ARDUINO, CIRCUITPYTHON, CMD_CAPTURE, CMD_PING, CMD_REINIT, INITIALIZING, PING_TIMEOUT, READY,
+                     READY_MARKERS, STATUS_PREFIX, CameraError, parse_status)
+from .frame import HEADER_SIZE, FrameError, check_body, decode_header, frame_body_size
+from .jpeg import frame_jpeg
+from .receive import IMG_SIGNAL
+
+
+class AsyncSerial:
+    """Non-blocking reader/writer over a serial (or pty) file descriptor."""
+
+    def __init__(self, fd, owner=None):
+        self.fd = fd
+        self.owner = owner  # Keeps a pyserial port (and its settings) alive
+        self.buf = bytearray()
+        self.wbuf = bytearray()  # Written but not yet accepted by the port
+        self.eof = False
+        self._waiter = None
+        self._drained = None
+        self._loop = asyncio.get_running_loop()
+        os.set_blocking(fd, False)
+        self._loop.add_reader(fd, self._on_readable)
+
+    @classmethod
+    def open(cls, port, baud=115200):
+        import serial
+        ser = serial.Serial(port, baud, timeout=0)
+        return cls(ser.fileno(), owner=ser)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''  # EIO once the other end of a pty goes away
+        if data:
+            self.buf += data
+        else:
+            self.eof = True
+            self._loop.remove_reader(self.fd)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def _wait(self, deadline):
+        if self.eof:
+            raise ConnectionError("Serial port closed")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError
+        self._waiter = self._loop.create_future()
+        try:
+            await asyncio.wait_for(self._waiter, remaining)
+        finally:
+            self._waiter = None
+
+    async def readline(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            end = self.buf.find(b'\n')
+            if end != -1:
+                line = bytes(self.buf[:end + 1])
+                del self.buf[:end + 1]
+                return line
+            await self._wait(deadline)
+
+    async def readinto(self, view, timeout):
+        """Fill `view` completely or raise asyncio.TimeoutError."""
+        deadline = time.monotonic() + timeout
+        pos = 0
+        while pos < len(view):
+            if not self.buf:
+                await self._wait(deadline)
+                continue
+            n = min(len(view) - pos, len(self.buf))
+            view[pos:pos + n] = self.buf[:n]
+            del self.buf[:n]
+            pos += n
+
+    def write(self, data):
+        """Send `data` without blocking; what the port cannot take yet is
+        queued and written from the event loop as it becomes writable."""
+        if self.eof:
+            raise ConnectionError("Serial port closed")
+        if not self.wbuf:
+            try:
+                n = os.write(self.fd, data)
+            except BlockingIOError:
+                n = 0
+            if n == len(data):
+                return
+            data = memoryview(data)[n:]
+            self._loop.add_writer(self.fd, self._on_writable)
+        self.wbuf += data
+
+    def _on_writable(self):
+        try:
+            n = os.write(self.fd, self.wbuf)
+        except BlockingIOError:
+            return
+        except OSError:
+            n = len(self.wbuf)  # The other end went away; reads report it
+        del self.wbuf[:n]
+        if not self.wbuf:
+            self._loop.remove_writer(self.fd)
+            if self._drained is not None and not self._drained.done():
+                self._drained.set_result(None)
+
+    async def drain(self):
+        """Wait until everything passed to write() has reached the port."""
+        if self.wbuf:
+            if self._drained is None or self._drained.done():
+                self._drained = self._loop.create_future()
+            await self._drained
+
+    def reset_input_buffer(self):
+        self.buf.clear()
+
+    def close(self):
+        if not self.eof:
+            self._loop.remove_reader(self.fd)
+            self.eof = True
+        if self.wbuf:
+            self._loop.remove_writer(self.fd)
+            self.wbuf.clear()
+        if self._drained is not None and not self._drained.done():
+            self._drained.set_result(None)
+        if self.owner is not None:
+            self.owner.close()
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+class AsyncPicoCamera:
+    """asyncio counterpart of picocam.camera.PicoCamera.
+
+    Pass a port name, or an already-open file descriptor as `fd` (for
+    example one side of a pty pair standing in for a device).
+    """
+
+    def __init__(self, port=None, dialect=CIRCUITPYTHON, baud=115200, fd=None,
+                 boot_wait=8, on_line=None, probe=True):
+        if dialect not in (ARDUINO, CIRCUITPYTHON):
+            raise ValueError(f"Unknown firmware dialect: {dialect}")
+        self.port = port
+        self.dialect = dialect
+        self.baud = baud
+        self.fd = fd
+        self.boot_wait = boot_wait
+        self.on_line = on_line
+        self.probe = probe
+        self.status = None
+        self.transfer_timeout = 60 if dialect == ARDUINO else 20
+        self.link = None
+        self.last_header = None
+        self.last_dimensions = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    async def open(self, wait=True):
+        if self.fd is not None:
+            self.link = AsyncSerial(self.fd)
+        else:
+            self.link = AsyncSerial.open(self.port, self.baud)
+        if wait:
+            await self.wait_ready()
+
+    def close(self):
+        if self.link is not None:
+            self.link.close()
+            self.link = None
+
+    async def _wait_line(self, markers, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                raw = await self.link.readline(deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                return None
+            text = raw.decode('ascii', errors='ignore').strip()
+            if not text:
+                continue
+            if self.on_line:
+                self.on_line(text)
+            if any(m in text for m in markers):
+                return text
+
+    async def ping(self, timeout=PING_TIMEOUT):
+        """Ask the device for its status (0x18); a DeviceStatus, or None without an answer."""
+        self.link.write(CMD_PING)
+        line = await self._wait_line((STATUS_PREFIX,), timeout)
+        if line is None:
+            return None
+        self.status = parse_status(line, self.dialect)
+        return self.status
+
+    async def _probe(self, wait):
+        # Same contract as PicoCamera._probe()
+        deadline = time.monotonic() + wait
+        answered = False
+        while time.monotonic() < deadline:
+            self.link.write(CMD_PING)
+            line = await self._wait_line((STATUS_PREFIX, "Camera Ready!"), PING_TIMEOUT)
+            if line is None:
+                if not answered:
+                    return False
+                continue
+            if STATUS_PREFIX not in line:
+                status = await self.ping()
+            else:
+                status = self.status = parse_status(line, self.dialect)
+            if status is None or status.state == READY:
+                return True
+            answered = True
+            if status.state != INITIALIZING:
+                self.link.write(CMD_REINIT)
+        raise CameraError(f"Pico still {self.status.state} after {wait}s")
+
+    async def wait_ready(self, timeout=60):
+        if self.probe and await self._probe(self.boot_wait if self.dialect == ARDUINO else timeout):
+            return
+        if self.dialect == ARDUINO:
+            # Same contract as PicoCamera: boot chatter ends with 'Camera Ready!'
+            await self._wait_line(("Camera Ready!",), self.boot_wait)
+            self.link.reset_input_buffer()
+            return
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if await self._wait_line(READY_MARKERS, min(15, deadline - time.monotonic())):
+                return
+            self.link.write(CMD_REINIT)
+        raise CameraError("Pico did not report ready")
+
+    async def _read_frame(self):
+        raw = bytearray(HEADER_SIZE)
+        try:
+            await self.link.readinto(memoryview(raw), self.transfer_timeout)
+            header = decode_header(raw)
+            body = bytearray(frame_body_size(header))
+            await self.link.readinto(memoryview(body), self.transfer_timeout)
+        except asyncio.TimeoutError:
+            raise FrameError("Timed out reading frame") from None
+        self.last_header = header
+        jpeg, validator = frame_jpeg(header, check_body(header, body))
+        self.last_dimensions = (validator.width, validator.height)
+        return header, jpeg
+
+    async def capture(self):
+        self.link.reset_input_buffer()  # Clear any heartbeats
+        self.link.write(CMD_CAPTURE)
+        line = await self._wait_line((IMG_SIGNAL, ERROR), 10)
+        if line is None:
+            raise CameraError("Timed out waiting for image signal")
+        if ERROR in line:
+            raise CameraError(f"Pico reported error: {line}")
+        _, jpeg = await self._read_frame()
+        return jpeg
+
+    async def stream_frames(self, count=0):
+        """Async generator over (header, jpeg) for a burst of `count` frames.
+
+        count == 0 streams until the consumer stops iterating, at which
+        point the device is told to stop after its current frame.
+        """
+        self.link.reset_input_buffer()
+        self.link.write(burst_command(count))
+        received = 0
+        finished = False
+        try:
+            while count == 0 or received < count:
+                line = await self._wait_line((IMG_SIGNAL, BURST_DONE, ERROR), self.transfer_timeout)
+                if line is None or BURST_DONE in line:
+                    finished = True
+                    return
+                if ERROR in line:
+                    received += 1
+                    continue
+                frame = await self._read_frame()
+                received += 1
+                yield frame
+            await self._wait_line((BURST_DONE,), 2)
+            finished = True
+        finally:
+            if not finished and self.link is not None and not self.link.eof:
+                self.link.write(CMD_STOP)
@@ -0,0 +1,91 @@
+import time
+from collections import namedtuple
+
+from .frame import FrameError, read_frame
+from .jpeg import JpegValidator, frame_jpeg
+from .receive import IMG_SIGNAL, discard_input, wait_for_line
+from .sink import BackgroundWriter  # Re-exported: it was defined here before picocam.sink
+
+# Burst protocol: CMD_BURST followed by the frame count as ASCII and a
+# newline (0 = until stopped). CMD_STOP ends a running burst after the
+# current frame; the device then prints BURST_DONE.
+CMD_BURST = b'\x12'
+CMD_STOP = b'\x13'
+BURST_DONE = "ACK CMD Burst Done"
+ERROR = "ACK CMD ERROR"
+# After a frame fails part way its remaining bytes are dropped until the
+# link has been quiet this long, which is shorter than the capture before
+# the device sends the next frame
+RESYNC_QUIET = 0.02
+
+BurstStats = namedtuple('BurstStats', 'frames errors bytes elapsed intervals resolutions')
+
+
+def burst_command(count):
+    return CMD_BURST + f"{count}\n".encode('ascii')
+
+
+def receive_burst(ser, count, on_frame, frame_timeout=60, idle_timeout=None, on_line=None):
+    """Run a burst of `count` frames (0 = until stopped) and collect stats.
+
+    `on_frame(header, jpeg)` is called from the receive loop for each good
+    frame; hand the data to a BackgroundWriter so disk I/O overlaps with the
+    next transfer. Frames that fail the CRC or JPEG checks are counted as
+    errors, and what is left of them is dropped. Returns a BurstStats with the time between frames.
+    """
+    ser.write(burst_command(count))
+    ser.flush()
+
+    frames = errors = total = 0
+    intervals = []
+    resolutions = set()
+    start = last = time.monotonic()
+
+    while count == 0 or frames + errors < count:
+        line, _ = wait_for_line(ser, (IMG_SIGNAL, BURST_DONE, ERROR),
+                                timeout=frame_timeout, on_line=on_line)
+        if line is None or BURST_DONE in line:
+            break
+        if ERROR in line:
+            errors += 1
+            continue
+        try:
+            validator = JpegValidator()
+            header, payload = read_frame(ser, timeout=frame_timeout, validator=validator,
+                                         idle_timeout=idle_timeout)
+            jpeg, _ = frame_jpeg(header, payload, validator)
+        except FrameError:
+            errors += 1
+            discard_input(ser, quiet=RESYNC_QUIET, timeout=frame_timeout)
+            continue
+
+        now = time.monotonic()
+        intervals.append(now - last)
+        last = now
+        frames += 1
+        total += header.length
+        resolutions.add(header.resolution)
+        on_frame(header, jpeg)
+
+    if count != 0:
+        # Consume the closing status line so the port is idle afterwards
+        wait_for_line(ser, (BURST_DONE,), timeout=2, on_line=on_line)
+
+    return BurstStats(frames, errors, total, last - start, intervals, sorted(resolutions))
+
+
+def stop_burst(ser):
+    ser.write(CMD_STOP)
+    ser.flush()
+
+
+def format_stats(stats):
+    if not stats.frames:
+        return f"No frames received ({stats.errors} errors)"
+    per_minute = stats.frames / stats.elapsed * 60 if stats.elapsed else 0.0
+    mean = sum(stats.intervals) / len(stats.intervals)
+    res = ",".join(str(r) for r in stats.resolutions)
+    return (f"{stats.frames} frames ({stats.errors} errors) at resolution id {res}: "
+            f"{per_minute:.1f} frames/min, {stats.bytes / stats.elapsed / 1024:.1f} KB/s, "
+            f"interval mean {mean * 1000:.0f} ms, min {min(stats.intervals) * 1000:.0f} ms, "
+            f"max {max(stats.intervals) * 1000:.0f} ms")
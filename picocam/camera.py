@@ -0,0 +1,535 @@
+import os
+import time
+from collections import namedtuple
+
+import serial
+import serial.tools.list_ports
+
+from .burst import BurstStats, receive_burst
+from .chunked import CMD_CHUNKED, FLAG_CHUNKED, parse_chunk_size, receive_chunked
+from .frame import HEADER_SIZE, FrameError, decode_header, read_frame
+from .jpeg import JpegValidator, add_comment, frame_jpeg
+from .preview import PreviewStream
+from .quality import QSCALE_PREFIX, check_qscale, parse_qscale, qscale_command, qscale_comment
+from .receive import IMG_SIGNAL, discard_input, parse_length, read_exact, wait_for_line
+from .regs import resolution_id
+from .roi import FLAG_ROI, ROI_PREFIX, align_roi, check_roi, parse_roi, roi_command, roi_comment
+from .sink import DirectorySink, timestamp_name
+
+ARDUINO = 'arduino'
+CIRCUITPYTHON = 'circuitpython'
+
+CMD_CAPTURE = b'\x10'
+CMD_REINIT = b'\x11'
+CMD_RESOLUTION = b'\x16'
+CMD_CALIBRATE_SPI = b'\x17'
+CMD_PING = b'\x18'
+
+READY_MARKERS = ("Camera Ready!", "Waiting for command", "Heartbeat")
+ERROR = "ACK CMD ERROR"
+RESOLUTION_PREFIX = "ACK CMD Resolution:"
+SWITCHED_PREFIX = "ACK CMD Switched:"
+SPI_CLOCK_PREFIX = "ACK CMD SPI Clock:"
+STATUS_PREFIX = "ACK CMD Status:"
+READY, INITIALIZING = 'ready', 'initializing'
+PING_TIMEOUT = 1  # A running firmware answers a ping within milliseconds
+FULL_RESOLUTION = 6  # 2592x1944, the mode a region of interest is cut from
+
+# Answer to a status ping (0x18): state ('ready', 'initializing' or
+# 'error'), active resolution id, firmware dialect and version
+DeviceStatus = namedtuple('DeviceStatus', 'state resolution dialect version')
+
+
+class CameraError(Exception):
+    """Raised when the Pico does not answer or reports a capture error."""
+
+
+def find_pico_ports():
+    """Return every port that looks like a Pico, as ListPortInfo objects."""
+    found = []
+    for p in serial.tools.list_ports.comports():
+        desc = p.description.lower()
+        # Common identifiers for Pico / CircuitPython on Mac
+        if "pico" in desc or "circuitpython" in desc or "usbmodem" in desc:
+            found.append(p)
+    return found
+
+
+def find_pico_port():
+    ports = find_pico_ports()
+    return ports[0].device if ports else None
+
+
+def parse_status(line, dialect=None):
+    """DeviceStatus from an 'ACK CMD Status:' line.
+
+    Raises CameraError if the line does not parse, or if the device runs
+    another firmware than `dialect` (when given).
+    """
+    fields = line.split(STATUS_PREFIX, 1)[-1].replace("END", "").split()
+    if len(fields) < 5 or not fields[1].isdigit():
+        raise CameraError(f"Unreadable status: {line}")
+    status = DeviceStatus(fields[0], int(fields[1]), fields[3], fields[4])
+    if dialect is not None and status.dialect != dialect:
+        raise CameraError(f"Pico runs the {status.dialect} firmware, expected {dialect}")
+    return status
+
+
+def save_image(data, path, prefix='img'):
+    """Write `data` to `path`, or to a new timestamped file if `path` is a directory."""
+    if os.path.isdir(path):
+        return DirectorySink(path, fsync='never').write(timestamp_name(prefix), data)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+class PicoCamera:
+    """A warm serial session with a Pico running either firmware.
+
+    open() pays the boot/readiness wait once; capture() can then be called
+    any number of times on the same connection. It first pings the device
+    (0x18), so a board that is already up is ready at once; firmware that
+    does not answer pings (or probe=False) gets the boot waits instead.
+
+        with PicoCamera(dialect=CIRCUITPYTHON) as cam:
+            jpeg = cam.capture()
+            path = cam.capture("images/")
+    """
+
+    def __init__(self, port=None, dialect=ARDUINO, baud=115200, boot_wait=None,
+                 ready_timeout=60, idle_timeout=5, on_line=None, serial_class=serial.Serial, probe=True):
+        if dialect not in (ARDUINO, CIRCUITPYTHON):
+            raise ValueError(f"Unknown firmware dialect: {dialect}")
+        self.port = port
+        self.dialect = dialect
+        self.baud = baud
+        self.ready_timeout = ready_timeout
+        self.idle_timeout = idle_timeout  # Give up on a frame after this long without data
+        self.on_line = on_line
+        self.serial_class = serial_class
+        self.probe = probe
+        self.ser = None
+        self.status = None  # DeviceStatus from the last ping
+        self.last_header = None
+        self.last_dimensions = None  # (width, height) from the last JPEG's SOF
+        self.last_chunk_stats = None
+        self.resolution = None  # Active mode as last reported by the device
+        self.last_switch = None
+        self.preview_stream = None  # PreviewStream while a preview runs
+        self.roi = None  # Roi the device reported active, or None for the full frame
+        self.qscale = None  # JPEG quantization scale last set or reported, None if never asked
+        self.last_length = None  # 'ACK CMD Length' of the last frame (FIFO bytes, with padding)
+
+        if dialect == ARDUINO:
+            # The sketch prints nothing once booted, so cap the boot drain
+            self.boot_wait = 8 if boot_wait is None else boot_wait
+            self.transfer_timeout = 60
+        else:
+            self.boot_wait = None
+            self.transfer_timeout = 20
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def is_open(self):
+        return self.ser is not None and self.ser.is_open
+
+    def open(self):
+        if self.is_open:
+            return
+        port = self.port or find_pico_port()
+        if not port:
+            raise CameraError("Could not find Pico serial port. Is it plugged in?")
+        self.port = port
+        self.ser = self.serial_class(port, self.baud, timeout=1)
+        try:
+            if self.probe and self._probe():
+                return
+            if self.dialect == ARDUINO:
+                self._wait_boot()
+            else:
+                self._wait_ready()
+        except BaseException:
+            self.close()
+            raise
+
+    def _probe(self):
+        # Ping until the device reports ready. A board that is still booting
+        # answers 'initializing', or nothing until its firmware runs, and
+        # ends its boot with 'Camera Ready!'. Returns False if no ping is
+        # answered within PING_TIMEOUT (older firmware, or not running yet)
+        wait = self.boot_wait if self.dialect == ARDUINO else self.ready_timeout
+        deadline = time.monotonic() + wait
+        answered = False
+        while time.monotonic() < deadline:
+            self.ser.write(CMD_PING)
+            self.ser.flush()
+            line, _ = wait_for_line(self.ser, (STATUS_PREFIX, "Camera Ready!"),
+                                    timeout=PING_TIMEOUT, on_line=self.on_line)
+            if line is None:
+                if not answered:
+                    return False
+                continue
+            if STATUS_PREFIX not in line:
+                # Boot just finished; one more ping for the status, which
+                # firmware without the command never answers
+                status = self.ping()
+            else:
+                status = self._set_status(line)
+            if status is None or status.state == READY:
+                return True
+            answered = True
+            if status.state != INITIALIZING:
+                self.ser.write(CMD_REINIT)  # Diagnostics failed: run them again
+        raise CameraError(f"Pico still {self.status.state} after {wait}s")
+
+    def _set_status(self, line):
+        status = self.status = parse_status(line, self.dialect)
+        self.resolution = status.resolution
+        return status
+
+    def ping(self, timeout=PING_TIMEOUT):
+        """Ask the device for its status (0x18) without disturbing a capture session.
+
+        Returns a DeviceStatus, also kept in `status`, or None if there is
+        no answer within `timeout` seconds (firmware without the command).
+        """
+        if not self.is_open:
+            self.open()
+        self.ser.write(CMD_PING)
+        self.ser.flush()
+        line, _ = wait_for_line(self.ser, (STATUS_PREFIX,), timeout=timeout, on_line=self.on_line)
+        return None if line is None else self._set_status(line)
+
+    def _wait_boot(self):
+        # Drain boot chatter until 'Camera Ready!' or boot_wait seconds
+        wait_for_line(self.ser, ("Camera Ready!",), timeout=self.boot_wait, on_line=self.on_line)
+        self.ser.reset_input_buffer()
+
+    def _wait_ready(self):
+        # code.py prints 'Camera Ready!' once and then heartbeats every 5s;
+        # poke it with a re-init (0x11) after 15s of silence
+        self.ser.reset_input_buffer()
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            line, _ = wait_for_line(self.ser, READY_MARKERS, timeout=15, on_line=self.on_line)
+            if line:
+                return
+            self.ser.write(CMD_REINIT)
+        raise CameraError("Pico did not report ready")
+
+    def close(self):
+        if self.ser is not None and self.ser.is_open:
+            self.ser.close()
+        self.ser = None
+
+    def reinit(self):
+        self.roi = None  # The re-init resets the window
+        self.qscale = None  # and the quantization scale
+        self.ser.write(CMD_REINIT)
+        self.ser.flush()
+
+    def set_resolution(self, resolution=None):
+        """Switch the sensor mode without a full re-init, or query it if None.
+
+        `resolution` is an OV5642_* id from ArduCAM.h or a 'WxH' name. The
+        device writes only the registers that differ from the active mode.
+        Returns the active resolution id; the device's own report of the
+        switch ('4 writes in 5.9 ms') is kept in last_switch.
+        """
+        arg = '' if resolution is None else str(resolution_id(resolution))
+        if not self.is_open:
+            self.open()
+        self.ser.reset_input_buffer()
+        self.ser.write(CMD_RESOLUTION + f"{arg}\n".encode('ascii'))
+        self.ser.flush()
+        return self._read_resolution()
+
+    def _read_resolution(self):
+        switched = None
+
+        def on_line(text):
+            nonlocal switched
+            if SWITCHED_PREFIX in text:
+                switched = text.split(SWITCHED_PREFIX, 1)[1].replace("END", "").strip()
+            if self.on_line:
+                self.on_line(text)
+
+        # A fallback full re-init takes a couple of seconds
+        line, _ = wait_for_line(self.ser, (RESOLUTION_PREFIX, ERROR), timeout=10, on_line=on_line)
+        if line is None:
+            raise CameraError("Timed out waiting for resolution report")
+        if ERROR in line:
+            raise CameraError(f"Pico reported error: {line}")
+        self.resolution = int(line.split(RESOLUTION_PREFIX, 1)[1].split()[0])
+        self.roi = None  # Any switch drops the window
+        if switched is not None:
+            self.last_switch = switched
+        return self.resolution
+
+    def set_roi(self, x=None, y=None, width=None, height=None, align=True):
+        """Capture only a window of the 2592x1944 frame, or the full frame again with no arguments.
+
+        The rectangle is in full-frame pixels. With align=True it is widened
+        to the grid the sensor needs (see picocam.roi.align_roi); otherwise
+        an unaligned one raises ValueError. The device switches to
+        2592x1944 if needed. Captures through the window come back with the
+        ROI recorded in a JPEG comment (picocam.roi.roi_comment). Returns
+        the active Roi, or None.
+        """
+        roi = None
+        if x is not None:
+            roi = align_roi(x, y, width, height) if align else (x, y, width, height)
+            check_roi(roi)
+        if not self.is_open:
+            self.open()
+        self.ser.reset_input_buffer()
+        self.ser.write(roi_command(roi))
+        self.ser.flush()
+        line, _ = wait_for_line(self.ser, (ROI_PREFIX, ERROR), timeout=10, on_line=self.on_line)
+        if line is None:
+            raise CameraError("Timed out waiting for ROI report")
+        if ERROR in line:
+            raise CameraError(f"Pico reported error: {line}")
+        if roi is not None:
+            self.resolution = FULL_RESOLUTION
+        self.roi = parse_roi(line)
+        return self.roi
+
+    def set_qscale(self, qscale=None):
+        """Set the JPEG quantization scale (1-63, lower is finer), or query it if None.
+
+        Captures after a scale has been set or queried record it in a JPEG
+        comment (picocam.quality.qscale_comment). Returns the active scale.
+        """
+        if qscale is not None:
+            check_qscale(qscale)
+        if not self.is_open:
+            self.open()
+        self.ser.reset_input_buffer()
+        self.ser.write(qscale_command(qscale))
+        self.ser.flush()
+        line, _ = wait_for_line(self.ser, (QSCALE_PREFIX, ERROR), timeout=10, on_line=self.on_line)
+        if line is None:
+            raise CameraError("Timed out waiting for qscale report")
+        if ERROR in line:
+            raise CameraError(f"Pico reported error: {line}")
+        self.qscale = parse_qscale(line)
+        return self.qscale
+
+    def _tag(self, header, jpeg):
+        # Record the window a frame was taken through, and the scale it was
+        # compressed at, in the JPEG itself
+        if header.flags & FLAG_ROI and self.roi is not None:
+            jpeg = add_comment(jpeg, roi_comment(self.roi))
+        if self.qscale is not None:
+            jpeg = add_comment(jpeg, qscale_comment(self.qscale))
+        return jpeg
+
+    def calibrate_spi(self):
+        """Re-run the FIFO SPI clock calibration (CircuitPython only).
+
+        The device reads a fresh capture at increasing SPI clocks, keeps the
+        step below the fastest one that read it intact and stores it in NVM.
+        Returns the clock in Hz.
+        """
+        if self.dialect != CIRCUITPYTHON:
+            raise ValueError("SPI clock calibration needs the CircuitPython firmware")
+        if not self.is_open:
+            self.open()
+        self.ser.reset_input_buffer()
+        self.ser.write(CMD_CALIBRATE_SPI)
+        self.ser.flush()
+        line, _ = wait_for_line(self.ser, (SPI_CLOCK_PREFIX, ERROR), timeout=15, on_line=self.on_line)
+        if line is None:
+            raise CameraError("Timed out waiting for SPI calibration")
+        if ERROR in line:
+            raise CameraError(f"Pico reported error: {line}")
+        return int(line.split(SPI_CLOCK_PREFIX, 1)[1].split()[0])
+
+    def capture(self, path=None, chunked=False, resolution=None, retries=0):
+        """Take one picture.
+
+        Returns the JPEG as a memoryview, or writes it to `path` (a file or
+        a directory for a timestamped name) and returns the file path.
+
+        With chunked=True (CircuitPython only) the image is sent in
+        checksummed chunks and only damaged ones are transferred again.
+        `resolution` switches the sensor mode first if it is not active.
+        A frame that fails its checks (FrameError) is captured again up to
+        `retries` times.
+        """
+        if chunked and self.dialect != CIRCUITPYTHON:
+            raise ValueError("Chunked transfer needs the CircuitPython firmware")
+        if resolution is not None and resolution_id(resolution) != self.resolution:
+            self.set_resolution(resolution)
+        for attempt in range(retries + 1):
+            self.arm()
+            self.fire(CMD_CHUNKED if chunked else CMD_CAPTURE)
+            try:
+                jpeg = self.receive()
+                break
+            except FrameError:
+                if attempt == retries:
+                    raise
+        if path is None:
+            return jpeg
+        return save_image(jpeg, path)
+
+    def trigger(self):
+        """Send the capture command (0x10) without waiting for the image."""
+        self.arm()
+        return self.fire()
+
+    def arm(self):
+        if not self.is_open:
+            self.open()
+        self.ser.reset_input_buffer()  # Clear any heartbeats
+
+    def fire(self, command=CMD_CAPTURE):
+        """Write the capture command and return when it was sent (perf_counter)."""
+        self.ser.write(command)
+        self.ser.flush()
+        return time.perf_counter()
+
+    def receive(self):
+        """Receive the image for a trigger() and return the JPEG.
+
+        The payload is checked as a JPEG while it arrives (picocam.jpeg), so
+        a malformed frame raises JpegError, a FrameError, without waiting for
+        the rest; so does a transfer that stalls for idle_timeout seconds.
+        The rest of an abandoned frame is discarded before raising.
+        """
+        chunk_size = None
+        self.last_length = None
+
+        def on_line(text):
+            nonlocal chunk_size
+            chunk_size = parse_chunk_size(text) or chunk_size
+            self.last_length = parse_length(text) or self.last_length
+            if self.on_line:
+                self.on_line(text)
+
+        line, _ = wait_for_line(self.ser, (IMG_SIGNAL, ERROR), timeout=10, on_line=on_line)
+        if line is None:
+            raise CameraError("Timed out waiting for image signal")
+        if ERROR in line:
+            raise CameraError(f"Pico reported error: {line}")
+
+        validator = JpegValidator()
+        if chunk_size is None:
+            try:
+                header, payload = read_frame(self.ser, timeout=self.transfer_timeout, validator=validator,
+                                             idle_timeout=self.idle_timeout)
+            except FrameError:
+                discard_input(self.ser)
+                raise
+        else:
+            try:
+                raw = bytearray(HEADER_SIZE)
+                if read_exact(self.ser, memoryview(raw), self.transfer_timeout) < HEADER_SIZE:
+                    raise FrameError("Timed out reading frame header")
+                header = decode_header(raw)
+                if not header.flags & FLAG_CHUNKED:
+                    raise FrameError("Expected a chunked frame")
+                self.last_chunk_stats = {}
+                payload = receive_chunked(self.ser, header, chunk_size, timeout=self.transfer_timeout,
+                                          stats=self.last_chunk_stats)
+            except FrameError:
+                discard_input(self.ser)
+                raise
+        self.last_header = header
+        jpeg, validator = frame_jpeg(header, payload, validator)
+        self.last_dimensions = (validator.width, validator.height)
+        return self._tag(header, jpeg)
+
+    def preview(self, count=0, mjpeg=None):
+        """Start a live preview at 320x240 and return its PreviewStream of JPEGs.
+
+        `count` frames are sent, or until the preview is left with shoot()
+        or stop_preview(); `mjpeg` saves them as an MJPEG file (see
+        picocam.preview).
+        """
+        if self.preview_stream is not None:
+            self.stop_preview()
+        if not self.is_open:
+            self.open()
+        self.ser.reset_input_buffer()
+        self.preview_stream = PreviewStream(self.ser, count, mjpeg, frame_timeout=self.transfer_timeout,
+                                            idle_timeout=self.idle_timeout, on_line=self.on_line)
+        return self.preview_stream
+
+    def stop_preview(self):
+        """Leave the preview; returns the resolution id the sensor is back in."""
+        stream, self.preview_stream = self.preview_stream, None
+        if stream is not None:
+            stream.end()
+            self._read_resolution()
+        return self.resolution
+
+    def shoot(self, retries=0):
+        """Leave the preview with one capture in the mode it started from; returns the JPEG.
+
+        The device switches back and captures at once, without another
+        command round trip. Outside a preview this is capture().
+        """
+        stream, self.preview_stream = self.preview_stream, None
+        if stream is None:
+            return self.capture(retries=retries)
+        if stream.done:  # All `count` frames sent: the device is back in its command loop
+            self._read_resolution()
+            return self.capture(retries=retries)
+        stream.end(CMD_CAPTURE)
+        self._read_resolution()
+        try:
+            return self.receive()
+        except FrameError:
+            if not retries:
+                raise
+        return self.capture(retries=retries - 1)
+
+    def burst(self, count, on_frame, quality=None):
+        """Capture `count` frames back to back; see picocam.burst.receive_burst.
+
+        With `quality`, a picocam.quality.QualityController, each frame is
+        taken at the scale it chooses for its budget. The device takes no
+        commands during a 0x12 burst, so the frames are then single captures
+        (0x10) with the scale set in between, and count == 0 runs until
+        interrupted.
+        """
+        if quality is not None:
+            return self._quality_burst(count, on_frame, quality)
+        if not self.is_open:
+            self.open()
+        self.ser.reset_input_buffer()
+        return receive_burst(self.ser, count, lambda header, jpeg: on_frame(header, self._tag(header, jpeg)),
+                             frame_timeout=self.transfer_timeout, idle_timeout=self.idle_timeout,
+                             on_line=self.on_line)
+
+    def _quality_burst(self, count, on_frame, quality):
+        frames = errors = total = 0
+        intervals = []
+        resolutions = set()
+        start = last = time.monotonic()
+        while count == 0 or frames + errors < count:
+            try:
+                jpeg = quality.capture(self)
+            except (CameraError, FrameError):
+                # A failed frame, as in a 0x12 burst; the next one is still taken
+                # at the controller's scale
+                errors += 1
+                continue
+            now = time.monotonic()
+            intervals.append(now - last)
+            last = now
+            frames += 1
+            total += self.last_header.length
+            resolutions.add(self.last_header.resolution)
+            on_frame(self.last_header, jpeg)
+        return BurstStats(frames, errors, total, last - start, intervals, sorted(resolutions))
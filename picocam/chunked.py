@@ -0,0 +1,118 @@
+import struct
+import time
+import zlib
+
+from .frame import FrameError
+
+# Chunked transfer (CircuitPython firmware only). After the usual frame
+# header (with FLAG_CHUNKED set) the device sends the payload as records:
+#   magic 'PK', index u16, length u16, CRC32 of the data u32, data
+# and ends each round with a record of index CHUNK_END and length 0. The
+# host then writes CMD_RESEND followed by the missing indices as ASCII,
+# comma-separated and newline-terminated; the device re-reads just those
+# ranges from the FIFO. An empty list ends the transfer.
+CMD_CHUNKED = b'\x14'
+CMD_RESEND = b'\x15'
+CHUNKED_PREFIX = "ACK CMD Chunked:"
+FLAG_CHUNKED = 0x8000
+
+CHUNK_MAGIC = b'PK'
+CHUNK_END = 0xFFFF
+_RECORD = struct.Struct('<2sHHI')
+
+MAX_ROUNDS = 8
+
+
+def parse_chunk_size(text):
+    """Return N from an 'ACK CMD Chunked: N END' line, or None."""
+    if CHUNKED_PREFIX not in text:
+        return None
+    fields = text.split(CHUNKED_PREFIX, 1)[1].split()
+    try:
+        return int(fields[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def resend_command(indices):
+    return CMD_RESEND + ",".join(str(i) for i in indices).encode('ascii') + b"\n"
+
+
+def _read_round(ser, buf, chunk_size, missing, idle_timeout, deadline):
+    """Parse one round of chunk records into `buf`, removing them from `missing`.
+
+    Records are found by their magic, so a dropped or corrupted byte costs
+    only the chunks it touches: anything that fails the index, length or
+    CRC checks is skipped one byte at a time until the next valid record.
+    """
+    view = memoryview(buf)
+    total = len(buf)
+    pending = bytearray()
+    last_data = time.monotonic()
+
+    while time.monotonic() < deadline:
+        data = ser.read(max(ser.in_waiting, 1))
+        if data:
+            pending += data
+            last_data = time.monotonic()
+        elif time.monotonic() - last_data > idle_timeout:
+            return  # The end marker was lost; whatever is missing gets resent
+
+        while True:
+            at = pending.find(CHUNK_MAGIC)
+            if at == -1:
+                del pending[:max(len(pending) - 1, 0)]
+                break
+            if len(pending) - at < _RECORD.size:
+                del pending[:at]
+                break
+            _, index, length, crc = _RECORD.unpack_from(pending, at)
+            if index == CHUNK_END and length == 0:
+                return
+            start = index * chunk_size
+            if index not in missing or length != min(chunk_size, total - start):
+                del pending[:at + 1]
+                continue
+            end = at + _RECORD.size + length
+            if len(pending) < end:
+                del pending[:at]
+                break
+            chunk = pending[at + _RECORD.size:end]
+            if zlib.crc32(chunk) != crc:
+                del pending[:at + 1]
+                continue
+            view[start:start + length] = chunk
+            missing.discard(index)
+            del pending[:end]
+    raise FrameError("Timed out during chunked transfer")
+
+
+def receive_chunked(ser, header, chunk_size, timeout=60, idle_timeout=1.0,
+                    max_rounds=MAX_ROUNDS, stats=None):
+    """Receive a chunked payload, asking only for bad or missing chunks again.
+
+    `header` is the decoded frame header and `chunk_size` comes from the
+    'ACK CMD Chunked' line. Returns the payload as a memoryview; `stats`, if
+    given, is a dict that receives 'rounds' and 'resent' counts.
+    """
+    count = -(-header.length // chunk_size)
+    buf = bytearray(header.length)
+    missing = set(range(count))
+    deadline = time.monotonic() + timeout
+    resent = 0
+
+    for rounds in range(1, max_rounds + 1):
+        _read_round(ser, buf, chunk_size, missing, idle_timeout, deadline)
+        if not missing or rounds == max_rounds:
+            ser.write(resend_command(()))  # Done: the device resets its FIFO
+            ser.flush()
+            break
+        ser.write(resend_command(sorted(missing)))
+        ser.flush()
+        resent += len(missing)
+    if stats is not None:
+        stats['rounds'] = rounds
+        stats['resent'] = resent
+    if missing:
+        raise FrameError(f"{len(missing)} of {count} chunks still missing after {max_rounds} rounds")
+    return memoryview(buf)
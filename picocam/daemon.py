@@ -0,0 +1,257 @@
+"""Capture daemon: one process owns the serial link and serves frames.
+
+    uv run python -m picocam.daemon --dialect circuitpython --http 8765
+    curl -o shot.jpg localhost:8765/capture
+    curl -o last.jpg localhost:8765/latest
+    curl localhost:8765/status
+
+With --unix PATH the same endpoints are served over a Unix socket instead
+(curl --unix-socket PATH http://pico/capture).
+"""
+import argparse
+import errno
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .camera import ARDUINO, CIRCUITPYTHON, PicoCamera
+
+CachedFrame = namedtuple('CachedFrame', 'sequence timestamp resolution jpeg')
+
+
+class FrameCache:
+    """Recent frames in memory, evicting the oldest past a byte or count limit."""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_frames=16):
+        self.max_bytes = max_bytes
+        self.max_frames = max_frames
+        self.frames = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def add(self, frame):
+        with self.lock:
+            # The device restarts its sequence at 1 after a reset: a repeated
+            # number replaces the old frame and becomes the newest
+            old = self.frames.pop(frame.sequence, None)
+            if old is not None:
+                self.bytes -= len(old.jpeg)
+            self.frames[frame.sequence] = frame
+            self.bytes += len(frame.jpeg)
+            # Always keep the newest frame, even if it alone exceeds the limit
+            while len(self.frames) > 1 and (self.bytes > self.max_bytes
+                                            or len(self.frames) > self.max_frames):
+                _, old = self.frames.popitem(last=False)
+                self.bytes -= len(old.jpeg)
+        return frame
+
+    def latest(self):
+        with self.lock:
+            if not self.frames:
+                return None
+            return next(reversed(self.frames.values()))
+
+    def get(self, sequence):
+        with self.lock:
+            return self.frames.get(sequence)
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.frame = None
+        self.error = None
+
+
+class CaptureService:
+    """Serializes access to a PicoCamera and coalesces concurrent captures.
+
+    A capture() call that arrives while another is in flight waits for that
+    transfer and shares its frame instead of queueing a new one.
+    """
+
+    def __init__(self, camera, cache=None):
+        self.camera = camera
+        self.cache = cache if cache is not None else FrameCache()
+        self.lock = threading.Lock()
+        self.flight = None
+        self.started = time.time()
+        self.captures = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_error = None
+
+    def capture(self):
+        with self.lock:
+            flight = self.flight
+            leader = flight is None
+            if leader:
+                flight = self.flight = _Flight()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                jpeg = bytes(self.camera.capture())
+                header = self.camera.last_header
+                frame = CachedFrame(header.sequence, time.time(), header.resolution, jpeg)
+                flight.frame = self.cache.add(frame)
+                self.captures += 1
+            except Exception as e:
+                flight.error = e
+                self.errors += 1
+                self.last_error = str(e)
+            finally:
+                with self.lock:
+                    self.flight = None
+                flight.done.set()
+
+        flight.done.wait()
+        if flight.error:
+            raise flight.error
+        return flight.frame
+
+    def latest(self):
+        return self.cache.latest()
+
+    def status(self):
+        latest = self.cache.latest()
+        return {
+            'port': self.camera.port,
+            'dialect': self.camera.dialect,
+            'connected': self.camera.is_open,
+            'busy': self.flight is not None,
+            'uptime': round(time.time() - self.started, 1),
+            'captures': self.captures,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'cached_frames': len(self.cache),
+            'cached_bytes': self.cache.bytes,
+            'latest_sequence': latest.sequence if latest else None,
+            'latest_timestamp': latest.timestamp if latest else None,
+        }
+
+
+class CaptureHandler(BaseHTTPRequestHandler):
+    service = None  # Set on the subclass created by make_server()
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if path == '/capture':
+            try:
+                self._send_frame(self.service.capture())
+            except Exception as e:
+                self._send_json({'error': str(e)}, status=503)
+        elif path == '/latest':
+            frame = self.service.latest()
+            if frame is None:
+                self._send_json({'error': 'no frame captured yet'}, status=404)
+            else:
+                self._send_frame(frame)
+        elif path == '/status':
+            self._send_json(self.service.status())
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    do_POST = do_GET
+
+    def _send_frame(self, frame):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(frame.jpeg)))
+        self.send_header('X-Frame-Sequence', str(frame.sequence))
+        self.send_header('X-Frame-Timestamp', f"{frame.timestamp:.3f}")
+        self.send_header('X-Frame-Resolution', str(frame.resolution))
+        self.end_headers()
+        self.wfile.write(frame.jpeg)
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'unix'
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def remove_stale_socket(path):
+    """Remove a Unix socket left at `path` by a daemon that did not shut down cleanly.
+
+    Anything else there, or a socket a running daemon still accepts
+    connections on, raises OSError and is left in place.
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "Not a socket, refusing to replace it", path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise OSError(errno.EADDRINUSE, "Another process is serving on this socket", path)
+
+
+def make_server(service, http_port=None, unix_path=None, host='127.0.0.1'):
+    handler = type('BoundCaptureHandler', (CaptureHandler,), {'service': service})
+    if unix_path:
+        remove_stale_socket(unix_path)
+        return ThreadingUnixHTTPServer(unix_path, handler)
+    return ThreadingHTTPServer((host, http_port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Pico camera frames over HTTP or a Unix socket.")
+    parser.add_argument('--serial', help="Serial port (auto-detected if omitted)")
+    parser.add_argument('--dialect', choices=(ARDUINO, CIRCUITPYTHON), default=CIRCUITPYTHON)
+    parser.add_argument('--http', type=int, default=8765, help="Localhost HTTP port")
+    parser.add_argument('--unix', help="Serve on this Unix socket path instead of HTTP")
+    parser.add_argument('--cache-mb', type=float, default=32, help="Frame cache size limit")
+    parser.add_argument('--cache-frames', type=int, default=16, help="Frame cache count limit")
+    args = parser.parse_args()
+
+    camera = PicoCamera(args.serial, args.dialect)
+    cache = FrameCache(int(args.cache_mb * 1024 * 1024), args.cache_frames)
+    service = CaptureService(camera, cache)
+
+    print(f"Connecting to Pico ({args.dialect})...")
+    camera.open()
+    server = make_server(service, args.http, args.unix)
+    where = args.unix or f"http://127.0.0.1:{args.http}"
+    print(f"Serving /capture, /latest and /status on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        camera.close()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,589 @@
+"""Software Pico: a pty that speaks the Arduino or CircuitPython firmware dialect.
+
+    uv run python -m picocam.emulator --dialect circuitpython --rate 500000
+    Emulating circuitpython Pico on /dev/pts/7
+
+Point either capture script (or PicoCamera) at the printed port. Frames are
+the sample JPEGs in images/, sent with the same text lines, binary frames
+and burst handling as pico_ov5642.ino and circuitpython/code.py. Link speed,
+jitter and fault injection are configurable.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import select
+import struct
+import time
+import tty
+import zlib
+from fractions import Fraction
+
+from .camera import ARDUINO, CIRCUITPYTHON, INITIALIZING, READY
+from .chunked import CHUNK_END, CHUNK_MAGIC, FLAG_CHUNKED
+from .frame import encode_frame, encode_header
+from .jpeg import SOF_MARKERS, JpegError, validate_jpeg
+from .quality import QSCALE_DEFAULT, QSCALE_MAX, QSCALE_MIN, size_ratio
+from .regs import RESOLUTIONS, load_tables, resolution_delta, switch_time
+from .roi import FLAG_ROI, SENSOR_HEIGHT, SENSOR_WIDTH, check_roi, window_writes
+from .transform import STANDARD, TRANSFORM_NAMES, apply
+
+DEFAULT_IMAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'images')
+WRITE_CHUNK = 4096
+HEARTBEAT_INTERVAL = 5.0
+CHUNKED_SIZE = 4096
+PREVIEW_RESOLUTION = 0  # 320x240
+FULL_RESOLUTION = 6  # 2592x1944, the mode a region of interest is cut from
+FIRMWARE_VERSION = "0.1.0"  # Reported by 0x18
+_RECORD = struct.Struct('<2sHHI')
+
+
+def load_images(directory=DEFAULT_IMAGE_DIR):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith('.jpg'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                images.append(f.read())
+    return images
+
+
+def windowed_image(jpeg, width, height):
+    """Stand-in for a width x height window of a full-frame JPEG.
+
+    Keeps the headers with the SOF size set to the window and cuts the
+    entropy-coded data in proportion to the area, as for an evenly
+    detailed scene. The result passes JpegValidator but does not decode
+    to the window's pixels.
+    """
+    info = validate_jpeg(jpeg)
+    return resized_scan(jpeg, Fraction(width * height, info.width * info.height), (width, height))
+
+
+def scaled_image(jpeg, qscale):
+    """Stand-in for `jpeg` (taken at QSCALE_DEFAULT) compressed at `qscale`.
+
+    The entropy-coded data is cut, or repeated, to the size
+    picocam.quality.size_ratio() models. Like windowed_image(), the result
+    passes JpegValidator but does not decode to the same picture.
+    """
+    return resized_scan(jpeg, size_ratio(qscale))
+
+
+def resized_scan(jpeg, ratio, size=None):
+    # Headers (with the SOF set to `size`, a (width, height) pair, if given),
+    # then `ratio` times the entropy-coded data, then EOI
+    info = validate_jpeg(jpeg)
+    sof = next(i for i in range(len(jpeg) - 1)
+               if jpeg[i] == 0xFF and jpeg[i + 1] in SOF_MARKERS)
+    sos = jpeg.index(b'\xff\xda')
+    scan = sos + 2 + int.from_bytes(jpeg[sos + 2:sos + 4], 'big')
+    out = bytearray(jpeg[:scan])
+    if size is not None:
+        out[sof + 5:sof + 9] = struct.pack('>HH', size[1], size[0])
+    data = jpeg[scan:info.end - 2]
+    data = (data * math.ceil(ratio))[:max(int(len(data) * ratio), 1)]
+    end = len(data)
+    while data[end - 1] == 0xFF:  # Do not split a stuffed byte or marker
+        end -= 1
+    return bytes(out + data[:end] + b'\xff\xd9')
+
+
+class Faults:
+    """Per-frame fault probabilities for the emulated link.
+
+    corrupt  flip one payload byte after the CRC is computed
+    drop     lose a run of bytes mid-frame (the host sees a short frame)
+    stall    pause the link for `stall_time` seconds mid-frame
+    timeout  report a capture timeout instead of sending a frame
+
+    block_error flips a byte in each 4 KB block with that probability, so
+    large frames are hit more often, as on a noisy link. Unlike the per-frame
+    faults it also applies to chunked transfers.
+    """
+
+    def __init__(self, corrupt=0.0, drop=0.0, stall=0.0, timeout=0.0, stall_time=2.0,
+                 block_error=0.0):
+        self.corrupt = corrupt
+        self.drop = drop
+        self.stall = stall
+        self.timeout = timeout
+        self.stall_time = stall_time
+        self.block_error = block_error
+
+
+class PicoEmulator:
+    """Serve one emulated Pico on the master side of a pty pair.
+
+    `port` is the slave device path for pyserial; `fd` is an open slave file
+    descriptor for in-process users such as AsyncPicoCamera.
+    """
+
+    def __init__(self, dialect=CIRCUITPYTHON, images=None, rate=None, jitter=0.0,
+                 faults=None, boot_delay=0.0, resolution=6, seed=None, transform=STANDARD,
+                 capture_time=0.0):
+        if dialect not in (ARDUINO, CIRCUITPYTHON):
+            raise ValueError(f"Unknown firmware dialect: {dialect}")
+        self.dialect = dialect
+        self.images = images or load_images()
+        self.rate = rate
+        self.jitter = jitter
+        self.faults = faults or Faults()
+        self.boot_delay = boot_delay
+        self.capture_time = capture_time  # Trigger to capture done, as the sensor's frame time
+        self.resolution = resolution
+        self.transform = transform  # Wiring fault applied to CircuitPython payloads
+        self.random = random.Random(seed)
+        self.sequence = 0
+        self.image_index = 0
+        self.pending = bytearray()
+        self.chunked = None  # Payload held "in the FIFO" during a chunked transfer
+        self.tables = None  # Parsed lazily on the first 0x16
+        self.spi_clock = 20000000  # Reported by 0x17
+        self.state = INITIALIZING  # Reported by 0x18
+        self.roi = None  # Set by 0x1A
+        self.roi_images = None  # Frames while the window is active
+        self.qscale = QSCALE_DEFAULT  # Set by 0x1B; frames are resized to match
+        self.process = None
+
+        self.master, self.fd = os.openpty()
+        tty.setraw(self.fd)
+        self.port = os.ttyname(self.fd)
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Serve from a child process so the emulator's CPU is not the host's."""
+        ctx = multiprocessing.get_context('fork')
+        self.process = ctx.Process(target=self.serve_forever, daemon=True)
+        self.process.start()
+        os.close(self.master)
+        return self
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def serve_forever(self):
+        try:
+            self.wait_boot()
+            self.boot()
+            self.state = READY
+            last_heartbeat = time.monotonic()
+            while True:
+                ready, _, _ = select.select([self.master], [], [], 0.5)
+                if ready:
+                    self.pending += os.read(self.master, 1024)
+                    self.dispatch()
+                if (self.dialect == CIRCUITPYTHON
+                        and time.monotonic() - last_heartbeat > HEARTBEAT_INTERVAL):
+                    self.line("ACK CMD Heartbeat... END")
+                    last_heartbeat = time.monotonic()
+        except (OSError, SystemExit):
+            pass  # Host closed the pty, or a CircuitPython 'STOP'
+
+    def wait_boot(self):
+        # Both firmwares answer status pings while they initialize; other
+        # commands wait until boot is done
+        end = time.monotonic() + self.boot_delay
+        while time.monotonic() < end:
+            ready, _, _ = select.select([self.master], [], [], max(end - time.monotonic(), 0))
+            if ready:
+                data = os.read(self.master, 1024)
+                for _ in range(data.count(0x18)):
+                    self.status()
+                self.pending += data.replace(b'\x18', b'')
+
+    # --- Link ---
+
+    def send(self, data):
+        view = memoryview(data)
+        start = time.monotonic()
+        sent = 0
+        while view:
+            n = os.write(self.master, view[:WRITE_CHUNK])
+            view = view[n:]
+            sent += n
+            if self.rate:
+                ahead = start + sent / self.rate - time.monotonic()
+                if self.jitter:
+                    ahead += abs(self.random.gauss(0, self.jitter))
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    def line(self, text):
+        self.send(text.encode() + b"\n")
+
+    # --- Commands ---
+
+    def dispatch(self):
+        while self.pending:
+            cmd = self.pending[0]
+            if cmd == 0x15 and self.dialect == CIRCUITPYTHON:
+                end = self.pending.find(b"\n")
+                if end == -1:
+                    return
+                arg = bytes(self.pending[1:end]).decode('ascii', errors='ignore')
+                del self.pending[:end + 1]
+                self.resend([int(i) for i in arg.split(",") if i.strip().isdigit()])
+                continue
+            if cmd == 0x16:
+                end = self.pending.find(b"\n")
+                if end == -1:
+                    return
+                arg = bytes(self.pending[1:end]).decode('ascii', errors='ignore').strip()
+                del self.pending[:end + 1]
+                self.set_resolution(arg)
+                continue
+            if cmd == 0x1A:
+                end = self.pending.find(b"\n")
+                if end == -1:
+                    return
+                arg = bytes(self.pending[1:end]).decode('ascii', errors='ignore').strip()
+                del self.pending[:end + 1]
+                self.set_roi(arg)
+                continue
+            if cmd == 0x1B:
+                end = self.pending.find(b"\n")
+                if end == -1:
+                    return
+                arg = bytes(self.pending[1:end]).decode('ascii', errors='ignore').strip()
+                del self.pending[:end + 1]
+                self.set_qscale(arg)
+                continue
+            if cmd == 0x19:
+                end = self.pending.find(b"\n")
+                if end == -1:
+                    return
+                arg = bytes(self.pending[1:end]).strip()
+                del self.pending[:end + 1]
+                self.preview(int(arg) if arg.isdigit() else 0)
+                continue
+            if cmd == 0x12:
+                end = self.pending.find(b"\n")
+                if end == -1:
+                    return  # Wait for the rest of the argument
+                arg = bytes(self.pending[1:end]).strip()
+                del self.pending[:end + 1]
+                if arg.isdigit() or not arg:
+                    count = int(arg or 0)
+                else:
+                    # String.toInt() yields 0 in the sketch; code.py falls back to 1
+                    count = 0 if self.dialect == ARDUINO else 1
+                self.burst(count)
+                continue
+            if self.dialect == CIRCUITPYTHON and self.pending.upper().startswith(b"STOP"):
+                raise SystemExit
+            del self.pending[0]
+            if cmd == 0x10:
+                self.capture()
+            elif cmd == 0x11:
+                self.reinit()
+            elif cmd == 0x14 and self.dialect == CIRCUITPYTHON:
+                self.capture_chunked()
+            elif cmd == 0x18:
+                self.status()
+            elif cmd == 0x17 and self.dialect == CIRCUITPYTHON:
+                self.line("ACK CMD Calibrating SPI Clock... END")
+                self.line(f"ACK CMD SPI Clock: {self.spi_clock} Hz (fastest good {self.spi_clock} Hz, 0 ms) END")
+            elif self.dialect == ARDUINO:
+                self.line(f"ACK CMD Received unknown byte: 0x{cmd:X} END")
+
+    def status(self):
+        self.line(f"ACK CMD Status: {self.state} {self.resolution} {RESOLUTIONS[self.resolution]} "
+                  f"{self.dialect} {FIRMWARE_VERSION} END")
+
+    def boot(self):
+        if self.dialect == ARDUINO:
+            self.send(b"\n\n")
+            for text in ("ACK CMD --- ArduCAM Boot Start --- END",
+                         "ACK CMD SPI interface OK. END",
+                         "ACK CMD CPLD Revision: 0x73 END",
+                         "ACK CMD OV5642 detected. END",
+                         "ACK CMD Camera Ready! END"):
+                self.line(text)
+        else:
+            self.line("--- Pico Booting ---")
+            self.line("ACK CMD Booting System... END")
+            self.line("")
+            self.diagnostics()
+            self.line("")
+            self.line("CircuitPython Waiting for command...")
+
+    def diagnostics(self):
+        self.line("")
+        self.line("--- Hardware Diagnostics ---")
+        self.line("ACK CMD Starting Initializer... END")
+        self.line("SPI Interface OK")
+        self.line("OV5642 detected")
+        self.line("ACK CMD Sensor Initialized. END")
+        self.line("ACK CMD CPLD Revision: 0x73 END")
+        self.line("ACK CMD ID: VID=0x56, PID=0x42 END")
+        self.line("ACK CMD Syncing Hardware (Safe-Sweep 16)... END")
+        self.line("ACK CMD Camera Ready! END")
+
+    def reinit(self):
+        self.roi = None
+        self.qscale = QSCALE_DEFAULT
+        if self.dialect == ARDUINO:
+            self.line("ACK CMD Re-initializing Camera... END")
+            self.line("ACK CMD Re-init Done. END")
+        else:
+            self.diagnostics()
+
+    def set_roi(self, arg):
+        # Sleeps for the window writes and the settle delay after them
+        if arg:
+            try:
+                roi = tuple(int(v) for v in arg.split(","))
+                check_roi(roi)
+            except ValueError:
+                self.line(f"ACK CMD ERROR: Bad ROI {arg} END")
+                return
+            if self.resolution != FULL_RESOLUTION:
+                self.set_resolution(str(FULL_RESOLUTION), report=False)
+            time.sleep(switch_time(len(window_writes(roi))) + 0.1)
+            self.roi = roi
+            self.roi_images = [windowed_image(jpeg, roi[2], roi[3]) for jpeg in self.sized_images(FULL_RESOLUTION)]
+        elif self.roi:
+            time.sleep(switch_time(len(window_writes((0, 0, SENSOR_WIDTH, SENSOR_HEIGHT)))) + 0.1)
+            self.roi = None
+        self.line(f"ACK CMD ROI: {','.join(str(v) for v in self.roi) if self.roi else 'off'} END")
+
+    def set_qscale(self, arg):
+        if arg:
+            if not arg.isdigit() or not QSCALE_MIN <= int(arg) <= QSCALE_MAX:
+                self.line(f"ACK CMD ERROR: Bad qscale {arg} END")
+                return
+            time.sleep(switch_time(1))
+            self.qscale = int(arg)
+        self.line(f"ACK CMD QScale: {self.qscale} END")
+
+    def set_resolution(self, arg, report=True):
+        # Sleeps for the modelled I2C time of the same delta the firmware writes
+        if arg:
+            if not arg.isdigit() or int(arg) not in RESOLUTIONS:
+                self.line(f"ACK CMD ERROR: Unknown resolution {arg} END")
+                return
+            target = int(arg)
+            self.roi = None
+            if self.tables is None:
+                self.tables = load_tables()
+            delta = resolution_delta(self.tables, self.resolution, target)
+            elapsed = switch_time(None if delta is None else len(delta), self.tables)
+            time.sleep(elapsed)
+            self.resolution = target
+            done = "full re-init" if delta is None else f"{len(delta)} writes"
+            self.line(f"ACK CMD Switched: {done} in {elapsed * 1000:.1f} ms END")
+        if report:
+            self.line(f"ACK CMD Resolution: {self.resolution} {RESOLUTIONS[self.resolution]} END")
+
+    def sized_images(self, resolution):
+        """Sample images whose SOF matches `resolution`, else the smallest or largest one."""
+        name = RESOLUTIONS[resolution]
+        matching = []
+        for jpeg in self.images:
+            try:
+                info = validate_jpeg(jpeg)
+            except JpegError:
+                continue
+            if f"{info.width}x{info.height}" == name:
+                matching.append(jpeg)
+        if matching:
+            return matching
+        return [min(self.images, key=len) if resolution == PREVIEW_RESOLUTION else max(self.images, key=len)]
+
+    def next_image(self, images=None):
+        images = images or self.images
+        jpeg = images[self.image_index % len(images)]
+        self.image_index += 1
+        if self.qscale != QSCALE_DEFAULT:
+            jpeg = scaled_image(jpeg, self.qscale)
+        # The FIFO length includes a few bytes of padding after EOI
+        return jpeg + bytes(self.random.randrange(1, 8))
+
+    def capture(self, images=None):
+        self.line("ACK CMD Capture Started... END")
+        time.sleep(self.capture_time)
+        if self.random.random() < self.faults.timeout:
+            if self.dialect == ARDUINO:
+                self.line("ACK CMD ERROR: Capture Timeout END")
+            else:
+                self.line("ACK CMD ERROR: Timeout END")
+            return
+
+        self.line("ACK CMD Capture Done. END")
+        if images is None and self.roi:
+            images = self.roi_images
+        payload = self.next_image(images)
+        self.line(f"ACK CMD Length: {len(payload)} END")
+        transform = STANDARD
+        if self.dialect == CIRCUITPYTHON:
+            transform = self.transform
+            payload = apply(payload, transform)
+            self.line(f"ACK CMD Header found: {TRANSFORM_NAMES[transform]} at 0 END")
+        self.send(b"ACK IMG END\n")
+
+        self.sequence += 1
+        flags = transform | (FLAG_ROI if self.roi else 0)
+        frame = bytearray(encode_frame(payload, self.resolution, self.sequence, flags))
+        self.send_frame(frame)
+        if self.dialect == CIRCUITPYTHON:
+            self.line("ACK CMD Stream Finished. END")
+
+    def damage(self, data, start=0):
+        """Flip one byte in each 4 KB block of `data` hit by faults.block_error."""
+        if self.faults.block_error:
+            for block in range(start, len(data), WRITE_CHUNK):
+                if self.random.random() < self.faults.block_error:
+                    data[self.random.randrange(block, min(block + WRITE_CHUNK, len(data)))] ^= 0xFF
+        return data
+
+    def capture_chunked(self):
+        self.line("ACK CMD Capture Started... END")
+        time.sleep(self.capture_time)
+        self.line("ACK CMD Capture Done. END")
+        payload = apply(self.next_image(self.roi_images if self.roi else None), self.transform)
+        self.line(f"ACK CMD Length: {len(payload)} END")
+        self.line(f"ACK CMD Header found: {TRANSFORM_NAMES[self.transform]} at 0 END")
+        self.line(f"ACK CMD Chunked: {CHUNKED_SIZE} END")
+        self.send(b"ACK IMG END\n")
+
+        self.sequence += 1
+        self.send(encode_header(len(payload), self.resolution, self.sequence,
+                                FLAG_CHUNKED | self.transform | (FLAG_ROI if self.roi else 0)))
+        self.chunked = payload
+        self.send_chunks(range(-(-len(payload) // CHUNKED_SIZE)))
+
+    def send_chunks(self, indices):
+        payload = self.chunked
+        for idx in indices:
+            data = payload[idx * CHUNKED_SIZE:(idx + 1) * CHUNKED_SIZE]
+            record = bytearray(_RECORD.pack(CHUNK_MAGIC, idx, len(data), zlib.crc32(data)))
+            record += data
+            self.send(self.damage(record, _RECORD.size))
+        self.send(_RECORD.pack(CHUNK_MAGIC, CHUNK_END, 0, 0))
+
+    def resend(self, indices):
+        if self.chunked is None:
+            return
+        count = -(-len(self.chunked) // CHUNKED_SIZE)
+        indices = sorted(i for i in indices if i < count)
+        if indices:
+            self.send_chunks(indices)
+            return
+        self.chunked = None  # reset_fifo()
+        self.line("ACK CMD Stream Finished. END")
+
+    def send_frame(self, frame):
+        faults = self.faults
+        self.damage(frame, 20)
+        if self.random.random() < faults.corrupt:
+            frame[self.random.randrange(20, len(frame) - 4)] ^= 0xFF
+        if self.random.random() < faults.drop:
+            at = self.random.randrange(20, len(frame))
+            del frame[at:at + self.random.randrange(1, 512)]
+        if self.random.random() < faults.stall:
+            at = self.random.randrange(20, len(frame))
+            self.send(frame[:at])
+            time.sleep(faults.stall_time)
+            self.send(frame[at:])
+            return
+        self.send(frame)
+
+    def stop_requested(self):
+        ready, _, _ = select.select([self.master], [], [], 0)
+        if ready:
+            self.pending += os.read(self.master, 1024)
+        if 0x13 in self.pending:
+            del self.pending[:self.pending.index(0x13) + 1]
+            return True
+        return False
+
+    def preview_command(self):
+        # 0x10 (leave and capture) wins over 0x13 (leave); other input is kept
+        ready, _, _ = select.select([self.master], [], [], 0)
+        if ready:
+            self.pending += os.read(self.master, 1024)
+        found = None
+        for cmd in (0x13, 0x10):
+            if cmd in self.pending:
+                self.pending.remove(cmd)
+                found = cmd
+        return found
+
+    def preview(self, count):
+        # Preview frames are the QVGA samples, and the capture that ends a
+        # preview one at the resolution it returns to
+        full = self.resolution
+        if full != PREVIEW_RESOLUTION:
+            self.set_resolution(str(PREVIEW_RESOLUTION), report=False)
+        self.line(f"ACK CMD Preview Started: {count} frames END")
+        frames = self.sized_images(PREVIEW_RESOLUTION)
+        n = 0
+        cmd = None
+        while count == 0 or n < count:
+            self.capture(frames)
+            n += 1
+            cmd = self.preview_command()
+            if cmd:
+                break
+        self.line(f"ACK CMD Preview Done: {n} frames END")
+        if full != PREVIEW_RESOLUTION:
+            self.set_resolution(str(full), report=False)
+        self.line(f"ACK CMD Resolution: {self.resolution} {RESOLUTIONS[self.resolution]} END")
+        if cmd == 0x10:
+            self.capture(self.sized_images(full))
+
+    def burst(self, count):
+        self.line(f"ACK CMD Burst Started: {count} frames END")
+        n = 0
+        while count == 0 or n < count:
+            self.capture()
+            n += 1
+            if self.stop_requested():
+                break
+        self.line(f"ACK CMD Burst Done: {n} frames END")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate a Pico camera on a pseudo-terminal.")
+    parser.add_argument('--dialect', choices=(ARDUINO, CIRCUITPYTHON), default=CIRCUITPYTHON)
+    parser.add_argument('--images', default=DEFAULT_IMAGE_DIR, help="Directory of JPEGs to stream")
+    parser.add_argument('--rate', type=float, help="Link speed in bytes/s (default: unthrottled)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Per-chunk delay jitter (s)")
+    parser.add_argument('--boot-delay', type=float, default=0.0)
+    parser.add_argument('--capture-time', type=float, default=0.0, help="Seconds from trigger to capture done")
+    parser.add_argument('--corrupt', type=float, default=0.0, help="Probability of a flipped byte per frame")
+    parser.add_argument('--drop', type=float, default=0.0, help="Probability of lost bytes per frame")
+    parser.add_argument('--stall', type=float, default=0.0, help="Probability of a mid-frame stall")
+    parser.add_argument('--timeout', type=float, default=0.0, help="Probability of a capture timeout")
+    parser.add_argument('--block-error', type=float, default=0.0,
+                        help="Probability of a flipped byte per 4 KB block")
+    parser.add_argument('--transform', choices=TRANSFORM_NAMES, default=TRANSFORM_NAMES[STANDARD],
+                        help="Wiring fault the CircuitPython dialect reports and applies")
+    args = parser.parse_args()
+
+    faults = Faults(args.corrupt, args.drop, args.stall, args.timeout,
+                    block_error=args.block_error)
+    emu = PicoEmulator(args.dialect, load_images(args.images), args.rate, args.jitter,
+                       faults, args.boot_delay, transform=TRANSFORM_NAMES.index(args.transform),
+                       capture_time=args.capture_time)
+    print(f"Emulating {args.dialect} Pico on {emu.port}", flush=True)
+    try:
+        emu.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Capture from every connected Pico at once.
+
+    uv run python -m picocam.fleet --dialect circuitpython --rounds 3
+
+Each camera is identified by its USB serial number and keeps its own warm
+PicoCamera session. A capture round arms every camera, releases one worker
+thread per camera from a shared barrier so the 0x10 triggers go out as
+close together as possible, and receives all images in parallel.
+"""
+import argparse
+import os
+import threading
+import time
+from collections import namedtuple
+
+from .camera import ARDUINO, CIRCUITPYTHON, PicoCamera, find_pico_ports
+from .sink import BackgroundWriter
+
+RoundResult = namedtuple('RoundResult', 'frames errors trigger_times skew elapsed bytes')
+
+
+def camera_id(port_info):
+    return port_info.serial_number or os.path.basename(port_info.device)
+
+
+class Fleet:
+    """One PicoCamera per connected board, keyed by USB serial number."""
+
+    def __init__(self, dialect=CIRCUITPYTHON, ports=None, **camera_kwargs):
+        if ports is None:
+            ports = {camera_id(p): p.device for p in find_pico_ports()}
+        self.cameras = {cid: PicoCamera(dev, dialect, **camera_kwargs)
+                        for cid, dev in sorted(ports.items())}
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        # Boot/readiness waits are independent, so pay them in parallel
+        errors = self._parallel(lambda cid, cam: cam.open())
+        if errors:
+            self.close()
+            raise next(iter(errors.values()))
+
+    def close(self):
+        for cam in self.cameras.values():
+            cam.close()
+
+    def _parallel(self, fn):
+        errors = {}
+
+        def run(cid, cam):
+            try:
+                fn(cid, cam)
+            except Exception as e:
+                errors[cid] = e
+
+        threads = [threading.Thread(target=run, args=item) for item in self.cameras.items()]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return errors
+
+    def capture_round(self):
+        """Trigger every camera together and receive all images in parallel."""
+        barrier = threading.Barrier(len(self.cameras))
+        frames, trigger_times = {}, {}
+
+        def shoot(cid, cam):
+            try:
+                cam.arm()
+            except Exception:
+                barrier.abort()  # Never leave the other workers stuck waiting
+                raise
+            try:
+                barrier.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass  # Another camera failed to arm; fire this one anyway
+            trigger_times[cid] = cam.fire()
+            frames[cid] = bytes(cam.receive())
+
+        start = time.perf_counter()
+        errors = self._parallel(shoot)
+        elapsed = time.perf_counter() - start
+
+        times = list(trigger_times.values())
+        skew = max(times) - min(times) if times else 0.0
+        total = sum(len(f) for f in frames.values())
+        return RoundResult(frames, errors, trigger_times, skew, elapsed, total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synchronized capture from every connected Pico.")
+    parser.add_argument('--dialect', choices=(ARDUINO, CIRCUITPYTHON), default=CIRCUITPYTHON)
+    parser.add_argument('--rounds', type=int, default=1)
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'images'), help="Directory, .tar, .zip or .sqlite to store into")
+    parser.add_argument('--fsync', default='close', help="never, close, always or every N images")
+    args = parser.parse_args()
+
+    fleet = Fleet(args.dialect)
+    if not fleet.cameras:
+        print("Error: No Pico serial ports found.")
+        return
+    print(f"Found {len(fleet.cameras)} cameras: {', '.join(fleet.cameras)}")
+
+    fsync = int(args.fsync) if args.fsync.isdigit() else args.fsync
+    with fleet, BackgroundWriter(args.out, fsync=fsync) as writer:
+        for n in range(1, args.rounds + 1):
+            result = fleet.capture_round()
+            for cid, jpeg in result.frames.items():
+                writer.submit(jpeg, index=n, camera=cid)
+            for cid, err in result.errors.items():
+                print(f"  {cid}: {err}")
+            print(f"Round {n}: {len(result.frames)}/{len(fleet.cameras)} images, "
+                  f"trigger skew {result.skew * 1000:.2f} ms, "
+                  f"{result.bytes / 1024:.0f} KB in {result.elapsed:.2f}s "
+                  f"({result.bytes / result.elapsed / 1024:.1f} KB/s)")
+
+
+if __name__ == "__main__":
+    main()
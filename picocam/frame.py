@@ -0,0 +1,102 @@
+import struct
+import time
+import zlib
+from collections import namedtuple
+
+from .receive import read_exact
+from .transform import FLAG_TRANSFORM
+
+# Frame layout (all integers little-endian):
+#   header  : magic 'PCAM', version u8, resolution u8, flags u16,
+#             sequence u32, payload length u32, header CRC32 u32
+#   payload : `length` bytes, starting at the JPEG SOI
+#   trailer : CRC32 of the payload u32
+# The payload CRC trails the data because neither firmware can hold a 5MP
+# frame in RAM; it is computed while the FIFO is streamed out.
+FRAME_MAGIC = b'PCAM'
+FRAME_VERSION = 1
+
+_HEADER = struct.Struct('<4sBBHII')
+_CRC = struct.Struct('<I')
+HEADER_SIZE = _HEADER.size + _CRC.size
+TRAILER_SIZE = _CRC.size
+
+FrameHeader = namedtuple('FrameHeader', 'version resolution flags sequence length')
+
+
+class FrameError(Exception):
+    """Raised when a frame is truncated or fails its integrity checks."""
+
+
+def encode_header(length, resolution=0, sequence=0, flags=0):
+    head = _HEADER.pack(FRAME_MAGIC, FRAME_VERSION, resolution, flags, sequence, length)
+    return head + _CRC.pack(zlib.crc32(head))
+
+
+def decode_header(data):
+    if len(data) != HEADER_SIZE:
+        raise FrameError(f"Header is {len(data)} bytes, expected {HEADER_SIZE}")
+    head = bytes(data[:_HEADER.size])
+    magic, version, resolution, flags, sequence, length = _HEADER.unpack(head)
+    if magic != FRAME_MAGIC:
+        raise FrameError(f"Bad frame magic {magic!r}")
+    if version != FRAME_VERSION:
+        raise FrameError(f"Unsupported frame version {version}")
+    (crc,) = _CRC.unpack_from(data, _HEADER.size)
+    if crc != zlib.crc32(head):
+        raise FrameError("Header CRC mismatch")
+    return FrameHeader(version, resolution, flags, sequence, length)
+
+
+def encode_frame(payload, resolution=0, sequence=0, flags=0):
+    header = encode_header(len(payload), resolution, sequence, flags)
+    return header + bytes(payload) + _CRC.pack(zlib.crc32(payload))
+
+
+def frame_body_size(header):
+    """Bytes that follow the header: payload plus CRC trailer."""
+    return header.length + TRAILER_SIZE
+
+
+def check_body(header, body):
+    """Verify the payload CRC of a frame body and return the payload view."""
+    payload = memoryview(body)[:header.length]
+    (crc,) = _CRC.unpack_from(body, header.length)
+    if crc != zlib.crc32(payload):
+        raise FrameError("Payload CRC mismatch")
+    return payload
+
+
+def read_frame(ser, timeout=60, validator=None, idle_timeout=None):
+    """Read one frame from `ser` and return (header, payload memoryview).
+
+    The payload buffer is allocated once from the header's length field and
+    filled in place. Raises FrameError on timeout, on `idle_timeout` seconds
+    without data, or on checksum failure.
+
+    `validator` (a picocam.jpeg.JpegValidator) is fed the payload as it
+    arrives, so a malformed JPEG raises its JpegError mid-transfer. It is
+    not fed frames whose flags report a wiring fault (FLAG_TRANSFORM), as
+    those are only a JPEG after picocam.transform.recover().
+    """
+    deadline = time.monotonic() + timeout
+
+    raw = bytearray(HEADER_SIZE)
+    if read_exact(ser, memoryview(raw), timeout) < HEADER_SIZE:
+        raise FrameError("Timed out reading frame header")
+    header = decode_header(raw)
+
+    buf = bytearray(frame_body_size(header))
+    view = memoryview(buf)
+    progress = None
+    if validator is not None and not header.flags & FLAG_TRANSFORM:
+        def progress(pos):
+            end = min(pos, header.length)
+            if end > validator.offset and not validator.done:
+                validator.feed(view[validator.offset:end])
+
+    got = read_exact(ser, view, max(deadline - time.monotonic(), 0),
+                     idle_timeout=idle_timeout, progress=progress)
+    if got < len(buf):
+        raise FrameError(f"Timed out after {got} of {len(buf)} frame bytes")
+    return header, check_body(header, buf)
@@ -0,0 +1,281 @@
+"""Incremental JPEG structure check for payloads that arrive in pieces.
+
+JpegValidator is fed the payload chunk by chunk as it is received. It walks
+SOI, then every marker segment by its length field (APPn, COM and the
+like are skipped; DQT, DHT, SOF, SOS and DRI are checked field by field),
+then the entropy-coded data of each scan up to EOI:
+
+    validator = JpegValidator()
+    for chunk in chunks:
+        if validator.feed(chunk):
+            break                      # EOI seen: validator.end bytes of JPEG
+    validator.finish()                 # JpegError if EOI never came
+    print(validator.width, validator.height)
+
+A malformed segment raises JpegError (a FrameError) from the feed() call
+that contains it, so a receiver can give up on a frame as soon as its
+structure breaks instead of at the end of the transfer. Damage inside
+entropy-coded data is only caught when it produces an invalid marker; the
+frame CRC covers the rest.
+"""
+from .frame import FrameError
+from .transform import FLAG_TRANSFORM, recover
+
+SOI = 0xD8
+EOI = 0xD9
+SOS = 0xDA
+DQT = 0xDB
+DRI = 0xDD
+DHT = 0xC4
+TEM = 0x01
+COM = 0xFE
+# Start-of-frame markers: every C0-CF except DHT, JPG and DAC
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {DHT, 0xC8, 0xCC}
+PROGRESSIVE_SOF = frozenset((0xC2, 0xC6, 0xCA, 0xCE))
+# Longest valid length field of the checked segments, so an implausible
+# one fails before its bytes arrive
+MAX_LENGTH = {SOS: 2 + 1 + 4 * 2 + 3, DQT: 2 + 4 * 129, DHT: 2 + 4 * (17 + 256), DRI: 4}
+MAX_SOF_LENGTH = 2 + 6 + 4 * 3
+
+# Parser states
+_SOI_FF, _SOI_D8, _MARKER, _MARKER_ID, _LENGTH_HI, _LENGTH_LO, _SEGMENT, _ENTROPY, _ENTROPY_FF, _DONE = range(10)
+_STATE_NAMES = ('SOI', 'SOI', 'marker', 'marker', 'segment length', 'segment length', 'segment',
+                'entropy-coded data', 'entropy-coded data', 'EOI')
+
+
+class JpegError(FrameError):
+    """Raised when a payload is not a well-formed JPEG."""
+
+
+class JpegValidator:
+    """Checks a JPEG's marker structure as it is received; see the module docstring.
+
+    After each feed(), `offset` is the number of bytes consumed. Once EOI
+    has been seen, `end` is the offset just past it and later input is
+    ignored. The frame header fields are set when the SOF segment has been
+    parsed.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.end = None
+        self.width = None
+        self.height = None
+        self.components = None
+        self.precision = None
+        self.progressive = False
+        self.scans = 0
+        self.tables = 0  # DQT + DHT tables defined
+        self.state = _SOI_FF
+        self._marker = None
+        self._length = 0
+        self._need = 0
+        self._segment = None  # bytearray for segments that are parsed, None when skipping
+
+    @property
+    def done(self):
+        return self.end is not None
+
+    def _fail(self, message, at):
+        raise JpegError(f"Malformed JPEG at byte {at}: {message}")
+
+    def feed(self, data):
+        """Parse the next chunk of the payload; returns True once EOI has been seen."""
+        if self.end is not None:
+            return True
+        buf = data if isinstance(data, (bytes, bytearray)) else bytes(data)
+        base = self.offset
+        i, n = 0, len(buf)
+        while i < n:
+            state = self.state
+            if state == _ENTROPY:
+                # Bulk of the payload: only 0xFF bytes need a look
+                j = buf.find(b'\xff', i)
+                if j < 0:
+                    i = n
+                    break
+                i = j + 1
+                self.state = _ENTROPY_FF
+                continue
+            if state == _SEGMENT:
+                k = min(self._need, n - i)
+                if self._segment is not None:
+                    self._segment += buf[i:i + k]
+                i += k
+                self._need -= k
+                if not self._need:
+                    self._end_segment(base + i)
+                continue
+
+            b = buf[i]
+            i += 1
+            if state == _ENTROPY_FF:
+                if b == 0x00 or 0xD0 <= b <= 0xD7:  # Stuffed 0xFF or restart marker
+                    self.state = _ENTROPY
+                elif b != 0xFF:  # 0xFF is fill before a marker
+                    self._start_marker(b, base + i)
+            elif state == _MARKER:
+                if b != 0xFF:
+                    self._fail(f"expected a marker, found 0x{b:02X}", base + i - 1)
+                self.state = _MARKER_ID
+            elif state == _MARKER_ID:
+                if b != 0xFF:
+                    self._start_marker(b, base + i)
+            elif state == _LENGTH_HI:
+                self._length = b << 8
+                self.state = _LENGTH_LO
+            elif state == _LENGTH_LO:
+                self._start_segment(self._length | b, base + i)
+            elif state == _SOI_FF:
+                if b != 0xFF:
+                    self._fail(f"no SOI, starts with 0x{b:02X}", base)
+                self.state = _SOI_D8
+            elif state == _SOI_D8:
+                if b != SOI:
+                    self._fail(f"no SOI, starts with 0xFF{b:02X}", base)
+                self.state = _MARKER
+            if self.end is not None:
+                break
+        self.offset = base + i
+        return self.end is not None
+
+    def finish(self):
+        """Raise JpegError unless EOI has been seen."""
+        if self.end is None:
+            raise JpegError(f"JPEG truncated after {self.offset} bytes, in {_STATE_NAMES[self.state]}")
+        return self
+
+    def _start_marker(self, marker, at):
+        # `at` is the offset just past the marker byte
+        if marker == EOI:
+            if not self.scans:
+                self._fail("EOI before any scan", at - 2)
+            self.end = at
+            self.state = _DONE
+        elif marker == TEM:
+            self.state = _MARKER
+        elif marker == SOI:
+            self._fail("second SOI", at - 2)
+        elif 0xD0 <= marker <= 0xD7 or marker == 0x00:
+            self._fail(f"marker 0xFF{marker:02X} outside entropy-coded data", at - 2)
+        else:
+            self._marker = marker
+            self.state = _LENGTH_HI
+
+    def _start_segment(self, length, at):
+        if length < 2:
+            self._fail(f"segment 0xFF{self._marker:02X} has length {length}", at - 4)
+        sof = self._marker in SOF_MARKERS
+        limit = MAX_SOF_LENGTH if sof else MAX_LENGTH.get(self._marker)
+        if limit is not None and length > limit:
+            self._fail(f"segment 0xFF{self._marker:02X} has length {length}", at - 4)
+        self._need = length - 2
+        parsed = sof or limit is not None
+        self._segment = bytearray() if parsed else None
+        self.state = _SEGMENT
+        if not self._need:
+            self._end_segment(at)
+
+    def _end_segment(self, at):
+        marker, seg = self._marker, self._segment
+        self._segment = None
+        self.state = _MARKER
+        if seg is None:
+            return
+        start = at - len(seg) - 4  # Offset of the marker, for messages
+        name = f"segment 0xFF{marker:02X}"
+        if marker in SOF_MARKERS:
+            if self.width is not None:
+                self._fail("second SOF", start)
+            if len(seg) < 6 or len(seg) != 6 + 3 * seg[5]:
+                self._fail(f"{name} (SOF) has {len(seg)} bytes", start)
+            self.precision = seg[0]
+            self.height = (seg[1] << 8) | seg[2]
+            self.width = (seg[3] << 8) | seg[4]
+            self.components = seg[5]
+            self.progressive = marker in PROGRESSIVE_SOF
+            if not self.width or not 1 <= self.components <= 4:
+                self._fail(f"SOF gives {self.width}x{self.height} with {self.components} components", start)
+        elif marker == SOS:
+            if self.width is None:
+                self._fail("SOS before SOF", start)
+            if len(seg) < 1 or len(seg) != 4 + 2 * seg[0] or not 1 <= seg[0] <= self.components:
+                self._fail(f"{name} (SOS) has {len(seg)} bytes", start)
+            self.scans += 1
+            self.state = _ENTROPY
+        elif marker == DQT:
+            pos = 0
+            while pos < len(seg):
+                pq, tq = seg[pos] >> 4, seg[pos] & 0x0F
+                size = 1 + 64 * (pq + 1)
+                if pq > 1 or tq > 3 or pos + size > len(seg):
+                    self._fail(f"{name} (DQT) table at +{pos} does not fit", start)
+                pos += size
+                self.tables += 1
+        elif marker == DHT:
+            pos = 0
+            while pos < len(seg):
+                tc, th = seg[pos] >> 4, seg[pos] & 0x0F
+                if pos + 17 > len(seg):
+                    self._fail(f"{name} (DHT) table at +{pos} is cut short", start)
+                size = 17 + sum(seg[pos + 1:pos + 17])
+                if tc > 1 or th > 3 or size > 17 + 256 or pos + size > len(seg):
+                    self._fail(f"{name} (DHT) table at +{pos} does not fit", start)
+                pos += size
+                self.tables += 1
+        elif marker == DRI:
+            if len(seg) != 2:
+                self._fail(f"{name} (DRI) has {len(seg)} bytes", start)
+
+
+def validate_jpeg(data):
+    """Check a complete payload; returns the JpegValidator (see its `end`, `width`, `height`).
+
+    Raises JpegError if the structure is broken or EOI is missing.
+    """
+    validator = JpegValidator()
+    validator.feed(data)
+    return validator.finish()
+
+
+def frame_jpeg(header, payload, validator=None):
+    """Return (jpeg, validator) for a received frame payload.
+
+    Undoes any wiring fault in the header flags, checks the JPEG and drops
+    the FIFO padding after EOI. `validator` is the one read_frame() fed
+    while receiving, if any; payloads it was not fed (chunked or faulted
+    frames) are checked here in one go.
+    """
+    payload = recover(payload, header.flags & FLAG_TRANSFORM)
+    if validator is None:
+        validator = JpegValidator()
+    if not validator.offset:
+        validator.feed(payload)
+    validator.finish()
+    return payload[:validator.end], validator
+
+
+def add_comment(jpeg, text):
+    """Return `jpeg` with a COM segment holding `text` (Latin-1) right after SOI."""
+    data = text.encode('latin-1')
+    if len(data) > 0xFFFF - 2:
+        raise ValueError("JPEG comment too long")
+    if bytes(jpeg[:2]) != b'\xff\xd8':
+        raise JpegError("Malformed JPEG at byte 0: no SOI")
+    segment = b'\xff\xfe' + (len(data) + 2).to_bytes(2, 'big') + data
+    return b'\xff\xd8' + segment + bytes(jpeg[2:])
+
+
+def jpeg_comments(jpeg):
+    """Texts of the COM segments before the first scan."""
+    comments = []
+    pos = 2
+    while pos + 4 <= len(jpeg) and jpeg[pos] == 0xFF:
+        marker = jpeg[pos + 1]
+        if marker == SOS or marker == EOI:
+            break
+        length = (jpeg[pos + 2] << 8) | jpeg[pos + 3]
+        if marker == COM:
+            comments.append(bytes(jpeg[pos + 4:pos + 2 + length]).decode('latin-1'))
+        pos += 2 + length
+    return comments
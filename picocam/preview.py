@@ -0,0 +1,119 @@
+"""Live preview: low-resolution frames back to back, then back to full size.
+
+CMD_PREVIEW (0x19) followed by the frame count as ASCII and a newline
+(0 = until stopped) switches the sensor to 320x240 JPEG and streams frames
+as a burst does. Between frames the device looks for CMD_STOP (0x13),
+which ends the preview, or CMD_CAPTURE (0x10), which ends it with a
+capture. Either way it first switches back to the mode the preview started
+from and reports it ('ACK CMD Resolution: ...'), so that capture is at
+full resolution:
+
+    with PicoCamera(dialect=CIRCUITPYTHON) as cam:
+        for jpeg in cam.preview(mjpeg="preview.mjpeg"):
+            show(jpeg)
+            if framed():
+                break
+        full = cam.shoot()
+
+Preview frames can be saved as an MJPEG file: the JPEGs one after the
+other, which ffplay and VLC play as is.
+"""
+import os
+import time
+
+from .burst import CMD_STOP, RESYNC_QUIET, BurstStats
+from .frame import FrameError, read_frame
+from .jpeg import JpegValidator, frame_jpeg
+from .receive import IMG_SIGNAL, discard_input, wait_for_line
+
+CMD_PREVIEW = b'\x19'
+PREVIEW_DONE = "ACK CMD Preview Done"
+ERROR = "ACK CMD ERROR"
+PREVIEW_RESOLUTION = 0  # OV5642_320x240
+
+
+def preview_command(count=0):
+    return CMD_PREVIEW + f"{count}\n".encode('ascii')
+
+
+class PreviewStream:
+    """Iterator over the JPEG frames of a running preview.
+
+    Iteration ends when the device reports the preview done (after `count`
+    frames, or once end() has asked it to stop) or nothing arrives for
+    `frame_timeout` seconds. Frames that fail the CRC or JPEG checks are
+    skipped, with what is left of them, and counted in `errors`. `mjpeg` is
+    a path or a binary file each good frame is appended to.
+    """
+
+    def __init__(self, ser, count=0, mjpeg=None, frame_timeout=60, idle_timeout=None, on_line=None):
+        self.ser = ser
+        self.frame_timeout = frame_timeout
+        self.idle_timeout = idle_timeout
+        self.on_line = on_line
+        self.owns_mjpeg = isinstance(mjpeg, (str, os.PathLike))
+        self.mjpeg = open(mjpeg, 'wb') if self.owns_mjpeg else mjpeg
+        self.frames = self.errors = self.bytes = 0
+        self.intervals = []
+        self.last_header = None
+        self.done = False
+        ser.write(preview_command(count))
+        ser.flush()
+        self.start = self.last = time.monotonic()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self.done:
+            line, _ = wait_for_line(self.ser, (IMG_SIGNAL, PREVIEW_DONE, ERROR),
+                                    timeout=self.frame_timeout, on_line=self.on_line)
+            if line is None or PREVIEW_DONE in line:
+                self._finish()
+                break
+            if ERROR in line:
+                self.errors += 1
+                continue
+            try:
+                validator = JpegValidator()
+                header, payload = read_frame(self.ser, timeout=self.frame_timeout, validator=validator,
+                                             idle_timeout=self.idle_timeout)
+                jpeg, _ = frame_jpeg(header, payload, validator)
+            except FrameError:
+                self.errors += 1
+                discard_input(self.ser, quiet=RESYNC_QUIET, timeout=self.frame_timeout)
+                continue
+            now = time.monotonic()
+            self.intervals.append(now - self.last)
+            self.last = now
+            self.frames += 1
+            self.bytes += header.length
+            self.last_header = header
+            if self.mjpeg is not None:
+                self.mjpeg.write(jpeg)
+            return jpeg
+        raise StopIteration
+
+    def _finish(self):
+        self.done = True
+        if self.owns_mjpeg:
+            self.mjpeg.close()
+
+    def end(self, command=CMD_STOP):
+        """Ask the device to leave the preview with `command` and drain the frames still coming."""
+        if not self.done:
+            self.ser.write(command)
+            self.ser.flush()
+            for _ in self:
+                pass
+
+    @property
+    def fps(self):
+        elapsed = self.last - self.start
+        return self.frames / elapsed if elapsed else 0.0
+
+    @property
+    def stats(self):
+        """The preview so far as a BurstStats, for picocam.burst.format_stats()."""
+        return BurstStats(self.frames, self.errors, self.bytes, self.last - self.start,
+                          self.intervals, [PREVIEW_RESOLUTION] if self.frames else [])
@@ -0,0 +1,155 @@
+"""Adaptive JPEG quality: the finest quantization that keeps frames within a budget.
+
+CMD_QSCALE (0x1B) followed by a scale (1-63) and a newline sets the
+OV5642 JPEG quantization scale, COMPRESSION CTRL07 (0x4407) bits [5:0].
+An empty argument just reports it. Lower is finer and larger: the init
+sequence sets 8, and ArduCAM's 'high quality' is 2. The device answers
+'ACK CMD QScale: <scale> END'. A resolution switch keeps the scale; a
+re-init resets it to 8.
+
+Frame size falls with the scale roughly as a power law:
+size(q) = size(8) * (8 / q) ** SIZE_EXPONENT, where size(8) depends on
+the scene. QualityController turns the last few frame lengths (the
+device's 'ACK CMD Length' values) into size(8) by that model. It then
+picks the finest scale at which the largest of them, plus a margin, fits
+the byte budget, or the time budget at the measured link rate:
+
+    controller = QualityController(budget_time=1.0, overhead=0.3)
+    with PicoCamera(dialect=CIRCUITPYTHON) as cam:
+        while True:
+            jpeg = controller.capture(cam)
+            print(controller.history[-1])
+
+PicoCamera records a scale it has set in each JPEG as a COM segment
+(qscale_comment()).
+"""
+import time
+from collections import deque, namedtuple
+
+CMD_QSCALE = b'\x1b'
+QSCALE_PREFIX = "ACK CMD QScale:"
+QSCALE_DEFAULT = 8
+QSCALE_MIN, QSCALE_MAX = 1, 63
+SIZE_EXPONENT = 0.75  # Rough fit for natural scenes; see benchmarks/bench_quality.py
+COMMENT_PREFIX = "picocam qscale="
+
+# One controlled capture: the scale used, the device's FIFO length, the
+# seconds capture() took, and the length and byte budget predicted for it
+QualityRecord = namedtuple('QualityRecord', 'qscale length seconds predicted budget')
+
+
+def qscale_command(qscale=None):
+    arg = '' if qscale is None else str(qscale)
+    return CMD_QSCALE + f"{arg}\n".encode('ascii')
+
+
+def parse_qscale(text):
+    """Scale from an 'ACK CMD QScale: N END' line, or ValueError."""
+    fields = text.split(QSCALE_PREFIX, 1)[-1].split()
+    if not fields or not fields[0].isdigit():
+        raise ValueError(f"Unreadable qscale report: {text}")
+    return int(fields[0])
+
+
+def check_qscale(qscale):
+    if not QSCALE_MIN <= qscale <= QSCALE_MAX:
+        raise ValueError(f"qscale {qscale} is outside {QSCALE_MIN}-{QSCALE_MAX}")
+
+
+def size_ratio(qscale, reference=QSCALE_DEFAULT, exponent=SIZE_EXPONENT):
+    """Modelled size of a frame at `qscale` relative to the same scene at `reference`."""
+    return (reference / qscale) ** exponent
+
+
+def qscale_comment(qscale):
+    """JPEG COM text recording the quantization scale a frame was taken at."""
+    return f"{COMMENT_PREFIX}{qscale}"
+
+
+def qscale_from_comments(comments):
+    """The scale recorded by qscale_comment() among a JPEG's COM texts, or None."""
+    for text in comments:
+        if text.startswith(COMMENT_PREFIX) and text[len(COMMENT_PREFIX):].isdigit():
+            return int(text[len(COMMENT_PREFIX):])
+    return None
+
+
+class QualityController:
+    """Chooses the quantization scale for each next frame from the recent ones.
+
+    Give either `budget_bytes` or `budget_time` (seconds per capture()).
+    A time budget becomes a byte budget at `rate` bytes/s, or at the
+    slowest link rate measured over the window, after the fixed
+    `overhead` seconds each capture takes whatever its size (exposure,
+    settle delays). Predictions take the largest of the last `window`
+    frames, so a scene that gets busier is caught before the budget is
+    blown, and add `margin` on top. Scales are kept within best..worst.
+    """
+
+    def __init__(self, budget_bytes=None, budget_time=None, rate=None, overhead=0.0, window=8, margin=0.1,
+                 best=QSCALE_MIN, worst=QSCALE_MAX, start=QSCALE_DEFAULT, exponent=SIZE_EXPONENT):
+        if (budget_bytes is None) == (budget_time is None):
+            raise ValueError("Give either a byte budget or a time budget")
+        check_qscale(best)
+        check_qscale(worst)
+        if best > worst:
+            raise ValueError("best must be a lower scale than worst")
+        self.budget_bytes = budget_bytes
+        self.budget_time = budget_time
+        self.rate = rate
+        self.overhead = overhead
+        self.margin = margin
+        self.best = best
+        self.worst = worst
+        self.exponent = exponent
+        self.sizes = deque(maxlen=window)  # Recent frame lengths, as at QSCALE_DEFAULT
+        self.rates = deque(maxlen=window)  # Measured link bytes/s
+        self.history = []
+        self.qscale = min(max(start, best), worst)  # Scale for the next frame
+
+    def budget(self):
+        """The byte budget for the next frame, or None until a time budget has a rate."""
+        if self.budget_bytes is not None:
+            return self.budget_bytes
+        rate = self.rate or (min(self.rates) if self.rates else None)
+        if rate is None:
+            return None
+        return max(self.budget_time - self.overhead, 0) * rate
+
+    def predict(self, qscale):
+        """Predicted length of the next frame at `qscale`, or None before any frame."""
+        if not self.sizes:
+            return None
+        return max(self.sizes) * size_ratio(qscale, exponent=self.exponent)
+
+    def choose(self):
+        """The finest scale predicted to fit the budget (the coarsest allowed if none does)."""
+        budget = self.budget()
+        if budget is None or not self.sizes:
+            return self.qscale
+        for qscale in range(self.best, self.worst + 1):
+            if self.predict(qscale) * (1 + self.margin) <= budget:
+                return qscale
+        return self.worst
+
+    def observe(self, qscale, length, seconds=None):
+        """Record a frame `length` bytes long taken at `qscale`; returns the scale for the next one."""
+        self.sizes.append(length / size_ratio(qscale, exponent=self.exponent))
+        if seconds is not None and seconds > self.overhead:
+            self.rates.append(length / (seconds - self.overhead))
+        self.qscale = self.choose()
+        return self.qscale
+
+    def capture(self, cam, **kwargs):
+        """cam.capture(**kwargs) at the chosen scale; logs a QualityRecord to `history`."""
+        qscale = self.qscale
+        if cam.qscale != qscale:
+            cam.set_qscale(qscale)
+        predicted, budget = self.predict(qscale), self.budget()
+        start = time.perf_counter()
+        jpeg = cam.capture(**kwargs)
+        seconds = time.perf_counter() - start
+        length = cam.last_length or cam.last_header.length
+        self.history.append(QualityRecord(qscale, length, seconds, predicted, budget))
+        self.observe(qscale, length, seconds)
+        return jpeg
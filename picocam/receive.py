@@ -0,0 +1,136 @@
+import time
+
+# Markers sent by the firmware around the binary JPEG stream
+LENGTH_PREFIX = "ACK CMD Length:"
+IMG_SIGNAL = "ACK IMG END"
+EOI = b'\xff\xd9'
+
+# Upper bound used when the firmware did not announce a length (8 MB FIFO)
+MAX_FIFO_SIZE = 0x7FFFFF
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_length(text):
+    """Return N from an 'ACK CMD Length: N END' line, or None."""
+    if LENGTH_PREFIX not in text:
+        return None
+    fields = text.split(LENGTH_PREFIX, 1)[1].split()
+    if not fields:
+        return None
+    try:
+        return int(fields[0])
+    except ValueError:
+        return None
+
+
+def wait_for_line(ser, markers, timeout=10, on_line=None):
+    """Read text lines until one contains any of `markers`.
+
+    Returns (line, length): the matching line (None on timeout) and the
+    FIFO length from the last 'ACK CMD Length' line seen, if any.
+    """
+    length = None
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        raw = ser.readline()
+        if not raw:
+            continue
+        text = raw.decode('ascii', errors='ignore').strip()
+        if not text:
+            continue
+        if on_line:
+            on_line(text)
+        if LENGTH_PREFIX in text:
+            length = parse_length(text)
+        if any(m in text for m in markers):
+            return text, length
+    return None, length
+
+
+def read_exact(ser, view, timeout, chunk_size=CHUNK_SIZE, idle_timeout=None, progress=None):
+    """Fill `view` from `ser` with large readinto calls.
+
+    Returns the number of bytes stored, which is less than len(view) only
+    if `timeout` seconds elapse first, or `idle_timeout` seconds pass
+    without any data. `progress(pos)` is called after each read.
+    """
+    size = len(view)
+    pos = 0
+    now = last_data = time.monotonic()
+    deadline = now + timeout
+    while pos < size and now < deadline:
+        # Ask for everything already buffered, but block for at least one byte
+        want = min(size - pos, max(ser.in_waiting, 1), chunk_size)
+        n = ser.readinto(view[pos:pos + want])
+        now = time.monotonic()
+        if n:
+            pos += n
+            last_data = now
+            if progress:
+                progress(pos)
+        elif idle_timeout is not None and now - last_data > idle_timeout:
+            break
+    return pos
+
+
+def discard_input(ser, quiet=0.5, timeout=60):
+    """Drop incoming bytes until `ser` has been silent for `quiet` seconds.
+
+    Used after giving up on a frame part way, so the rest of it does not
+    end up in front of the next reply. Returns the number of bytes dropped.
+    """
+    dropped = 0
+    now = last_data = time.monotonic()
+    deadline = now + timeout
+    while now - last_data < quiet and now < deadline:
+        n = ser.in_waiting
+        if n:
+            dropped += len(ser.read(n))
+            last_data = time.monotonic()
+        else:
+            time.sleep(0.01)
+        now = time.monotonic()
+    return dropped
+
+
+def trim_to_eoi(data, window=4096):
+    """Drop FIFO padding that follows the last EOI in the final `window` bytes."""
+    start = max(len(data) - window, 0)
+    eoi = bytes(data[start:]).rfind(EOI)
+    if eoi == -1:
+        return data
+    return data[:start + eoi + 2]
+
+
+def receive_jpeg(ser, length=None, timeout=60, chunk_size=CHUNK_SIZE, progress=None):
+    """Receive a JPEG stream of at most `length` bytes, stopping at EOI.
+
+    `length` is the FIFO size announced by the 'ACK CMD Length' line; the
+    payload between SOI and EOI never exceeds it, so one buffer of that size
+    is allocated up front and filled in place through a memoryview. The EOI
+    marker is located with bytearray.find() over each new chunk, starting one
+    byte early so a marker split across two reads is still found.
+
+    Returns a memoryview over the received bytes (up to and including EOI,
+    or everything received before the timeout).
+    """
+    size = length if length else MAX_FIFO_SIZE
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    deadline = time.monotonic() + timeout
+
+    while pos < size and time.monotonic() < deadline:
+        want = min(size - pos, max(ser.in_waiting, 1), chunk_size)
+        n = ser.readinto(view[pos:pos + want])
+        if not n:
+            continue
+
+        eoi = buf.find(EOI, max(pos - 1, 0), pos + n)
+        pos += n
+        if progress:
+            progress(pos)
+        if eoi != -1:
+            return view[:eoi + 2]
+
+    return view[:pos]
@@ -0,0 +1,258 @@
+"""OV5642 register tables and resolution deltas, as applied by both firmwares.
+
+The sensor state after InitCAM() plus a size table only depends on the
+size table, so moving between two JPEG modes only needs the registers
+whose value differs. resolution_delta() is the host-side model of the
+0x16 command in pico_ov5642.ino and circuitpython/code.py; benchmarks use
+it to count writes without hardware.
+
+compile_tables() packs every table, plus the delta for each pair of
+resolutions, into the binary file that circuitpython/Arducam.py reads
+lazily (OV5642_regs.bin, built by pico_ov5642/extract_regs.py):
+
+    header   <4sBBH20sI: magic, version, flags (0), record count,
+             SHA-1 of the source header, index length
+    index    per record: name length (u8), name (ASCII), span count (u8),
+             then <HH (entry offset, entry count) per span
+    pool     3-byte entries [AddrH, AddrL, Val]
+
+A record's table is the concatenation of its pool spans, so sequences
+that several tables share are stored once. Deltas are named
+delta_<src>_<dst>; a missing delta means the switch needs a full re-init.
+"""
+import hashlib
+import os
+import re
+import struct
+
+REGS_HEADER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'pico_ov5642', 'ov5642_regs.h')
+END_MARKER = 0xFFFF
+
+# Both firmwares pause 1 ms after each register write; a 4-byte I2C write
+# at 100 kHz adds about 0.4 ms. InitCAM() also sleeps ~300 ms in total.
+I2C_WRITE_TIME = 0.0014
+INIT_DELAY = 0.3
+
+# Resolution ids match the OV5642_* constants in ArduCAM.h. 1920x1080 (7)
+# only exists as a RAW table, so it cannot be selected in JPEG mode.
+RESOLUTIONS = {
+    0: '320x240',
+    1: '640x480',
+    2: '1024x768',
+    3: '1280x960',
+    4: '1600x1200',
+    5: '2048x1536',
+    6: '2592x1944',
+}
+SIZE_TABLES = {res: f'ov5642_{name}' for res, name in RESOLUTIONS.items()}
+
+# InitCAM() for JPEG: these tables in order, then a few single writes
+INIT_TABLES = ('OV5642_QVGA_Preview', 'OV5642_JPEG_Capture_QSXGA', 'ov5642_320x240')
+INIT_FIXUPS = ((0x3818, 0xa8), (0x3621, 0x10), (0x3801, 0xb0),
+               (0x4407, 0x08), (0x5888, 0x00), (0x5000, 0xff))
+
+# Compiled table file
+BIN_MAGIC = b'OVRG'
+BIN_VERSION = 1
+BIN_HEADER = struct.Struct('<4sBBH20sI')
+BIN_SPAN = struct.Struct('<HH')
+ENTRY_SIZE = 3
+MIN_SHARED = 8  # Shortest shared run (entries) worth a span of its own
+
+_TABLE = re.compile(r'const\s+struct\s+sensor_reg\s+(\w+)\[\]\s*PROGMEM\s*=\s*\{(.*?)\};', re.S)
+_ENTRY = re.compile(r'\{\s*(0x[0-9a-fA-F]+)\s*,\s*(0x[0-9a-fA-F]+)\s*\}')
+
+
+def resolution_id(value):
+    """Accept a resolution id or a 'WxH' name and return the id."""
+    if isinstance(value, str) and not value.isdigit():
+        for res, name in RESOLUTIONS.items():
+            if name == value.lower():
+                return res
+        raise ValueError(f"Unknown resolution {value!r}; choose from {', '.join(RESOLUTIONS.values())}")
+    res = int(value)
+    if res not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution id {res}")
+    return res
+
+
+def load_tables(path=REGS_HEADER, end_marker=False):
+    """Parse every sensor_reg array in `path` into {name: [(reg, value), ...]}.
+
+    The 0xFFFF end marker is dropped unless `end_marker` is set.
+    """
+    with open(path) as f:
+        text = f.read()
+    tables = {}
+    for name, body in _TABLE.findall(text):
+        entries = [(int(reg, 16), int(val, 16)) for reg, val in _ENTRY.findall(body)]
+        tables[name] = [(reg, val) for reg, val in entries if end_marker or reg != END_MARKER]
+    return tables
+
+
+def init_state(tables):
+    """Register values InitCAM() leaves behind, before the size table."""
+    state = {}
+    for name in INIT_TABLES:
+        state.update(tables[name])
+    state.update(INIT_FIXUPS)
+    return state
+
+
+def init_writes(tables):
+    """Number of I2C writes a full InitCAM() + set_JPEG_size() costs (sans size table)."""
+    return sum(len(tables[name]) for name in INIT_TABLES) + len(INIT_FIXUPS) + 1
+
+
+def switch_time(writes, tables=None):
+    """Estimated seconds for `writes` register writes, or a full re-init if None."""
+    if writes is None:
+        return init_writes(tables or load_tables()) * I2C_WRITE_TIME + INIT_DELAY
+    return writes * I2C_WRITE_TIME
+
+
+def resolution_delta(tables, src, dst, base=None):
+    """Writes that take the sensor from mode `src` to mode `dst`.
+
+    Returns a list of (reg, value), or None when `src` set a register that
+    InitCAM() never writes (its reset default is unknown), in which case the
+    firmware falls back to a full re-init.
+
+    Registers only `src` sets go back to their InitCAM() values first. Then
+    every `dst` entry is written unless `src` left the same value behind;
+    registers that `dst` writes more than once (reset pulses, group holds)
+    are always written in full.
+    """
+    if src == dst:
+        return []
+    base = init_state(tables) if base is None else base
+    old = dict(tables[SIZE_TABLES[src]])
+    new_table = tables[SIZE_TABLES[dst]]
+    new = dict(new_table)
+
+    writes = []
+    for reg in old:
+        if reg in new:
+            continue
+        if reg not in base:
+            return None
+        if old[reg] != base[reg]:
+            writes.append((reg, base[reg]))
+
+    counts = {}
+    for reg, _ in new_table:
+        counts[reg] = counts.get(reg, 0) + 1
+    for reg, val in new_table:
+        if counts[reg] > 1 or old.get(reg) != val:
+            writes.append((reg, val))
+    return writes
+
+
+def delta_name(src, dst):
+    return f'delta_{src}_{dst}'
+
+
+def _pack(entries):
+    return b''.join(bytes(((reg >> 8) & 0xFF, reg & 0xFF, val)) for reg, val in entries)
+
+
+def _longest_run(pool, data, pos, min_run):
+    # Longest entry-aligned match of data[pos:] inside pool: (entry offset, entries)
+    best = (0, 0)
+    key = data[pos:pos + min_run * ENTRY_SIZE]
+    if len(key) < min_run * ENTRY_SIZE:
+        return best
+    at = pool.find(key)
+    while at != -1:
+        if at % ENTRY_SIZE == 0:
+            n = min_run
+            while (pos + n * ENTRY_SIZE < len(data) and at + n * ENTRY_SIZE < len(pool)
+                   and pool[at + n * ENTRY_SIZE:at + (n + 1) * ENTRY_SIZE]
+                   == data[pos + n * ENTRY_SIZE:pos + (n + 1) * ENTRY_SIZE]):
+                n += 1
+            if n > best[1]:
+                best = (at // ENTRY_SIZE, n)
+        at = pool.find(key, at + 1)
+    return best
+
+
+def build_pool(records, min_run=MIN_SHARED):
+    """Lay out packed tables in one pool, sharing runs of >= `min_run` entries.
+
+    Largest tables go first so the runs they contain are available to the
+    rest. Returns (pool bytes, {name: [(entry offset, entries), ...]}).
+    """
+    pool = bytearray()
+    spans = {}
+    for name in sorted(records, key=lambda n: -len(records[n])):
+        data = records[name]
+        out = []
+        pos = 0
+        while pos < len(data):
+            offset, n = _longest_run(pool, data, pos, min_run)
+            if n == 0:
+                offset, n = len(pool) // ENTRY_SIZE, 1
+                pool += data[pos:pos + ENTRY_SIZE]
+            if out and out[-1][0] + out[-1][1] == offset:
+                out[-1] = (out[-1][0], out[-1][1] + n)
+            else:
+                out.append((offset, n))
+            pos += n * ENTRY_SIZE
+        spans[name] = out
+    return bytes(pool), spans
+
+
+def compile_tables(path=REGS_HEADER, digest=bytes(20), min_run=MIN_SHARED):
+    """Pack every table in `path` and every resolution delta into the OV5642_regs.bin format.
+
+    Tables keep their 0xFFFF end marker, which the driver treats as a short
+    pause, exactly as the C++ driver does; deltas have none.
+    """
+    tables = load_tables(path)
+    records = {name: _pack(entries) for name, entries in load_tables(path, end_marker=True).items()}
+    for src in RESOLUTIONS:
+        for dst in RESOLUTIONS:
+            delta = None if src == dst else resolution_delta(tables, src, dst)
+            if delta is not None:
+                records[delta_name(src, dst)] = _pack(delta)
+    pool, spans = build_pool(records, min_run)
+
+    index = bytearray()
+    for name, data in records.items():
+        index += bytes((len(name),)) + name.encode('ascii') + bytes((len(spans[name]),))
+        for offset, count in spans[name]:
+            index += BIN_SPAN.pack(offset, count)
+    header = BIN_HEADER.pack(BIN_MAGIC, BIN_VERSION, 0, len(records), digest, len(index))
+    return header + bytes(index) + pool
+
+
+def read_compiled(data):
+    """Inverse of compile_tables(): {name: packed bytes} plus the source digest."""
+    magic, version, _, count, digest, index_len = BIN_HEADER.unpack_from(data)
+    if magic != BIN_MAGIC or version != BIN_VERSION:
+        raise ValueError("Not an OV5642_regs.bin file")
+    pool = memoryview(data)[BIN_HEADER.size + index_len:]
+    pos = BIN_HEADER.size
+    records = {}
+    for _ in range(count):
+        name = bytes(data[pos + 1:pos + 1 + data[pos]]).decode('ascii')
+        pos += 1 + data[pos]
+        nspans = data[pos]
+        pos += 1
+        packed = bytearray()
+        for _ in range(nspans):
+            offset, entries = BIN_SPAN.unpack_from(data, pos)
+            packed += pool[offset * ENTRY_SIZE:(offset + entries) * ENTRY_SIZE]
+            pos += BIN_SPAN.size
+        records[name] = bytes(packed)
+    return records, digest
+
+
+def source_digest(path=REGS_HEADER):
+    """SHA-1 of the header and of this module (the format and delta rule), to detect stale output."""
+    digest = hashlib.sha1()
+    for name in (path, __file__):
+        with open(name, 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
@@ -0,0 +1,93 @@
+"""Region-of-interest capture: the sensor outputs one window of the full frame.
+
+CMD_ROI followed by 'x,y,width,height' and a newline makes the firmware
+switch to 2592x1944 (if needed) and program the OV5642 window registers:
+the array window start and size (0x3800-0x3807) and the DVP output size
+(0x3808-0x380B) to the rectangle, so it is sent unscaled at native
+resolution, and the AEC average window (0x5682/0x5683, 0x5686/0x5687) to
+match. An empty argument restores the full frame. The device answers
+'ACK CMD ROI: x,y,width,height END' or 'ACK CMD ROI: off END'.
+
+Frames captured through a window carry FLAG_ROI in the header flags. The
+rectangle must lie inside the 2592x1944 array, with x and width multiples
+of 16 and y and height multiples of 8 (one JPEG MCU); align_roi() widens
+any rectangle to that grid. Switching resolution or re-initializing the
+sensor drops the window.
+"""
+from collections import namedtuple
+
+CMD_ROI = b'\x1a'
+ROI_PREFIX = "ACK CMD ROI:"
+FLAG_ROI = 0x4000
+
+SENSOR_WIDTH, SENSOR_HEIGHT = 2592, 1944
+ALIGN_X, ALIGN_Y = 16, 8
+# Array window origin the 2592x1944 table sets (0x3800/0x3801, 0x3802/0x3803)
+WINDOW_HS, WINDOW_VS = 0x1B0, 0x0A
+COMMENT_PREFIX = "picocam roi="
+
+Roi = namedtuple('Roi', 'x y width height')
+
+
+def align_roi(x, y, width, height):
+    """The smallest valid Roi covering the rectangle, clipped to the sensor.
+
+    Raises ValueError if nothing of it lies on the sensor.
+    """
+    x0, y0 = max(int(x), 0), max(int(y), 0)
+    x1, y1 = min(int(x + width), SENSOR_WIDTH), min(int(y + height), SENSOR_HEIGHT)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"ROI {x},{y} {width}x{height} is outside the {SENSOR_WIDTH}x{SENSOR_HEIGHT} sensor")
+    x0 -= x0 % ALIGN_X
+    y0 -= y0 % ALIGN_Y
+    x1 = min(x1 + -x1 % ALIGN_X, SENSOR_WIDTH)
+    y1 = min(y1 + -y1 % ALIGN_Y, SENSOR_HEIGHT)
+    return Roi(x0, y0, x1 - x0, y1 - y0)
+
+
+def check_roi(roi):
+    """Raise ValueError unless `roi` is a rectangle the firmware accepts."""
+    x, y, width, height = roi
+    if (width <= 0 or height <= 0 or x < 0 or y < 0 or x + width > SENSOR_WIDTH or y + height > SENSOR_HEIGHT
+            or x % ALIGN_X or width % ALIGN_X or y % ALIGN_Y or height % ALIGN_Y):
+        raise ValueError(f"Invalid ROI {x},{y} {width}x{height}")
+
+
+def roi_command(roi=None):
+    arg = '' if roi is None else ",".join(str(v) for v in roi)
+    return CMD_ROI + f"{arg}\n".encode('ascii')
+
+
+def parse_roi(text):
+    """Roi from an 'ACK CMD ROI: x,y,w,h END' line (None for 'off'), or ValueError."""
+    arg = text.split(ROI_PREFIX, 1)[-1].replace("END", "").strip()
+    if arg == "off":
+        return None
+    fields = arg.split(",")
+    if len(fields) != 4:
+        raise ValueError(f"Unreadable ROI report: {text}")
+    return Roi(*(int(v) for v in fields))
+
+
+def window_writes(roi):
+    """(reg, value) writes the firmware makes for `roi`, for models and benchmarks."""
+    x, y, width, height = roi
+    hs, vs = WINDOW_HS + x, WINDOW_VS + y
+    writes = []
+    for reg, value in ((0x3800, hs), (0x3802, vs), (0x3804, width), (0x3806, height),
+                       (0x3808, width), (0x380A, height), (0x5682, width), (0x5686, height)):
+        writes += [(reg, value >> 8), (reg + 1, value & 0xFF)]
+    return writes
+
+
+def roi_comment(roi):
+    """JPEG COM text recording `roi` in full-frame coordinates."""
+    return f"{COMMENT_PREFIX}{roi.x},{roi.y},{roi.width},{roi.height} of {SENSOR_WIDTH}x{SENSOR_HEIGHT}"
+
+
+def roi_from_comments(comments):
+    """The Roi recorded by roi_comment() among a JPEG's COM texts, or None."""
+    for text in comments:
+        if text.startswith(COMMENT_PREFIX):
+            return parse_roi(text[len(COMMENT_PREFIX):].split()[0])
+    return None
@@ -0,0 +1,335 @@
+"""Where captured images go: a background writer in front of pluggable storage.
+
+BackgroundWriter takes frames from the receive loop and hands them to a
+sink on a worker thread, so a slow disk never holds up the next transfer
+for longer than it takes the bounded queue to fill:
+
+    with BackgroundWriter(open_sink("images.sqlite", fsync=16)) as writer:
+        stored = writer.submit(jpeg, camera="cam0", index=header.sequence)
+    print("Saved", writer.sink.describe(stored.result()))
+
+Sinks:
+
+  DirectorySink  one .jpg per image; never overwrites an existing file
+  TarSink        append-only .tar; after a crash every complete member
+                 before the cut is still readable
+  ZipSink        appended .zip (stored, not compressed); readable only once
+                 closed, as the central directory is written last
+  SQLiteSink     blobs in an `images` table indexed by timestamp and by
+                 camera and timestamp
+
+Names are unique within a writer at microsecond resolution, so frames
+captured in the same second no longer overwrite each other.
+
+Every sink takes an fsync policy: 'never' (leave flushing to the OS),
+'close' (once, when closed), 'always' (after every image) or an int N
+(after every N images).
+"""
+import abc
+import concurrent.futures
+import datetime
+import os
+import queue
+import sqlite3
+import tarfile
+import threading
+import time
+import zipfile
+from io import BytesIO
+
+FSYNC_POLICIES = ('never', 'close', 'always')
+
+
+def timestamp_name(prefix='img', when=None, camera=None, index=None):
+    """'img_20250101-120000.123456[_camera][_0001]' for `when` (a time.time() value)."""
+    stamp = datetime.datetime.fromtimestamp(time.time() if when is None else when)
+    name = f"{prefix}_{stamp:%Y%m%d-%H%M%S.%f}"
+    if camera is not None:
+        name += f"_{camera}"
+    if index is not None:
+        name += f"_{index:04d}"
+    return name
+
+
+class Sink(abc.ABC):
+    """Base class: stores named images and applies the fsync policy.
+
+    Subclasses implement _write(name, data, when, camera, index) and
+    _sync() (make everything written so far durable), and may extend
+    close(). A subclass missing either cannot be instantiated.
+    """
+
+    extension = '.jpg'
+
+    def __init__(self, fsync='close'):
+        if fsync not in FSYNC_POLICIES and not (isinstance(fsync, int) and fsync > 0):
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)} or a positive count")
+        self.fsync = fsync
+        self.unsynced = 0
+        self.closed = False
+
+    def write(self, name, data, when=None, camera=None, index=None):
+        """Store `data` under `name` (no extension); returns where it went.
+
+        The name can gain a '-N' suffix if it is already taken, so use the
+        returned location rather than `name` to find the image again.
+        """
+        where = self._write(name, data, time.time() if when is None else when, camera, index)
+        self.unsynced += 1
+        if self.fsync == 'always' or (isinstance(self.fsync, int) and self.unsynced >= self.fsync):
+            self.sync()
+        return where
+
+    def sync(self):
+        if self.unsynced:
+            self._sync()
+            self.unsynced = 0
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.fsync != 'never':
+            self.sync()
+
+    def describe(self, where):
+        """Where an image is, for people, from a location write() returned."""
+        return where
+
+    @abc.abstractmethod
+    def _write(self, name, data, when, camera, index):
+        """Store one image; returns where it went."""
+
+    @abc.abstractmethod
+    def _sync(self):
+        """Make everything written so far durable."""
+
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class DirectorySink(Sink):
+    """One file per image in `directory`, created exclusively."""
+
+    def __init__(self, directory, fsync='close'):
+        super().__init__(fsync)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.pending = []  # Files written since the last sync
+
+    def _write(self, name, data, when, camera, index):
+        path = os.path.join(self.directory, name + self.extension)
+        n = 1
+        while True:
+            try:
+                f = open(path, 'xb')
+                break
+            except FileExistsError:  # Written by another process or an earlier run
+                n += 1
+                path = os.path.join(self.directory, f"{name}-{n}{self.extension}")
+        with f:
+            f.write(data)
+        self.pending.append(path)
+        return path
+
+    def _sync(self):
+        for path in self.pending:
+            _fsync_path(path)
+        self.pending.clear()
+        _fsync_path(self.directory)  # The new directory entries
+
+
+class TarSink(Sink):
+    """Images appended to a tar archive, created if missing."""
+
+    def __init__(self, path, fsync='close'):
+        super().__init__(fsync)
+        self.path = path
+        self.tar = tarfile.open(path, 'a')
+
+    def _write(self, name, data, when, camera, index):
+        info = tarfile.TarInfo(name + self.extension)
+        info.size = len(data)
+        info.mtime = when
+        self.tar.addfile(info, BytesIO(data))
+        return f"{self.path}:{info.name}"
+
+    def describe(self, where):
+        return f"{where[len(self.path) + 1:]} in tar archive {self.path}"
+
+    def _sync(self):
+        self.tar.fileobj.flush()
+        os.fsync(self.tar.fileobj.fileno())
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.tar.close()  # Writes the end-of-archive blocks
+            if self.fsync != 'never':
+                _fsync_path(self.path)
+
+
+class ZipSink(Sink):
+    """Images appended uncompressed (JPEG does not deflate) to a zip archive."""
+
+    def __init__(self, path, fsync='close'):
+        super().__init__(fsync)
+        self.path = path
+        self.zip = zipfile.ZipFile(path, 'a', compression=zipfile.ZIP_STORED)
+
+    def _write(self, name, data, when, camera, index):
+        info = zipfile.ZipInfo(name + self.extension, time.localtime(when)[:6])
+        self.zip.writestr(info, bytes(data))
+        return f"{self.path}:{info.filename}"
+
+    def describe(self, where):
+        return f"{where[len(self.path) + 1:]} in zip archive {self.path} (readable once closed)"
+
+    def _sync(self):
+        self.zip.fp.flush()
+        os.fsync(self.zip.fp.fileno())
+
+    def close(self):
+        if not self.closed:
+            self.zip.close()  # Writes the central directory
+            self.closed = True
+            if self.fsync != 'never':
+                _fsync_path(self.path)
+
+
+class SQLiteSink(Sink):
+    """Images as blobs in an SQLite database.
+
+    Table `images` (name, timestamp, camera, sequence, data) with indexes
+    on timestamp and on (camera, timestamp). Every image is committed at
+    once with synchronous=OFF; the fsync policy then decides when the
+    database file reaches the disk.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS images (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL,"
+        " timestamp REAL NOT NULL, camera TEXT, sequence INTEGER, data BLOB NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS images_timestamp ON images (timestamp)",
+        "CREATE INDEX IF NOT EXISTS images_camera ON images (camera, timestamp)",
+    )
+
+    def __init__(self, path, fsync='close'):
+        super().__init__(fsync)
+        self.path = path
+        # Used from the writer thread only, after being opened here
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA synchronous=OFF")
+        with self.db:
+            for statement in self.SCHEMA:
+                self.db.execute(statement)
+
+    def _write(self, name, data, when, camera, index):
+        unique, n = name, 1
+        while True:
+            try:
+                with self.db:
+                    self.db.execute("INSERT INTO images (name, timestamp, camera, sequence, data)"
+                                    " VALUES (?, ?, ?, ?, ?)", (unique, when, camera, index, bytes(data)))
+                return f"{self.path}:{unique}"
+            except sqlite3.IntegrityError:  # Name stored by an earlier run
+                n += 1
+                unique = f"{name}-{n}"
+
+    def describe(self, where):
+        return f"'{where[len(self.path) + 1:]}' in the images table of {self.path}"
+
+    def _sync(self):
+        _fsync_path(self.path)
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self.db.close()
+
+
+def open_sink(target, fsync='close'):
+    """Sink for `target` by its extension: .tar, .zip, .db/.sqlite/.sqlite3, else a directory."""
+    ext = os.path.splitext(target)[1].lower()
+    if ext == '.tar':
+        return TarSink(target, fsync)
+    if ext == '.zip':
+        return ZipSink(target, fsync)
+    if ext in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteSink(target, fsync)
+    return DirectorySink(target, fsync)
+
+
+class BackgroundWriter:
+    """Write frames to a sink on a worker thread while the next one is received.
+
+    `sink` is a Sink or a path for open_sink(). The queue is bounded so a
+    slow disk applies backpressure to the receive loop instead of buffering
+    an unbounded number of 5MP frames. submit() returns a
+    concurrent.futures.Future for the location the sink reports once the
+    image is written. A write that fails on the worker fails its future and
+    those of the images queued behind it, and is raised from the next
+    submit() or from close().
+    """
+
+    def __init__(self, sink, prefix='img', maxsize=4, fsync='close'):
+        self.sink = open_sink(sink, fsync) if isinstance(sink, (str, os.PathLike)) else sink
+        self.prefix = prefix
+        self.paths = []
+        self.last_name = None
+        self.repeats = 0
+        self.error = None
+        self.queue = queue.Queue(maxsize)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, data, index=None, camera=None):
+        """Queue `data`; returns a Future for where it is stored (blocks while the queue is full)."""
+        if self.error is not None:
+            raise self.error
+        when = time.time()
+        name = timestamp_name(self.prefix, when, camera, index)
+        if name == self.last_name:  # Same microsecond as the previous frame
+            self.repeats += 1
+        else:
+            self.last_name, self.repeats = name, 1
+        if self.repeats > 1:
+            name = f"{name}-{self.repeats}"
+        stored = concurrent.futures.Future()
+        self.queue.put((stored, (name, data, when, camera, index)))
+        return stored
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            stored, args = item
+            if self.error is None:
+                try:
+                    where = self.sink.write(*args)
+                except Exception as e:
+                    self.error = e
+                else:
+                    self.paths.append(where)
+                    stored.set_result(where)
+                    continue
+            stored.set_exception(self.error)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+            self.sink.close()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,113 @@
+"""Undo the wiring faults that check_for_header() in circuitpython/code.py detects.
+
+When the SOI was only found after a bit reversal, inversion, nibble swap
+or 1-bit shift, the device streams the FIFO bytes as they are and puts the
+fault's index in TRANSFORMS (code.py; TRANSFORM_NAMES here) in the low
+bits of the frame header flags (FLAG_TRANSFORM). recover() turns such a payload back into the JPEG:
+
+    payload = recover(payload, header.flags & FLAG_TRANSFORM)
+
+Byte-wise faults are undone with a 256-entry lookup table through
+bytes.translate(), which is faster than a NumPy table lookup. The shifts
+move every bit across byte boundaries, using NumPy array shifts when NumPy
+is installed (`uv run --with numpy ...`) and int arithmetic otherwise.
+Undoing Shift-R1 loses the bit shifted out of the last byte. That byte is
+FIFO padding after the EOI.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+STANDARD, BIT_REVERSED, BIT_INVERTED, NIBBLE_SWAP, SHIFT_R1, SHIFT_L1 = range(6)
+TRANSFORM_NAMES = ('Standard', 'Bit-Reversed', 'Bit-Inverted', 'Nibble-Swap', 'Shift-R1', 'Shift-L1')
+FLAG_TRANSFORM = 0x000F
+
+
+def _reverse_bits(b):
+    return int(f'{b:08b}'[::-1], 2)
+
+
+# The byte-wise faults are their own inverse
+TABLES = {
+    BIT_REVERSED: bytes(_reverse_bits(b) for b in range(256)),
+    BIT_INVERTED: bytes(b ^ 0xFF for b in range(256)),
+    NIBBLE_SWAP: bytes(((b << 4) | (b >> 4)) & 0xFF for b in range(256)),
+}
+
+
+def transform_name(transform):
+    if 0 <= transform < len(TRANSFORM_NAMES):
+        return TRANSFORM_NAMES[transform]
+    return f'unknown ({transform})'
+
+
+def _shift(data, left, carry):
+    # The whole payload as one big-endian number shifted by one bit; `carry`
+    # is the bit shifted in at the far end
+    n = len(data)
+    if n == 0:
+        return b''
+    value = int.from_bytes(data, 'big')
+    if left:
+        value = ((value << 1) & ((1 << 8 * n) - 1)) | carry
+    else:
+        value = (value >> 1) | (carry << (8 * n - 1))
+    return value.to_bytes(n, 'big')
+
+
+def _shift_numpy(data, left, carry):
+    src = np.frombuffer(data, dtype=np.uint8)
+    out = np.empty_like(src)
+    if not len(src):
+        return b''
+    if left:
+        out[:-1] = (src[:-1] << 1) | (src[1:] >> 7)
+        out[-1] = ((src[-1] << 1) | carry) & 0xFF
+    else:
+        out[1:] = (src[1:] >> 1) | (src[:-1] << 7)
+        out[0] = (src[0] >> 1) | (carry << 7)
+    return out.tobytes()
+
+
+def apply(data, transform, use_numpy=None):
+    """The forward fault: what the device streams when the wiring has `transform`.
+
+    For the shifts the bit shifted in is 0. Used by the emulator and the
+    benchmarks to produce faulted payloads.
+    """
+    return _run(data, transform, use_numpy, forward=True)
+
+
+def recover(data, transform, use_numpy=None):
+    """Return `data` with `transform` undone.
+
+    Standard payloads come back unchanged (not copied); anything else is a
+    new bytes object. use_numpy=None picks the faster method for the fault
+    (NumPy only for the shifts, if installed); True or False forces NumPy on
+    or off. Raises ValueError for an unknown transform id.
+    """
+    return _run(data, transform, use_numpy, forward=False)
+
+
+def _run(data, transform, use_numpy, forward):
+    if transform == STANDARD:
+        return data
+    if use_numpy and np is None:
+        raise ImportError("NumPy is not installed")
+    if transform in TABLES:
+        if use_numpy:
+            table = np.frombuffer(TABLES[transform], dtype=np.uint8)
+            return np.take(table, np.frombuffer(data, dtype=np.uint8)).tobytes()
+        return bytes(data).translate(TABLES[transform])
+    if transform in (SHIFT_R1, SHIFT_L1):
+        # Shift-R1 is undone by a left shift and vice versa. Undoing
+        # Shift-L1 needs the bit lost off the first byte: the payload starts
+        # at the SOI, whose first byte is 0xFF
+        left = (transform == SHIFT_L1) == forward
+        carry = 0 if forward or left else 1
+        if use_numpy is None:
+            use_numpy = np is not None
+        shift = _shift_numpy if use_numpy else _shift
+        return shift(data, left, carry)
+    raise ValueError(f"Unknown transform {transform}")
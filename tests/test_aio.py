@@ -0,0 +1,195 @@
+import asyncio
+import contextlib
+import os
+import tty
+
+import pytest
+
+from picocam.aio import AsyncPicoCamera, AsyncSerial
+from picocam.burst import BURST_DONE, CMD_BURST, CMD_STOP
+from picocam.camera import ARDUINO, CIRCUITPYTHON, CMD_CAPTURE, CMD_PING, CameraError
+from picocam.emulator import PicoEmulator, load_images
+from picocam.frame import FrameError, encode_frame
+from picocam.jpeg import validate_jpeg
+
+JPEG = min(load_images(), key=len)
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 30))
+
+
+class ScriptedPico:
+    """The device side of a pty, answering command bytes with canned replies.
+
+    `replies` maps a command byte to the bytes sent back when it arrives;
+    commands without a reply are only recorded in `received`.
+    """
+
+    def __init__(self, replies=None):
+        self.replies = dict(replies or {})
+        self.received = bytearray()
+        self.master, self.fd = os.openpty()
+        tty.setraw(self.fd)
+        os.set_blocking(self.master, False)
+
+    def start(self):
+        asyncio.get_running_loop().add_reader(self.master, self._on_command)
+        return self
+
+    def _on_command(self):
+        for cmd in os.read(self.master, 1024):
+            self.received.append(cmd)
+            os.write(self.master, self.replies.get(cmd, b''))
+
+    def close(self):
+        asyncio.get_running_loop().remove_reader(self.master)
+        os.close(self.master)
+        os.close(self.fd)
+
+
+def framed(jpeg, sequence=1):
+    return b"ACK IMG END\n" + encode_frame(jpeg, resolution=6, sequence=sequence)
+
+
+@pytest.mark.parametrize('dialect', [CIRCUITPYTHON, ARDUINO])
+def test_wait_ready_and_capture(dialect):
+    async def main():
+        async with AsyncPicoCamera(fd=emu.fd, dialect=dialect, boot_wait=2) as cam:
+            jpeg = await cam.capture()
+            return jpeg, cam.last_header
+
+    with PicoEmulator(dialect, [JPEG], boot_delay=0.2) as emu:
+        jpeg, header = run(main())
+    assert jpeg == JPEG
+    assert header.sequence == 1
+    assert validate_jpeg(jpeg).end == len(JPEG)
+
+
+def test_stream_frames_count():
+    async def main():
+        async with AsyncPicoCamera(fd=emu.fd) as cam:
+            return [(header.sequence, jpeg) async for header, jpeg in cam.stream_frames(3)]
+
+    with PicoEmulator(CIRCUITPYTHON, [JPEG]) as emu:
+        frames = run(main())
+    assert frames == [(1, JPEG), (2, JPEG), (3, JPEG)]
+
+
+def test_stream_frames_stops_device_when_consumer_stops():
+    async def main():
+        async with AsyncPicoCamera(fd=emu.fd) as cam:
+            async with contextlib.aclosing(cam.stream_frames(0)) as frames:
+                async for header, _ in frames:
+                    if header.sequence == 2:
+                        break
+            # The device finishes the frame in flight, then ends the burst
+            return await cam._wait_line((BURST_DONE,), 10)
+
+    with PicoEmulator(CIRCUITPYTHON, [JPEG], rate=2e6) as emu:
+        assert run(main()) is not None
+
+
+def test_wait_ready_times_out_on_silent_port():
+    async def main():
+        device = ScriptedPico().start()
+        cam = AsyncPicoCamera(fd=device.fd)
+        await cam.open(wait=False)
+        try:
+            with pytest.raises(CameraError, match="did not report ready"):
+                await cam.wait_ready(timeout=0.5)
+        finally:
+            cam.close()
+            device.close()
+        return device.received
+
+    assert bytes(run(main())).startswith(CMD_PING)
+
+
+def test_capture_times_out_on_truncated_frame():
+    async def main():
+        device = ScriptedPico({CMD_CAPTURE[0]: framed(JPEG)[:-100]}).start()
+        cam = AsyncPicoCamera(fd=device.fd, probe=False)
+        await cam.open(wait=False)
+        cam.transfer_timeout = 0.2
+        try:
+            with pytest.raises(FrameError, match="Timed out"):
+                await cam.capture()
+        finally:
+            cam.close()
+            device.close()
+
+    run(main())
+
+
+def test_cancelled_capture_leaves_camera_usable():
+    async def main():
+        device = ScriptedPico().start()  # Never answers the first capture
+        cam = AsyncPicoCamera(fd=device.fd, probe=False)
+        await cam.open(wait=False)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(cam.capture(), 0.2)
+            assert cam.link._waiter is None
+            device.replies[CMD_CAPTURE[0]] = framed(JPEG, sequence=5)
+            jpeg = await cam.capture()
+            return jpeg, cam.last_header.sequence
+        finally:
+            cam.close()
+            device.close()
+
+    assert run(main()) == (JPEG, 5)
+
+
+def test_cancelled_stream_stops_device():
+    async def main():
+        # One frame, then the device stalls mid-burst
+        device = ScriptedPico({CMD_BURST[0]: b"ACK CMD Burst Started: 0 frames END\n" + framed(JPEG)}).start()
+        cam = AsyncPicoCamera(fd=device.fd, probe=False)
+        await cam.open(wait=False)
+        received = []
+
+        async def consume():
+            async for header, jpeg in cam.stream_frames(0):
+                received.append(jpeg)
+
+        task = asyncio.create_task(consume())
+        try:
+            while not received:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0.05)  # Let the stop command reach the device
+            return received, bytes(device.received)
+        finally:
+            cam.close()
+            device.close()
+
+    received, commands = run(main())
+    assert received == [JPEG]
+    assert commands.endswith(CMD_STOP)
+
+
+def test_write_queues_what_the_port_cannot_take():
+    async def main():
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        loop = asyncio.get_running_loop()
+        link = AsyncSerial(slave)
+        data = os.urandom(1 << 20)  # Far beyond the pty's buffer
+        link.write(data)  # Returns at once with the rest queued
+        assert link.wbuf
+        got = bytearray()
+        loop.add_reader(master, lambda: got.extend(os.read(master, 65536)))
+        await link.drain()
+        while len(got) < len(data):
+            await asyncio.sleep(0.01)
+        loop.remove_reader(master)
+        link.close()
+        os.close(master)
+        os.close(slave)
+        return got == data
+
+    assert run(main())
@@ -0,0 +1,40 @@
+from picocam.camera import CIRCUITPYTHON, PicoCamera
+from picocam.emulator import PicoEmulator, load_images
+
+JPEG = min(load_images(), key=len)
+SOF = JPEG.index(b'\xff\xc0')
+# Zero width in the SOF: the validator rejects the frame a few hundred bytes in
+BROKEN = JPEG[:SOF + 7] + b'\x00\x00' + JPEG[SOF + 9:]
+
+
+class MixedEmulator(PicoEmulator):
+    """Sends its images in turn in previews too, not only those of the preview size."""
+
+    def sized_images(self, resolution):
+        return self.images
+
+
+def replies(lines, start):
+    """The lines from the one containing `start` on."""
+    return lines[next(i for i, line in enumerate(lines) if start in line):]
+
+
+def test_burst_drops_the_rest_of_a_bad_frame():
+    lines, frames = [], []
+    with MixedEmulator(CIRCUITPYTHON, [JPEG, BROKEN], capture_time=0.1) as emu, \
+            PicoCamera(emu.port, CIRCUITPYTHON, on_line=lines.append) as cam:
+        stats = cam.burst(6, lambda header, jpeg: frames.append(header.sequence))
+    assert (stats.frames, stats.errors) == (3, 3)
+    assert frames == [1, 3, 5]
+    # Without the resync the bad frames' payloads are read as text lines
+    assert all(line.startswith("ACK ") for line in replies(lines, "Burst Started"))
+
+
+def test_preview_drops_the_rest_of_a_bad_frame():
+    lines = []
+    with MixedEmulator(CIRCUITPYTHON, [BROKEN, JPEG], capture_time=0.1) as emu, \
+            PicoCamera(emu.port, CIRCUITPYTHON, on_line=lines.append) as cam:
+        stream = cam.preview(4)
+        assert list(stream) == [JPEG, JPEG]
+        assert (stream.frames, stream.errors) == (2, 2)
+    assert all(line.startswith("ACK ") for line in replies(lines, "Preview Started"))
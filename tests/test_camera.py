@@ -0,0 +1,69 @@
+import pytest
+
+from picocam.camera import CIRCUITPYTHON, PicoCamera
+from picocam.emulator import load_images
+from picocam.frame import FrameError, encode_frame
+
+JPEG = min(load_images(), key=len)
+
+
+class ScriptedSerial:
+    """A port that has already received `data` from the device."""
+
+    is_open = True
+
+    def __init__(self, data):
+        self.data = bytearray(data)
+        self.written = bytearray()
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def read(self, size=1):
+        chunk = bytes(self.data[:size])
+        del self.data[:size]
+        return chunk
+
+    def readinto(self, view):
+        chunk = self.read(len(view))
+        view[:len(chunk)] = chunk
+        return len(chunk)
+
+    def readline(self):
+        end = self.data.find(b'\n')
+        return self.read(len(self.data) if end == -1 else end + 1)
+
+    def write(self, data):
+        self.written += data
+
+    def flush(self):
+        pass
+
+
+def camera(data):
+    cam = PicoCamera('scripted', CIRCUITPYTHON)
+    cam.ser = ScriptedSerial(data)
+    cam.transfer_timeout = 0.2
+    return cam
+
+
+@pytest.mark.parametrize('frame', [
+    encode_frame(JPEG, resolution=6, sequence=1),  # Plain frame where a chunked one was asked for
+    b'\x00' * 16 + encode_frame(JPEG),  # Noise in place of the header
+], ids=['not-chunked', 'bad-header'])
+def test_chunked_frame_error_discards_the_rest(frame):
+    cam = camera(b"ACK CMD Chunked: 4096 END\nACK IMG END\n" + frame + b"ACK CMD Stream Finished. END\n")
+    with pytest.raises(FrameError):
+        cam.receive()
+    assert cam.ser.in_waiting == 0
+
+
+def test_framed_frame_error_discards_the_rest():
+    frame = bytearray(encode_frame(JPEG))
+    frame[-1] ^= 0x01
+    cam = camera(b"ACK IMG END\n" + frame + b"ACK CMD Stream Finished. END\n")
+    with pytest.raises(FrameError, match="CRC"):
+        cam.receive()
+    assert cam.ser.in_waiting == 0
+
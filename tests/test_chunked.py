@@ -0,0 +1,54 @@
+import pytest
+
+from picocam.camera import ARDUINO, CIRCUITPYTHON, PicoCamera
+from picocam.chunked import CMD_RESEND, parse_chunk_size, resend_command
+from picocam.emulator import Faults, PicoEmulator, load_images
+from picocam.frame import FrameError
+
+FULL = max(load_images(), key=len)
+
+
+def test_parse_chunk_size():
+    assert parse_chunk_size("ACK CMD Chunked: 4096 END") == 4096
+    assert parse_chunk_size("ACK CMD Chunked: END") is None
+    assert parse_chunk_size("ACK CMD Length: 4096 END") is None
+
+
+def test_resend_command():
+    assert resend_command([3, 17, 64]) == CMD_RESEND + b"3,17,64\n"
+    assert resend_command(()) == CMD_RESEND + b"\n"
+
+
+def test_clean_link_needs_one_round():
+    with PicoEmulator(CIRCUITPYTHON, [FULL]) as emu, PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        jpeg = cam.capture(chunked=True)
+        stats = cam.last_chunk_stats
+    assert bytes(jpeg) == FULL
+    assert stats == {'rounds': 1, 'resent': 0}
+
+
+def test_only_damaged_chunks_are_resent():
+    count = -(-len(FULL) // 4096)
+    faults = Faults(block_error=0.2)
+    with PicoEmulator(CIRCUITPYTHON, [FULL], faults=faults, seed=1) as emu, \
+            PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        jpegs = [bytes(cam.capture(chunked=True)) for _ in range(2)]
+        stats = cam.last_chunk_stats
+    assert jpegs == [FULL, FULL]
+    assert stats['rounds'] > 1
+    assert 0 < stats['resent'] < count
+
+
+def test_gives_up_after_max_rounds_and_stays_usable():
+    with PicoEmulator(CIRCUITPYTHON, [FULL], faults=Faults(block_error=1.0)) as emu, \
+            PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        with pytest.raises(FrameError, match="still missing after 8 rounds"):
+            cam.capture(chunked=True)
+        # The device got the closing empty resend list and is back in its command loop
+        assert cam.ping().state == 'ready'
+
+
+def test_arduino_has_no_chunked_transfer():
+    cam = PicoCamera('unused', ARDUINO)
+    with pytest.raises(ValueError):
+        cam.capture(chunked=True)
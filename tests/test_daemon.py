@@ -0,0 +1,125 @@
+import http.client
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+from picocam.daemon import CachedFrame, CaptureService, FrameCache, make_server, remove_stale_socket
+
+Header = namedtuple('Header', 'sequence resolution')
+
+
+def frame(sequence, data):
+    return CachedFrame(sequence, 0.0, 6, data)
+
+
+def test_sequence_reset_replaces_and_moves_to_newest():
+    cache = FrameCache()
+    cache.add(frame(1, b'a' * 10))
+    cache.add(frame(2, b'b' * 10))
+    cache.add(frame(1, b'c' * 10))  # The board reset and numbers from 1 again
+    assert len(cache) == 2
+    assert cache.bytes == 20
+    assert cache.latest().jpeg == b'c' * 10
+    assert cache.get(1).jpeg == b'c' * 10
+
+
+def test_eviction_after_sequence_reset():
+    cache = FrameCache(max_bytes=25, max_frames=16)
+    for sequence in (1, 2, 1, 3):
+        cache.add(frame(sequence, bytes(10)))
+    # 2 is now the oldest entry; evicting it brings the total back under the limit
+    assert list(cache.frames) == [1, 3]
+    assert cache.bytes == 20
+
+
+def test_newest_frame_kept_past_the_limit():
+    cache = FrameCache(max_bytes=5)
+    cache.add(frame(1, bytes(4)))
+    cache.add(frame(2, bytes(10)))
+    assert list(cache.frames) == [2]
+    assert cache.bytes == 10
+
+
+class SlowCamera:
+    """PicoCamera stand-in whose capture() lasts until `waiting` other clients have queued up."""
+
+    port = 'fake'
+    dialect = 'circuitpython'
+    is_open = True
+
+    def __init__(self, clients):
+        self.service = None
+        self.waiting = clients - 1
+        self.calls = 0
+        self.last_header = None
+
+    def capture(self):
+        self.calls += 1
+        deadline = time.monotonic() + 10
+        while self.service.coalesced < self.waiting and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.last_header = Header(self.calls, 6)
+        return b'jpeg %d' % self.calls
+
+
+def test_concurrent_clients_share_one_capture():
+    clients = 8
+    camera = SlowCamera(clients)
+    service = camera.service = CaptureService(camera)
+    server = make_server(service, http_port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    responses = [None] * clients
+
+    def fetch(i):
+        conn = http.client.HTTPConnection(*server.server_address, timeout=20)
+        conn.request('GET', '/capture')
+        reply = conn.getresponse()
+        responses[i] = (reply.status, reply.getheader('X-Frame-Sequence'), reply.read())
+        conn.close()
+
+    threads = [threading.Thread(target=fetch, args=(i,)) for i in range(clients)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(20)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert camera.calls == 1
+    assert responses == [(200, '1', b'jpeg 1')] * clients
+    status = service.status()
+    assert (status['captures'], status['coalesced'], status['busy']) == (1, clients - 1, False)
+    # The next request after the flight lands is a new capture
+    assert service.capture().jpeg == b'jpeg 2'
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / 'pico.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()  # Bound but nobody listening, as after a crash
+    remove_stale_socket(path)
+    assert not os.path.exists(path)
+
+
+def test_live_socket_is_not_replaced(tmp_path):
+    path = str(tmp_path / 'pico.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as live:
+        live.bind(path)
+        live.listen()
+        with pytest.raises(OSError, match="Another process"):
+            make_server(None, unix_path=path)
+    assert os.path.exists(path)
+
+
+def test_other_file_is_not_replaced(tmp_path):
+    path = tmp_path / 'pico.sock'
+    path.write_text('not a socket')
+    with pytest.raises(FileExistsError):
+        make_server(None, unix_path=str(path))
+    assert path.read_text() == 'not a socket'
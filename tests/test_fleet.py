@@ -0,0 +1,51 @@
+import contextlib
+
+import pytest
+import serial
+
+from picocam.camera import CIRCUITPYTHON, CameraError
+from picocam.emulator import Faults, PicoEmulator, load_images
+from picocam.fleet import Fleet
+
+IMAGES = sorted(load_images(), key=len)
+
+
+def emulators(stack, faults):
+    return {name: stack.enter_context(PicoEmulator(CIRCUITPYTHON, [jpeg], faults=fault))
+            for (name, fault), jpeg in zip(faults.items(), IMAGES)}
+
+
+def test_round_fans_out_to_every_camera():
+    with contextlib.ExitStack() as stack:
+        emus = emulators(stack, {'a': None, 'b': None, 'c': None})
+        with Fleet(CIRCUITPYTHON, {name: emu.port for name, emu in emus.items()}) as fleet:
+            rounds = [fleet.capture_round() for _ in range(2)]
+            sequences = {cid: cam.last_header.sequence for cid, cam in fleet.cameras.items()}
+    for result in rounds:
+        assert result.errors == {}
+        assert result.frames == dict(zip('abc', IMAGES))
+        assert set(result.trigger_times) == set('abc')
+        assert result.skew == max(result.trigger_times.values()) - min(result.trigger_times.values())
+        assert result.bytes == sum(map(len, IMAGES))
+    assert sequences == {'a': 2, 'b': 2, 'c': 2}
+
+
+def test_failing_camera_does_not_stop_the_others():
+    with contextlib.ExitStack() as stack:
+        emus = emulators(stack, {'a': None, 'b': Faults(timeout=1.0), 'c': None})
+        with Fleet(CIRCUITPYTHON, {name: emu.port for name, emu in emus.items()}) as fleet:
+            result = fleet.capture_round()
+            # The failure is per round: the next one still gets the healthy cameras
+            again = fleet.capture_round()
+    for r in (result, again):
+        assert set(r.frames) == {'a', 'c'}
+        assert list(r.errors) == ['b'] and isinstance(r.errors['b'], CameraError)
+        assert set(r.trigger_times) == set('abc')
+
+
+def test_open_failure_closes_every_camera(tmp_path):
+    with PicoEmulator(CIRCUITPYTHON, IMAGES[:1]) as emu:
+        fleet = Fleet(CIRCUITPYTHON, {'a': emu.port, 'missing': str(tmp_path / 'ttyACM9')})
+        with pytest.raises(serial.SerialException):
+            fleet.open()
+        assert not any(cam.is_open for cam in fleet.cameras.values())
@@ -0,0 +1,110 @@
+import pytest
+
+from picocam.frame import (HEADER_SIZE, TRAILER_SIZE, FrameError, check_body, decode_header, encode_frame,
+                           encode_header, read_frame)
+from picocam.jpeg import JpegError, JpegValidator
+
+JPEG = b'\xff\xd8\xff\xfe\x00\x06test\xff\xda\x00\x02' + bytes(range(1, 255)) * 8 + b'\xff\xd9'
+
+
+class ReplaySerial:
+    """Serial port stand-in that hands out `data` at most `burst` bytes per read."""
+
+    def __init__(self, data, burst=None):
+        self.data = bytes(data)
+        self.pos = 0
+        self.burst = burst or len(self.data) or 1
+
+    @property
+    def in_waiting(self):
+        return len(self.data) - self.pos
+
+    def readinto(self, view):
+        n = min(len(view), self.burst, len(self.data) - self.pos)
+        view[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+def test_header_round_trip():
+    header = decode_header(encode_header(123456, resolution=6, sequence=42, flags=0x4000))
+    assert (header.resolution, header.sequence, header.flags, header.length) == (6, 42, 0x4000, 123456)
+
+
+@pytest.mark.parametrize('payload', [b'', b'x', JPEG])
+def test_frame_round_trip(payload):
+    frame = encode_frame(payload, resolution=3, sequence=7)
+    assert len(frame) == HEADER_SIZE + len(payload) + TRAILER_SIZE
+    header, body = read_frame(ReplaySerial(frame), timeout=1)
+    assert (header.resolution, header.sequence, header.length) == (3, 7, len(payload))
+    assert bytes(body) == payload
+
+
+def test_short_reads_are_reassembled():
+    # A USB CDC port delivers a frame in pieces of any size
+    for burst in (1, 7, HEADER_SIZE + 1):
+        header, body = read_frame(ReplaySerial(encode_frame(JPEG, sequence=burst), burst), timeout=1)
+        assert header.sequence == burst
+        assert bytes(body) == JPEG
+
+
+@pytest.mark.parametrize('offset', range(HEADER_SIZE))
+def test_corrupted_header_rejected(offset):
+    frame = bytearray(encode_frame(JPEG))
+    frame[offset] ^= 0x01
+    with pytest.raises(FrameError):
+        read_frame(ReplaySerial(frame), timeout=1)
+
+
+def test_corrupted_header_crc_rejected():
+    header = bytearray(encode_header(10))
+    header[-1] ^= 0x80
+    with pytest.raises(FrameError, match="Header CRC mismatch"):
+        decode_header(header)
+
+
+@pytest.mark.parametrize('offset', [HEADER_SIZE, HEADER_SIZE + len(JPEG) // 2, -1])
+def test_corrupted_payload_rejected(offset):
+    # The last byte is the payload CRC itself
+    frame = bytearray(encode_frame(JPEG))
+    frame[offset] ^= 0x01
+    with pytest.raises(FrameError, match="Payload CRC mismatch"):
+        read_frame(ReplaySerial(frame), timeout=1)
+
+
+def test_check_body_rejects_corruption():
+    frame = encode_frame(JPEG)
+    header = decode_header(frame[:HEADER_SIZE])
+    body = bytearray(frame[HEADER_SIZE:])
+    assert bytes(check_body(header, body)) == JPEG
+    body[0] ^= 0xFF
+    with pytest.raises(FrameError):
+        check_body(header, body)
+
+
+@pytest.mark.parametrize('size', [0, 1, HEADER_SIZE - 1])
+def test_truncated_header_times_out(size):
+    with pytest.raises(FrameError, match="header"):
+        read_frame(ReplaySerial(encode_frame(JPEG)[:size]), timeout=0.05)
+
+
+@pytest.mark.parametrize('missing', [1, TRAILER_SIZE, 100])
+def test_truncated_body_times_out(missing):
+    frame = encode_frame(JPEG)
+    with pytest.raises(FrameError, match=f"{len(frame) - HEADER_SIZE - missing} of"):
+        read_frame(ReplaySerial(frame[:-missing], burst=64), timeout=0.05)
+
+
+def test_truncated_body_stops_at_idle_timeout():
+    with pytest.raises(FrameError, match="Timed out"):
+        read_frame(ReplaySerial(encode_frame(JPEG)[:-100]), timeout=60, idle_timeout=0.05)
+
+
+def test_decode_header_wrong_size():
+    with pytest.raises(FrameError, match="expected"):
+        decode_header(encode_header(10)[:-1])
+
+
+def test_validator_rejects_a_non_jpeg_payload():
+    with pytest.raises(JpegError):
+        read_frame(ReplaySerial(encode_frame(b'not a jpeg' * 10)), timeout=1, validator=JpegValidator())
@@ -0,0 +1,81 @@
+import pytest
+
+from picocam.emulator import load_images
+from picocam.frame import HEADER_SIZE, TRAILER_SIZE, decode_header, encode_frame
+from picocam.jpeg import JpegError, JpegValidator, frame_jpeg, validate_jpeg
+
+JPEG = min(load_images(), key=len)
+SOF = JPEG.index(b'\xff\xc0')
+
+
+def with_sof(height, width):
+    jpeg = bytearray(JPEG)
+    jpeg[SOF + 5:SOF + 9] = height.to_bytes(2, 'big') + width.to_bytes(2, 'big')
+    return bytes(jpeg)
+
+
+def test_sample_is_valid():
+    validator = validate_jpeg(JPEG + b'\x00' * 5)
+    assert (validator.width, validator.height) == (320, 240)
+    assert validator.end == len(JPEG)
+
+
+@pytest.mark.parametrize('size', [0, 1, 2, SOF, SOF + 7, len(JPEG) // 2, len(JPEG) - 1])
+def test_truncated_jpeg(size):
+    with pytest.raises(JpegError, match="truncated"):
+        validate_jpeg(JPEG[:size])
+
+
+def test_missing_eoi():
+    # Entropy-coded data that simply stops, padded like a FIFO read
+    with pytest.raises(JpegError, match="truncated after .* in entropy-coded data"):
+        validate_jpeg(JPEG[:-2] + b'\x00' * 64)
+
+
+@pytest.mark.parametrize('height, width', [(240, 0), (0, 0)])
+def test_bad_sof_dimensions(height, width):
+    with pytest.raises(JpegError, match=f"SOF gives {width}x{height}"):
+        validate_jpeg(with_sof(height, width))
+
+
+def test_no_soi():
+    with pytest.raises(JpegError, match="no SOI"):
+        validate_jpeg(b'\x00' + JPEG)
+
+
+@pytest.mark.parametrize('chunk', [1, 3, 64, 4096])
+def test_chunked_feed_matches_one_call(chunk):
+    validator = JpegValidator()
+    done = [validator.feed(JPEG[i:i + chunk]) for i in range(0, len(JPEG), chunk)]
+    assert done[-1] and not any(done[:-1])
+    assert (validator.end, validator.width, validator.height, validator.scans) == \
+        (len(JPEG), 320, 240, validate_jpeg(JPEG).scans)
+    validator.finish()
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 256])
+def test_chunked_feed_fails_in_the_chunk_with_the_error(chunk):
+    # A receiver can give up on the frame as soon as the SOF arrives
+    bad = with_sof(240, 0)
+    validator = JpegValidator()
+    with pytest.raises(JpegError, match="SOF gives"):
+        for i in range(0, len(bad), chunk):
+            validator.feed(memoryview(bad)[i:i + chunk])
+    assert i < SOF + 19
+
+
+def test_chunked_feed_ignores_input_after_eoi():
+    validator = JpegValidator()
+    assert validator.feed(JPEG[:100]) is False
+    assert validator.feed(JPEG[100:] + b'\xff\xd8 FIFO padding') is True
+    assert validator.feed(b'more') is True
+    assert validator.end == len(JPEG)
+
+
+def test_frame_jpeg_trims_padding_and_checks_unfed_payloads():
+    frame = encode_frame(JPEG + bytes(5))
+    header = decode_header(frame[:HEADER_SIZE])
+    jpeg, validator = frame_jpeg(header, frame[HEADER_SIZE:-TRAILER_SIZE])
+    assert jpeg == JPEG and validator.width == 320
+    with pytest.raises(JpegError):
+        frame_jpeg(header, JPEG[:-2])
@@ -0,0 +1,53 @@
+import pytest
+
+from picocam.camera import ARDUINO, CIRCUITPYTHON, PicoCamera
+from picocam.emulator import PicoEmulator
+from picocam.jpeg import validate_jpeg
+from picocam.preview import PREVIEW_RESOLUTION
+
+
+def size(jpeg):
+    info = validate_jpeg(jpeg)
+    return info.width, info.height
+
+
+@pytest.mark.parametrize('dialect', [CIRCUITPYTHON, ARDUINO])
+def test_preview_count_returns_to_full_resolution(dialect, tmp_path):
+    mjpeg = tmp_path / 'preview.mjpeg'
+    with PicoEmulator(dialect) as emu, PicoCamera(emu.port, dialect) as cam:
+        stream = cam.preview(3, mjpeg=str(mjpeg))
+        frames = list(stream)
+        assert stream.done and stream.last_header.resolution == PREVIEW_RESOLUTION
+        assert cam.stop_preview() == 6
+    assert [size(jpeg) for jpeg in frames] == [(320, 240)] * 3
+    assert (stream.stats.frames, stream.stats.errors) == (3, 0)
+    assert mjpeg.read_bytes() == b''.join(frames)
+
+
+@pytest.mark.parametrize('dialect', [CIRCUITPYTHON, ARDUINO])
+def test_stop_preview_ends_an_open_stream(dialect):
+    with PicoEmulator(dialect, rate=2e6) as emu, PicoCamera(emu.port, dialect) as cam:
+        stream = cam.preview()
+        first = next(stream)
+        assert cam.stop_preview() == 6
+        assert stream.done and stream.frames >= 1
+        status = cam.ping()
+    assert size(first) == (320, 240)
+    assert status.resolution == 6
+
+
+@pytest.mark.parametrize('dialect', [CIRCUITPYTHON, ARDUINO])
+def test_shoot_leaves_preview_with_a_full_capture(dialect):
+    with PicoEmulator(dialect, rate=2e6) as emu, PicoCamera(emu.port, dialect) as cam:
+        stream = cam.preview()
+        next(stream)
+        jpeg = cam.shoot()
+        assert cam.preview_stream is None and cam.resolution == 6
+    assert size(jpeg) == (2592, 1944)
+
+
+def test_shoot_outside_preview_is_a_capture():
+    with PicoEmulator(CIRCUITPYTHON) as emu, PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        jpeg = cam.shoot()
+        assert cam.last_header.sequence == 1 and cam.last_header.resolution == 6
+    validate_jpeg(jpeg)
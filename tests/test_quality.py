@@ -0,0 +1,55 @@
+import pytest
+
+from picocam.camera import CIRCUITPYTHON, PicoCamera
+from picocam.emulator import Faults, PicoEmulator, load_images
+from picocam.jpeg import jpeg_comments
+from picocam.quality import QSCALE_DEFAULT, QualityController, qscale_from_comments, size_ratio
+
+FULL = max(load_images(), key=len)
+
+
+def test_controller_coarsens_to_fit_byte_budget():
+    controller = QualityController(budget_bytes=100_000)
+    qscale = controller.observe(QSCALE_DEFAULT, 250_000)
+    assert qscale > QSCALE_DEFAULT
+    assert 250_000 * size_ratio(qscale, QSCALE_DEFAULT) * 1.1 <= 100_000
+
+
+def test_controller_needs_exactly_one_budget():
+    with pytest.raises(ValueError):
+        QualityController()
+    with pytest.raises(ValueError):
+        QualityController(budget_bytes=1, budget_time=1.0)
+
+
+def test_time_budget_waits_for_a_rate():
+    controller = QualityController(budget_time=1.0, overhead=0.2)
+    assert controller.budget() is None
+    controller.observe(QSCALE_DEFAULT, 200_000, seconds=1.2)
+    assert controller.budget() == pytest.approx(0.8 * 200_000)
+
+
+def test_burst_within_byte_budget():
+    budget = len(FULL) // 2
+    quality = QualityController(budget_bytes=budget)
+    frames = []
+    with PicoEmulator(CIRCUITPYTHON, [FULL]) as emu, PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        stats = cam.burst(5, lambda header, jpeg: frames.append(bytes(jpeg)), quality)
+    assert stats.frames == 5 and stats.errors == 0
+    assert [qscale_from_comments(jpeg_comments(jpeg)) for jpeg in frames] == \
+        [record.qscale for record in quality.history]
+    assert quality.history[0].qscale == QSCALE_DEFAULT
+    # The first frame is over budget; the controller fits the rest
+    assert all(record.length <= budget for record in quality.history[1:])
+
+
+def test_burst_counts_capture_errors():
+    # The device reports a capture timeout ('ACK CMD ERROR') for some frames
+    quality = QualityController(budget_bytes=len(FULL) // 2)
+    frames = []
+    with PicoEmulator(CIRCUITPYTHON, [FULL], faults=Faults(timeout=0.4), seed=3) as emu, \
+            PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        stats = cam.burst(8, lambda header, jpeg: frames.append(bytes(jpeg)), quality)
+    assert stats.errors and stats.frames + stats.errors == 8
+    assert len(frames) == len(quality.history) == stats.frames
+    assert quality.history[-1].qscale > QSCALE_DEFAULT
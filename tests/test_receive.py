@@ -0,0 +1,99 @@
+import pytest
+
+from picocam.emulator import load_images
+from picocam.receive import parse_length, read_exact, receive_jpeg, trim_to_eoi, wait_for_line
+
+JPEG = min(load_images(), key=len)
+
+
+class ReplaySerial:
+    """Serial port stand-in that hands out `data` at most `burst` bytes per read."""
+
+    def __init__(self, data, burst=None):
+        self.data = bytes(data)
+        self.pos = 0
+        self.burst = burst or len(self.data) or 1
+
+    @property
+    def in_waiting(self):
+        return len(self.data) - self.pos
+
+    def readinto(self, view):
+        n = min(len(view), self.burst, len(self.data) - self.pos)
+        view[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def readline(self):
+        end = self.data.find(b'\n', self.pos)
+        end = len(self.data) if end == -1 else end + 1
+        line, self.pos = self.data[self.pos:end], end
+        return line
+
+
+@pytest.mark.parametrize('text, length', [
+    ("ACK CMD Length: 5692 END", 5692),
+    ("ACK CMD Length:  12 END", 12),
+    ("ACK CMD Length: END", None),
+    ("ACK CMD Length: many END", None),
+    ("ACK CMD Capture Done. END", None),
+])
+def test_parse_length(text, length):
+    assert parse_length(text) == length
+
+
+def test_wait_for_line_returns_the_announced_length():
+    ser = ReplaySerial(b"ACK CMD Capture Done. END\nACK CMD Length: 5692 END\nACK IMG END\n" + JPEG)
+    lines = []
+    assert wait_for_line(ser, ("ACK IMG END",), timeout=1, on_line=lines.append) == ("ACK IMG END", 5692)
+    assert len(lines) == 3 and ser.pos == ser.data.index(JPEG)
+
+
+@pytest.mark.parametrize('burst', [None, 1, 7, 4096])
+def test_receive_stops_at_eoi(burst):
+    # The FIFO length covers padding after EOI, which stays unread
+    ser = ReplaySerial(JPEG + bytes(8) + b'next', burst)
+    data = receive_jpeg(ser, length=len(JPEG) + 8, timeout=1)
+    assert isinstance(data, memoryview) and bytes(data) == JPEG
+    assert ser.in_waiting <= 12
+
+
+def test_receive_finds_eoi_split_across_reads():
+    # The FF of EOI ends one read and the D9 starts the next
+    ser = ReplaySerial(JPEG + bytes(4), burst=len(JPEG) - 1)
+    assert bytes(receive_jpeg(ser, length=len(JPEG) + 4, timeout=1)) == JPEG
+
+
+def test_receive_never_reads_past_length():
+    ser = ReplaySerial(JPEG, burst=1000)
+    assert bytes(receive_jpeg(ser, length=3000, timeout=1)) == JPEG[:3000]
+    assert ser.pos == 3000
+
+
+def test_receive_returns_what_arrived_before_timeout():
+    ser = ReplaySerial(JPEG[:-100], burst=512)
+    assert bytes(receive_jpeg(ser, length=len(JPEG), timeout=0.05)) == JPEG[:-100]
+
+
+def test_receive_without_length_uses_the_fifo_size():
+    ser = ReplaySerial(JPEG + bytes(8))
+    assert bytes(receive_jpeg(ser, timeout=1)) == JPEG
+
+
+@pytest.mark.parametrize('burst', [1, 100, None])
+def test_read_exact_fills_the_view(burst):
+    buf = bytearray(len(JPEG))
+    assert read_exact(ReplaySerial(JPEG + b'more', burst), memoryview(buf), timeout=1) == len(JPEG)
+    assert buf == JPEG
+
+
+def test_read_exact_stops_at_idle_timeout():
+    buf = bytearray(len(JPEG))
+    got = read_exact(ReplaySerial(JPEG[:1000]), memoryview(buf), timeout=60, idle_timeout=0.05)
+    assert got == 1000 and buf[:1000] == JPEG[:1000]
+
+
+def test_trim_to_eoi():
+    assert bytes(trim_to_eoi(JPEG + bytes(7))) == JPEG
+    assert bytes(trim_to_eoi(JPEG)) == JPEG
+    assert bytes(trim_to_eoi(JPEG[:-2] + bytes(5000))) == JPEG[:-2] + bytes(5000)
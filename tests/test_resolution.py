@@ -0,0 +1,64 @@
+import itertools
+import re
+
+import pytest
+
+from picocam.camera import ARDUINO, CIRCUITPYTHON, PicoCamera
+from picocam.emulator import PicoEmulator
+from picocam.regs import (RESOLUTIONS, SIZE_TABLES, init_state, load_tables, resolution_delta,
+                          resolution_id)
+
+TABLES = load_tables()
+
+
+@pytest.mark.parametrize('value, res', [(0, 0), ('6', 6), ('2592x1944', 6), ('1024X768', 2)])
+def test_resolution_id(value, res):
+    assert resolution_id(value) == res
+
+
+@pytest.mark.parametrize('value', [7, '1920x1080', 'huge', -1])
+def test_resolution_id_rejects_unknown(value):
+    with pytest.raises(ValueError):
+        resolution_id(value)
+
+
+def state_after(src, dst):
+    # Registers after InitCAM() + the size table of src, then the delta to dst
+    state = init_state(TABLES)
+    state.update(TABLES[SIZE_TABLES[src]])
+    delta = resolution_delta(TABLES, src, dst)
+    if delta is None:
+        return None
+    state.update(delta)
+    return state
+
+
+@pytest.mark.parametrize('src, dst', list(itertools.permutations(RESOLUTIONS, 2)))
+def test_delta_reaches_the_same_state_as_a_re_init(src, dst):
+    state = state_after(src, dst)
+    if state is None:
+        # Only when src sets a register InitCAM() leaves at an unknown reset value
+        assert set(dict(TABLES[SIZE_TABLES[src]])) - set(init_state(TABLES))
+        return
+    expected = init_state(TABLES)
+    expected.update(TABLES[SIZE_TABLES[dst]])
+    assert state == expected
+
+
+def test_same_mode_needs_no_writes():
+    assert resolution_delta(TABLES, 3, 3) == []
+
+
+@pytest.mark.parametrize('dialect', [CIRCUITPYTHON, ARDUINO])
+def test_switch_and_query(dialect):
+    with PicoEmulator(dialect) as emu, PicoCamera(emu.port, dialect) as cam:
+        assert cam.set_resolution() == 6
+        assert cam.set_resolution('320x240') == 0
+        writes = len(resolution_delta(TABLES, 6, 0))
+        assert re.fullmatch(rf"{writes} writes in [\d.]+ ms", cam.last_switch)
+        cam.capture()
+        assert cam.last_header.resolution == 0
+        # capture(resolution=...) switches first, and only when needed
+        cam.capture(resolution=4)
+        assert (cam.resolution, cam.last_header.resolution) == (4, 4)
+        assert cam.ping().resolution == 4
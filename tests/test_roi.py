@@ -0,0 +1,82 @@
+import pytest
+
+from picocam.camera import ARDUINO, CIRCUITPYTHON, PicoCamera
+from picocam.emulator import PicoEmulator
+from picocam.jpeg import jpeg_comments, validate_jpeg
+from picocam.receive import wait_for_line
+from picocam.roi import (FLAG_ROI, ROI_PREFIX, SENSOR_WIDTH, Roi, align_roi, check_roi, parse_roi, roi_command,
+                         roi_from_comments, window_writes)
+
+
+@pytest.mark.parametrize('rect, roi', [
+    ((0, 0, 640, 480), Roi(0, 0, 640, 480)),
+    ((5, 3, 100, 50), Roi(0, 0, 112, 56)),
+    ((-20, -20, 100, 100), Roi(0, 0, 80, 80)),
+    ((2590, 1940, 100, 100), Roi(2576, 1936, 16, 8)),
+])
+def test_align_roi(rect, roi):
+    assert align_roi(*rect) == roi
+    check_roi(roi)
+
+
+def test_align_roi_off_sensor():
+    with pytest.raises(ValueError):
+        align_roi(SENSOR_WIDTH, 0, 64, 64)
+
+
+@pytest.mark.parametrize('roi', [(8, 0, 64, 64), (0, 4, 64, 64), (0, 0, 0, 64), (2560, 0, 64, 64)])
+def test_check_roi_rejects(roi):
+    with pytest.raises(ValueError):
+        check_roi(roi)
+
+
+def test_command_and_report():
+    assert roi_command(Roi(16, 8, 320, 240)) == b'\x1a16,8,320,240\n'
+    assert roi_command() == b'\x1a\n'
+    assert parse_roi("ACK CMD ROI: 16,8,320,240 END") == Roi(16, 8, 320, 240)
+    assert parse_roi("ACK CMD ROI: off END") is None
+    with pytest.raises(ValueError):
+        parse_roi("ACK CMD ROI: 16,8 END")
+
+
+def test_window_writes():
+    writes = dict(window_writes(Roi(16, 8, 320, 240)))
+    assert len(writes) == 16
+    assert (writes[0x3808] << 8 | writes[0x3809], writes[0x380A] << 8 | writes[0x380B]) == (320, 240)
+
+
+@pytest.mark.parametrize('dialect', [CIRCUITPYTHON, ARDUINO])
+def test_set_and_restore_over_the_emulator(dialect):
+    with PicoEmulator(dialect, resolution=2) as emu, PicoCamera(emu.port, dialect) as cam:
+        assert cam.set_roi(100, 100, 300, 200) == Roi(96, 96, 304, 208)
+        assert cam.resolution == 6  # Windows are cut from the full frame
+        jpeg = cam.capture()
+        assert cam.last_header.flags & FLAG_ROI
+        info = validate_jpeg(jpeg)
+        assert (info.width, info.height) == (304, 208)
+        assert roi_from_comments(jpeg_comments(jpeg)) == Roi(96, 96, 304, 208)
+
+        assert cam.set_roi() is None
+        jpeg = cam.capture()
+        assert not cam.last_header.flags & FLAG_ROI
+        assert roi_from_comments(jpeg_comments(jpeg)) is None
+
+
+def test_resolution_switch_drops_the_window():
+    with PicoEmulator(CIRCUITPYTHON) as emu, PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        cam.set_roi(0, 0, 640, 480)
+        cam.set_resolution(0)
+        assert cam.roi is None
+        cam.capture()
+        assert not cam.last_header.flags & FLAG_ROI
+
+
+def test_unaligned_roi_is_rejected():
+    with PicoEmulator(CIRCUITPYTHON) as emu, PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        with pytest.raises(ValueError):
+            cam.set_roi(5, 0, 64, 64, align=False)
+        # The device checks too
+        cam.ser.write(roi_command((5, 0, 64, 64)))
+        line, _ = wait_for_line(cam.ser, (ROI_PREFIX, "ACK CMD ERROR"), timeout=5)
+        assert line == "ACK CMD ERROR: Bad ROI 5,0,64,64 END"
+        assert cam.set_roi(0, 0, 64, 64) == Roi(0, 0, 64, 64)
@@ -0,0 +1,96 @@
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from picocam.sink import BackgroundWriter, DirectorySink, SQLiteSink, Sink, TarSink, ZipSink, open_sink
+
+JPEG = b'\xff\xd8' + bytes(100) + b'\xff\xd9'
+
+
+def test_directory_reports_renamed_file(tmp_path, monkeypatch):
+    # Every frame gets the same timestamp name; the sink renames the file on disk
+    monkeypatch.setattr('picocam.sink.timestamp_name', lambda *args: 'img')
+    (tmp_path / 'img.jpg').write_bytes(b'earlier run')
+    with BackgroundWriter(DirectorySink(str(tmp_path))) as writer:
+        stored = [writer.submit(JPEG) for _ in range(2)]
+    paths = [f.result() for f in stored]
+    assert paths == [str(tmp_path / 'img-2.jpg'), str(tmp_path / 'img-2-2.jpg')]
+    assert all(open(path, 'rb').read() == JPEG for path in paths)
+    assert (tmp_path / 'img.jpg').read_bytes() == b'earlier run'
+
+
+@pytest.mark.parametrize('name', ['images.tar', 'images.zip', 'images.sqlite'])
+def test_archives_report_member(tmp_path, name):
+    target = str(tmp_path / name)
+    with BackgroundWriter(target) as writer:
+        where = writer.submit(JPEG, index=1, camera='cam0').result()
+    assert where.startswith(target + ':')
+    member = where[len(target) + 1:]
+    assert member.endswith('_cam0_0001' + ('' if name.endswith('.sqlite') else '.jpg'))
+    assert member in writer.sink.describe(where)
+    if name.endswith('.tar'):
+        with tarfile.open(target) as tar:
+            assert tar.extractfile(member).read() == JPEG
+    elif name.endswith('.zip'):
+        with zipfile.ZipFile(target) as z:
+            assert z.read(member) == JPEG
+
+
+def test_describe_directory_is_the_path(tmp_path):
+    sink = open_sink(str(tmp_path / 'out'))
+    where = sink.write('img', JPEG)
+    sink.close()
+    assert sink.describe(where) == where == os.path.join(str(tmp_path / 'out'), 'img.jpg')
+
+
+class FailingSink(Sink):
+    def _write(self, name, data, when, camera, index):
+        raise OSError("disk full")
+
+    def _sync(self):
+        pass
+
+
+def test_write_error_fails_future_and_close():
+    writer = BackgroundWriter(FailingSink())
+    stored = writer.submit(JPEG)
+    with pytest.raises(OSError, match="disk full"):
+        stored.result(timeout=5)
+    with pytest.raises(OSError, match="disk full"):
+        writer.close()
+
+
+def test_incomplete_sink_fails_on_construction():
+    class NoSync(Sink):
+        def _write(self, name, data, when, camera, index):
+            return name
+
+    with pytest.raises(TypeError):
+        NoSync()
+
+
+@pytest.mark.parametrize('name, cls', [
+    ('images', DirectorySink),
+    ('images.tar', TarSink),
+    ('images.ZIP', ZipSink),
+    ('images.db', SQLiteSink),
+    ('images.sqlite', SQLiteSink),
+    ('images.sqlite3', SQLiteSink),
+])
+def test_open_sink_dispatch(tmp_path, name, cls):
+    sink = open_sink(str(tmp_path / name), fsync='never')
+    try:
+        assert type(sink) is cls
+        assert sink.fsync == 'never'
+        where = sink.write('img', JPEG)
+    finally:
+        sink.close()
+    assert 'img' in sink.describe(where)
+    if cls is DirectorySink:
+        assert os.path.isdir(tmp_path / name)
+        assert open(where, 'rb').read() == JPEG
+    elif cls is ZipSink:
+        with zipfile.ZipFile(str(tmp_path / name)) as z:
+            assert z.read('img.jpg') == JPEG
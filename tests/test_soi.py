@@ -0,0 +1,127 @@
+import ast
+import os
+import random
+
+import pytest
+
+CODE_PY = os.path.join(os.path.dirname(__file__), '..', 'circuitpython', 'code.py')
+# Patterns added to SOI_PATTERNS after the find() scanner; the legacy loop never looked for them
+EXTRA_PATTERNS = (b'\xff\xb1',)
+
+MARKERS = {
+    'Standard': b'\xff\xd8',
+    'Bit-Reversed': b'\xff\x1b',
+    'Bit-Inverted': b'\x00\x27',
+    'Nibble-Swap': b'\xff\x8d',
+    'Shift-R1': b'\x7f\xec',
+    'Shift-L1': b'\xff\xb0',
+}
+
+
+def load_firmware_scanner(extra=False):
+    """check_for_header() and the SOI_* constants from circuitpython/code.py."""
+    with open(CODE_PY) as f:
+        tree = ast.parse(f.read())
+    keep = [node for node in tree.body
+            if isinstance(node, ast.FunctionDef) and node.name == 'check_for_header'
+            or isinstance(node, ast.Assign) and any(getattr(t, 'id', '').startswith('SOI_') for t in node.targets)]
+    namespace = {}
+    exec(compile(ast.Module(body=keep, type_ignores=[]), CODE_PY, 'exec'), namespace)
+    if not extra:
+        namespace['SOI_PATTERNS'] = tuple(p for p in namespace['SOI_PATTERNS'] if p[0] not in EXTRA_PATTERNS)
+    return namespace
+
+
+def legacy_check_for_header(data):
+    # code.py's scanner before the find() version: one Python iteration per byte
+    for i in range(len(data)-1):
+        b1, b2 = data[i], data[i+1]
+        if b1 == 0xFF and b2 == 0xD8: return f"Standard at {i}", i
+        if b1 == 0xFF and b2 == 0x1B: return f"Bit-Reversed at {i}", i
+        if b1 == 0x00 and b2 == 0x27: return f"Bit-Inverted at {i}", i
+        if b1 == 0xFF and b2 == 0x8D: return f"Nibble-Swap at {i}", i
+        if b1 == 0x7F and b2 == 0xEC: return f"Shift-R1 at {i}", i
+        if b1 == 0xFF and b2 == 0xB0: return f"Shift-L1 at {i}", i
+    return None, -1
+
+
+FIRMWARE = load_firmware_scanner()
+check_for_header = FIRMWARE['check_for_header']
+WINDOW = FIRMWARE['SOI_WINDOW']
+
+
+def probe(marker, offset, size=2048):
+    # FIFO noise that cannot form a marker, the marker at `offset`, then JPEG-like bytes
+    data = bytearray(b'\x55' * size)
+    if marker is not None:
+        data[offset:offset + len(marker)] = marker
+    return data
+
+
+@pytest.mark.parametrize('offset', [0, 1, 37, WINDOW - 2, WINDOW - 1, WINDOW, WINDOW + 1, 1500, 2046])
+@pytest.mark.parametrize('name', MARKERS)
+def test_matches_legacy_scan(name, offset):
+    data = probe(MARKERS[name], offset)
+    assert check_for_header(data) == legacy_check_for_header(data) == (f"{name} at {offset}", offset)
+
+
+def test_marker_split_across_window_edge():
+    # FF in the last byte of the first window, D8 in the first byte after it
+    data = probe(b'\xff\xd8', WINDOW - 1)
+    assert data[WINDOW - 1:WINDOW + 1] == b'\xff\xd8'
+    assert check_for_header(data) == legacy_check_for_header(data) == (f"Standard at {WINDOW - 1}", WINDOW - 1)
+
+
+@pytest.mark.parametrize('data', [
+    bytearray(),
+    bytearray(b'\xff'),
+    bytearray(2048),
+    bytearray(b'\xff' * 2048),
+    bytearray(2047) + b'\xff',
+    bytearray(b'\x55' * 2048),
+], ids=['empty', 'one byte', 'zeros', 'ones', 'FF last', 'noise'])
+def test_absent_marker(data):
+    assert check_for_header(data) == legacy_check_for_header(data) == (None, -1)
+
+
+def test_earliest_marker_wins():
+    # A later table entry earlier in the buffer beats an earlier entry further on
+    data = probe(b'\xff\xd8', 40)
+    data[10:12] = b'\x7f\xec'
+    assert check_for_header(data) == legacy_check_for_header(data) == ("Shift-R1 at 10", 10)
+    # And a match inside the first window beats one after it
+    data = probe(b'\x00\x27', 900)
+    data[WINDOW - 5:WINDOW - 3] = b'\xff\x8d'
+    assert check_for_header(data) == legacy_check_for_header(data)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_buffers_match_legacy(seed):
+    rng = random.Random(seed)
+    # Few distinct byte values, so markers turn up at random places
+    data = bytearray(rng.choice((0x00, 0x27, 0x7F, 0xEC, 0xFF, 0xD8, 0x8D, 0x1B, 0xB0)) for _ in range(2048))
+    assert check_for_header(data) == legacy_check_for_header(data)
+
+
+def test_searches_only_up_to_end():
+    # The readout buffer is searched in place; bytes past `end` are stale
+    data = probe(b'\xff\xd8', 100)
+    assert check_for_header(data, 100) == (None, -1)
+    assert check_for_header(data, 101) == (None, -1)
+    assert check_for_header(data, 102) == ("Standard at 100", 100)
+    assert check_for_header(bytes(data), 102) == ("Standard at 100", 100)
+
+
+def test_shift_l1_of_a_real_soi():
+    # FF D8 FF shifted left one bit is FF B1 FF: the top bit of the marker
+    # that always follows SOI shifts in, so FF B0 alone never matched a real
+    # JPEG. SOI_PATTERNS has FF B1 under the same label, the one place the
+    # scanner deliberately differs from the legacy loop.
+    scan = load_firmware_scanner(extra=True)['check_for_header']
+    shifted = ((int.from_bytes(b'\xff\xd8\xff\xe0', 'big') << 1) & 0xFFFFFFFF).to_bytes(4, 'big')
+    assert shifted[:2] == b'\xff\xb1'
+    data = probe(shifted, 20)
+    assert scan(data) == ("Shift-L1 at 20", 20)
+    assert legacy_check_for_header(data) == (None, -1)
+    # FF B0 is still recognised
+    assert scan(probe(b'\xff\xb0', 20)) == ("Shift-L1 at 20", 20)
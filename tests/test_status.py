@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from picocam.camera import ARDUINO, CIRCUITPYTHON, CameraError, DeviceStatus, PicoCamera, parse_status
+from picocam.emulator import PicoEmulator, load_images
+
+JPEG = min(load_images(), key=len)
+
+
+@pytest.mark.parametrize('line, status', [
+    ("ACK CMD Status: ready 6 2592x1944 circuitpython 0.1.0 END",
+     DeviceStatus('ready', 6, 'circuitpython', '0.1.0')),
+    ("ACK CMD Status: initializing 0 320x240 arduino 0.1.0 END",
+     DeviceStatus('initializing', 0, 'arduino', '0.1.0')),
+    ("noise ACK CMD Status: error 4 1600x1200 arduino 0.2 END",
+     DeviceStatus('error', 4, 'arduino', '0.2')),
+])
+def test_parse_status(line, status):
+    assert parse_status(line) == status
+    assert parse_status(line, status.dialect) == status
+
+
+@pytest.mark.parametrize('line', [
+    "ACK CMD Status: ready END",
+    "ACK CMD Status: ready six 2592x1944 arduino 0.1.0 END",
+    "ACK CMD Status: END",
+])
+def test_parse_status_rejects_unreadable(line):
+    with pytest.raises(CameraError, match="Unreadable"):
+        parse_status(line)
+
+
+def test_parse_status_rejects_other_firmware():
+    with pytest.raises(CameraError, match="runs the arduino firmware"):
+        parse_status("ACK CMD Status: ready 6 2592x1944 arduino 0.1.0 END", CIRCUITPYTHON)
+
+
+@pytest.mark.parametrize('dialect', [CIRCUITPYTHON, ARDUINO])
+def test_open_waits_only_as_long_as_the_boot(dialect):
+    with PicoEmulator(dialect, [JPEG], boot_delay=0.5) as emu:
+        start = time.monotonic()
+        with PicoCamera(emu.port, dialect, boot_wait=30, ready_timeout=30) as cam:
+            opened = time.monotonic() - start
+            assert cam.status == DeviceStatus('ready', 6, dialect, '0.1.0')
+            assert bytes(cam.capture()) == JPEG
+    assert 0.5 <= opened < 5
+
+
+def test_ping_between_captures():
+    with PicoEmulator(CIRCUITPYTHON, [JPEG]) as emu, PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        cam.capture()
+        assert cam.ping().state == 'ready'
+        cam.capture()
+        assert cam.last_header.sequence == 2
+
+
+class SilentSerial:
+    """A port where nothing ever answers."""
+
+    is_open = True
+    in_waiting = 0
+
+    def __init__(self):
+        self.written = bytearray()
+
+    def readline(self):
+        time.sleep(0.01)
+        return b''
+
+    def write(self, data):
+        self.written += data
+
+    def flush(self):
+        pass
+
+
+def test_ping_without_answer_returns_none():
+    cam = PicoCamera('silent', CIRCUITPYTHON)
+    cam.ser = SilentSerial()
+    assert cam.ping(timeout=0.1) is None
+    assert cam.ser.written == b'\x18'
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from picocam.camera import CIRCUITPYTHON, PicoCamera
+from picocam.emulator import PicoEmulator, load_images
+from picocam.transform import (BIT_INVERTED, BIT_REVERSED, FLAG_TRANSFORM, NIBBLE_SWAP, SHIFT_L1, SHIFT_R1,
+                               STANDARD, TRANSFORM_NAMES, apply, np, recover, transform_name)
+
+JPEG = min(load_images(), key=len)
+PAYLOAD = JPEG + bytes(5)  # FIFO padding after EOI, as the device streams it
+FAULTS = range(len(TRANSFORM_NAMES))
+METHODS = [False, pytest.param(True, marks=pytest.mark.skipif(np is None, reason="needs NumPy"))]
+
+
+@pytest.mark.parametrize('use_numpy', METHODS)
+@pytest.mark.parametrize('transform', FAULTS)
+def test_recover_undoes_apply(transform, use_numpy):
+    faulted = apply(PAYLOAD, transform, use_numpy)
+    assert len(faulted) == len(PAYLOAD)
+    assert (faulted == PAYLOAD) == (transform == STANDARD)
+    # Shift-R1 loses the bit shifted off the end, which falls in the padding
+    assert recover(faulted, transform, use_numpy)[:len(JPEG)] == JPEG
+
+
+@pytest.mark.parametrize('transform, soi', [
+    (BIT_REVERSED, b'\xff\x1b'),
+    (BIT_INVERTED, b'\x00\x27'),
+    (NIBBLE_SWAP, b'\xff\x8d'),
+    (SHIFT_R1, b'\x7f\xec'),
+    (SHIFT_L1, b'\xff\xb1'),
+])
+def test_faulted_soi_matches_the_firmware_patterns(transform, soi):
+    assert apply(JPEG, transform)[:2] == soi
+
+
+@pytest.mark.parametrize('transform', [SHIFT_R1, SHIFT_L1])
+def test_numpy_and_int_shifts_agree(transform):
+    if np is None:
+        pytest.skip("needs NumPy")
+    data = os.urandom(4099)
+    assert recover(data, transform, use_numpy=True) == recover(data, transform, use_numpy=False)
+    assert apply(data, transform, use_numpy=True) == apply(data, transform, use_numpy=False)
+
+
+def test_standard_is_not_copied():
+    view = memoryview(PAYLOAD)
+    assert recover(view, STANDARD) is view
+
+
+def test_unknown_transform():
+    with pytest.raises(ValueError):
+        recover(PAYLOAD, FLAG_TRANSFORM)
+    assert transform_name(SHIFT_L1) == 'Shift-L1'
+    assert transform_name(9) == 'unknown (9)'
+
+
+@pytest.mark.parametrize('transform', FAULTS)
+def test_capture_recovers_faulted_stream(transform):
+    with PicoEmulator(CIRCUITPYTHON, [JPEG], transform=transform) as emu, \
+            PicoCamera(emu.port, CIRCUITPYTHON) as cam:
+        jpeg = cam.capture()
+        assert cam.last_header.flags & FLAG_TRANSFORM == transform
+    assert bytes(jpeg) == JPEG